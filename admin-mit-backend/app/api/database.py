@@ -6,7 +6,7 @@
 
 Requirements: 1.1, 1.3, 1.4, 1.5, 3.1-3.6, 4.2-4.8, 6.1, 6.2, 6.3, 6.4
 """
-from flask import Blueprint, request, jsonify, g, Response
+from flask import Blueprint, request, jsonify, g, Response, stream_with_context
 from app.core.middleware import tenant_required, role_required
 from app.services.database_management import (
     database_management_service,
@@ -964,13 +964,19 @@ def execute_query(conn_id):
         - page: 页码 (默认 1)
         - per_page: 每页数量 (默认 50)
         - max_rows: 最大返回行数 (默认 1000)
+        - count_mode: 总数模式 none/estimate/exact (可选，默认使用配置)
+        - session_id: 查询会话 ID（翻页时传回上次返回的值；不传则重新执行查询）
+    
+    SELECT 查询按查询会话分页，翻页时传回 session_id 复用已缓存的结果窗口。
     
     Returns:
         JSON: 查询结果
             - columns: 列名列表
             - rows: 数据行列表
             - row_count: 返回行数
-            - total_count: 总行数
+            - total_count: 总行数（未知时为 null）
+            - total_estimated: 总行数是否为执行计划估算值（估算值不计入 pagination.total）
+            - session_id: 查询会话 ID（SELECT 查询）
             - execution_time: 执行时间（毫秒）
             - affected_rows: 受影响行数（对于 INSERT/UPDATE/DELETE）
             - is_select: 是否为 SELECT 查询
@@ -1008,7 +1014,9 @@ def execute_query(conn_id):
             page=page,
             per_page=per_page,
             max_rows=max_rows,
-            tenant_id=g.tenant_id
+            tenant_id=g.tenant_id,
+            count_mode=data.get('count_mode'),
+            session_id=data.get('session_id')
         )
         
         # 记录操作日志（仅记录非 SELECT 查询）
@@ -1073,12 +1081,15 @@ def export_csv(conn_id):
     Path Parameters:
         - conn_id: 连接配置 ID
     
+    查询通过独立连接和服务端游标逐批读取，CSV 以分块流式响应返回，
+    导出行数不受内存限制。
+    
     Request Body:
         - sql: SQL 查询语句 (必填，只支持 SELECT)
-        - max_rows: 最大导出行数 (默认 10000)
+        - max_rows: 最大导出行数 (可选，默认不限制)
     
     Returns:
-        CSV 文件下载
+        CSV 文件下载（流式）
         
     Requirements: 4.7
     """
@@ -1098,10 +1109,12 @@ def export_csv(conn_id):
                 'message': 'SQL 语句不能为空'
             }), 400
         
-        max_rows = data.get('max_rows', 10000)
-        max_rows = min(max_rows, 100000)  # 限制最大导出行数
+        max_rows = data.get('max_rows')
+        if max_rows is not None:
+            max_rows = max(int(max_rows), 1)
         
-        csv_content = database_management_service.export_csv(
+        # 查询在此处执行，SQL 错误仍以 JSON 返回
+        chunks = database_management_service.stream_csv(
             connection_id=conn_id,
             sql=sql,
             max_rows=max_rows,
@@ -1119,13 +1132,22 @@ def export_csv(conn_id):
             }
         )
         
+        def generate():
+            try:
+                yield from chunks
+            except Exception as e:
+                # 响应已开始输出，重新抛出使服务器中断分块响应，避免客户端收到看似完整的截断文件
+                logger.error(f"Export CSV stream error: {e}")
+                raise
+        
         # 返回 CSV 文件
         return Response(
-            csv_content,
+            stream_with_context(generate()),
             mimetype='text/csv',
             headers={
                 'Content-Disposition': 'attachment; filename=query_result.csv',
-                'Content-Type': 'text/csv; charset=utf-8'
+                'Content-Type': 'text/csv; charset=utf-8',
+                'X-Accel-Buffering': 'no'
             }
         )
         
@@ -4,6 +4,7 @@ SSH 主机管理 API
 from flask import Blueprint, request, jsonify, g
 from app.services.ssh_service import ssh_service
 from app.services.host_info_service import host_info_service
+from app.services.host_metrics_snapshot_service import host_metrics_snapshot_service
 from app.models.host import SSHHost, HostInfo
 from app.extensions import db
 from app.core.middleware import tenant_required, role_required
@@ -76,12 +77,18 @@ def get_hosts():
             error_out=False
         )
         
+        # 一次读取租户下所有主机的最新性能指标
+        try:
+            tenant_metrics = host_info_service.get_tenant_latest_metrics(g.tenant_id)
+        except Exception as e:
+            logger.warning(f"获取租户最新性能指标失败: {e}")
+            tenant_metrics = {}
+        
         hosts = []
         for host in pagination.items:
             host_data = host.to_dict(include_sensitive=False)
             # 添加最新性能指标
-            latest_metrics = host_info_service.get_host_latest_metrics(host.id)
-            host_data['latest_metrics'] = latest_metrics
+            host_data['latest_metrics'] = tenant_metrics.get(host.id)
             hosts.append(host_data)
         
         return jsonify({
@@ -381,6 +388,8 @@ def delete_host(host_id):
         db.session.delete(host)
         db.session.commit()
         
+        host_metrics_snapshot_service.remove_host(g.tenant_id, host_id)
+        
         return jsonify({
             'success': True,
             'message': '主机删除成功'
@@ -414,7 +423,7 @@ def get_host(host_id):
         host_data = host.to_dict(include_sensitive=False)
         
         # 添加最新性能指标
-        latest_metrics = host_info_service.get_host_latest_metrics(host.id)
+        latest_metrics = host_info_service.get_host_latest_metrics(host.id, g.tenant_id)
         host_data['latest_metrics'] = latest_metrics
         
         # 添加性能指标历史（最近24小时）
@@ -453,7 +462,7 @@ def get_host_status(host_id):
             }), 404
         
         # 获取最新性能指标
-        latest_metrics = host_info_service.get_host_latest_metrics(host.id)
+        latest_metrics = host_info_service.get_host_latest_metrics(host.id, g.tenant_id)
         
         # 获取采集状态
         collection_status = host_info_service.get_collection_status()
@@ -624,16 +633,27 @@ def get_host_metrics(host_id):
         # 获取查询参数
         hours = request.args.get('hours', 24, type=int)
         limit = request.args.get('limit', 100, type=int)
+        resolution_param = request.args.get('resolution', 'auto')
         
         # 限制查询范围
         hours = min(hours, 168)  # 最多7天
         limit = min(limit, 1000)  # 最多1000条记录
         
+        # 分辨率: auto（按时间范围自动选择）/ raw / 1m / 5m / 1h
+        resolution_map = {'raw': 0, '1m': 60, '5m': 300, '1h': 3600}
+        if resolution_param != 'auto' and resolution_param not in resolution_map:
+            return jsonify({
+                'success': False,
+                'message': f'不支持的分辨率: {resolution_param}'
+            }), 400
+        resolution = resolution_map.get(resolution_param)
+        
         # 获取最新性能指标
-        latest_metrics = host_info_service.get_host_latest_metrics(host.id)
+        latest_metrics = host_info_service.get_host_latest_metrics(host.id, g.tenant_id)
         
         # 获取历史性能指标
-        metrics_history = host_info_service.get_host_metrics_history(host.id, hours)
+        metrics_series = host_info_service.get_host_metrics_series(host.id, hours, resolution)
+        metrics_history = metrics_series['points']
         
         # 如果需要限制记录数，取最新的记录
         if len(metrics_history) > limit:
@@ -653,22 +673,25 @@ def get_host_metrics(host_id):
             if cpu_values:
                 stats['cpu'] = {
                     'avg': round(sum(cpu_values) / len(cpu_values), 2),
-                    'max': max(cpu_values),
-                    'min': min(cpu_values)
+                    # 汇总数据使用桶内极值，原始数据退化为采样值本身
+                    'max': max(m.get('cpu_max', m['cpu_usage']) for m in metrics_history if m.get('cpu_usage') is not None),
+                    'min': min(m.get('cpu_min', m['cpu_usage']) for m in metrics_history if m.get('cpu_usage') is not None)
                 }
             
             if memory_values:
                 stats['memory'] = {
                     'avg': round(sum(memory_values) / len(memory_values), 2),
-                    'max': max(memory_values),
-                    'min': min(memory_values)
+                    # 汇总数据使用桶内极值，原始数据退化为采样值本身
+                    'max': max(m.get('memory_max', m['memory_usage']) for m in metrics_history if m.get('memory_usage') is not None),
+                    'min': min(m.get('memory_min', m['memory_usage']) for m in metrics_history if m.get('memory_usage') is not None)
                 }
             
             if disk_values:
                 stats['disk'] = {
                     'avg': round(sum(disk_values) / len(disk_values), 2),
-                    'max': max(disk_values),
-                    'min': min(disk_values)
+                    # 汇总数据使用桶内极值，原始数据退化为采样值本身
+                    'max': max(m.get('disk_max', m['disk_usage']) for m in metrics_history if m.get('disk_usage') is not None),
+                    'min': min(m.get('disk_min', m['disk_usage']) for m in metrics_history if m.get('disk_usage') is not None)
                 }
         
         return jsonify({
@@ -684,6 +707,8 @@ def get_host_metrics(host_id):
                 'query_params': {
                     'hours': hours,
                     'limit': limit,
+                    'resolution': metrics_series['resolution'],
+                    'resolution_seconds': metrics_series['resolution_seconds'],
                     'total_records': len(metrics_history)
                 }
             }
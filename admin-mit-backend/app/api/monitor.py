@@ -561,6 +561,33 @@ def get_alert_channel(channel_id):
         }), 500
 
 
+@monitor_bp.route('/channels/notification-metrics', methods=['GET'])
+@tenant_required
+def get_notification_metrics():
+    """获取告警通知发送队列深度和发送延迟"""
+    try:
+        from app.services.alert_notification_dispatcher import alert_notification_dispatcher
+        
+        tenant_id = get_current_tenant_id()
+        channel_ids = [
+            row[0] for row in db.session.query(AlertChannel.id).filter(
+                AlertChannel.tenant_id == tenant_id
+            ).all()
+        ]
+        
+        return jsonify({
+            'success': True,
+            'data': alert_notification_dispatcher.get_metrics(channel_ids, tenant_id=tenant_id)
+        })
+        
+    except Exception as e:
+        logger.error(f"获取告警通知指标失败: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'message': f'获取告警通知指标失败: {str(e)}'
+        }), 500
+
+
 # ==================== Alert Rule APIs ====================
 
 def validate_rule_data(data, required_fields=None):
@@ -1873,45 +1900,35 @@ def _get_alert_distribution(tenant_id, time_threshold):
 def _get_host_status_statistics(tenant_id):
     """获取主机状态统计"""
     try:
-        from app.models.host import SSHHost, HostMetrics
+        from app.models.host import SSHHost
+        from app.services.host_info_service import host_info_service
         
-        # 获取所有主机的最新指标
-        latest_metrics = db.session.query(
+        hosts = db.session.query(
             SSHHost.id,
             SSHHost.name,
             SSHHost.hostname,
-            SSHHost.status,
-            HostMetrics.cpu_usage,
-            HostMetrics.memory_usage,
-            HostMetrics.disk_usage,
-            HostMetrics.load_average,
-            HostMetrics.collected_at
-        ).outerjoin(
-            HostMetrics,
-            SSHHost.id == HostMetrics.host_id
+            SSHHost.status
         ).filter(
             SSHHost.tenant_id == tenant_id
-        ).order_by(
-            SSHHost.id,
-            desc(HostMetrics.collected_at)
-        ).all()
+        ).order_by(SSHHost.id).all()
+        
+        # 从租户最新指标快照中一次读取所有主机的当前状态
+        tenant_metrics = host_info_service.get_tenant_latest_metrics(tenant_id)
         
-        # 按主机分组，取最新的指标
         host_metrics = {}
-        for metric in latest_metrics:
-            host_id = metric[0]
-            if host_id not in host_metrics:
-                host_metrics[host_id] = {
-                    'id': metric[0],
-                    'name': metric[1],
-                    'hostname': metric[2],
-                    'status': metric[3],
-                    'cpu_usage': float(metric[4]) if metric[4] else 0,
-                    'memory_usage': float(metric[5]) if metric[5] else 0,
-                    'disk_usage': float(metric[6]) if metric[6] else 0,
-                    'load_average': float(metric[7]) if metric[7] else 0,
-                    'last_updated': metric[8].isoformat() if metric[8] else None
-                }
+        for host_id, name, hostname, status in hosts:
+            metrics = tenant_metrics.get(host_id) or {}
+            host_metrics[host_id] = {
+                'id': host_id,
+                'name': name,
+                'hostname': hostname,
+                'status': status,
+                'cpu_usage': metrics.get('cpu_usage') or 0,
+                'memory_usage': metrics.get('memory_usage') or 0,
+                'disk_usage': metrics.get('disk_usage') or 0,
+                'load_average': metrics.get('load_average') or 0,
+                'last_updated': metrics.get('collected_at')
+            }
         
         # 计算健康状态
         healthy_hosts = 0
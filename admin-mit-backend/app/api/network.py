@@ -3,7 +3,7 @@
 """
 from flask import Blueprint, request, jsonify, g, Response
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from sqlalchemy import desc, func, or_
+from sqlalchemy import or_
 from datetime import datetime
 import logging
 
@@ -755,6 +755,10 @@ def create_probe():
         db.session.add(probe)
         db.session.commit()
         
+        # 启用了自动探测时加入调度
+        from app.services.network_probe_scheduler import network_probe_scheduler
+        network_probe_scheduler.sync_probe(probe)
+        
         logger.info(f"创建探测任务成功: {probe.name} (ID: {probe.id})")
         return jsonify({
             'success': True,
@@ -850,6 +854,7 @@ def update_probe(probe_id):
             'auto_probe_enabled', 'enabled'
         ]
         
+        old_interval = probe.interval_seconds
         for field in updatable_fields:
             if field in data:
                 if field == 'method' and data[field]:
@@ -860,6 +865,10 @@ def update_probe(probe_id):
         probe.updated_at = datetime.utcnow()
         db.session.commit()
         
+        # 同步调度（启停、间隔变更）
+        from app.services.network_probe_scheduler import network_probe_scheduler
+        network_probe_scheduler.sync_probe(probe, old_interval=old_interval)
+        
         logger.info(f"更新探测任务成功: {probe.name} (ID: {probe.id})")
         return jsonify({
             'success': True,
@@ -918,6 +927,13 @@ def delete_probe(probe_id):
         db.session.delete(probe)
         db.session.commit()
         
+        # 移出调度
+        try:
+            from app.services.network_probe_scheduler import network_probe_scheduler
+            network_probe_scheduler.unschedule_probe(probe_id)
+        except Exception as e:
+            logger.warning(f"清理调度状态失败: {str(e)}")
+        
         logger.info(f"删除探测任务成功: {probe_name} (ID: {probe_id})")
         return jsonify({
             'success': True,
@@ -976,18 +992,12 @@ def start_probe(probe_id):
         
         logger.info(f"启动自动探测: {probe.name} (ID: {probe.id}), 间隔: {probe.interval_seconds}秒")
         
-        # 立即触发独立的定时调度任务
+        # 加入调度，下一次 ticker 时立即执行
         try:
-            from app.tasks.network_probe_tasks import schedule_single_probe
-            schedule_single_probe.apply_async(
-                kwargs={
-                    'probe_id': probe.id,
-                    'tenant_id': tenant_id,
-                    'interval_seconds': probe.interval_seconds
-                }
-            )
+            from app.services.network_probe_scheduler import network_probe_scheduler
+            network_probe_scheduler.schedule_probe(probe.id, probe.interval_seconds, delay=0)
         except Exception as e:
-            logger.warning(f"触发调度任务失败: {str(e)}")
+            logger.warning(f"加入探测调度失败: {str(e)}")
         
         return jsonify({
             'success': True,
@@ -1047,23 +1057,10 @@ def stop_probe(probe_id):
         
         logger.info(f"停止自动探测: {probe.name} (ID: {probe.id})")
         
-        # 清理 Redis 中的调度状态
+        # 移出调度
         try:
-            import redis
-            from app.core.config_manager import config_manager
-            redis_config = config_manager.get_redis_config()
-            redis_password = redis_config.get('password', '')
-            redis_client = redis.Redis(
-                host=redis_config['host'],
-                port=redis_config['port'],
-                password=redis_password if redis_password else None,
-                db=3,
-                decode_responses=True
-            )
-            # 删除调度相关的 key
-            redis_client.delete(f"probe_schedule:{probe_id}")
-            redis_client.delete(f"probe_last_run:{probe_id}")
-            redis_client.delete(f"probe_lock:{probe_id}")
+            from app.services.network_probe_scheduler import network_probe_scheduler
+            network_probe_scheduler.unschedule_probe(probe_id)
         except Exception as e:
             logger.warning(f"清理调度状态失败: {str(e)}")
         
@@ -1321,6 +1318,7 @@ def get_probe_statistics(probe_id):
                     "failed": 3,
                     "timeout": 2
                 },
+                "percentiles": {"p50": 110.0, "p95": 240.5, "p99": 480.0},
                 "probe_info": {...}
             }
         }
@@ -1404,7 +1402,10 @@ def get_probe_history(probe_id):
                         "timeout_count": 0,
                         "average_response_time": 123.45,
                         "min_response_time": 100,
-                        "max_response_time": 150
+                        "max_response_time": 150,
+                        "p50": 120.0,
+                        "p95": 145.0,
+                        "p99": 149.0
                     },
                     ...
                 ],
@@ -1440,12 +1441,35 @@ def get_probe_history(probe_id):
         
         # 导入探测结果模型
         from app.models.network import NetworkProbeResult
+        from app.services.network_probe_stats_service import network_probe_stats_service
         from datetime import timedelta
         
         # 计算时间范围
         end_time = datetime.utcnow()
         start_time = end_time - timedelta(hours=hours)
         
+        if network_probe_stats_service.can_serve_history(start_time, interval):
+            # 聚合数据覆盖查询范围时按时间桶读取
+            history = network_probe_stats_service.get_probe_history(probe_id, start_time, end_time, interval)
+            return jsonify({
+                'success': True,
+                'data': {
+                    'history': history,
+                    'probe_info': {
+                        'id': probe.id,
+                        'name': probe.name,
+                        'protocol': probe.protocol,
+                        'target_url': probe.target_url
+                    },
+                    'query_params': {
+                        'hours': hours,
+                        'interval_minutes': interval,
+                        'start_time': start_time.isoformat() + 'Z',
+                        'end_time': end_time.isoformat() + 'Z'
+                    }
+                }
+            }), 200
+        
         # 查询时间范围内的所有结果
         results = NetworkProbeResult.query.filter(
             NetworkProbeResult.probe_id == probe_id,
@@ -1475,7 +1499,7 @@ def get_probe_history(probe_id):
                 timeout_results = [r for r in bucket_results if r.status == 'timeout']
                 
                 # 计算响应时间统计（仅成功的请求）
-                response_times = [r.response_time for r in success_results if r.response_time is not None]
+                response_times = sorted(r.response_time for r in success_results if r.response_time is not None)
                 
                 history.append({
                     'timestamp': current_bucket_start.isoformat() + 'Z',
@@ -1484,7 +1508,12 @@ def get_probe_history(probe_id):
                     'timeout_count': len(timeout_results),
                     'average_response_time': round(sum(response_times) / len(response_times), 2) if response_times else None,
                     'min_response_time': min(response_times) if response_times else None,
-                    'max_response_time': max(response_times) if response_times else None
+                    'max_response_time': max(response_times) if response_times else None,
+                    **{
+                        f"p{int(q * 100)}": response_times[min(int(q * len(response_times)), len(response_times) - 1)]
+                        if response_times else None
+                        for q in (0.5, 0.95, 0.99)
+                    }
                 })
             else:
                 # 没有数据的时间桶
@@ -1495,7 +1524,10 @@ def get_probe_history(probe_id):
                     'timeout_count': 0,
                     'average_response_time': None,
                     'min_response_time': None,
-                    'max_response_time': None
+                    'max_response_time': None,
+                    'p50': None,
+                    'p95': None,
+                    'p99': None
                 })
             
             current_bucket_start = bucket_end
@@ -1623,7 +1655,8 @@ def get_network_dashboard():
                     "success": 950,
                     "failed": 30,
                     "timeout": 20,
-                    "success_rate": 95.0
+                    "success_rate": 95.0,
+                    "response_time_percentiles": {"p50": 110.0, "p95": 240.5, "p99": 480.0}
                 },
                 "protocol_distribution": {
                     "http": 20,
@@ -1674,209 +1707,10 @@ def get_network_dashboard():
                 'message': '租户信息缺失'
             }), 400
         
-        # 导入必要的模型和服务
-        from app.models.network import NetworkProbeResult
-        from datetime import timedelta
-        
-        # 计算时间范围（今天）
-        now = datetime.utcnow()
-        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        
-        # 1. 概览统计
-        total_probes = NetworkProbe.query.filter(
-            NetworkProbe.tenant_id == tenant_id
-        ).count()
-        
-        active_probes = NetworkProbe.query.filter(
-            NetworkProbe.tenant_id == tenant_id,
-            NetworkProbe.auto_probe_enabled == True,
-            NetworkProbe.enabled == True
-        ).count()
-        
-        total_groups = NetworkProbeGroup.query.filter(
-            NetworkProbeGroup.tenant_id == tenant_id
-        ).count()
-        
-        total_results_today = NetworkProbeResult.query.filter(
-            NetworkProbeResult.tenant_id == tenant_id,
-            NetworkProbeResult.probed_at >= today_start
-        ).count()
-        
-        overview = {
-            'total_probes': total_probes,
-            'active_probes': active_probes,
-            'total_groups': total_groups,
-            'total_results_today': total_results_today
-        }
-        
-        # 2. 探测任务状态分布
-        running_count = NetworkProbe.query.filter(
-            NetworkProbe.tenant_id == tenant_id,
-            NetworkProbe.auto_probe_enabled == True,
-            NetworkProbe.enabled == True
-        ).count()
-        
-        stopped_count = NetworkProbe.query.filter(
-            NetworkProbe.tenant_id == tenant_id,
-            or_(
-                NetworkProbe.auto_probe_enabled == False,
-                NetworkProbe.enabled == False
-            )
-        ).count()
+        # 大屏数据由聚合服务计算（CTE 查询 + 按租户短时缓存，并发请求只回源一次）
+        from app.services.network_dashboard_service import network_dashboard_service
         
-        probe_status = {
-            'running': running_count,
-            'stopped': stopped_count,
-            'error': 0  # 可以根据实际情况统计错误状态
-        }
-        
-        # 3. 最近探测结果统计（最近24小时）
-        last_24h_start = now - timedelta(hours=24)
-        recent_results_query = NetworkProbeResult.query.filter(
-            NetworkProbeResult.tenant_id == tenant_id,
-            NetworkProbeResult.probed_at >= last_24h_start
-        )
-        
-        success_count = recent_results_query.filter(
-            NetworkProbeResult.status == 'success'
-        ).count()
-        
-        failed_count = recent_results_query.filter(
-            NetworkProbeResult.status == 'failed'
-        ).count()
-        
-        timeout_count = recent_results_query.filter(
-            NetworkProbeResult.status == 'timeout'
-        ).count()
-        
-        total_recent = success_count + failed_count + timeout_count
-        success_rate = (success_count / total_recent * 100) if total_recent > 0 else 0
-        
-        recent_results = {
-            'success': success_count,
-            'failed': failed_count,
-            'timeout': timeout_count,
-            'success_rate': round(success_rate, 2)
-        }
-        
-        # 4. 协议分布
-        protocol_distribution = {}
-        protocol_counts = db.session.query(
-            NetworkProbe.protocol,
-            func.count(NetworkProbe.id)
-        ).filter(
-            NetworkProbe.tenant_id == tenant_id
-        ).group_by(
-            NetworkProbe.protocol
-        ).all()
-        
-        for protocol, count in protocol_counts:
-            protocol_distribution[protocol] = count
-        
-        # 5. 响应时间最慢的探测任务（Top 5）
-        # 查询最近24小时内平均响应时间最慢的探测任务
-        slow_probes_query = db.session.query(
-            NetworkProbe.id,
-            NetworkProbe.name,
-            NetworkProbe.protocol,
-            NetworkProbe.target_url,
-            func.avg(NetworkProbeResult.response_time).label('avg_response_time')
-        ).join(
-            NetworkProbeResult,
-            NetworkProbe.id == NetworkProbeResult.probe_id
-        ).filter(
-            NetworkProbe.tenant_id == tenant_id,
-            NetworkProbeResult.status == 'success',
-            NetworkProbeResult.response_time.isnot(None),
-            NetworkProbeResult.probed_at >= last_24h_start
-        ).group_by(
-            NetworkProbe.id,
-            NetworkProbe.name,
-            NetworkProbe.protocol,
-            NetworkProbe.target_url
-        ).order_by(
-            desc('avg_response_time')
-        ).limit(5).all()
-        
-        top_slow_probes = [
-            {
-                'id': probe_id,
-                'name': name,
-                'average_response_time': round(float(avg_time), 2),
-                'protocol': protocol,
-                'target_url': target_url
-            }
-            for probe_id, name, protocol, target_url, avg_time in slow_probes_query
-        ]
-        
-        # 6. 失败次数最多的探测任务（Top 5）
-        failed_probes_query = db.session.query(
-            NetworkProbe.id,
-            NetworkProbe.name,
-            NetworkProbe.protocol,
-            NetworkProbe.target_url,
-            func.count(NetworkProbeResult.id).label('failed_count')
-        ).join(
-            NetworkProbeResult,
-            NetworkProbe.id == NetworkProbeResult.probe_id
-        ).filter(
-            NetworkProbe.tenant_id == tenant_id,
-            NetworkProbeResult.status.in_(['failed', 'timeout']),
-            NetworkProbeResult.probed_at >= last_24h_start
-        ).group_by(
-            NetworkProbe.id,
-            NetworkProbe.name,
-            NetworkProbe.protocol,
-            NetworkProbe.target_url
-        ).order_by(
-            desc('failed_count')
-        ).limit(5).all()
-        
-        top_failed_probes = [
-            {
-                'id': probe_id,
-                'name': name,
-                'failed_count': failed_count,
-                'protocol': protocol,
-                'target_url': target_url
-            }
-            for probe_id, name, protocol, target_url, failed_count in failed_probes_query
-        ]
-        
-        # 7. 最近的告警（最近10条失败或超时的探测结果）
-        recent_alert_results = NetworkProbeResult.query.join(
-            NetworkProbe,
-            NetworkProbeResult.probe_id == NetworkProbe.id
-        ).filter(
-            NetworkProbeResult.tenant_id == tenant_id,
-            NetworkProbeResult.status.in_(['failed', 'timeout'])
-        ).order_by(
-            NetworkProbeResult.probed_at.desc()
-        ).limit(10).all()
-        
-        recent_alerts = []
-        for result in recent_alert_results:
-            probe = NetworkProbe.query.get(result.probe_id)
-            if probe:
-                recent_alerts.append({
-                    'probe_id': result.probe_id,
-                    'probe_name': probe.name,
-                    'status': result.status,
-                    'error_message': result.error_message or '未知错误',
-                    'probed_at': result.probed_at.isoformat() + 'Z'
-                })
-        
-        # 组装响应数据
-        dashboard_data = {
-            'overview': overview,
-            'probe_status': probe_status,
-            'recent_results': recent_results,
-            'protocol_distribution': protocol_distribution,
-            'top_slow_probes': top_slow_probes,
-            'top_failed_probes': top_failed_probes,
-            'recent_alerts': recent_alerts,
-            'timestamp': now.isoformat() + 'Z'
-        }
+        dashboard_data = network_dashboard_service.get_dashboard(tenant_id)
         
         logger.info(f"获取网络监控大屏数据成功: tenant_id={tenant_id}")
         
@@ -6,7 +6,7 @@ Redis 管理 API
 
 Requirements: 1.1, 1.3, 1.4, 1.5, 2.1, 2.2, 2.3, 2.4, 7.1, 7.2, 7.3, 7.4
 """
-from flask import Blueprint, request, jsonify, g
+from flask import Blueprint, request, jsonify, g, Response, stream_with_context
 from app.core.middleware import tenant_required, role_required
 from app.services.redis_management_service import redis_management_service
 from app.services.redis_connection_manager import (
@@ -15,6 +15,7 @@ from app.services.redis_connection_manager import (
     RedisOperationError,
 )
 from app.services.operation_log_service import operation_log_service
+import json
 import logging
 
 logger = logging.getLogger(__name__)
@@ -604,23 +605,25 @@ def scan_keys(conn_id):
     
     Query Parameters:
         - pattern: 键名匹配模式 (默认 '*')
-        - cursor: 游标位置 (默认 0)
+        - cursor: 游标位置 (默认 0；集群模式为上一页返回的游标字符串)
         - count: 每次扫描返回的建议数量 (默认 50)
         - database: 数据库索引 (可选，仅单机模式有效)
+        - memory: 是否返回键的内存占用 (默认 false)
     
     Returns:
         JSON: 包含键列表和游标信息
             - cursor: 下一个游标位置 (0 表示扫描完成)
-            - keys: 键信息列表 [{key, type, ttl}, ...]
+            - keys: 键信息列表 [{key, type, ttl[, memory]}, ...]
             - total_scanned: 本次扫描的键数量
         
     Requirements: 3.1, 3.2, 3.3, 3.4, 3.5
     """
     try:
         pattern = request.args.get('pattern', '*')
-        cursor = request.args.get('cursor', 0, type=int)
+        cursor = request.args.get('cursor', '0')
         count = request.args.get('count', 50, type=int)
         database = request.args.get('database', type=int)
+        with_memory = request.args.get('memory', 'false').lower() in ('true', '1')
         
         # 限制每次扫描数量
         count = min(max(count, 1), 1000)
@@ -631,7 +634,8 @@ def scan_keys(conn_id):
             cursor=cursor,
             count=count,
             database=database,
-            tenant_id=g.tenant_id
+            tenant_id=g.tenant_id,
+            with_memory=with_memory
         )
         
         return jsonify({
@@ -674,6 +678,66 @@ def scan_keys(conn_id):
         }), 500
 
 
+@redis_bp.route('/<int:conn_id>/keys-stream', methods=['GET'])
+@tenant_required
+def stream_keys(conn_id):
+    """
+    流式扫描 Redis 键列表
+    
+    服务端连续执行 SCAN，每扫描一页即以一行 JSON（NDJSON）推送给客户端，
+    适用于键树浏览大量键的场景。
+    
+    Path Parameters:
+        - conn_id: 连接配置 ID
+    
+    Query Parameters:
+        - pattern: 键名匹配模式 (默认 '*')
+        - count: 每页扫描的建议数量 (默认 500，最大 1000)
+        - database: 数据库索引 (可选，仅单机模式有效)
+        - memory: 是否返回键的内存占用 (默认 false)
+        - limit: 最多返回的键数量 (默认 10000，最大 100000)
+    
+    Returns:
+        application/x-ndjson: 每行一页 {cursor, keys, total_scanned}；
+        出错时最后一行为 {error}
+    """
+    pattern = request.args.get('pattern', '*')
+    count = min(max(request.args.get('count', 500, type=int), 1), 1000)
+    database = request.args.get('database', type=int)
+    with_memory = request.args.get('memory', 'false').lower() in ('true', '1')
+    limit = min(max(request.args.get('limit', 10000, type=int), 1), 100000)
+    
+    pages = redis_management_service.iter_keys(
+        conn_id=conn_id,
+        pattern=pattern,
+        count=count,
+        database=database,
+        tenant_id=g.tenant_id,
+        with_memory=with_memory,
+        limit=limit
+    )
+    
+    def generate():
+        try:
+            for page in pages:
+                yield json.dumps(page, ensure_ascii=False) + '\n'
+        except (RedisConnectionException, RedisTimeoutException, RedisOperationError, ValueError) as e:
+            logger.warning(f"Stream keys error: {e}")
+            yield json.dumps({'error': str(e)}, ensure_ascii=False) + '\n'
+        except Exception as e:
+            logger.error(f"Stream keys error: {e}")
+            yield json.dumps({'error': '扫描键列表失败'}, ensure_ascii=False) + '\n'
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+
 @redis_bp.route('/<int:conn_id>/keys/<path:key>', methods=['GET'])
 @tenant_required
 def get_key_detail(conn_id, key):
@@ -691,7 +755,10 @@ def get_key_detail(conn_id, key):
             - ttl: 过期时间
             - encoding: 内部编码
             - size: 大小
-            - value: 键值
+            - value: 键值（集合类型只包含第一页）
+            - total: 集合元素总数
+            - truncated: 集合是否只返回了部分元素
+            - next_cursor: 下一页游标或起始索引
         
     Requirements: 3.4, 3.5, 4.1
     """
@@ -718,9 +785,13 @@ def get_key_detail(conn_id, key):
         )
         
         # 合并信息
+        # 集合类型只返回第一页，附带元素总数、是否截断和下一页游标
         result = {
             **key_info,
-            'value': key_value.get('value') if key_value else None
+            'value': key_value.get('value') if key_value else None,
+            'total': key_value.get('total') if key_value else None,
+            'truncated': key_value.get('truncated', False) if key_value else False,
+            'next_cursor': key_value.get('next_cursor') if key_value else None
         }
         
         return jsonify({
@@ -921,7 +992,8 @@ def update_key(conn_id, key):
             value=value,
             key_type=key_type,
             ttl=ttl,
-            tenant_id=g.tenant_id
+            tenant_id=g.tenant_id,
+            reject_truncated=True
         )
         
         # 记录操作日志
@@ -1192,38 +1264,59 @@ def set_key_ttl(conn_id, key):
 @tenant_required
 def get_hash(conn_id, key):
     """
-    获取 Hash 的所有字段和值
+    分页获取 Hash 的字段和值
+    
+    使用 HSCAN 增量读取，每页受元素数量和字节预算限制。
     
     Path Parameters:
         - conn_id: 连接配置 ID
         - key: 键名
     
+    Query Parameters:
+        - cursor: 游标位置 (默认 0)
+        - count: 每页字段数量 (可选，默认使用配置)
+        - match: 字段匹配模式 (可选)
+        - max_bytes: 每页字节预算 (可选，不超过配置上限)
+    
     Returns:
         JSON: Hash 字段和值
+            - fields: 本页字段和值
+            - field_count: 本页字段数量
+            - total: 字段总数
+            - cursor: 下一页游标 (0 表示读取完成)
         
     Requirements: 4.4
     """
     try:
-        result = redis_management_service.hget_all(
+        page = redis_management_service.scan_collection(
             conn_id=conn_id,
             key=key,
+            cursor=request.args.get('cursor', '0'),
+            count=request.args.get('count', type=int),
+            match=request.args.get('match') or None,
+            max_bytes=request.args.get('max_bytes', type=int),
             tenant_id=g.tenant_id
         )
         
-        if result is None:
+        if page is None:
             return jsonify({
                 'success': False,
                 'message': f'键不存在: {key}',
                 'error_code': 'REDIS_KEY_NOT_FOUND'
             }), 404
         
+        if page['type'] != 'hash':
+            raise ValueError(f"键类型不是 hash: {page['type']}")
+        
         return jsonify({
             'success': True,
             'data': {
                 'key': key,
                 'type': 'hash',
-                'fields': result,
-                'field_count': len(result)
+                'fields': {item['field']: item['value'] for item in page['items']},
+                'field_count': page['item_count'],
+                'total': page['total'],
+                'cursor': page['cursor']
             }
         })
         
@@ -1485,6 +1578,8 @@ def get_list(conn_id, key):
         - start: 起始索引 (默认 0)
         - stop: 结束索引 (默认 -1，表示最后一个元素)
     
+    单次返回的元素受每页数量和字节预算限制，未读完时以 next_start 继续请求，读完时 next_start 为 null。
+    
     Returns:
         JSON: List 元素列表
         
@@ -1509,13 +1604,15 @@ def get_list(conn_id, key):
                 'error_code': 'REDIS_KEY_NOT_FOUND'
             }), 404
         
+        elements, next_start = result
         return jsonify({
             'success': True,
             'data': {
                 'key': key,
                 'type': 'list',
-                'elements': result,
-                'element_count': len(result)
+                'elements': elements,
+                'element_count': len(elements),
+                'next_start': next_start
             }
         })
         
@@ -1764,38 +1861,59 @@ def delete_list_elements(conn_id, key):
 @tenant_required
 def get_set(conn_id, key):
     """
-    获取 Set 的所有成员
+    分页获取 Set 的成员
+    
+    使用 SSCAN 增量读取，每页受元素数量和字节预算限制。
     
     Path Parameters:
         - conn_id: 连接配置 ID
         - key: 键名
     
+    Query Parameters:
+        - cursor: 游标位置 (默认 0)
+        - count: 每页成员数量 (可选，默认使用配置)
+        - match: 成员匹配模式 (可选)
+        - max_bytes: 每页字节预算 (可选，不超过配置上限)
+    
     Returns:
         JSON: Set 成员列表
+            - members: 本页成员
+            - member_count: 本页成员数量
+            - total: 成员总数
+            - cursor: 下一页游标 (0 表示读取完成)
         
     Requirements: 4.6
     """
     try:
-        result = redis_management_service.smembers(
+        page = redis_management_service.scan_collection(
             conn_id=conn_id,
             key=key,
+            cursor=request.args.get('cursor', '0'),
+            count=request.args.get('count', type=int),
+            match=request.args.get('match') or None,
+            max_bytes=request.args.get('max_bytes', type=int),
             tenant_id=g.tenant_id
         )
         
-        if result is None:
+        if page is None:
             return jsonify({
                 'success': False,
                 'message': f'键不存在: {key}',
                 'error_code': 'REDIS_KEY_NOT_FOUND'
             }), 404
         
+        if page['type'] != 'set':
+            raise ValueError(f"键类型不是 set: {page['type']}")
+        
         return jsonify({
             'success': True,
             'data': {
                 'key': key,
                 'type': 'set',
-                'members': result,
-                'member_count': len(result)
+                'members': page['items'],
+                'member_count': page['item_count'],
+                'total': page['total'],
+                'cursor': page['cursor']
             }
         })
         
@@ -2055,6 +2173,8 @@ def get_zset(conn_id, key):
         - stop: 结束索引 (默认 -1，表示最后一个元素)
         - withscores: 是否包含分数 (默认 true)
     
+    单次返回的成员受每页数量和字节预算限制，未读完时以 next_start 继续请求，读完时 next_start 为 null。
+    
     Returns:
         JSON: ZSet 成员列表
         
@@ -2082,10 +2202,9 @@ def get_zset(conn_id, key):
             }), 404
         
         # 格式化结果
+        members, next_start = result
         if withscores:
-            members = [{'member': m, 'score': s} for m, s in result]
-        else:
-            members = result
+            members = [{'member': m, 'score': s} for m, s in members]
         
         return jsonify({
             'success': True,
@@ -2093,7 +2212,8 @@ def get_zset(conn_id, key):
                 'key': key,
                 'type': 'zset',
                 'members': members,
-                'member_count': len(members)
+                'member_count': len(members),
+                'next_start': next_start
             }
         })
         
@@ -2352,6 +2472,71 @@ def delete_zset_members(conn_id, key):
         }), 500
 
 
+# ==================== 集合元素流式读取 API ====================
+
+@redis_bp.route('/<int:conn_id>/elements-stream/<path:key>', methods=['GET'])
+@tenant_required
+def stream_collection_elements(conn_id, key):
+    """
+    流式读取 Hash/List/Set/ZSet 的元素
+    
+    服务端以 HSCAN/SSCAN/ZSCAN 或有限窗口的 LRANGE 连续读取，每页以一行 JSON
+    （NDJSON）推送给客户端，单页受元素数量和字节预算限制，适用于导出或浏览大集合。
+    
+    Path Parameters:
+        - conn_id: 连接配置 ID
+        - key: 键名
+    
+    Query Parameters:
+        - count: 每页元素数量 (可选，默认使用配置)
+        - match: 字段/成员匹配模式 (可选，List 不支持)
+        - max_bytes: 每页字节预算 (可选，不超过配置上限)
+        - limit: 最多返回的元素数量 (默认 100000，最大 1000000)
+    
+    Returns:
+        application/x-ndjson: 每行一页 {key, type, total, cursor, items, item_count, bytes}；
+        键不存在或出错时最后一行为 {error}
+    """
+    count = request.args.get('count', type=int)
+    match = request.args.get('match') or None
+    max_bytes = request.args.get('max_bytes', type=int)
+    limit = min(max(request.args.get('limit', 100000, type=int), 1), 1000000)
+    
+    pages = redis_management_service.iter_collection(
+        conn_id=conn_id,
+        key=key,
+        count=count,
+        match=match,
+        max_bytes=max_bytes,
+        tenant_id=g.tenant_id,
+        limit=limit
+    )
+    
+    def generate():
+        found = False
+        try:
+            for page in pages:
+                found = True
+                yield json.dumps(page, ensure_ascii=False) + '\n'
+            if not found:
+                yield json.dumps({'error': f'键不存在: {key}'}, ensure_ascii=False) + '\n'
+        except (RedisConnectionException, RedisTimeoutException, RedisOperationError, ValueError) as e:
+            logger.warning(f"Stream collection error: {e}")
+            yield json.dumps({'error': str(e)}, ensure_ascii=False) + '\n'
+        except Exception as e:
+            logger.error(f"Stream collection error: {e}")
+            yield json.dumps({'error': '读取集合元素失败'}, ensure_ascii=False) + '\n'
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+
 # ==================== 服务器信息 API ====================
 
 @redis_bp.route('/<int:conn_id>/info', methods=['GET'])
@@ -2600,3 +2785,129 @@ def get_cluster_nodes(conn_id):
             'success': False,
             'message': '获取集群节点失败'
         }), 500
+
+
+# ==================== 键空间分析 API ====================
+
+@redis_bp.route('/<int:conn_id>/keyspace-analysis', methods=['POST'])
+@role_required('admin', 'super_admin', '超级管理员', '运维管理员', '系统管理员')
+def start_keyspace_analysis(conn_id):
+    """
+    启动或恢复键空间分析
+    
+    后台 Celery 任务增量扫描整个键空间，按前缀、类型、TTL 区间汇总键数量与内存，
+    并记录最大的键。未完成的分析默认从上次的游标继续。
+    
+    Path Parameters:
+        - conn_id: 连接配置 ID
+    
+    Request Body:
+        - pattern: 键名匹配模式 (默认 '*')
+        - database: 数据库索引 (可选，仅单机模式有效)
+        - restart: 是否丢弃已有进度重新开始 (默认 false)
+    
+    Returns:
+        JSON: 分析状态
+    """
+    try:
+        from app.models.redis_connection import RedisConnection
+        from app.services.redis_keyspace_analyzer import redis_keyspace_analyzer
+        from app.tasks.redis_tasks import analyze_redis_keyspace
+        
+        if not RedisConnection.get_by_tenant(conn_id, g.tenant_id):
+            return jsonify({
+                'success': False,
+                'message': f'连接配置不存在: ID={conn_id}'
+            }), 404
+        
+        data = request.get_json(silent=True) or {}
+        state, should_schedule = redis_keyspace_analyzer.start(
+            tenant_id=g.tenant_id,
+            conn_id=conn_id,
+            pattern=data.get('pattern', '*'),
+            database=data.get('database'),
+            restart=bool(data.get('restart', False))
+        )
+        
+        if should_schedule:
+            analyze_redis_keyspace.apply_async(args=[g.tenant_id, conn_id, state['run_id']])
+        
+        return jsonify({
+            'success': True,
+            'data': redis_keyspace_analyzer.build_report(state)
+        })
+        
+    except Exception as e:
+        logger.error(f"Start keyspace analysis error: {e}")
+        return jsonify({
+            'success': False,
+            'message': '启动键空间分析失败'
+        }), 500
+
+
+@redis_bp.route('/<int:conn_id>/keyspace-analysis', methods=['GET'])
+@tenant_required
+def get_keyspace_analysis(conn_id):
+    """
+    获取键空间分析进度与结果
+    
+    Path Parameters:
+        - conn_id: 连接配置 ID
+    
+    Query Parameters:
+        - top_prefixes: 返回的前缀数量 (默认 50，最大 500)
+    
+    Returns:
+        JSON: 分析报告，尚未分析时 data 为 null
+            - status: running | completed | cancelled | failed
+            - scanned_keys / sampled_keys / estimated_bytes
+            - by_prefix / by_type / by_ttl: [{name, count, estimated_bytes, sampled}, ...]
+            - top_keys: [{key, type, ttl, bytes}, ...]
+    """
+    try:
+        from app.services.redis_keyspace_analyzer import redis_keyspace_analyzer
+        
+        top_prefixes = min(max(request.args.get('top_prefixes', 50, type=int), 1), 500)
+        state = redis_keyspace_analyzer.get_state(g.tenant_id, conn_id)
+        
+        return jsonify({
+            'success': True,
+            'data': redis_keyspace_analyzer.build_report(state, top_prefixes)
+        })
+        
+    except Exception as e:
+        logger.error(f"Get keyspace analysis error: {e}")
+        return jsonify({
+            'success': False,
+            'message': '获取键空间分析结果失败'
+        }), 500
+
+
+@redis_bp.route('/<int:conn_id>/keyspace-analysis/cancel', methods=['POST'])
+@role_required('admin', 'super_admin', '超级管理员', '运维管理员', '系统管理员')
+def cancel_keyspace_analysis(conn_id):
+    """
+    取消键空间分析（已汇总的结果保留）
+    
+    Path Parameters:
+        - conn_id: 连接配置 ID
+    
+    Returns:
+        JSON: 分析状态
+    """
+    try:
+        from app.services.redis_keyspace_analyzer import redis_keyspace_analyzer
+        
+        state = redis_keyspace_analyzer.cancel(g.tenant_id, conn_id)
+        
+        return jsonify({
+            'success': True,
+            'data': redis_keyspace_analyzer.build_report(state)
+        })
+        
+    except Exception as e:
+        logger.error(f"Cancel keyspace analysis error: {e}")
+        return jsonify({
+            'success': False,
+            'message': '取消键空间分析失败'
+        }), 500
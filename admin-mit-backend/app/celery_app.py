@@ -63,6 +63,7 @@ def create_celery_app() -> Celery:
         task_routes={
             'app.tasks.network_probe_tasks.*': {'queue': 'network_probes'},
             'app.tasks.alert_tasks.*': {'queue': 'alerts'},
+            'app.tasks.notification_tasks.*': {'queue': 'notifications'},
             'app.tasks.ansible_tasks.*': {'queue': 'ansible'},
         },
         
@@ -93,9 +94,13 @@ def create_celery_app() -> Celery:
         imports=[
             'app.tasks.network_probe_tasks',
             'app.tasks.host_probe_tasks',
+            'app.tasks.host_metrics_tasks',
+            'app.tasks.alert_tasks',
+            'app.tasks.notification_tasks',
             'app.tasks.audit_cleanup_tasks',
             'app.tasks.backup_tasks',
             'app.tasks.ansible_tasks',
+            'app.tasks.redis_tasks',
         ],
     )
     
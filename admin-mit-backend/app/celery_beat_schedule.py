@@ -19,13 +19,25 @@ CELERY_BEAT_SCHEDULE = {
     
     # ==================== 网络探测任务 ====================
     
-    # 每分钟调度一次自动探测任务
+    # 自动探测调度 ticker：取出到期探测并按分片派发
     'schedule-auto-probes': {
         'task': 'app.tasks.network_probe_tasks.schedule_auto_probes',
+        'schedule': 5.0,  # 每 5 秒执行一次
+        'options': {
+            'queue': 'network_probes',
+            'priority': 2,
+            'expires': 5
+        }
+    },
+    
+    # 补写异常退出进程遗留的探测结果
+    'recover-probe-result-spools': {
+        'task': 'app.tasks.network_probe_tasks.recover_probe_result_spools',
         'schedule': 60.0,  # 每 60 秒执行一次
         'options': {
             'queue': 'network_probes',
-            'priority': 2
+            'priority': 2,
+            'expires': 60
         }
     },
     
@@ -73,6 +85,69 @@ CELERY_BEAT_SCHEDULE = {
         }
     },
     
+    # ==================== 主机性能指标任务 ====================
+    
+    # 每分钟汇总 1 分钟粒度指标
+    'rollup-host-metrics-1m': {
+        'task': 'app.tasks.host_metrics_tasks.rollup_host_metrics',
+        'schedule': 60.0,  # 每 60 秒执行一次
+        'kwargs': {'resolution': 60},
+        'options': {
+            'priority': 2
+        }
+    },
+    
+    # 每 5 分钟汇总 5 分钟粒度指标
+    'rollup-host-metrics-5m': {
+        'task': 'app.tasks.host_metrics_tasks.rollup_host_metrics',
+        'schedule': 300.0,  # 每 300 秒执行一次
+        'kwargs': {'resolution': 300},
+        'options': {
+            'priority': 2
+        }
+    },
+    
+    # 每小时汇总 1 小时粒度指标
+    'rollup-host-metrics-1h': {
+        'task': 'app.tasks.host_metrics_tasks.rollup_host_metrics',
+        'schedule': crontab(minute=5),  # 每小时第 5 分钟执行
+        'kwargs': {'resolution': 3600},
+        'options': {
+            'priority': 2
+        }
+    },
+    
+    # 每小时按保留期清理过期的原始指标和汇总数据
+    'prune-host-metrics': {
+        'task': 'app.tasks.host_metrics_tasks.prune_host_metrics',
+        'schedule': crontab(minute=45),  # 每小时第 45 分钟执行
+        'options': {
+            'priority': 1
+        }
+    },
+    
+    # ==================== 告警监控任务 ====================
+    
+    # 每分钟为每个存在启用规则的租户派发一次告警评估
+    'dispatch-alert-evaluations': {
+        'task': 'app.tasks.alert_tasks.dispatch_alert_evaluations',
+        'schedule': 60.0,  # 每 60 秒执行一次
+        'options': {
+            'queue': 'alerts',
+            'priority': 3
+        }
+    },
+    
+    # 每分钟重新调度滞留的告警通知
+    'sweep-pending-notifications': {
+        'task': 'app.tasks.notification_tasks.sweep_pending_notifications',
+        'schedule': 60.0,  # 每 60 秒执行一次
+        'options': {
+            'queue': 'notifications',
+            'priority': 3
+        }
+    },
+    
     # ==================== 审计日志清理任务 ====================
     # Feature: webshell-command-audit
     # Requirements: 5.5
@@ -87,6 +162,16 @@ CELERY_BEAT_SCHEDULE = {
         }
     },
     
+    # 补写异常退出进程遗留的审计日志
+    'recover-audit-log-spools': {
+        'task': 'app.tasks.audit_cleanup_tasks.recover_audit_log_spools',
+        'schedule': 60.0,  # 每 60 秒执行一次
+        'options': {
+            'priority': 2,
+            'expires': 60
+        }
+    },
+    
     # ==================== Ansible 任务 ====================
     
     # 每小时清理超时的 Ansible 执行记录（超过2小时未完成的任务）
@@ -100,6 +100,7 @@ def handle_webshell_create_terminal(data):
         cols = data.get('cols', 80)
         rows = data.get('rows', 24)
         use_bridge = data.get('use_bridge', True)  # 默认使用桥接模式
+        binary_output = bool(data.get('binary', False))  # 客户端支持二进制输出帧
         
         if not webshell_session_id:
             emit('webshell_error', {'message': '缺少会话 ID'})
@@ -134,7 +135,8 @@ def handle_webshell_create_terminal(data):
                 cols=cols,
                 rows=rows,
                 socket_sid=socket_sid,  # 传递 Socket.IO session ID
-                ip_address=ip_address   # 传递客户端 IP 地址（用于审计日志）
+                ip_address=ip_address,  # 传递客户端 IP 地址（用于审计日志）
+                binary_output=binary_output
             )
             
             if success:
@@ -5,7 +5,7 @@ from .user import User
 from .role import Role, UserRole
 from .menu import Menu
 from .operation_log import OperationLog
-from .host import SSHHost, HostInfo, HostMetrics, HostGroup, HostProbeResult
+from .host import SSHHost, HostInfo, HostMetrics, HostMetricsRollup, HostGroup, HostProbeResult
 from .ansible import AnsiblePlaybook, PlaybookExecution
 from .monitor import AlertChannel, AlertRule, AlertRecord, AlertNotification
 from .network import NetworkProbeGroup, NetworkProbe, NetworkProbeResult, NetworkAlertRule, NetworkAlertRecord
@@ -31,6 +31,7 @@ __all__ = [
     'SSHHost',
     'HostInfo',
     'HostMetrics',
+    'HostMetricsRollup',
     'HostGroup',
     'HostProbeResult',
     'AnsiblePlaybook',
@@ -172,6 +172,69 @@ class HostMetrics(db.Model):
         return f'<HostMetrics host_id={self.host_id} collected_at={self.collected_at}>'
 
 
+class HostMetricsRollup(db.Model):
+    """主机性能指标降采样汇总模型（1分钟/5分钟/1小时）"""
+    __tablename__ = 'host_metrics_rollups'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    host_id = db.Column(db.Integer, db.ForeignKey('ssh_hosts.id', ondelete='CASCADE'), nullable=False)
+    resolution = db.Column(db.Integer, nullable=False)  # 汇总粒度（秒）: 60, 300, 3600
+    bucket_start = db.Column(db.DateTime, nullable=False)  # 时间桶起始时间（UTC）
+    sample_count = db.Column(db.Integer, nullable=False, default=0)  # 原始样本数
+    
+    cpu_min = db.Column(db.Numeric(5, 2))
+    cpu_max = db.Column(db.Numeric(5, 2))
+    cpu_avg = db.Column(db.Numeric(5, 2))
+    cpu_last = db.Column(db.Numeric(5, 2))
+    memory_min = db.Column(db.Numeric(5, 2))
+    memory_max = db.Column(db.Numeric(5, 2))
+    memory_avg = db.Column(db.Numeric(5, 2))
+    memory_last = db.Column(db.Numeric(5, 2))
+    disk_min = db.Column(db.Numeric(5, 2))
+    disk_max = db.Column(db.Numeric(5, 2))
+    disk_avg = db.Column(db.Numeric(5, 2))
+    disk_last = db.Column(db.Numeric(5, 2))
+    load_min = db.Column(db.Numeric(5, 2))
+    load_max = db.Column(db.Numeric(5, 2))
+    load_avg = db.Column(db.Numeric(5, 2))
+    load_last = db.Column(db.Numeric(5, 2))
+    network_in_last = db.Column(db.BigInteger)  # 网络入流量计数器（桶内最后值）
+    network_out_last = db.Column(db.BigInteger)  # 网络出流量计数器（桶内最后值）
+    
+    __table_args__ = (
+        db.UniqueConstraint('host_id', 'resolution', 'bucket_start', name='uq_host_metrics_rollup_bucket'),
+        db.Index('ix_host_metrics_rollups_resolution_bucket', 'resolution', 'bucket_start'),
+    )
+    
+    METRIC_PREFIXES = ('cpu', 'memory', 'disk', 'load')
+    
+    def to_dict(self):
+        """转换为字典格式，字段与 HostMetrics.to_dict 保持兼容（取平均值）"""
+        def _float(value):
+            return float(value) if value is not None else None
+        
+        result = {
+            'id': self.id,
+            'host_id': self.host_id,
+            'resolution': self.resolution,
+            'sample_count': self.sample_count,
+            'cpu_usage': _float(self.cpu_avg),
+            'memory_usage': _float(self.memory_avg),
+            'disk_usage': _float(self.disk_avg),
+            'load_average': _float(self.load_avg),
+            'network_in': self.network_in_last,
+            'network_out': self.network_out_last,
+            'collected_at': self.bucket_start.isoformat() if self.bucket_start else None
+        }
+        for prefix in self.METRIC_PREFIXES:
+            for stat in ('min', 'max', 'avg', 'last'):
+                result[f'{prefix}_{stat}'] = _float(getattr(self, f'{prefix}_{stat}'))
+        return result
+    
+    def __repr__(self):
+        return f'<HostMetricsRollup host_id={self.host_id} resolution={self.resolution} bucket_start={self.bucket_start}>'
+
+
 class HostProbeResult(db.Model):
     """主机探测结果模型"""
     __tablename__ = 'host_probe_results'
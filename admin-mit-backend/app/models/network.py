@@ -133,6 +133,14 @@ class NetworkProbeResult(BaseModel):
     error_message = db.Column(db.Text)
     probed_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        # 按探测任务取最近结果 / 按时间范围统计，附带常用列以支持仅索引扫描
+        db.Index(
+            'idx_probe_results_probe_probed_at', probe_id, probed_at.desc(),
+            postgresql_include=['status', 'response_time', 'status_code']
+        ),
+    )
+    
     def to_dict(self):
         """转换为字典格式"""
         from datetime import datetime, timedelta
@@ -9,6 +9,7 @@ from .password_service import password_decrypt_service
 from .csrf_service import csrf_service
 from .ssh_service import ssh_service
 from .host_info_service import host_info_service
+from .host_metrics_snapshot_service import host_metrics_snapshot_service
 from .webshell_service import webshell_service
 from .webshell_terminal_service import webshell_terminal_service
 from .websocket_service import websocket_service
@@ -16,6 +17,7 @@ from .ansible_service import ansible_service
 from .ansible_websocket_service import ansible_websocket_service
 from .email_notification_service import email_notification_service
 from .dingtalk_notification_service import dingtalk_notification_service
+from .alert_notification_dispatcher import alert_notification_dispatcher
 from .alert_monitoring_service import alert_monitoring_engine
 from .session_service import session_service
 from .command_filter_service import command_filter_service
@@ -43,6 +45,7 @@ __all__ = [
     'csrf_service',
     'ssh_service',
     'host_info_service',
+    'host_metrics_snapshot_service',
     'webshell_service',
     'webshell_terminal_service',
     'websocket_service',
@@ -50,6 +53,7 @@ __all__ = [
     'ansible_websocket_service',
     'email_notification_service',
     'dingtalk_notification_service',
+    'alert_notification_dispatcher',
     'alert_monitoring_engine',
     'session_service',
     'command_filter_service',
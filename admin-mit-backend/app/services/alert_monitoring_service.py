@@ -2,12 +2,15 @@
 告警规则监控引擎
 提供告警规则评估、指标数据收集、告警触发逻辑、告警静默期控制等功能
 """
+import json
 import logging
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime, timedelta, timezone, timezone
 from typing import Dict, List, Optional, Tuple, Any
 from decimal import Decimal
+from flask import current_app
 from sqlalchemy import and_, or_
 
 from app.extensions import db
@@ -16,7 +19,9 @@ from app.models.monitor import AlertRule, AlertRecord, AlertChannel, AlertNotifi
 from app.services.host_info_service import host_info_service, HostInfoCollectionError
 from app.services.email_notification_service import email_notification_service
 from app.services.dingtalk_notification_service import dingtalk_notification_service
+from app.services.alert_notification_dispatcher import alert_notification_dispatcher
 from app.core.config_manager import config_manager
+from app.utils.threshold_matrix import ThresholdMatrix, ThresholdRule, OPERATORS
 
 logger = logging.getLogger(__name__)
 
@@ -31,25 +36,41 @@ class MetricDataCollector:
     
     def __init__(self):
         self.collection_timeout = 30  # 数据收集超时时间（秒）
+        
+        app_config = config_manager.get_app_config()
+        monitoring_config = app_config.get('alert_monitoring', {})
+        
+        # 并发采集的最大工作线程数
+        self.max_workers = max(1, int(monitoring_config.get('max_concurrent_evaluations', 10)))
+        # 单轮采集的截止时间（秒），超时的主机回退到最后已知指标
+        self.collection_deadline = monitoring_config.get('collection_deadline', 45)
+        
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        # 仍在采集中的主机，避免上一轮未完成的主机被重复提交
+        self._inflight_hosts = set()
+        self._inflight_lock = threading.Lock()
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """获取（懒加载）采集线程池"""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix='metric-collector'
+                )
+            return self._executor
     
     def collect_host_metrics(self, host: SSHHost) -> Optional[Dict[str, Any]]:
         """收集单个主机的性能指标"""
         try:
             # 尝试获取最新的性能指标
-            latest_metrics = host_info_service.get_host_latest_metrics(host.id)
+            latest_metrics = host_info_service.get_host_latest_metrics(host.id, host.tenant_id)
             
             # 如果没有最新数据或数据过期，尝试实时收集
             if not latest_metrics or self._is_metrics_stale(latest_metrics):
                 logger.info(f"主机 {host.name} 指标数据过期，开始实时收集")
-                try:
-                    latest_metrics = host_info_service.collect_host_performance_metrics(host)
-                except HostInfoCollectionError as e:
-                    logger.warning(f"实时收集主机 {host.name} 指标失败: {str(e)}")
-                    # 如果实时收集失败，使用最后可用的数据
-                    if latest_metrics:
-                        logger.info(f"使用主机 {host.name} 的历史指标数据")
-                    else:
-                        return None
+                return self._collect_live_metrics(host, latest_metrics)
             
             return latest_metrics
             
@@ -57,6 +78,40 @@ class MetricDataCollector:
             logger.error(f"收集主机 {host.name} 指标数据失败: {str(e)}")
             return None
     
+    def _collect_live_metrics(self, host: SSHHost,
+                              fallback: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """实时收集主机指标，失败时使用最后可用的数据"""
+        try:
+            return host_info_service.collect_host_performance_metrics(host)
+        except HostInfoCollectionError as e:
+            logger.warning(f"实时收集主机 {host.name} 指标失败: {str(e)}")
+            # 如果实时收集失败，使用最后可用的数据
+            if fallback:
+                logger.info(f"使用主机 {host.name} 的历史指标数据")
+            return fallback
+    
+    def _collect_in_worker(self, app, host: SSHHost, host_id: int, host_name: str,
+                           fallback: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """在工作线程中实时收集主机指标
+
+        host_id/host_name 由提交方预先读取：截止时间过后主线程的会话可能已关闭，
+        此时再访问原主机对象的属性会触发延迟加载失败
+        """
+        try:
+            with app.app_context():
+                try:
+                    # 将主机对象挂到当前线程的会话上，不触发额外查询
+                    local_host = db.session.merge(host, load=False)
+                    return self._collect_live_metrics(local_host, fallback)
+                finally:
+                    db.session.remove()
+        except Exception as e:
+            logger.error(f"收集主机 {host_name} 指标数据失败: {str(e)}")
+            return fallback
+        finally:
+            with self._inflight_lock:
+                self._inflight_hosts.discard(host_id)
+    
     def _is_metrics_stale(self, metrics: Dict[str, Any], max_age_minutes: int = 5) -> bool:
         """检查指标数据是否过期"""
         try:
@@ -72,7 +127,11 @@ class MetricDataCollector:
             return True
     
     def collect_all_hosts_metrics(self, tenant_id: int) -> Dict[int, Dict[str, Any]]:
-        """收集租户下所有主机的性能指标"""
+        """收集租户下所有主机的性能指标
+
+        指标未过期的主机直接使用最新数据；过期的主机提交到有界线程池并发实时采集，
+        在本轮截止时间内未完成的主机回退到最后已知指标。
+        """
         try:
             # 获取租户下所有启用的主机
             hosts = SSHHost.query.filter(
@@ -81,12 +140,31 @@ class MetricDataCollector:
             ).all()
             
             metrics_data = {}
+            stale_hosts = []
+            last_known = {}
+            
+            # 一次读取租户下所有主机的最新指标快照
+            try:
+                tenant_metrics = host_info_service.get_tenant_latest_metrics(tenant_id)
+            except Exception as e:
+                logger.warning(f"获取租户 {tenant_id} 最新指标快照失败: {str(e)}")
+                tenant_metrics = {}
             
             for host in hosts:
-                metrics = self.collect_host_metrics(host)
-                if metrics:
-                    metrics_data[host.id] = metrics
+                latest_metrics = tenant_metrics.get(host.id)
+                
+                if latest_metrics and not self._is_metrics_stale(latest_metrics):
+                    metrics_data[host.id] = latest_metrics
                 else:
+                    stale_hosts.append(host)
+                    last_known[host.id] = latest_metrics
+            
+            if stale_hosts:
+                live_metrics = self._collect_stale_hosts(stale_hosts, last_known)
+                metrics_data.update(live_metrics)
+            
+            for host in hosts:
+                if host.id not in metrics_data:
                     logger.warning(f"无法获取主机 {host.name} 的指标数据")
             
             return metrics_data
@@ -94,14 +172,428 @@ class MetricDataCollector:
         except Exception as e:
             logger.error(f"收集租户 {tenant_id} 所有主机指标失败: {str(e)}")
             return {}
+    
+    def _collect_stale_hosts(self, hosts: List[SSHHost],
+                             last_known: Dict[int, Optional[Dict[str, Any]]]) -> Dict[int, Dict[str, Any]]:
+        """并发实时采集指标过期的主机"""
+        app = current_app._get_current_object()
+        executor = self._get_executor()
+        futures = {}
+        results = {}
+        
+        for host in hosts:
+            host_id, host_name = host.id, host.name
+            with self._inflight_lock:
+                if host_id in self._inflight_hosts:
+                    # 上一轮的采集仍未结束，本轮直接使用最后已知指标
+                    if last_known.get(host_id):
+                        results[host_id] = last_known[host_id]
+                    continue
+                self._inflight_hosts.add(host_id)
+            
+            future = executor.submit(
+                self._collect_in_worker, app, host, host_id, host_name, last_known.get(host_id)
+            )
+            futures[future] = (host_id, host_name)
+        
+        if not futures:
+            return results
+        
+        logger.info(f"{len(futures)} 台主机指标数据过期，开始并发实时收集")
+        done, not_done = wait(futures.keys(), timeout=self.collection_deadline)
+        
+        for future in done:
+            host_id, _ = futures[future]
+            metrics = future.result()
+            if metrics:
+                results[host_id] = metrics
+        
+        for future in not_done:
+            host_id, host_name = futures[future]
+            # 尚未开始的任务直接取消；已在执行的任务继续在后台完成并写入数据库
+            if future.cancel():
+                with self._inflight_lock:
+                    self._inflight_hosts.discard(host_id)
+            logger.warning(f"主机 {host_name} 指标采集超过截止时间 {self.collection_deadline}s，使用最后已知指标")
+            if last_known.get(host_id):
+                results[host_id] = last_known[host_id]
+        
+        return results
+    
+    def shutdown(self):
+        """关闭采集线程池"""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+        with self._inflight_lock:
+            self._inflight_hosts.clear()
+
+
+class AlertDurationState:
+    """单个租户的告警持续时间状态（规则+主机 -> 首次触发时间等），记录本轮变更以便批量写回"""
+    
+    def __init__(self, tenant_id: int, entries: Dict[str, Dict[str, Any]]):
+        self.tenant_id = tenant_id
+        self.entries = entries
+        self.dirty = set()
+        self.removed = set()
+    
+    @staticmethod
+    def make_key(rule_id: int, host_id: int) -> str:
+        """生成状态键"""
+        return f"{rule_id}:{host_id}"
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.entries.get(key)
+    
+    def set(self, key: str, entry: Dict[str, Any]):
+        self.entries[key] = entry
+        self.dirty.add(key)
+        self.removed.discard(key)
+    
+    def delete(self, key: str):
+        if key in self.entries:
+            del self.entries[key]
+            self.removed.add(key)
+            self.dirty.discard(key)
+    
+    def keys(self) -> List[str]:
+        return list(self.entries.keys())
+
+
+class AlertDurationStateStore:
+    """告警持续时间状态存储
+
+    每个租户一个 Redis Hash，使多个 Worker 共享持续时间窗口并在重启后保留；
+    Redis 不可用时退化为进程内存储
+    """
+    
+    KEY_PREFIX = 'alert:duration'
+    
+    def __init__(self, redis_client=None):
+        self._redis = redis_client
+        self._local: Dict[int, Dict[str, Dict[str, Any]]] = {}
+        
+        app_config = config_manager.get_app_config()
+        monitoring_config = app_config.get('alert_monitoring', {})
+        # 超过该时间未再次触发的状态视为过期
+        self.max_age = timedelta(seconds=monitoring_config.get('cache_cleanup_interval', 1800))
+        self.state_ttl = monitoring_config.get('duration_state_ttl', 86400)
+    
+    @property
+    def redis(self):
+        """延迟获取 Redis 客户端"""
+        if self._redis is None:
+            from app.extensions import get_redis_client
+            self._redis = get_redis_client()
+        return self._redis
+    
+    def _get_state_key(self, tenant_id: int) -> str:
+        """获取租户状态缓存键"""
+        return f"{self.KEY_PREFIX}:{tenant_id}"
+    
+    @staticmethod
+    def _serialize(entry: Dict[str, Any]) -> str:
+        return json.dumps({
+            'first_trigger_time': entry['first_trigger_time'].isoformat(),
+            'last_trigger_time': entry['last_trigger_time'].isoformat(),
+            'current_value': str(entry['current_value']) if entry.get('current_value') is not None else None
+        })
+    
+    @staticmethod
+    def _deserialize(raw) -> Dict[str, Any]:
+        if isinstance(raw, bytes):
+            raw = raw.decode('utf-8')
+        data = json.loads(raw)
+        return {
+            'first_trigger_time': datetime.fromisoformat(data['first_trigger_time']),
+            'last_trigger_time': datetime.fromisoformat(data['last_trigger_time']),
+            'current_value': Decimal(data['current_value']) if data.get('current_value') is not None else None
+        }
+    
+    def load(self, tenant_id: int) -> AlertDurationState:
+        """加载租户的持续时间状态，并剔除过期条目"""
+        try:
+            raw_entries = self.redis.hgetall(self._get_state_key(tenant_id))
+            entries = {}
+            for key, raw in raw_entries.items():
+                if isinstance(key, bytes):
+                    key = key.decode('utf-8')
+                try:
+                    entries[key] = self._deserialize(raw)
+                except (ValueError, KeyError, TypeError):
+                    continue
+        except Exception as e:
+            logger.warning(f"从 Redis 加载告警持续时间状态失败，使用进程内状态: {str(e)}")
+            entries = dict(self._local.get(tenant_id, {}))
+        
+        state = AlertDurationState(tenant_id, entries)
+        
+        now = datetime.now(timezone.utc)
+        for key in state.keys():
+            last_trigger_time = state.get(key)['last_trigger_time']
+            if last_trigger_time.tzinfo is None:
+                last_trigger_time = last_trigger_time.replace(tzinfo=timezone.utc)
+            if now - last_trigger_time > self.max_age:
+                state.delete(key)
+        
+        return state
+    
+    def save(self, state: AlertDurationState):
+        """写回本轮变更的状态"""
+        self._local[state.tenant_id] = dict(state.entries)
+        if not state.dirty and not state.removed:
+            return
+        
+        try:
+            key = self._get_state_key(state.tenant_id)
+            pipe = self.redis.pipeline()
+            if state.removed:
+                pipe.hdel(key, *state.removed)
+            if state.dirty:
+                pipe.hset(key, mapping={
+                    field: self._serialize(state.entries[field]) for field in state.dirty
+                })
+            pipe.expire(key, self.state_ttl)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"写入告警持续时间状态失败: tenant_id={state.tenant_id}, 错误: {str(e)}")
+        finally:
+            state.dirty.clear()
+            state.removed.clear()
+    
+    def count(self) -> int:
+        """进程内已知的状态条目数"""
+        return sum(len(entries) for entries in self._local.values())
+
+
+class AlertMonitoringLease:
+    """租户告警评估租约
+
+    多个 Worker 同时收到同一租户的评估任务时，只有取得租约的 Worker 执行评估
+    """
+    
+    KEY_PREFIX = 'alert:monitor:lease'
+    
+    # 仅当租约仍属于自己时才续期
+    EXTEND_SCRIPT = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('expire', KEYS[1], ARGV[2])
+    end
+    return 0
+    """
+    
+    # 仅当租约仍属于自己时才释放
+    RELEASE_SCRIPT = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('del', KEYS[1])
+    end
+    return 0
+    """
+    
+    def __init__(self, redis_client=None):
+        self._redis = redis_client
+    
+    @property
+    def redis(self):
+        """延迟获取 Redis 客户端"""
+        if self._redis is None:
+            from app.extensions import get_redis_client
+            self._redis = get_redis_client()
+        return self._redis
+    
+    def _get_lease_key(self, tenant_id: int) -> str:
+        """获取租约键"""
+        return f"{self.KEY_PREFIX}:{tenant_id}"
+    
+    def acquire(self, tenant_id: int, owner: str, ttl: int) -> bool:
+        """尝试获取租约"""
+        return bool(self.redis.set(self._get_lease_key(tenant_id), owner, nx=True, ex=ttl))
+    
+    def extend(self, tenant_id: int, owner: str, ttl: int) -> bool:
+        """续期租约"""
+        try:
+            return bool(self.redis.eval(self.EXTEND_SCRIPT, 1, self._get_lease_key(tenant_id), owner, ttl))
+        except Exception as e:
+            logger.warning(f"续期告警评估租约失败: tenant_id={tenant_id}, 错误: {str(e)}")
+            return False
+    
+    def release(self, tenant_id: int, owner: str) -> bool:
+        """释放租约（比较持有者后删除）"""
+        try:
+            return bool(self.redis.eval(self.RELEASE_SCRIPT, 1, self._get_lease_key(tenant_id), owner))
+        except Exception as e:
+            logger.warning(f"释放告警评估租约失败: tenant_id={tenant_id}, 错误: {str(e)}")
+            return False
+    
+    def get_owner(self, tenant_id: int) -> Optional[str]:
+        """获取当前租约持有者"""
+        owner = self.redis.get(self._get_lease_key(tenant_id))
+        if isinstance(owner, bytes):
+            owner = owner.decode('utf-8')
+        return owner
 
 
 class AlertRuleEvaluator:
     """告警规则评估引擎"""
     
+    # 指标类型映射
+    METRIC_KEY_MAPPING = {
+        'cpu': 'cpu_usage',
+        'memory': 'memory_usage',
+        'disk': 'disk_usage',
+        'load': 'load_average'
+    }
+    
     def __init__(self):
-        self.evaluation_cache = {}  # 评估结果缓存
-        self.cache_ttl = 60  # 缓存TTL（秒）
+        # 持续时间条件状态（首次触发时间等），持久化在 Redis 中
+        self.duration_store = AlertDurationStateStore()
+    
+    def evaluate_rules(self, tenant_id: int, rules: List[AlertRule],
+                       host_metrics: Dict[int, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """批量评估租户下的全部告警规则
+
+        主机只查询一次，按主机建立各指标的列向量后，以 (指标, 操作符) 分组对全部规则做矩阵比较；
+        静默期所需的活跃告警记录也只用一次查询加载
+        """
+        try:
+            rules = [rule for rule in rules if rule.is_enabled()]
+            if not rules or not host_metrics:
+                return []
+            
+            hosts = SSHHost.query.filter(
+                SSHHost.tenant_id == tenant_id,
+                SSHHost.status == 1
+            ).all()
+            hosts_by_id = {host.id: host for host in hosts if host.id in host_metrics}
+            host_ids = list(hosts_by_id.keys())
+            
+            metric_keys = set(self.METRIC_KEY_MAPPING.get(rule.metric_type, rule.metric_type) for rule in rules)
+            matrix = ThresholdMatrix(host_ids, {
+                key: [host_metrics[host_id].get(key) for host_id in host_ids]
+                for key in metric_keys
+            })
+            
+            # 单条规则配置错误（如阈值为空）时跳过该规则，不影响其他规则
+            valid_rules = []
+            threshold_rules = []
+            for rule in rules:
+                if rule.condition_operator not in OPERATORS:
+                    logger.warning(f"不支持的操作符: {rule.condition_operator}")
+                try:
+                    threshold_rules.append(ThresholdRule(
+                        key=rule.id,
+                        metric=self.METRIC_KEY_MAPPING.get(rule.metric_type, rule.metric_type),
+                        operator=rule.condition_operator,
+                        threshold=rule.threshold_value,
+                        host_ids=rule.host_ids
+                    ))
+                except Exception as e:
+                    logger.error(f"评估告警规则 {rule.id} 失败: {str(e)}")
+                    continue
+                valid_rules.append(rule)
+            rules = valid_rules
+            
+            hits = matrix.evaluate(threshold_rules)
+            triggered_pairs = {(rules[rule_idx].id, host_ids[host_idx]) for rule_idx, host_idx, _ in hits}
+            
+            duration_state = self.duration_store.load(tenant_id)
+            
+            # 条件不满足的组合清理持续时间缓存
+            self._clear_untriggered_duration_cache(
+                duration_state, {rule.id for rule in rules}, hosts_by_id.keys(), triggered_pairs
+            )
+            
+            silence_state = self._load_silence_state([rules[rule_idx] for rule_idx, _, _ in hits])
+            
+            triggered_alerts = []
+            for rule_idx, host_idx, value in hits:
+                rule = rules[rule_idx]
+                host = hosts_by_id[host_ids[host_idx]]
+                try:
+                    current_value = Decimal(str(value))
+                    
+                    # 检查是否在静默期内
+                    if self._is_silenced(rule, silence_state.get((rule.id, host.id))):
+                        logger.debug(f"主机 {host.name} 规则 {rule.name} 在静默期内，跳过告警")
+                        continue
+                    
+                    # 检查持续时间条件
+                    if self._check_duration_condition(rule, host, current_value, duration_state):
+                        triggered_alerts.append({
+                            'rule': rule,
+                            'host': host,
+                            'current_value': current_value,
+                            'threshold_value': rule.threshold_value,
+                            'metric_type': rule.metric_type,
+                            'severity': rule.severity,
+                            'message': self._generate_alert_message(rule, host, current_value)
+                        })
+                        logger.info(f"触发告警: {rule.name} - {host.name}")
+                    else:
+                        logger.debug(f"主机 {host.name} 规则 {rule.name} 未满足持续时间条件")
+                except Exception as e:
+                    # 单条规则出错时记录日志，继续评估其余规则
+                    logger.error(f"评估告警规则 {rule.id} 在主机 {host.id} 上失败: {str(e)}")
+            
+            self.duration_store.save(duration_state)
+            
+            return triggered_alerts
+            
+        except Exception as e:
+            logger.error(f"批量评估租户 {tenant_id} 告警规则失败: {str(e)}")
+            raise AlertEvaluationError(f"批量评估告警规则失败: {str(e)}")
+    
+    def _load_silence_state(self, rules: List[AlertRule]) -> Dict[Tuple[int, int], datetime]:
+        """一次查询加载规则在各主机上最近一次活跃告警的触发时间"""
+        rule_ids = {rule.id for rule in rules if rule.silence_period and rule.silence_period > 0}
+        if not rule_ids:
+            return {}
+        
+        try:
+            from sqlalchemy import func
+            
+            rows = db.session.query(
+                AlertRecord.rule_id,
+                AlertRecord.host_id,
+                func.max(AlertRecord.last_triggered_at)
+            ).filter(
+                AlertRecord.rule_id.in_(rule_ids),
+                AlertRecord.status.in_(['active', 'acknowledged'])
+            ).group_by(AlertRecord.rule_id, AlertRecord.host_id).all()
+            
+            return {(rule_id, host_id): last_triggered_at for rule_id, host_id, last_triggered_at in rows}
+            
+        except Exception as e:
+            logger.error(f"加载告警静默状态失败: {str(e)}")
+            return {}
+    
+    @staticmethod
+    def _is_silenced(rule: AlertRule, last_triggered_at: Optional[datetime]) -> bool:
+        """根据最近一次活跃告警的触发时间判断是否在静默期内"""
+        if not rule.silence_period or rule.silence_period <= 0 or not last_triggered_at:
+            return False
+        
+        silence_end_time = last_triggered_at + timedelta(seconds=rule.silence_period)
+        if last_triggered_at.tzinfo is None:
+            # 如果数据库时间是naive，假设它是UTC
+            silence_end_time = silence_end_time.replace(tzinfo=timezone.utc)
+        
+        return datetime.now(timezone.utc) < silence_end_time
+    
+    def _clear_untriggered_duration_cache(self, duration_state: AlertDurationState,
+                                          rule_ids, host_ids, triggered_pairs):
+        """清理已评估但未触发的 (规则, 主机) 持续时间缓存"""
+        host_ids = set(host_ids)
+        for cache_key in duration_state.keys():
+            try:
+                rule_id, host_id = cache_key.split(':')
+                pair = (int(rule_id), int(host_id))
+            except ValueError:
+                continue
+            if pair[0] in rule_ids and pair[1] in host_ids and pair not in triggered_pairs:
+                duration_state.delete(cache_key)
     
     def evaluate_rule(self, rule: AlertRule, host_metrics: Dict[int, Dict[str, Any]]) -> List[Dict[str, Any]]:
         """评估单个告警规则"""
@@ -110,6 +602,7 @@ class AlertRuleEvaluator:
                 return []
             
             triggered_alerts = []
+            duration_state = self.duration_store.load(rule.tenant_id)
             
             # 获取规则适用的主机列表
             target_hosts = self._get_target_hosts(rule)
@@ -131,7 +624,7 @@ class AlertRuleEvaluator:
                         continue
                     
                     # 检查持续时间条件
-                    if self._check_duration_condition(rule, host, current_value):
+                    if self._check_duration_condition(rule, host, current_value, duration_state):
                         alert_info = {
                             'rule': rule,
                             'host': host,
@@ -147,7 +640,9 @@ class AlertRuleEvaluator:
                         logger.debug(f"主机 {host.name} 规则 {rule.name} 未满足持续时间条件")
                 else:
                     # 如果条件不满足，清理持续时间缓存
-                    self._clear_duration_cache(rule, host)
+                    self._clear_duration_cache(rule, host, duration_state)
+            
+            self.duration_store.save(duration_state)
             
             return triggered_alerts
             
@@ -179,16 +674,8 @@ class AlertRuleEvaluator:
     def _evaluate_condition(self, rule: AlertRule, metrics: Dict[str, Any]) -> Tuple[bool, Optional[Decimal]]:
         """评估规则条件"""
         try:
-            # 指标类型映射
-            metric_key_mapping = {
-                'cpu': 'cpu_usage',
-                'memory': 'memory_usage',
-                'disk': 'disk_usage',
-                'load': 'load_average'
-            }
-            
             # 获取实际的指标键名
-            metric_key = metric_key_mapping.get(rule.metric_type, rule.metric_type)
+            metric_key = self.METRIC_KEY_MAPPING.get(rule.metric_type, rule.metric_type)
             
             # 获取当前指标值
             current_value = metrics.get(metric_key)
@@ -250,49 +737,53 @@ class AlertRuleEvaluator:
             logger.error(f"检查静默期失败: {str(e)}")
             return False
     
-    def _check_duration_condition(self, rule: AlertRule, host: SSHHost, current_value: Decimal) -> bool:
+    def _check_duration_condition(self, rule: AlertRule, host: SSHHost, current_value: Decimal,
+                                  duration_state: AlertDurationState) -> bool:
         """检查持续时间条件"""
         try:
             if not rule.duration or rule.duration <= 0:
                 return True  # 没有持续时间要求，立即触发
             
-            cache_key = f"duration_{rule.id}_{host.id}"
+            cache_key = AlertDurationState.make_key(rule.id, host.id)
             current_time = datetime.now(timezone.utc)
             
-            # 检查缓存中的持续时间记录
-            if cache_key in self.evaluation_cache:
-                cache_entry = self.evaluation_cache[cache_key]
+            # 检查持续时间记录
+            cache_entry = duration_state.get(cache_key)
+            if cache_entry:
                 first_trigger_time = cache_entry['first_trigger_time']
+                if first_trigger_time.tzinfo is None:
+                    first_trigger_time = first_trigger_time.replace(tzinfo=timezone.utc)
                 
                 # 检查是否已满足持续时间
                 duration_seconds = (current_time - first_trigger_time).total_seconds()
                 if duration_seconds >= rule.duration:
                     # 清理缓存
-                    del self.evaluation_cache[cache_key]
+                    duration_state.delete(cache_key)
                     return True
                 else:
                     # 更新最后触发时间
-                    cache_entry['last_trigger_time'] = current_time
-                    cache_entry['current_value'] = current_value
+                    duration_state.set(cache_key, {
+                        'first_trigger_time': first_trigger_time,
+                        'last_trigger_time': current_time,
+                        'current_value': current_value
+                    })
                     return False
             else:
-                # 首次触发，记录到缓存
-                self.evaluation_cache[cache_key] = {
+                # 首次触发，记录状态
+                duration_state.set(cache_key, {
                     'first_trigger_time': current_time,
                     'last_trigger_time': current_time,
                     'current_value': current_value
-                }
+                })
                 return False
                 
         except Exception as e:
             logger.error(f"检查持续时间条件失败: {str(e)}")
             return True  # 出错时默认触发
     
-    def _clear_duration_cache(self, rule: AlertRule, host: SSHHost):
+    def _clear_duration_cache(self, rule: AlertRule, host: SSHHost, duration_state: AlertDurationState):
         """清理持续时间缓存"""
-        cache_key = f"duration_{rule.id}_{host.id}"
-        if cache_key in self.evaluation_cache:
-            del self.evaluation_cache[cache_key]
+        duration_state.delete(AlertDurationState.make_key(rule.id, host.id))
     
     def _generate_alert_message(self, rule: AlertRule, host: SSHHost, current_value: Decimal) -> str:
         """生成告警消息"""
@@ -324,31 +815,6 @@ class AlertRuleEvaluator:
         except Exception as e:
             logger.error(f"生成告警消息失败: {str(e)}")
             return f"主机 {host.name} 触发告警规则 {rule.name}"
-    
-    def cleanup_cache(self, max_age_minutes: int = 30):
-        """清理过期的缓存条目"""
-        try:
-            current_time = datetime.now(timezone.utc)
-            expired_keys = []
-            
-            for key, entry in self.evaluation_cache.items():
-                last_trigger_time = entry['last_trigger_time']
-                # 确保时间比较使用相同的时区
-                if last_trigger_time.tzinfo is None:
-                    last_trigger_time = last_trigger_time.replace(tzinfo=timezone.utc)
-                
-                age = (current_time - last_trigger_time).total_seconds() / 60
-                if age > max_age_minutes:
-                    expired_keys.append(key)
-            
-            for key in expired_keys:
-                del self.evaluation_cache[key]
-            
-            if expired_keys:
-                logger.info(f"清理了 {len(expired_keys)} 个过期的评估缓存条目")
-                
-        except Exception as e:
-            logger.error(f"清理评估缓存失败: {str(e)}")
 
 
 class AlertTriggerManager:
@@ -431,24 +897,9 @@ class AlertTriggerManager:
                 logger.warning(f"告警规则 {rule.name} 没有可用的通知渠道")
                 return
             
-            # 为每个渠道发送通知
-            for channel in channels:
-                try:
-                    service = self.notification_services.get(channel.type)
-                    if not service:
-                        logger.warning(f"不支持的通知渠道类型: {channel.type}")
-                        continue
-                    
-                    success, message = service.send_alert_notification(alert_record, channel)
-                    
-                    if success:
-                        logger.info(f"告警通知发送成功: {channel.name}")
-                    else:
-                        logger.error(f"告警通知发送失败: {channel.name} - {message}")
-                        
-                except Exception as e:
-                    logger.error(f"发送告警通知异常: {channel.name} - {str(e)}")
-                    
+            # 加入渠道发送队列，由通知 Worker 异步发送
+            alert_notification_dispatcher.dispatch(alert_record, channels)
+            
         except Exception as e:
             logger.error(f"发送告警通知失败: {str(e)}")
     
@@ -491,17 +942,25 @@ class AlertMonitoringEngine:
         
         self.evaluation_interval = monitoring_config.get('evaluation_interval', 60)  # 评估间隔（秒）
         self.max_concurrent_evaluations = monitoring_config.get('max_concurrent_evaluations', 10)
-        self.cache_cleanup_interval = monitoring_config.get('cache_cleanup_interval', 1800)  # 缓存清理间隔（秒）
+        # 执行模式：celery 由 Celery beat 定时派发评估任务；thread 为进程内常驻线程
+        self.execution_mode = monitoring_config.get('execution_mode', 'celery')
+        # 租户评估租约有效期（秒），需覆盖一轮采集和评估；每轮结束即释放，有效期只在 Worker 崩溃时生效
+        self.lease_ttl = monitoring_config.get('lease_ttl', self.evaluation_interval * 2)
+        self.lease = AlertMonitoringLease()
         
         # 运行状态
         self._monitoring_threads = {}
         self._stop_monitoring = {}
         self._is_running = False
-        self._last_cache_cleanup = datetime.now(timezone.utc)
+        self._last_cycle_stats: Dict[int, Dict[str, Any]] = {}
     
     def start_monitoring(self, tenant_id: int):
         """启动租户的告警监控"""
         try:
+            if self.execution_mode == 'celery':
+                logger.info(f"告警监控由 Celery beat 调度，忽略租户 {tenant_id} 的线程启动请求")
+                return
+            
             tenant_key = f"tenant_{tenant_id}"
             
             # 如果已经在监控，先停止
@@ -564,9 +1023,6 @@ class AlertMonitoringEngine:
                 # 执行一轮监控评估
                 self._perform_monitoring_cycle(tenant_id)
                 
-                # 定期清理缓存
-                self._cleanup_cache_if_needed()
-                
                 # 等待下次评估
                 if stop_event.wait(timeout=self.evaluation_interval):
                     break  # 收到停止信号
@@ -579,17 +1035,63 @@ class AlertMonitoringEngine:
         
         logger.info(f"租户 {tenant_id} 告警监控线程已停止")
     
-    def _perform_monitoring_cycle(self, tenant_id: int):
-        """执行一轮监控评估"""
+    def get_active_tenant_ids(self) -> List[int]:
+        """获取存在启用告警规则的租户"""
+        rows = db.session.query(AlertRule.tenant_id).filter(
+            AlertRule.enabled == True
+        ).distinct().all()
+        return [row[0] for row in rows]
+    
+    def run_scheduled_cycle(self, tenant_id: int, owner: str) -> Dict[str, Any]:
+        """在租约保护下执行一轮租户评估（供 Celery 任务调用）
+        
+        Args:
+            tenant_id: 租户ID
+            owner: 租约持有者标识，需在 Worker 间唯一
+        """
+        if not self.lease.acquire(tenant_id, owner, self.lease_ttl):
+            logger.debug(f"租户 {tenant_id} 的告警评估正由 {self.lease.get_owner(tenant_id)} 执行，跳过")
+            return {'tenant_id': tenant_id, 'status': 'skipped'}
+        
+        # 一轮结束后立即释放租约，下一次派发即可评估；有效期仅用于 Worker 崩溃时自动解锁
+        try:
+            stats = self._perform_monitoring_cycle(
+                tenant_id,
+                on_collected=lambda: self.lease.extend(tenant_id, owner, self.lease_ttl)
+            )
+        finally:
+            self.lease.release(tenant_id, owner)
+        stats['status'] = 'evaluated'
+        return stats
+    
+    def _perform_monitoring_cycle(self, tenant_id: int, on_collected=None) -> Dict[str, Any]:
+        """执行一轮监控评估
+        
+        Args:
+            tenant_id: 租户ID
+            on_collected: 指标采集完成后的回调（用于续期租约）
+        """
+        stats = {
+            'tenant_id': tenant_id,
+            'hosts': 0,
+            'rules': 0,
+            'triggered': 0,
+            'evaluation_time': 0.0,
+            'cycle_time': 0.0
+        }
         try:
             start_time = time.time()
             
             # 1. 收集所有主机的指标数据
             host_metrics = self.metric_collector.collect_all_hosts_metrics(tenant_id)
+            stats['hosts'] = len(host_metrics)
+            
+            if on_collected:
+                on_collected()
             
             if not host_metrics:
                 logger.debug(f"租户 {tenant_id} 没有可用的主机指标数据")
-                return
+                return stats
             
             # 2. 获取所有启用的告警规则
             rules = AlertRule.query.filter(
@@ -597,50 +1099,50 @@ class AlertMonitoringEngine:
                 AlertRule.enabled == True
             ).all()
             
+            stats['rules'] = len(rules)
+            
             if not rules:
                 logger.debug(f"租户 {tenant_id} 没有启用的告警规则")
-                return
+                return stats
+            
+            # 3. 一次性评估全部规则
+            evaluation_start = time.time()
+            triggered_alerts = self.rule_evaluator.evaluate_rules(tenant_id, rules, host_metrics)
+            evaluation_time = time.time() - evaluation_start
             
-            # 3. 评估每个规则
+            # 4. 触发告警
             total_triggered = 0
-            for rule in rules:
+            for alert_info in triggered_alerts:
                 try:
-                    triggered_alerts = self.rule_evaluator.evaluate_rule(rule, host_metrics)
-                    
-                    # 4. 触发告警
-                    for alert_info in triggered_alerts:
-                        self.trigger_manager.trigger_alert(alert_info)
-                        total_triggered += 1
-                        
+                    self.trigger_manager.trigger_alert(alert_info)
+                    total_triggered += 1
                 except Exception as e:
-                    logger.error(f"评估规则 {rule.name} 失败: {str(e)}")
+                    logger.error(f"触发告警 {alert_info['rule'].name} - {alert_info['host'].name} 失败: {str(e)}")
                     continue
             
             # 5. 记录监控周期统计
             cycle_time = time.time() - start_time
+            stats.update({
+                'triggered': total_triggered,
+                'evaluation_time': round(evaluation_time, 3),
+                'cycle_time': round(cycle_time, 3),
+                'finished_at': datetime.now(timezone.utc).isoformat()
+            })
+            self._last_cycle_stats[tenant_id] = stats
             logger.debug(
                 f"租户 {tenant_id} 监控周期完成: "
                 f"评估 {len(rules)} 个规则, "
                 f"收集 {len(host_metrics)} 个主机指标, "
                 f"触发 {total_triggered} 个告警, "
-                f"耗时 {cycle_time:.2f}s"
+                f"规则评估耗时 {evaluation_time:.3f}s, "
+                f"总耗时 {cycle_time:.2f}s"
             )
             
         except Exception as e:
             logger.error(f"执行监控周期失败: {str(e)}")
-    
-    def _cleanup_cache_if_needed(self):
-        """根据需要清理缓存"""
-        try:
-            current_time = datetime.now(timezone.utc)
-            time_since_cleanup = (current_time - self._last_cache_cleanup).total_seconds()
-            
-            if time_since_cleanup >= self.cache_cleanup_interval:
-                self.rule_evaluator.cleanup_cache()
-                self._last_cache_cleanup = current_time
-                
-        except Exception as e:
-            logger.error(f"清理缓存失败: {str(e)}")
+            stats['error'] = str(e)
+        
+        return stats
     
     def evaluate_rule_once(self, rule_id: int) -> Dict[str, Any]:
         """单次评估指定规则"""
@@ -685,13 +1187,17 @@ class AlertMonitoringEngine:
         """获取监控状态"""
         try:
             return {
-                'is_running': len(self._monitoring_threads) > 0,
+                'execution_mode': self.execution_mode,
+                'is_running': self.execution_mode == 'celery' or len(self._monitoring_threads) > 0,
                 'active_tenants': len(self._monitoring_threads),
                 'monitoring_tenants': list(self._monitoring_threads.keys()),
                 'evaluation_interval': self.evaluation_interval,
-                'cache_cleanup_interval': self.cache_cleanup_interval,
-                'last_cache_cleanup': self._last_cache_cleanup.isoformat(),
-                'cache_entries': len(self.rule_evaluator.evaluation_cache)
+                'max_concurrent_evaluations': self.metric_collector.max_workers,
+                'collection_deadline': self.metric_collector.collection_deadline,
+                'lease_ttl': self.lease_ttl,
+                'duration_state_entries': self.rule_evaluator.duration_store.count(),
+                'last_cycles': list(self._last_cycle_stats.values()),
+                'notifications': alert_notification_dispatcher.get_metrics()
             }
             
         except Exception as e:
@@ -783,6 +1289,7 @@ class AlertMonitoringEngine:
             self._monitoring_threads.clear()
             self._stop_monitoring.clear()
             self._is_running = False
+            self.metric_collector.shutdown()
             
             logger.info("已停止所有告警监控")
             
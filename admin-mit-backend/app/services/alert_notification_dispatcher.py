@@ -0,0 +1,544 @@
+"""
+告警通知分发服务
+告警触发时只写入待发送通知并放入渠道队列，由 Celery notifications 队列中的 Worker 异步发送；
+同一渠道在合并窗口内的多条告警合并为一条汇总消息，并记录发送延迟和队列深度
+
+发送时通知先从待发送队列移到处理中队列，发送结果落库后才移除；发送失败的通知
+按 notification_retry_attempts 重新入队，Worker 中途退出时处理中队列由下一次发送接管
+"""
+import json
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Any, Optional, Sequence
+
+from app.extensions import db
+from app.models.monitor import AlertChannel, AlertNotification, AlertRecord
+from app.services.email_notification_service import email_notification_service
+from app.services.dingtalk_notification_service import dingtalk_notification_service
+from app.core.config_manager import config_manager
+
+logger = logging.getLogger(__name__)
+
+
+def _percentile(sorted_values: List[float], percent: float) -> Optional[float]:
+    """计算已排序序列的百分位数"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(percent / 100.0 * (len(sorted_values) - 1))))
+    return round(sorted_values[index], 1)
+
+
+class AlertNotificationDispatcher:
+    """告警通知分发器"""
+
+    KEY_PREFIX = 'alert:notify'
+
+    # 仅当发送锁仍属于自己时才释放
+    RELEASE_LOCK_SCRIPT = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('del', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, redis_client=None):
+        self._redis = redis_client
+        self.notification_services = {
+            'email': email_notification_service,
+            'dingtalk': dingtalk_notification_service
+        }
+
+        app_config = config_manager.get_app_config()
+        monitoring_config = app_config.get('alert_monitoring', {})
+        notification_config = monitoring_config.get('notification', {})
+        # 分发模式：queue 经 Celery 队列异步发送；inline 在调用线程中同步发送
+        self.dispatch_mode = notification_config.get('dispatch_mode', 'queue')
+        # 合并窗口（秒），窗口内同一渠道的告警合并为一条汇总消息
+        self.coalesce_window = notification_config.get('coalesce_window', 30)
+        # 单条汇总消息最多包含的告警数
+        self.max_digest_size = notification_config.get('max_digest_size', 50)
+        # 每种渠道保留的延迟样本数
+        self.latency_samples = notification_config.get('latency_samples', 500)
+        # 单条通知最多发送次数（含首次）及失败后重新发送的延迟（秒）
+        self.retry_attempts = max(1, monitoring_config.get('notification_retry_attempts', 3))
+        self.retry_delay = monitoring_config.get('notification_retry_delay', 5)
+        # 渠道发送锁有效期（秒），Worker 异常退出后锁过期，处理中队列由下一次发送接管
+        self.flush_lock_ttl = notification_config.get('flush_lock_ttl', 300)
+        # 数据库中超过该时间仍为 pending 且不在任何队列中的通知由补发任务重新入队（秒）
+        self.stale_pending_after = notification_config.get('stale_pending_after', self.coalesce_window * 4)
+
+    @property
+    def redis(self):
+        """延迟获取 Redis 客户端"""
+        if self._redis is None:
+            from app.extensions import get_redis_client
+            self._redis = get_redis_client()
+        return self._redis
+
+    def _get_pending_key(self, channel_id: int) -> str:
+        """渠道待发送队列键"""
+        return f"{self.KEY_PREFIX}:pending:{channel_id}"
+
+    def _get_processing_key(self, channel_id: int) -> str:
+        """渠道处理中队列键（已取出、发送结果尚未落库的通知）"""
+        return f"{self.KEY_PREFIX}:processing:{channel_id}"
+
+    def _get_lock_key(self, channel_id: int) -> str:
+        """渠道发送锁键"""
+        return f"{self.KEY_PREFIX}:flushing:{channel_id}"
+
+    def _get_scheduled_key(self, channel_id: int) -> str:
+        """渠道已调度发送任务标记键"""
+        return f"{self.KEY_PREFIX}:scheduled:{channel_id}"
+
+    def _get_channels_key(self) -> str:
+        """存在待发送通知的渠道集合键"""
+        return f"{self.KEY_PREFIX}:channels"
+
+    def _get_latency_key(self, tenant_id: int, channel_type: str, kind: str) -> str:
+        """租户发送延迟样本键"""
+        return f"{self.KEY_PREFIX}:latency:{tenant_id}:{kind}:{channel_type}"
+
+    def _get_stats_key(self, tenant_id: int) -> str:
+        """租户发送计数键"""
+        return f"{self.KEY_PREFIX}:stats:{tenant_id}"
+
+    def dispatch(self, alert_record: AlertRecord, channels: Sequence[AlertChannel]):
+        """将告警通知加入各渠道的发送队列"""
+        if not channels:
+            return
+
+        if self.dispatch_mode == 'inline':
+            self._send_inline(alert_record, channels)
+            return
+
+        # 先落库为 pending，队列中只保存通知ID
+        notifications = [
+            AlertNotification(
+                tenant_id=alert_record.tenant_id,
+                alert_record_id=alert_record.id,
+                channel_id=channel.id,
+                status='pending'
+            )
+            for channel in channels
+        ]
+        db.session.add_all(notifications)
+        db.session.commit()
+
+        enqueued_at = time.time()
+        try:
+            pipe = self.redis.pipeline()
+            for notification in notifications:
+                channel_id = notification.channel_id
+                pipe.rpush(self._get_pending_key(channel_id), json.dumps({
+                    'notification_id': notification.id,
+                    'enqueued_at': enqueued_at
+                }))
+                pipe.sadd(self._get_channels_key(), channel_id)
+                # 合并窗口内只调度一次发送任务
+                pipe.set(self._get_scheduled_key(channel_id), 1, nx=True, ex=self.coalesce_window * 4)
+            results = pipe.execute()
+        except Exception as e:
+            logger.warning(f"告警通知入队失败，改为同步发送: {str(e)}")
+            for notification, channel in zip(notifications, channels):
+                try:
+                    self._deliver(channel, [(notification, alert_record, enqueued_at)])
+                except Exception as deliver_error:
+                    # 通知保持 pending，由补发任务重新入队
+                    logger.error(f"同步发送告警通知失败: channel_id={channel.id}, 错误: {str(deliver_error)}")
+            return
+
+        for index, notification in enumerate(notifications):
+            if results[index * 3 + 2]:
+                self._schedule_flush(notification.channel_id, self.coalesce_window)
+
+    def _schedule_flush(self, channel_id: int, countdown: int):
+        """调度渠道发送任务，Celery 不可用时立即在当前线程发送"""
+        try:
+            from app.tasks.notification_tasks import flush_channel_notifications
+            flush_channel_notifications.apply_async(args=[channel_id], countdown=countdown)
+        except Exception as e:
+            logger.warning(f"调度告警通知发送任务失败，改为同步发送: channel_id={channel_id}, 错误: {str(e)}")
+            self.flush_channel(channel_id)
+
+    def _send_inline(self, alert_record: AlertRecord, channels: Sequence[AlertChannel]):
+        """同步逐条发送（inline 模式）"""
+        for channel in channels:
+            try:
+                service = self.notification_services.get(channel.type)
+                if not service:
+                    logger.warning(f"不支持的通知渠道类型: {channel.type}")
+                    continue
+
+                start_time = time.time()
+                success, message = service.send_alert_notification(alert_record, channel)
+                self._record_metrics(channel.tenant_id, channel.type, success, time.time() - start_time,
+                                     [start_time])
+
+                if success:
+                    logger.info(f"告警通知发送成功: {channel.name}")
+                else:
+                    logger.error(f"告警通知发送失败: {channel.name} - {message}")
+            except Exception as e:
+                logger.error(f"发送告警通知异常: {channel.name} - {str(e)}")
+
+    def flush_channel(self, channel_id: int) -> Dict[str, Any]:
+        """发送渠道队列中的待发送通知（多条时合并为汇总消息）
+
+        同一渠道同时只有一个发送任务：通知移到处理中队列后发送，结果落库后才移除，
+        发送异常或 Worker 退出都不会丢失通知
+        """
+        token = uuid.uuid4().hex
+        lock_key = self._get_lock_key(channel_id)
+        if not self.redis.set(lock_key, token, nx=True, ex=self.flush_lock_ttl):
+            # 其他 Worker 正在发送该渠道，合并窗口后再检查
+            self._reschedule(channel_id, self.coalesce_window)
+            return {'channel_id': channel_id, 'sent': 0, 'busy': True}
+
+        try:
+            return self._flush_locked(channel_id)
+        except Exception:
+            # 处理中队列保留，稍后由新的发送任务接管（Redis 不可用时由补发任务接管）
+            try:
+                self._reschedule(channel_id, self.retry_delay)
+            except Exception:
+                pass
+            raise
+        finally:
+            try:
+                self.redis.eval(self.RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+            except Exception as e:
+                logger.warning(f"释放告警通知发送锁失败: channel_id={channel_id}, 错误: {str(e)}")
+
+    def _flush_locked(self, channel_id: int) -> Dict[str, Any]:
+        """持有渠道发送锁时发送一批通知"""
+        pending_key = self._get_pending_key(channel_id)
+        processing_key = self._get_processing_key(channel_id)
+
+        # 先清除调度标记，此后入队的通知会调度新的发送任务
+        self.redis.delete(self._get_scheduled_key(channel_id))
+
+        # 上次发送中途退出时遗留的通知优先处理，并计为一次发送尝试
+        raw_items = self.redis.lrange(processing_key, 0, -1)
+        resumed = bool(raw_items)
+        if not resumed:
+            pipe = self.redis.pipeline()
+            for _ in range(self.max_digest_size):
+                pipe.lmove(pending_key, processing_key, 'LEFT', 'RIGHT')
+            raw_items = [raw for raw in pipe.execute() if raw is not None]
+
+        remaining = self.redis.llen(pending_key)
+        if remaining:
+            # 超出单条汇总上限的部分立即继续发送
+            self._reschedule(channel_id, 0)
+        elif not raw_items:
+            self.redis.srem(self._get_channels_key(), channel_id)
+
+        if not raw_items:
+            return {'channel_id': channel_id, 'sent': 0}
+
+        items = {}
+        for raw in raw_items:
+            try:
+                item = json.loads(raw)
+                attempts = item.get('attempts', 0) + (1 if resumed else 0)
+                items[item['notification_id']] = (item['enqueued_at'], attempts)
+            except (ValueError, KeyError, TypeError):
+                continue
+
+        notifications = AlertNotification.query.filter(
+            AlertNotification.id.in_(list(items.keys())),
+            AlertNotification.status == 'pending'
+        ).all() if items else []
+
+        records = {
+            record.id: record
+            for record in AlertRecord.query.filter(
+                AlertRecord.id.in_({n.alert_record_id for n in notifications})
+            ).all()
+        } if notifications else {}
+
+        # 告警记录已删除或已达到最大发送次数的通知直接标记失败
+        orphaned = [n for n in notifications if n.alert_record_id not in records]
+        exhausted = [n for n in notifications if n.alert_record_id in records and items[n.id][1] >= self.retry_attempts]
+        notifications = [
+            n for n in notifications
+            if n.alert_record_id in records and items[n.id][1] < self.retry_attempts
+        ]
+        if orphaned or exhausted:
+            for notification in orphaned:
+                notification.status = 'failed'
+                notification.error_message = "告警记录不存在"
+            for notification in exhausted:
+                notification.status = 'failed'
+                notification.error_message = notification.error_message or "超过最大发送次数"
+            db.session.commit()
+
+        result = {'channel_id': channel_id, 'sent': 0}
+        retry_items = []
+        if notifications:
+            channel = AlertChannel.query.get(channel_id)
+            entries = [
+                (notification, records[notification.alert_record_id], items[notification.id][0])
+                for notification in notifications
+            ]
+            retryable = {
+                notification.id for notification in notifications
+                if items[notification.id][1] + 1 < self.retry_attempts
+            }
+            result = self._deliver(channel, entries, retryable=retryable)
+            if result.get('failed'):
+                retry_items = [
+                    json.dumps({
+                        'notification_id': notification.id,
+                        'enqueued_at': items[notification.id][0],
+                        'attempts': items[notification.id][1] + 1
+                    })
+                    for notification in notifications
+                    if notification.id in retryable
+                ]
+
+        # 发送结果已落库，移除处理中队列并将可重试的通知重新入队
+        pipe = self.redis.pipeline()
+        pipe.delete(processing_key)
+        if retry_items:
+            pipe.rpush(pending_key, *retry_items)
+            pipe.sadd(self._get_channels_key(), channel_id)
+        pipe.execute()
+
+        if retry_items:
+            logger.warning(f"告警通知发送失败，{self.retry_delay} 秒后重试: channel_id={channel_id}, 通知数 {len(retry_items)}")
+            self._reschedule(channel_id, self.retry_delay)
+        result['retrying'] = len(retry_items)
+        return result
+
+    def _reschedule(self, channel_id: int, countdown: int) -> bool:
+        """合并窗口内没有已调度的发送任务时调度一次"""
+        if self.redis.set(self._get_scheduled_key(channel_id), 1, nx=True, ex=self.coalesce_window * 4):
+            self._schedule_flush(channel_id, countdown)
+            return True
+        return False
+
+    def _deliver(self, channel: Optional[AlertChannel], entries: List,
+                 retryable: Optional[set] = None) -> Dict[str, Any]:
+        """发送并更新通知记录
+
+        Args:
+            channel: 告警渠道
+            entries: [(通知记录, 告警记录, 入队时间戳)]
+            retryable: 发送失败后会重新入队的通知ID，失败时保持 pending 状态
+        """
+        entries = [entry for entry in entries if entry[1] is not None]
+        if not entries:
+            return {'channel_id': channel.id if channel else None, 'sent': 0}
+        retryable = retryable or set()
+
+        start_time = time.time()
+        if channel is None:
+            success, message = False, "告警渠道不存在"
+        else:
+            service = self.notification_services.get(channel.type)
+            alert_records = [record for _, record, _ in entries]
+            try:
+                if not service:
+                    success, message = False, f"不支持的通知渠道类型: {channel.type}"
+                elif len(alert_records) == 1:
+                    success, message = service.send_alert_notification(
+                        alert_records[0], channel, record_status=False
+                    )
+                else:
+                    success, message = service.send_alert_digest(alert_records, channel)
+            except Exception as e:
+                success, message = False, f"发送告警通知异常: {str(e)}"
+        send_duration = time.time() - start_time
+
+        sent_at = datetime.now(timezone.utc)
+        try:
+            for notification, _, _ in entries:
+                if success:
+                    notification.status = 'sent'
+                    notification.sent_at = sent_at
+                    notification.error_message = None
+                else:
+                    notification.status = 'pending' if notification.id in retryable else 'failed'
+                    notification.sent_at = None
+                    notification.error_message = message
+            db.session.commit()
+        except Exception as e:
+            logger.error(f"更新告警通知状态失败: {str(e)}")
+            db.session.rollback()
+            raise
+
+        channel_type = channel.type if channel else 'unknown'
+        tenant_id = channel.tenant_id if channel else entries[0][1].tenant_id
+        self._record_metrics(tenant_id, channel_type, success, send_duration,
+                             [enqueued_at for _, _, enqueued_at in entries])
+
+        channel_name = channel.name if channel else '未知渠道'
+        if success:
+            logger.info(f"告警通知发送成功: {channel_name}, 告警数 {len(entries)}")
+        else:
+            logger.error(f"告警通知发送失败: {channel_name} - {message}")
+
+        return {
+            'channel_id': channel.id if channel else None,
+            'sent': len(entries) if success else 0,
+            'failed': 0 if success else len(entries),
+            'digest': len(entries) > 1,
+            'send_duration_ms': round(send_duration * 1000, 1)
+        }
+
+    def _record_metrics(self, tenant_id: int, channel_type: str, success: bool, send_duration: float,
+                        enqueued_times: List[float]):
+        """按租户记录发送耗时、端到端延迟和发送计数"""
+        try:
+            now = time.time()
+            pipe = self.redis.pipeline()
+
+            send_key = self._get_latency_key(tenant_id, channel_type, 'send')
+            pipe.lpush(send_key, round(send_duration * 1000, 1))
+            pipe.ltrim(send_key, 0, self.latency_samples - 1)
+
+            delivery_key = self._get_latency_key(tenant_id, channel_type, 'delivery')
+            pipe.lpush(delivery_key, *[round((now - t) * 1000, 1) for t in enqueued_times])
+            pipe.ltrim(delivery_key, 0, self.latency_samples - 1)
+
+            stats_key = self._get_stats_key(tenant_id)
+            pipe.hincrby(stats_key, f"{channel_type}:{'sent' if success else 'failed'}", len(enqueued_times))
+            pipe.hincrby(stats_key, f"{channel_type}:messages", 1)
+            pipe.execute()
+        except Exception as e:
+            logger.debug(f"记录告警通知指标失败: {str(e)}")
+
+    def sweep(self) -> int:
+        """补发滞留的通知
+
+        - 队列中有通知但没有已调度发送任务的渠道（任务丢失或 Worker 异常退出）重新调度
+        - 数据库中长时间为 pending 却不在任何队列中的通知（入队前进程退出）重新入队
+
+        Returns:
+            重新调度的渠道数
+        """
+        rescheduled = set()
+        channel_ids = {int(channel_id) for channel_id in self.redis.smembers(self._get_channels_key())}
+
+        # 不在队列中的 pending 通知
+        cutoff = datetime.utcnow() - timedelta(seconds=self.stale_pending_after)
+        stale = AlertNotification.query.filter(
+            AlertNotification.status == 'pending',
+            AlertNotification.created_at < cutoff
+        ).order_by(AlertNotification.id).limit(1000).all()
+        stale_by_channel: Dict[int, List[AlertNotification]] = {}
+        for notification in stale:
+            stale_by_channel.setdefault(notification.channel_id, []).append(notification)
+
+        for channel_id in channel_ids | set(stale_by_channel):
+            # 在一个事务中读取待发送和处理中队列，避免漏掉正在两者之间移动的通知
+            pipe = self.redis.pipeline()
+            pipe.lrange(self._get_pending_key(channel_id), 0, -1)
+            pipe.lrange(self._get_processing_key(channel_id), 0, -1)
+            pending_items, processing_items = pipe.execute()
+
+            queued = set()
+            for raw in list(pending_items) + list(processing_items):
+                try:
+                    queued.add(json.loads(raw)['notification_id'])
+                except (ValueError, KeyError, TypeError):
+                    continue
+
+            missing = [n for n in stale_by_channel.get(channel_id, []) if n.id not in queued]
+            if missing:
+                enqueued_at = time.time()
+                pipe = self.redis.pipeline()
+                pipe.rpush(self._get_pending_key(channel_id), *[
+                    json.dumps({'notification_id': n.id, 'enqueued_at': enqueued_at})
+                    for n in missing
+                ])
+                pipe.sadd(self._get_channels_key(), channel_id)
+                pipe.execute()
+                logger.info(f"重新入队滞留的告警通知: channel_id={channel_id}, 通知数 {len(missing)}")
+            elif not queued:
+                self.redis.srem(self._get_channels_key(), channel_id)
+                continue
+
+            if self._reschedule(channel_id, 0):
+                rescheduled.add(channel_id)
+        return len(rescheduled)
+
+    def get_metrics(self, channel_ids: Optional[Sequence[int]] = None,
+                    tenant_id: Optional[int] = None) -> Dict[str, Any]:
+        """获取队列深度、发送延迟和发送计数
+
+        Args:
+            channel_ids: 仅统计这些渠道的队列深度，为空时统计全部渠道
+            tenant_id: 租户ID，发送延迟和发送计数按租户记录，为空时不返回
+        """
+        try:
+            pending_channels = [int(c) for c in self.redis.smembers(self._get_channels_key())]
+            if channel_ids is not None:
+                allowed = set(channel_ids)
+                pending_channels = [c for c in pending_channels if c in allowed]
+
+            pipe = self.redis.pipeline()
+            for channel_id in pending_channels:
+                pipe.llen(self._get_pending_key(channel_id))
+                pipe.lindex(self._get_pending_key(channel_id), 0)
+            queue_results = pipe.execute() if pending_channels else []
+
+            now = time.time()
+            queue_depth = {}
+            oldest_age = 0.0
+            for index, channel_id in enumerate(pending_channels):
+                depth = queue_results[index * 2]
+                head = queue_results[index * 2 + 1]
+                if not depth:
+                    continue
+                queue_depth[channel_id] = depth
+                if head:
+                    try:
+                        oldest_age = max(oldest_age, now - json.loads(head)['enqueued_at'])
+                    except (ValueError, KeyError, TypeError):
+                        pass
+
+            metrics = {
+                'dispatch_mode': self.dispatch_mode,
+                'coalesce_window': self.coalesce_window,
+                'queue_depth': sum(queue_depth.values()),
+                'queue_depth_by_channel': queue_depth,
+                'oldest_pending_seconds': round(oldest_age, 1)
+            }
+            if tenant_id is None:
+                return metrics
+
+            latency = {}
+            for channel_type in self.notification_services:
+                latency[channel_type] = {}
+                for kind in ('send', 'delivery'):
+                    samples = sorted(
+                        float(v) for v in self.redis.lrange(self._get_latency_key(tenant_id, channel_type, kind), 0, -1)
+                    )
+                    latency[channel_type][kind] = {
+                        'samples': len(samples),
+                        'p50_ms': _percentile(samples, 50),
+                        'p95_ms': _percentile(samples, 95),
+                        'max_ms': samples[-1] if samples else None
+                    }
+
+            counters = {}
+            for field, value in self.redis.hgetall(self._get_stats_key(tenant_id)).items():
+                if isinstance(field, bytes):
+                    field = field.decode('utf-8')
+                counters[field] = int(value)
+
+            metrics['latency'] = latency
+            metrics['counters'] = counters
+            return metrics
+        except Exception as e:
+            logger.error(f"获取告警通知指标失败: {str(e)}")
+            return {'dispatch_mode': self.dispatch_mode, 'error': str(e)}
+
+
+# 全局告警通知分发器实例
+alert_notification_dispatcher = AlertNotificationDispatcher()
@@ -3,16 +3,25 @@
 
 提供命令过滤规则管理和命令检查功能。
 支持白名单/黑名单模式，通配符匹配，管道和链式命令解析。
+
+租户规则编译为 CommandFilterPolicy 后缓存在进程内（按规则 ID 和 updated_at 标识版本），
+规则变更时通过 Redis pub/sub 通知所有进程清除缓存。
 """
 import re
+import time
 import fnmatch
 import logging
+import threading
 from typing import Tuple, List, Optional, Dict, Any
 from app.extensions import db
 from app.models.webshell_audit import CommandFilterRule, DEFAULT_BLACKLIST
+from app.utils.command_matcher import CommandFilterPolicy
 
 logger = logging.getLogger(__name__)
 
+# 规则变更通知频道，消息内容为租户 ID
+RULES_CHANGED_CHANNEL = 'webshell:command_filter:rules_changed'
+
 
 class CommandFilterService:
     """命令过滤服务类"""
@@ -25,10 +34,33 @@ class CommandFilterService:
     # 匹配命令名（可能带路径）
     BASE_COMMAND_PATTERN = re.compile(r'^(?:\S*/)?([^\s/]+)')
     
+    # 本地策略缓存的兜底过期时间（秒），订阅断开期间丢失通知时最长在此时间后生效
+    POLICY_CACHE_TTL = 300
+    
+    # 订阅线程等待消息的超时时间（秒），需小于 Redis 客户端的 socket_timeout，空闲时不会触发读超时
+    LISTEN_POLL_TIMEOUT = 1.0
+    
     def __init__(self):
         """初始化命令过滤服务"""
+        self._redis = None
+        
+        # 租户 ID -> (规则版本, 编译后的策略, 过期时间)
+        self._policy_cache: Dict[int, Tuple[Optional[tuple], Optional[CommandFilterPolicy], float]] = {}
+        # 租户 ID -> 失效次数，用于丢弃加载期间已失效的结果
+        self._policy_generation: Dict[int, int] = {}
+        self._cache_lock = threading.Lock()
+        self._listener_thread: Optional[threading.Thread] = None
+        
         logger.info("命令过滤服务已初始化")
     
+    @property
+    def redis(self):
+        """延迟获取 Redis 客户端"""
+        if self._redis is None:
+            from app.extensions import redis_client, get_redis_client
+            self._redis = redis_client or get_redis_client()
+        return self._redis
+    
     def parse_command(self, command: str) -> List[str]:
         """
         解析命令字符串，提取所有基础命令
@@ -133,10 +165,10 @@ class CommandFilterService:
         if not command or not command.strip():
             return True, ""
         
-        # 获取过滤规则
-        rules = self.get_filter_rules(host_id, tenant_id)
+        # 获取编译后的过滤策略（进程内缓存）
+        policy = self.get_filter_policy(tenant_id)
         
-        if not rules or not rules.is_active:
+        if policy is None:
             # 没有规则或规则未激活，允许执行
             return True, ""
         
@@ -147,59 +179,119 @@ class CommandFilterService:
             return True, ""
         
         # 根据模式检查命令
-        mode = rules.mode
-        whitelist = rules.whitelist or []
-        blacklist = rules.blacklist or []
-        
-        if mode == 'whitelist' and whitelist:
-            # 白名单模式：只允许白名单中的命令
-            for base_cmd in base_commands:
-                if not self._is_in_list(base_cmd, whitelist):
-                    return False, f"命令 '{base_cmd}' 不在白名单中"
-            return True, ""
-        
-        elif mode == 'blacklist' or (not whitelist and blacklist):
-            # 黑名单模式：阻止黑名单中的命令
-            for base_cmd in base_commands:
-                matched_pattern = self._find_matching_pattern(base_cmd, blacklist)
-                if matched_pattern:
-                    return False, f"命令 '{base_cmd}' 匹配黑名单规则 '{matched_pattern}'"
-            return True, ""
-        
-        # 没有配置有效规则，允许执行
-        return True, ""
+        return policy.check(base_commands)
     
-    def _is_in_list(self, command: str, patterns: List[str]) -> bool:
-        """
-        检查命令是否在模式列表中
-        
-        Args:
-            command: 要检查的命令
-            patterns: 模式列表
-            
-        Returns:
-            是否匹配任一模式
-        """
-        for pattern in patterns:
-            if self.match_pattern(command, pattern):
-                return True
-        return False
+    # ==================== 编译策略缓存 ====================
     
-    def _find_matching_pattern(self, command: str, patterns: List[str]) -> Optional[str]:
+    def get_filter_policy(self, tenant_id: int) -> Optional[CommandFilterPolicy]:
         """
-        查找匹配的模式
+        获取租户编译后的过滤策略
+        
+        缓存未过期时不访问数据库；过期后重新查询规则，规则 ID 和 updated_at
+        未变化时复用已编译的策略。
         
         Args:
-            command: 要检查的命令
-            patterns: 模式列表
+            tenant_id: 租户 ID
             
         Returns:
-            匹配的模式，如果没有匹配则返回 None
+            CommandFilterPolicy，没有激活的规则时返回 None
         """
-        for pattern in patterns:
-            if self.match_pattern(command, pattern):
-                return pattern
-        return None
+        self._ensure_listener()
+        
+        now = time.monotonic()
+        with self._cache_lock:
+            entry = self._policy_cache.get(tenant_id)
+            generation = self._policy_generation.get(tenant_id, 0)
+        
+        if entry and entry[2] > now:
+            return entry[1]
+        
+        rule = self.get_filter_rules(None, tenant_id)
+        version = (rule.id, rule.updated_at) if rule else None
+        
+        if entry and entry[0] == version:
+            policy = entry[1]
+        elif rule:
+            policy = CommandFilterPolicy(rule.mode, rule.whitelist, rule.blacklist)
+        else:
+            policy = None
+        
+        with self._cache_lock:
+            # 加载期间收到变更通知时不写入缓存，下次检查重新加载
+            if self._policy_generation.get(tenant_id, 0) == generation:
+                self._policy_cache[tenant_id] = (version, policy, now + self.POLICY_CACHE_TTL)
+        
+        return policy
+    
+    def invalidate_policy(self, tenant_id: int):
+        """清除本进程的租户策略缓存"""
+        with self._cache_lock:
+            self._policy_cache.pop(tenant_id, None)
+            self._policy_generation[tenant_id] = self._policy_generation.get(tenant_id, 0) + 1
+    
+    def _notify_rules_changed(self, tenant_id: int):
+        """规则变更后清除本地缓存并通知其他进程"""
+        self.invalidate_policy(tenant_id)
+        try:
+            self.redis.publish(RULES_CHANGED_CHANNEL, str(tenant_id))
+        except Exception as e:
+            # 通知失败时其他进程在缓存过期后生效
+            logger.warning(f"发布命令过滤规则变更通知失败: {str(e)}")
+    
+    def _ensure_listener(self):
+        """按需启动规则变更订阅线程"""
+        if self._listener_thread is not None and self._listener_thread.is_alive():
+            return
+        with self._cache_lock:
+            if self._listener_thread is None or not self._listener_thread.is_alive():
+                self._listener_thread = threading.Thread(
+                    target=self._listen,
+                    name='command-filter-rules-listener',
+                    daemon=True
+                )
+                self._listener_thread.start()
+    
+    def _listen(self):
+        """订阅规则变更通知，断线后重连"""
+        from app.extensions import get_redis_client
+        
+        backoff = 1
+        while True:
+            pubsub = None
+            try:
+                # 订阅连接需要独占，不与业务命令共用
+                pubsub = get_redis_client().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(RULES_CHANGED_CHANNEL)
+                backoff = 1
+                
+                # 断线期间可能错过通知，重新订阅后清空本地缓存
+                with self._cache_lock:
+                    for tenant_id in list(self._policy_cache):
+                        self._policy_generation[tenant_id] = self._policy_generation.get(tenant_id, 0) + 1
+                    self._policy_cache.clear()
+                
+                # get_message 按超时轮询，空闲期间不会因 socket_timeout 断开重连
+                while True:
+                    message = pubsub.get_message(timeout=self.LISTEN_POLL_TIMEOUT)
+                    if not message or message.get('type') != 'message':
+                        continue
+                    try:
+                        tenant_id = int(message['data'])
+                    except (TypeError, ValueError):
+                        continue
+                    self.invalidate_policy(tenant_id)
+                    logger.debug(f"命令过滤规则已变更，清除租户 {tenant_id} 的策略缓存")
+                    
+            except Exception as e:
+                logger.error(f"命令过滤规则订阅连接异常，{backoff} 秒后重连: {str(e)}")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
     
     def get_filter_rules(self, host_id: Optional[int], tenant_id: int) -> Optional[CommandFilterRule]:
         """
@@ -270,6 +362,7 @@ class CommandFilterService:
                 db.session.add(rule)
             
             db.session.commit()
+            self._notify_rules_changed(tenant_id)
             logger.info(f"设置主机 {host_id} 的命令过滤规则成功")
             return True, "规则设置成功", rule
             
@@ -324,6 +417,7 @@ class CommandFilterService:
                 db.session.add(rule)
             
             db.session.commit()
+            self._notify_rules_changed(tenant_id)
             logger.info(f"设置租户 {tenant_id} 的全局命令过滤规则成功")
             return True, "全局规则设置成功", rule
             
@@ -352,6 +446,7 @@ class CommandFilterService:
             if rule:
                 db.session.delete(rule)
                 db.session.commit()
+                self._notify_rules_changed(tenant_id)
                 logger.info(f"删除主机 {host_id} 的命令过滤规则成功")
                 return True, "规则删除成功"
             else:
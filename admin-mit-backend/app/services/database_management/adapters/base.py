@@ -3,7 +3,9 @@
 """
 import logging
 from abc import ABC, abstractmethod
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, Iterator, List, Any, Optional, Tuple
+
+from ..base import DatabaseQueryError
 
 logger = logging.getLogger(__name__)
 
@@ -95,6 +97,101 @@ class BaseDatabaseAdapter(ABC):
         """获取服务器信息"""
         pass
     
+    # ==================== 查询会话分页 ====================
+    
+    def fetch_window(self, client: Any, sql: str, offset: int, limit: int) -> Tuple[List[str], List[List[Any]]]:
+        """
+        读取查询结果的一个行窗口（不执行 COUNT）
+        
+        Returns:
+            tuple: (列名列表, 已转换为 JSON 格式的数据行)
+        """
+        cursor = client.cursor()
+        try:
+            cursor.execute(self.build_paginated_sql(sql, limit, offset))
+            columns = [desc[0] for desc in cursor.description] if cursor.description else []
+            rows = []
+            for row in cursor.fetchall():
+                row_data = [row.get(col) for col in columns] if isinstance(row, dict) else list(row)
+                rows.append(self.convert_row_to_json(row_data))
+            return self.strip_pagination_columns(columns, rows, offset)
+        except Exception as e:
+            self._rollback(client)
+            raise DatabaseQueryError(f"查询执行失败: {str(e)}")
+        finally:
+            cursor.close()
+    
+    def strip_pagination_columns(
+        self,
+        columns: List[str],
+        rows: List[List[Any]],
+        offset: int
+    ) -> Tuple[List[str], List[List[Any]]]:
+        """去除分页 SQL 附加的辅助列（子类可覆盖）"""
+        return columns, rows
+    
+    def build_count_sql(self, sql: str) -> str:
+        """构建 COUNT SQL（子类可覆盖）"""
+        return f"SELECT COUNT(*) FROM ({sql}) AS count_query"
+    
+    def count_rows(self, client: Any, sql: str) -> Optional[int]:
+        """精确统计查询结果行数，失败时返回 None"""
+        cursor = client.cursor()
+        try:
+            cursor.execute(self.build_count_sql(sql))
+            row = cursor.fetchone()
+            return int(list(row.values())[0] if isinstance(row, dict) else row[0])
+        except Exception as e:
+            logger.warning(f"Count rows failed: {e}")
+            self._rollback(client)
+            return None
+        finally:
+            cursor.close()
+    
+    def estimate_row_count(self, client: Any, sql: str) -> Optional[int]:
+        """根据执行计划估算查询结果行数（不支持时返回 None，子类可覆盖）"""
+        return None
+    
+    @staticmethod
+    def _rollback(client: Any):
+        try:
+            client.rollback()
+        except Exception:
+            pass
+    
+    # ==================== 流式查询 ====================
+    
+    def stream_query(self, client: Any, sql: str, batch_size: int = 1000) -> Iterator[List[Any]]:
+        """
+        流式执行查询
+        
+        第一个元素为列名列表，之后每个元素为一批已转换为 JSON 格式的数据行。
+        游标由 _open_stream_cursor 创建，子类覆盖为服务端游标，保证内存占用与结果集大小无关。
+        """
+        cursor = self._open_stream_cursor(client, batch_size)
+        try:
+            cursor.execute(sql)
+            rows = cursor.fetchmany(batch_size)
+            yield [desc[0] for desc in cursor.description] if cursor.description else []
+            while rows:
+                yield [self.convert_row_to_json(list(row)) for row in rows]
+                rows = cursor.fetchmany(batch_size)
+        finally:
+            self._close_stream_cursor(client, cursor)
+    
+    def _open_stream_cursor(self, client: Any, batch_size: int) -> Any:
+        """创建流式读取游标：默认按 arraysize 分批从服务端获取（子类可覆盖）"""
+        cursor = client.cursor()
+        cursor.arraysize = batch_size
+        return cursor
+    
+    def _close_stream_cursor(self, client: Any, cursor: Any):
+        """关闭流式读取游标（子类可覆盖）"""
+        try:
+            cursor.close()
+        except Exception:
+            pass
+    
     def build_paginated_sql(self, sql: str, limit: int, offset: int) -> str:
         """构建分页 SQL（子类可覆盖）"""
         return f"{sql} LIMIT {limit} OFFSET {offset}"
@@ -242,6 +242,16 @@ class DMAdapter(BaseDatabaseAdapter):
         cursor.close()
         return indexes
     
+    def build_count_sql(self, sql: str) -> str:
+        """构建 COUNT SQL（达梦子查询不使用 AS 别名）"""
+        return f"SELECT COUNT(*) FROM ({sql})"
+    
+    def strip_pagination_columns(self, columns, rows, offset):
+        """去除 ROWNUM 分页附加的 rn 列"""
+        if offset > 0 and columns and columns[-1].lower() == 'rn':
+            return columns[:-1], [row[:-1] for row in rows]
+        return columns, rows
+    
     def build_paginated_sql(self, sql: str, limit: int, offset: int) -> str:
         """构建分页 SQL（达梦使用 ROWNUM）"""
         if offset > 0:
@@ -385,6 +385,33 @@ class MySQLAdapter(BaseDatabaseAdapter):
         
         return result
     
+    def estimate_row_count(self, client: Any, sql: str) -> Optional[int]:
+        """从 EXPLAIN 的 rows × filtered 估算结果行数（各表估算值相乘，不执行查询）"""
+        cursor = client.cursor()
+        try:
+            cursor.execute(f"EXPLAIN {sql}")
+            estimate = None
+            for row in cursor.fetchall():
+                if row.get('select_type') not in ('SIMPLE', 'PRIMARY') or row.get('rows') is None:
+                    continue
+                table_rows = float(row['rows']) * float(row.get('filtered') or 100) / 100
+                estimate = table_rows if estimate is None else estimate * table_rows
+            return int(estimate) if estimate is not None else None
+        except Exception as e:
+            logger.warning(f"Estimate row count failed: {e}")
+            return None
+        finally:
+            cursor.close()
+    
+    def _open_stream_cursor(self, client: Any, batch_size: int) -> Any:
+        """使用 SSCursor（无缓冲游标），结果逐批从服务端读取"""
+        import pymysql.cursors
+        return client.cursor(pymysql.cursors.SSCursor)
+    
+    def _close_stream_cursor(self, client: Any, cursor: Any):
+        """流式导出使用独立连接并在结束后关闭，无需读完剩余结果"""
+        pass
+    
     def get_server_info(self, client: Any) -> Dict[str, Any]:
         """获取服务器信息"""
         cursor = client.cursor()
@@ -1,8 +1,10 @@
 """
 PostgreSQL 数据库适配器
 """
+import json
 import logging
 import time
+import uuid
 from typing import Dict, List, Any, Optional
 
 from ..base import (
@@ -351,6 +353,39 @@ class PostgreSQLAdapter(BaseDatabaseAdapter):
         
         return result
     
+    def estimate_row_count(self, client: Any, sql: str) -> Optional[int]:
+        """从 EXPLAIN 的 Plan Rows 估算结果行数（不执行查询）"""
+        cursor = client.cursor()
+        try:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]['Plan']['Plan Rows'])
+        except Exception as e:
+            logger.warning(f"Estimate row count failed: {e}")
+            self._rollback(client)
+            return None
+        finally:
+            cursor.close()
+    
+    def _open_stream_cursor(self, client: Any, batch_size: int) -> Any:
+        """使用命名游标（服务端游标），每次 FETCH batch_size 行"""
+        cursor = client.cursor(name=f"mit_export_{uuid.uuid4().hex}")
+        cursor.itersize = batch_size
+        return cursor
+    
+    def _close_stream_cursor(self, client: Any, cursor: Any):
+        """关闭命名游标并结束其所在的只读事务"""
+        try:
+            cursor.close()
+        except Exception:
+            pass
+        try:
+            client.rollback()
+        except Exception:
+            pass
+    
     def get_server_info(self, client: Any) -> Dict[str, Any]:
         """获取服务器信息"""
         cursor = client.cursor()
@@ -105,25 +105,37 @@ class DatabaseConnectionManager:
             if connection_config.status != 1:
                 raise DatabaseConnectionError("连接配置已禁用")
             
-            # 获取适配器并创建连接
-            adapter = self.get_adapter(connection_config.db_type)
-            
-            client = adapter.create_connection(
-                host=connection_config.host,
-                port=connection_config.port or adapter.default_port,
-                username=connection_config.username,
-                password=connection_config.password,
-                database=connection_config.database,
-                timeout=connection_config.timeout or 10,
-                service_name=getattr(connection_config, 'service_name', None),
-                sid=getattr(connection_config, 'sid', None)
-            )
+            client = self.create_dedicated_client(connection_config)
             
             self._connections[connection_key] = client
             logger.info(f"Created new database connection: {connection_key}")
             
             return client
     
+    def create_dedicated_client(self, connection_config: DatabaseConnection):
+        """
+        创建不进入连接缓存的独立连接
+        
+        用于流式导出等长时间占用连接的操作，避免与共享连接上的其他查询交错；
+        调用方负责关闭。
+        """
+        if connection_config.status != 1:
+            raise DatabaseConnectionError("连接配置已禁用")
+        
+        # 获取适配器并创建连接
+        adapter = self.get_adapter(connection_config.db_type)
+        
+        return adapter.create_connection(
+            host=connection_config.host,
+            port=connection_config.port or adapter.default_port,
+            username=connection_config.username,
+            password=connection_config.password,
+            database=connection_config.database,
+            timeout=connection_config.timeout or 10,
+            service_name=getattr(connection_config, 'service_name', None),
+            sid=getattr(connection_config, 'sid', None)
+        )
+    
     def _close_client_internal(self, connection_key: str) -> bool:
         """内部方法：关闭指定连接（不加锁）"""
         if connection_key not in self._connections:
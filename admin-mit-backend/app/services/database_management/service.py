@@ -2,15 +2,20 @@
 数据库管理服务
 """
 import csv
+import hashlib
 import io
+import json
 import logging
-from typing import Dict, List, Optional, Tuple, Any
+import time
+import uuid
+from typing import Dict, Iterator, List, Optional, Tuple, Any
 from datetime import datetime
 
 from flask import g
 from sqlalchemy.exc import IntegrityError
 
 from app.extensions import db
+from app.core.config_manager import config_manager
 from app.models.database_connection import DatabaseConnection
 
 from .base import DatabaseQueryError
@@ -31,6 +36,25 @@ class DatabaseManagementService:
         """初始化服务"""
         self._encryption_service = db_password_encryption_service
         self._connection_manager = database_connection_manager
+        
+        db_config = config_manager.get_app_config().get('database_management', {})
+        export_config = db_config.get('export', {})
+        self.export_fetch_size = export_config.get('fetch_size', 2000)  # 流式导出每批从服务端获取的行数
+        
+        session_config = db_config.get('query_session', {})
+        self.session_enabled = session_config.get('enabled', True)
+        self.session_window_size = session_config.get('window_size', 500)  # 每个缓存窗口的行数
+        self.session_ttl = session_config.get('ttl', 300)  # 查询会话缓存时间（秒）
+        self.session_count_mode = session_config.get('count_mode', 'estimate')  # 默认总数模式
+        self._redis = None
+    
+    @property
+    def redis(self):
+        """延迟获取 Redis 客户端（缓存查询会话窗口）"""
+        if self._redis is None:
+            from app.extensions import redis_client, get_redis_client
+            self._redis = redis_client or get_redis_client()
+        return self._redis
     
     # ==================== 连接配置 CRUD ====================
     
@@ -375,6 +399,10 @@ class DatabaseManagementService:
     
     # ==================== SQL 查询执行 ====================
     
+    # 查询会话总数模式
+    COUNT_MODES = ('none', 'estimate', 'exact')
+    SESSION_PREFIX = 'db:query:session'
+    
     def execute_query(
         self,
         connection_id: int,
@@ -382,9 +410,30 @@ class DatabaseManagementService:
         page: int = 1,
         per_page: int = 50,
         max_rows: int = 1000,
-        tenant_id: Optional[int] = None
+        tenant_id: Optional[int] = None,
+        count_mode: Optional[str] = None,
+        session_id: Optional[str] = None
     ) -> Dict[str, Any]:
-        """执行 SQL 查询"""
+        """
+        执行 SQL 查询
+        
+        SELECT/WITH 查询使用查询会话分页：结果按固定大小的行窗口读取并缓存在 Redis 中，
+        翻页时只读取尚未缓存的窗口，不再每页执行 COUNT(*) 并重新执行整条查询。
+        每次执行（未传 session_id）都新建查询会话，只有翻页时传回返回的 session_id
+        才复用已缓存的窗口，重复执行同一查询总能读到最新数据。
+        总数按 count_mode 提供：none 不统计；estimate 使用执行计划估算（仅作提示，
+        不计入分页总数）；exact 执行一次 COUNT(*) 并缓存。读到结果末尾后总数即为精确值。
+        
+        Args:
+            connection_id: 连接配置 ID
+            sql: SQL 语句
+            page: 页码
+            per_page: 每页数量
+            max_rows: 最大返回行数
+            tenant_id: 租户 ID (可选)
+            count_mode: 总数模式 (可选，默认使用配置)
+            session_id: 查询会话 ID（翻页时传回上次返回的值，不传则新建会话）
+        """
         if not sql or not sql.strip():
             raise ValueError("SQL 语句不能为空")
         
@@ -397,12 +446,170 @@ class DatabaseManagementService:
         if max_rows < 1:
             max_rows = 1000
         
+        count_mode = count_mode or self.session_count_mode
+        if count_mode not in self.COUNT_MODES:
+            raise ValueError(f"不支持的总数模式: {count_mode}")
+        
+        if tenant_id is None:
+            tenant_id = getattr(g, 'tenant_id', None)
+        
         client, adapter, _ = self._get_client_and_adapter(connection_id, tenant_id)
         
         logger.info(f"Executing SQL: {sql[:100]}...")
         
+        sql_clean = sql.strip().rstrip(';').rstrip()
+        if self.session_enabled and sql_clean.upper().startswith(('SELECT', 'WITH')):
+            return self._execute_session_query(
+                client, adapter, connection_id, tenant_id, sql_clean,
+                page, per_page, max_rows, count_mode, session_id
+            )
+        
         return adapter.execute_query(client, sql, page, per_page, max_rows)
     
+    def _get_session_key(self, tenant_id: int, connection_id: int, session_id: str) -> str:
+        """查询会话键"""
+        return f"{self.SESSION_PREFIX}:{tenant_id}:{connection_id}:{session_id}"
+    
+    def _load_session(self, session_key: str, windows: List[int]) -> Tuple[Dict[str, Any], Dict[int, list]]:
+        """读取会话元数据和所需窗口；Redis 不可用时按无缓存处理"""
+        try:
+            values = self.redis.hmget(session_key, ['meta'] + [f"w{index}" for index in windows])
+        except Exception as e:
+            logger.warning(f"Load query session failed: {e}")
+            return {}, {}
+        
+        meta = json.loads(values[0]) if values[0] else {}
+        cached = {
+            index: json.loads(raw)
+            for index, raw in zip(windows, values[1:])
+            if raw is not None
+        }
+        return meta, cached
+    
+    def _save_session(self, session_key: str, meta: Dict[str, Any], windows: Dict[int, list]):
+        """保存会话元数据和新读取的窗口，并刷新过期时间"""
+        try:
+            mapping = {'meta': json.dumps(meta, ensure_ascii=False)}
+            for index, rows in windows.items():
+                mapping[f"w{index}"] = json.dumps(rows, ensure_ascii=False)
+            pipe = self.redis.pipeline()
+            pipe.hset(session_key, mapping=mapping)
+            pipe.expire(session_key, self.session_ttl)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Save query session failed: {e}")
+    
+    def _execute_session_query(
+        self,
+        client,
+        adapter,
+        connection_id: int,
+        tenant_id: int,
+        sql: str,
+        page: int,
+        per_page: int,
+        max_rows: int,
+        count_mode: str,
+        session_id: Optional[str]
+    ) -> Dict[str, Any]:
+        """按查询会话读取一页结果"""
+        start_time = time.time()
+        window_size = self.session_window_size
+        sql_hash = hashlib.sha256(sql.encode('utf-8')).hexdigest()
+        
+        offset = (page - 1) * per_page
+        stop = min(offset + per_page, max_rows)
+        windows = list(range(offset // window_size, (stop - 1) // window_size + 1)) if stop > offset else []
+        
+        meta, cached = {}, {}
+        if session_id:
+            meta, cached = self._load_session(self._get_session_key(tenant_id, connection_id, session_id), windows)
+            # 会话已过期或属于其他 SQL 时新建会话
+            if meta.get('sql_hash') != sql_hash:
+                meta, cached = {}, {}
+        if not meta:
+            session_id = uuid.uuid4().hex
+            meta = {'sql_hash': sql_hash}
+        session_key = self._get_session_key(tenant_id, connection_id, session_id)
+        
+        # 读取缺失的窗口；已知结果末尾（end）之后的窗口无需读取
+        fetched: Dict[int, list] = {}
+        for index in windows:
+            if index in cached:
+                continue
+            window_offset = index * window_size
+            if meta.get('end') is not None and window_offset >= meta['end']:
+                cached[index] = []
+                continue
+            columns, rows = adapter.fetch_window(client, sql, window_offset, window_size)
+            meta['columns'] = columns
+            if len(rows) < window_size:
+                meta['end'] = window_offset + len(rows)
+            cached[index] = fetched[index] = rows
+        
+        # 未读取任何窗口时（如页码超出范围）仍需列名
+        if 'columns' not in meta:
+            columns, rows = adapter.fetch_window(client, sql, 0, window_size)
+            meta['columns'] = columns
+            if len(rows) < window_size:
+                meta['end'] = len(rows)
+            fetched[0] = rows
+        
+        rows: List[List[Any]] = []
+        for index in windows:
+            rows.extend(cached[index])
+        first_offset = windows[0] * window_size if windows else offset
+        rows = rows[offset - first_offset:stop - first_offset]
+        
+        # 总数：已读到末尾时为精确值，否则按 count_mode 获取并缓存
+        total_count = meta.get('end')
+        total_estimated = False
+        if total_count is None:
+            if count_mode == 'exact':
+                if meta.get('exact_total') is None:
+                    meta['exact_total'] = adapter.count_rows(client, sql)
+                total_count = meta['exact_total']
+            elif count_mode == 'estimate':
+                if meta.get('estimated_total') is None:
+                    meta['estimated_total'] = adapter.estimate_row_count(client, sql)
+                total_count = meta['estimated_total']
+                total_estimated = total_count is not None
+        
+        self._save_session(session_key, meta, fetched)
+        
+        reachable = min(total_count, max_rows) if total_count is not None and not total_estimated else None
+        if reachable is not None:
+            has_next = stop < reachable
+        else:
+            has_next = len(rows) == per_page and stop < max_rows
+        # 估算值只作提示，分页总数只使用精确值；总数未知时页数为已知下界（还有下一页时为当前页 + 1）
+        pagination_total = total_count if not total_estimated else None
+        if pagination_total is not None:
+            pages = (min(pagination_total, max_rows) + per_page - 1) // per_page
+        else:
+            pages = page + 1 if has_next else page
+        
+        return {
+            'columns': meta.get('columns') or [],
+            'rows': rows,
+            'row_count': len(rows),
+            'total_count': total_count,
+            'total_estimated': total_estimated,
+            'execution_time': int((time.time() - start_time) * 1000),
+            'affected_rows': None,
+            'is_select': True,
+            'session_id': session_id,
+            'cached': not fetched,
+            'pagination': {
+                'page': page,
+                'per_page': per_page,
+                'total': pagination_total,
+                'pages': pages,
+                'has_prev': page > 1,
+                'has_next': has_next
+            }
+        }
+    
     def get_server_info(self, connection_id: int, tenant_id: Optional[int] = None) -> Dict[str, Any]:
         """获取服务器信息"""
         client, adapter, _ = self._get_client_and_adapter(connection_id, tenant_id)
@@ -418,31 +625,108 @@ class DatabaseManagementService:
         tenant_id: Optional[int] = None
     ) -> str:
         """导出查询结果为 CSV"""
-        result = self.execute_query(
+        return ''.join(self.stream_csv(
             connection_id=connection_id,
             sql=sql,
-            page=1,
-            per_page=max_rows,
             max_rows=max_rows,
             tenant_id=tenant_id
-        )
+        ))
+    
+    def stream_csv(
+        self,
+        connection_id: int,
+        sql: str,
+        max_rows: Optional[int] = None,
+        tenant_id: Optional[int] = None
+    ) -> Iterator[str]:
+        """
+        流式导出查询结果为 CSV
+        
+        使用独立连接和服务端游标（PostgreSQL 命名游标、MySQL SSCursor、
+        Oracle/DM 按 arraysize 分批获取）逐批读取，每批写成一个 CSV 片段返回，
+        内存占用与结果集大小无关。查询在本方法返回前执行，SQL 错误在开始输出前抛出。
+        
+        Args:
+            connection_id: 连接配置 ID
+            sql: 查询语句（只支持 SELECT/WITH）
+            max_rows: 最大导出行数（可选，默认不限制）
+            tenant_id: 租户 ID (可选)
+            
+        Returns:
+            Iterator[str]: CSV 片段，第一个片段包含 BOM 和表头
+        """
+        if not sql or not sql.strip():
+            raise ValueError("SQL 语句不能为空")
         
-        output = io.StringIO()
-        writer = csv.writer(output, quoting=csv.QUOTE_MINIMAL)
+        sql_clean = sql.strip().rstrip(';').rstrip()
+        if not sql_clean.upper().startswith(('SELECT', 'WITH')):
+            raise ValueError("只支持导出 SELECT 查询结果")
+        
+        if tenant_id is None:
+            tenant_id = getattr(g, 'tenant_id', None)
+        
+        if tenant_id is None:
+            raise ValueError("租户ID不能为空")
+        
+        connection = DatabaseConnection.get_by_tenant(connection_id, tenant_id)
+        if not connection:
+            raise ValueError(f"连接配置不存在: ID={connection_id}")
+        
+        adapter = self._connection_manager.get_adapter(connection.db_type)
+        client = self._connection_manager.create_dedicated_client(connection)
+        
+        logger.info(f"Streaming CSV export: {sql_clean[:100]}...")
         
-        # 写入表头
-        if result['columns']:
-            writer.writerow(result['columns'])
+        try:
+            batches = adapter.stream_query(client, sql_clean, self.export_fetch_size)
+            columns = next(batches)
+        except Exception as e:
+            try:
+                client.close()
+            except Exception:
+                pass
+            if isinstance(e, StopIteration):
+                raise DatabaseQueryError("查询未返回结果")
+            raise
         
-        # 写入数据行
-        for row in result['rows']:
-            writer.writerow(row)
+        return self._generate_csv(client, columns, batches, max_rows)
+    
+    @staticmethod
+    def _generate_csv(client, columns: List[str], batches: Iterator[List[Any]],
+                      max_rows: Optional[int]) -> Iterator[str]:
+        """将数据行批次写成 CSV 片段，结束或中断时关闭独立连接"""
+        output = io.StringIO()
+        writer = csv.writer(output, quoting=csv.QUOTE_MINIMAL)
         
-        csv_content = output.getvalue()
-        output.close()
+        def take():
+            chunk = output.getvalue()
+            output.seek(0)
+            output.truncate(0)
+            return chunk
         
-        # 添加 BOM 以支持 Excel 正确识别 UTF-8
-        return '\ufeff' + csv_content
+        try:
+            # 添加 BOM 以支持 Excel 正确识别 UTF-8
+            output.write('\ufeff')
+            if columns:
+                writer.writerow(columns)
+            yield take()
+            
+            exported = 0
+            for rows in batches:
+                if max_rows is not None and exported + len(rows) > max_rows:
+                    rows = rows[:max_rows - exported]
+                writer.writerows(rows)
+                exported += len(rows)
+                yield take()
+                if max_rows is not None and exported >= max_rows:
+                    break
+        finally:
+            batches.close()
+            output.close()
+            try:
+                client.close()
+            except Exception:
+                pass
 
 
 # 创建全局服务实例
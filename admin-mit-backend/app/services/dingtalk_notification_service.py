@@ -136,6 +136,46 @@ class DingTalkMessageFormatter:
             result = result.replace(placeholder, str(value))
         return result
     
+    def format_digest_message(self, alert_records: List[AlertRecord]) -> Dict:
+        """格式化告警汇总消息（同一渠道短时间内的多条告警合并为一条）"""
+        severities = {record.severity for record in alert_records}
+        if 'critical' in severities:
+            severity_emoji = self.severity_emoji_map['critical']
+        elif 'warning' in severities:
+            severity_emoji = self.severity_emoji_map['warning']
+        else:
+            severity_emoji = self.severity_emoji_map['info']
+        
+        title = f"{severity_emoji} 系统告警汇总（{len(alert_records)} 条）"
+        content_lines = [f"### {title}", ""]
+        
+        for record in alert_records:
+            emoji = self.severity_emoji_map.get(record.severity, '⚠️')
+            metric_display = self.metric_display_map.get(record.metric_type, record.metric_type)
+            unit = self.unit_map.get(record.metric_type, '')
+            condition = record.rule.condition_operator if record.rule else '>'
+            content_lines.append(
+                f"- {emoji} **{record.host.name if record.host else 'Unknown'}** "
+                f"{record.rule.name if record.rule else 'Unknown'}: "
+                f"{metric_display} {float(record.current_value)}{unit} "
+                f"({condition} {float(record.threshold_value)}{unit})"
+            )
+        
+        content_lines.extend([
+            "",
+            "---",
+            f"*发送时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}*",
+            "*此消息由 MiTong运维平台 自动发送*"
+        ])
+        
+        return {
+            "msgtype": "markdown",
+            "markdown": {
+                "title": title,
+                "text": "\n".join(content_lines)
+            }
+        }
+    
     def format_test_message(self, channel_name: str) -> Dict:
         """格式化测试消息"""
         title = "✅ 钉钉告警渠道测试"
@@ -335,9 +375,18 @@ class DingTalkNotificationService:
         self.webhook_manager = DingTalkWebhookManager()
         self.max_retries = 3  # 最大重试次数
         self.retry_delay = 1  # 重试延迟（秒）
+        # 复用 HTTP 连接（Keep-Alive），避免每条消息重新建立 TLS 连接
+        self.http_session = requests.Session()
     
-    def send_alert_notification(self, alert_record: AlertRecord, channel: AlertChannel) -> Tuple[bool, str]:
-        """发送告警通知消息"""
+    def send_alert_notification(self, alert_record: AlertRecord, channel: AlertChannel,
+                                record_status: bool = True) -> Tuple[bool, str]:
+        """发送告警通知消息
+        
+        Args:
+            alert_record: 告警记录
+            channel: 告警渠道
+            record_status: 是否写入通知记录（由通知分发器调用时由分发器更新记录）
+        """
         try:
             # 验证渠道类型
             if channel.type != 'dingtalk':
@@ -365,14 +414,39 @@ class DingTalkNotificationService:
             success, response_msg = self._send_message_with_retry(channel.config, message)
             
             # 记录发送状态
-            self._record_notification_status(alert_record, channel, success, response_msg)
+            if record_status:
+                self._record_notification_status(alert_record, channel, success, response_msg)
             
             return success, response_msg
             
         except Exception as e:
             error_msg = f"发送钉钉告警消息失败: {str(e)}"
             logger.error(error_msg, exc_info=True)
-            self._record_notification_status(alert_record, channel, False, error_msg)
+            if record_status:
+                self._record_notification_status(alert_record, channel, False, error_msg)
+            return False, error_msg
+    
+    def send_alert_digest(self, alert_records: List[AlertRecord], channel: AlertChannel) -> Tuple[bool, str]:
+        """将多条告警合并为一条汇总消息发送（不写入通知记录）"""
+        try:
+            if channel.type != 'dingtalk':
+                return False, f"渠道类型不匹配，期望dingtalk，实际{channel.type}"
+            
+            if not channel.is_enabled():
+                return False, "告警渠道已禁用"
+            
+            is_valid, error_msg = channel.validate_config()
+            if not is_valid:
+                return False, f"渠道配置无效: {error_msg}"
+            
+            message = self.message_formatter.format_digest_message(alert_records)
+            message = self._add_at_functionality(message, channel.config)
+            
+            return self._send_message_with_retry(channel.config, message)
+            
+        except Exception as e:
+            error_msg = f"发送钉钉告警汇总消息失败: {str(e)}"
+            logger.error(error_msg, exc_info=True)
             return False, error_msg
     
     def send_test_notification(self, channel: AlertChannel) -> Tuple[bool, str]:
@@ -449,7 +523,7 @@ class DingTalkNotificationService:
             
             # 发送请求
             timeout = config.get('timeout', 10)
-            response = requests.post(
+            response = self.http_session.post(
                 webhook_url,
                 json=message,
                 timeout=timeout,
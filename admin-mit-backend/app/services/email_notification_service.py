@@ -3,11 +3,13 @@
 """
 import smtplib
 import ssl
+import threading
+import time
 from datetime import datetime, timezone
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.header import Header
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 from jinja2 import Template, Environment, BaseLoader
 import logging
 
@@ -25,6 +27,7 @@ class EmailTemplateEngine:
         self.env = Environment(loader=BaseLoader())
         self._templates = {
             'alert_notification': self._get_alert_template(),
+            'alert_digest': self._get_digest_template(),
             'test_notification': self._get_test_template()
         }
     
@@ -109,6 +112,65 @@ class EmailTemplateEngine:
         </div>
     </div>
 </body>
+</html>
+        """
+    
+    def _get_digest_template(self) -> str:
+        """获取告警汇总邮件模板（同一渠道短时间内的多条告警合并发送）"""
+        return """
+<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <title>{{ subject }}</title>
+    <style>
+        body { font-family: Arial, sans-serif; margin: 0; padding: 20px; background-color: #f5f5f5; }
+        .container { max-width: 800px; margin: 0 auto; background-color: white; border-radius: 8px; overflow: hidden; box-shadow: 0 2px 10px rgba(0,0,0,0.1); }
+        .header { background-color: {% if has_critical %}#ff4d4f{% else %}#faad14{% endif %}; color: white; padding: 20px; text-align: center; }
+        .content { padding: 20px; }
+        table { width: 100%; border-collapse: collapse; font-size: 13px; }
+        th, td { border-bottom: 1px solid #eee; padding: 8px; text-align: left; }
+        th { background-color: #f6f8fa; color: #666; }
+        .footer { background-color: #f6f8fa; padding: 15px; text-align: center; color: #666; font-size: 12px; }
+        .severity-critical { color: #ff4d4f; font-weight: bold; }
+        .severity-warning { color: #faad14; font-weight: bold; }
+        .severity-info { color: #1890ff; font-weight: bold; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>🚨 系统告警汇总</h1>
+            <p>{{ subject }}</p>
+        </div>
+        <div class="content">
+            <table>
+                <tr>
+                    <th>严重级别</th>
+                    <th>主机名称</th>
+                    <th>告警规则</th>
+                    <th>监控指标</th>
+                    <th>当前值 / 阈值</th>
+                    <th>触发时间</th>
+                </tr>
+                {% for alert in alerts %}
+                <tr>
+                    <td class="severity-{{ alert.severity }}">{{ alert.severity_display }}</td>
+                    <td>{{ alert.host_name }}</td>
+                    <td>{{ alert.rule_name }}</td>
+                    <td>{{ alert.metric_type_display }}</td>
+                    <td>{{ alert.current_value }}{{ alert.unit }} / {{ alert.condition_operator }} {{ alert.threshold_value }}{{ alert.unit }}</td>
+                    <td>{{ alert.triggered_at }}</td>
+                </tr>
+                {% endfor %}
+            </table>
+        </div>
+        <div class="footer">
+            <p>此邮件由 MiTong运维平台 自动发送，请勿回复</p>
+            <p>发送时间: {{ sent_at }}</p>
+        </div>
+    </div>
+</body>
 </html>
         """
     
@@ -170,6 +232,122 @@ class EmailTemplateEngine:
         severity_prefix = severity_map.get(alert_record.severity, '【告警】')
         
         return f"{severity_prefix}{alert_record.host.name} - {alert_record.rule.name}"
+    
+    def get_digest_subject(self, alert_records: List[AlertRecord]) -> str:
+        """生成告警汇总邮件主题"""
+        severities = {record.severity for record in alert_records}
+        if 'critical' in severities:
+            prefix = '【严重】'
+        elif 'warning' in severities:
+            prefix = '【警告】'
+        else:
+            prefix = '【信息】'
+        host_count = len({record.host_id for record in alert_records})
+        return f"{prefix}{len(alert_records)} 条告警（涉及 {host_count} 台主机）"
+
+
+class SMTPConnectionCache:
+    """SMTP 连接缓存
+
+    按渠道保持已登录的 SMTP 会话，连续发送时复用连接，
+    空闲超过 keepalive 时间或服务器断开后重新建立
+    """
+    
+    def __init__(self, keepalive: int = 300):
+        self.keepalive = keepalive
+        self._connections: Dict[Any, Dict[str, Any]] = {}
+        self._locks: Dict[Any, threading.Lock] = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _config_signature(config: Dict) -> Tuple:
+        """配置签名，渠道配置变更后不再复用旧连接"""
+        return (
+            config.get('smtp_server'), str(config.get('smtp_port')), config.get('username'),
+            config.get('password'), bool(config.get('use_tls', True)), bool(config.get('use_ssl', False))
+        )
+    
+    @staticmethod
+    def open_connection(config: Dict) -> smtplib.SMTP:
+        """建立并登录 SMTP 连接"""
+        smtp_server = config['smtp_server']
+        smtp_port = int(config['smtp_port'])
+        timeout = config.get('timeout', 30)
+        
+        if config.get('use_ssl', False):
+            server = smtplib.SMTP_SSL(smtp_server, smtp_port, timeout=timeout)
+        else:
+            server = smtplib.SMTP(smtp_server, smtp_port, timeout=timeout)
+            if config.get('use_tls', True):
+                server.starttls()
+        
+        server.login(config['username'], config['password'])
+        return server
+    
+    def get_lock(self, key) -> threading.Lock:
+        """获取渠道连接锁，同一连接同一时刻只能发送一封邮件"""
+        with self._lock:
+            if key not in self._locks:
+                self._locks[key] = threading.Lock()
+            return self._locks[key]
+    
+    def acquire(self, key, config: Dict) -> smtplib.SMTP:
+        """获取渠道连接（调用方需持有 get_lock(key)）"""
+        signature = self._config_signature(config)
+        entry = self._connections.get(key)
+        
+        if entry and entry['signature'] == signature and time.time() - entry['last_used'] < self.keepalive:
+            try:
+                if entry['server'].noop()[0] == 250:
+                    return entry['server']
+            except smtplib.SMTPException:
+                pass
+            except OSError:
+                pass
+        
+        self.discard(key)
+        server = self.open_connection(config)
+        self._connections[key] = {
+            'server': server,
+            'signature': signature,
+            'last_used': time.time()
+        }
+        return server
+    
+    def touch(self, key):
+        """更新连接最后使用时间"""
+        entry = self._connections.get(key)
+        if entry:
+            entry['last_used'] = time.time()
+    
+    def discard(self, key):
+        """关闭并移除渠道连接"""
+        entry = self._connections.pop(key, None)
+        if entry:
+            try:
+                entry['server'].quit()
+            except Exception:
+                pass
+    
+    def close_idle(self):
+        """关闭空闲超时的连接"""
+        now = time.time()
+        for key in list(self._connections.keys()):
+            lock = self.get_lock(key)
+            if not lock.acquire(blocking=False):
+                continue
+            try:
+                entry = self._connections.get(key)
+                if entry and now - entry['last_used'] >= self.keepalive:
+                    self.discard(key)
+            finally:
+                lock.release()
+    
+    def close_all(self):
+        """关闭全部连接"""
+        for key in list(self._connections.keys()):
+            with self.get_lock(key):
+                self.discard(key)
 
 
 class SMTPConfigManager:
@@ -251,9 +429,20 @@ class EmailNotificationService:
     def __init__(self):
         self.template_engine = EmailTemplateEngine()
         self.smtp_manager = SMTPConfigManager()
+        
+        from app.core.config_manager import config_manager
+        notification_config = config_manager.get_app_config().get('alert_monitoring', {}).get('notification', {})
+        self.connection_cache = SMTPConnectionCache(keepalive=notification_config.get('smtp_keepalive', 300))
     
-    def send_alert_notification(self, alert_record: AlertRecord, channel: AlertChannel) -> Tuple[bool, str]:
-        """发送告警通知邮件"""
+    def send_alert_notification(self, alert_record: AlertRecord, channel: AlertChannel,
+                                record_status: bool = True) -> Tuple[bool, str]:
+        """发送告警通知邮件
+        
+        Args:
+            alert_record: 告警记录
+            channel: 告警渠道
+            record_status: 是否写入通知记录（由通知分发器调用时由分发器更新记录）
+        """
         try:
             # 验证渠道类型
             if channel.type != 'email':
@@ -280,18 +469,56 @@ class EmailNotificationService:
                 channel.config,
                 subject,
                 html_content,
-                channel.config['to_emails']
+                channel.config['to_emails'],
+                connection_key=channel.id
             )
             
             # 记录发送状态
-            self._record_notification_status(alert_record, channel, success, message)
+            if record_status:
+                self._record_notification_status(alert_record, channel, success, message)
             
             return success, message
             
         except Exception as e:
             error_msg = f"发送告警邮件失败: {str(e)}"
             logger.error(error_msg, exc_info=True)
-            self._record_notification_status(alert_record, channel, False, error_msg)
+            if record_status:
+                self._record_notification_status(alert_record, channel, False, error_msg)
+            return False, error_msg
+    
+    def send_alert_digest(self, alert_records: List[AlertRecord], channel: AlertChannel) -> Tuple[bool, str]:
+        """将多条告警合并为一封汇总邮件发送（不写入通知记录）"""
+        try:
+            if channel.type != 'email':
+                return False, f"渠道类型不匹配，期望email，实际{channel.type}"
+            
+            if not channel.is_enabled():
+                return False, "告警渠道已禁用"
+            
+            is_valid, error_msg = channel.validate_config()
+            if not is_valid:
+                return False, f"渠道配置无效: {error_msg}"
+            
+            subject = self.template_engine.get_digest_subject(alert_records)
+            html_content = self.template_engine.render_template(
+                'alert_digest',
+                subject=subject,
+                alerts=[self._prepare_alert_email_data(record) for record in alert_records],
+                has_critical=any(record.severity == 'critical' for record in alert_records),
+                sent_at=datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            )
+            
+            return self._send_email(
+                channel.config,
+                subject,
+                html_content,
+                channel.config['to_emails'],
+                connection_key=channel.id
+            )
+            
+        except Exception as e:
+            error_msg = f"发送告警汇总邮件失败: {str(e)}"
+            logger.error(error_msg, exc_info=True)
             return False, error_msg
     
     def send_test_notification(self, channel: AlertChannel) -> Tuple[bool, str]:
@@ -372,17 +599,15 @@ class EmailNotificationService:
             'sent_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
     
-    def _send_email(self, config: Dict, subject: str, html_content: str, to_emails: List[str]) -> Tuple[bool, str]:
-        """发送邮件"""
+    def _send_email(self, config: Dict, subject: str, html_content: str, to_emails: List[str],
+                    connection_key=None) -> Tuple[bool, str]:
+        """发送邮件
+        
+        Args:
+            connection_key: 连接复用键（通常为渠道ID），为空时每次新建并关闭连接
+        """
         try:
-            # 获取配置参数
-            smtp_server = config['smtp_server']
-            smtp_port = int(config['smtp_port'])
-            username = config['username']
-            password = config['password']
             from_email = config['from_email']
-            use_tls = config.get('use_tls', True)
-            use_ssl = config.get('use_ssl', False)
             
             # 创建邮件消息
             msg = MIMEMultipart('alternative')
@@ -395,16 +620,12 @@ class EmailNotificationService:
             msg.attach(html_part)
             
             # 创建SMTP连接并发送邮件
-            if use_ssl:
-                server = smtplib.SMTP_SSL(smtp_server, smtp_port)
+            if connection_key is None:
+                server = SMTPConnectionCache.open_connection(config)
+                server.send_message(msg, from_addr=from_email, to_addrs=to_emails)
+                server.quit()
             else:
-                server = smtplib.SMTP(smtp_server, smtp_port)
-                if use_tls:
-                    server.starttls()
-            
-            server.login(username, password)
-            server.send_message(msg, from_addr=from_email, to_addrs=to_emails)
-            server.quit()
+                self._send_with_cached_connection(connection_key, config, msg, from_email, to_emails)
             
             logger.info(f"邮件发送成功: {subject} -> {', '.join(to_emails)}")
             return True, "邮件发送成功"
@@ -434,6 +655,24 @@ class EmailNotificationService:
             logger.error(error_msg, exc_info=True)
             return False, error_msg
     
+    def _send_with_cached_connection(self, connection_key, config: Dict, msg: MIMEMultipart,
+                                     from_email: str, to_emails: List[str]):
+        """通过渠道缓存连接发送，连接已被服务器关闭时重连一次"""
+        with self.connection_cache.get_lock(connection_key):
+            for attempt in range(2):
+                server = self.connection_cache.acquire(connection_key, config)
+                try:
+                    server.send_message(msg, from_addr=from_email, to_addrs=to_emails)
+                    self.connection_cache.touch(connection_key)
+                    return
+                except smtplib.SMTPServerDisconnected:
+                    self.connection_cache.discard(connection_key)
+                    if attempt == 1:
+                        raise
+                except Exception:
+                    self.connection_cache.discard(connection_key)
+                    raise
+    
     def _record_notification_status(self, alert_record: AlertRecord, channel: AlertChannel, 
                                   success: bool, message: str):
         """记录通知发送状态"""
@@ -14,6 +14,8 @@ from decimal import Decimal
 from app.extensions import db
 from app.models.host import SSHHost, HostInfo, HostMetrics
 from app.services.ssh_service import ssh_service, SSHConnectionError
+from app.services.host_metrics_snapshot_service import host_metrics_snapshot_service
+from app.services.host_metrics_rollup_service import host_metrics_rollup_service
 from app.core.config_manager import config_manager
 
 logger = logging.getLogger(__name__)
@@ -225,19 +227,207 @@ class PerformanceMetricsCollector:
         return None
 
 
+
+class BatchedMetricsCollector:
+    """批量性能指标收集器
+
+    通过单个 SSH 通道执行一个复合探测脚本，一次性读取 /proc/stat、/proc/meminfo、
+    /proc/loadavg、/proc/net/dev 以及根分区的 statvfs 信息，再在本地解析分段输出，
+    避免逐项采集时每台主机 5~7 次的 exec_command 开销。
+    """
+    
+    FRAME_PREFIX = '==MTPROBE:'
+    FRAME_SUFFIX = '=='
+    
+    # CPU 使用率需要两次 /proc/stat 采样求差值，采样间隔（秒）
+    CPU_SAMPLE_INTERVAL = 0.5
+    
+    PROBE_SCRIPT = (
+        "LC_ALL=C; export LC_ALL; "
+        "echo '==MTPROBE:stat1=='; grep '^cpu ' /proc/stat; "
+        "sleep {interval}; "
+        "echo '==MTPROBE:stat2=='; grep '^cpu ' /proc/stat; "
+        "echo '==MTPROBE:meminfo=='; cat /proc/meminfo; "
+        "echo '==MTPROBE:loadavg=='; cat /proc/loadavg; "
+        "echo '==MTPROBE:netdev=='; cat /proc/net/dev; "
+        "echo '==MTPROBE:statvfs=='; stat -f -c '%S %b %f %a' / 2>/dev/null; "
+        "echo '==MTPROBE:end=='"
+    )
+    
+    def build_probe_script(self) -> str:
+        """生成复合探测脚本"""
+        return self.PROBE_SCRIPT.format(interval=self.CPU_SAMPLE_INTERVAL)
+    
+    def collect(self, ssh_connection, timeout: int = 30) -> Dict[str, Any]:
+        """执行复合探测脚本并解析全部指标"""
+        stdout, stderr, exit_code = ssh_connection.execute_command(
+            self.build_probe_script(), timeout=timeout
+        )
+        if exit_code != 0 and not stdout:
+            raise HostInfoCollectionError(f"执行批量采集脚本失败: {stderr.strip()}")
+        
+        return self.parse_output(stdout)
+    
+    def split_frames(self, output: str) -> Dict[str, List[str]]:
+        """按分隔标记拆分脚本输出"""
+        frames: Dict[str, List[str]] = {}
+        current = None
+        for line in output.splitlines():
+            stripped = line.strip()
+            if stripped.startswith(self.FRAME_PREFIX) and stripped.endswith(self.FRAME_SUFFIX):
+                current = stripped[len(self.FRAME_PREFIX):-len(self.FRAME_SUFFIX)]
+                frames[current] = []
+            elif current is not None and stripped:
+                frames[current].append(stripped)
+        return frames
+    
+    def parse_output(self, output: str) -> Dict[str, Any]:
+        """解析分段输出为指标字典"""
+        frames = self.split_frames(output)
+        network_in, network_out = self._parse_netdev(frames.get('netdev', []))
+        
+        return {
+            'cpu_usage': self._parse_cpu(frames.get('stat1', []), frames.get('stat2', [])),
+            'memory_usage': self._parse_meminfo(frames.get('meminfo', [])),
+            'disk_usage': self._parse_statvfs(frames.get('statvfs', [])),
+            'network_in': network_in,
+            'network_out': network_out,
+            'load_average': self._parse_loadavg(frames.get('loadavg', []))
+        }
+    
+    @staticmethod
+    def _read_cpu_times(lines: List[str]) -> Optional[Tuple[int, int]]:
+        """解析 /proc/stat 的 cpu 行，返回 (空闲时间, 总时间)"""
+        for line in lines:
+            parts = line.split()
+            if parts and parts[0] == 'cpu':
+                try:
+                    values = [int(v) for v in parts[1:]]
+                except ValueError:
+                    return None
+                if len(values) < 4:
+                    return None
+                # idle + iowait
+                idle = values[3] + (values[4] if len(values) > 4 else 0)
+                # guest/guest_nice 已计入 user/nice，不重复统计
+                total = sum(values[:8])
+                return idle, total
+        return None
+    
+    def _parse_cpu(self, first: List[str], second: List[str]) -> Optional[Decimal]:
+        """根据两次采样计算 CPU 使用率"""
+        start = self._read_cpu_times(first)
+        end = self._read_cpu_times(second)
+        if not start:
+            return None
+        
+        if end and end[1] > start[1]:
+            idle_delta = end[0] - start[0]
+            total_delta = end[1] - start[1]
+        else:
+            # 采样间隔内计数未变化时退化为开机以来的平均值
+            idle_delta, total_delta = start
+        
+        if total_delta <= 0:
+            return None
+        usage = (1 - idle_delta / total_delta) * 100
+        return Decimal(str(round(max(0.0, min(usage, 100.0)), 2)))
+    
+    @staticmethod
+    def _parse_meminfo(lines: List[str]) -> Optional[Decimal]:
+        """解析 /proc/meminfo 计算内存使用率"""
+        values = {}
+        for line in lines:
+            match = re.match(r'^(\w+):\s+(\d+)', line)
+            if match:
+                values[match.group(1)] = int(match.group(2))
+        
+        total = values.get('MemTotal')
+        if not total:
+            return None
+        
+        available = values.get('MemAvailable')
+        if available is None:
+            # 旧内核没有 MemAvailable，按 free 的口径估算
+            available = (values.get('MemFree', 0) + values.get('Buffers', 0)
+                         + values.get('Cached', 0))
+        
+        usage = (total - available) / total * 100
+        return Decimal(str(round(usage, 2)))
+    
+    @staticmethod
+    def _parse_statvfs(lines: List[str]) -> Optional[Decimal]:
+        """解析根分区 statvfs（块大小 总块数 空闲块 可用块）计算磁盘使用率"""
+        if not lines:
+            return None
+        parts = lines[0].split()
+        if len(parts) < 4:
+            return None
+        try:
+            _, blocks, bfree, bavail = (int(v) for v in parts[:4])
+        except ValueError:
+            return None
+        
+        used = blocks - bfree
+        # 与 df 口径一致：已用 / (已用 + 普通用户可用)
+        denominator = used + bavail
+        if denominator <= 0:
+            return None
+        usage = used / denominator * 100
+        return Decimal(str(round(usage, 2)))
+    
+    @staticmethod
+    def _parse_netdev(lines: List[str]) -> Tuple[Optional[int], Optional[int]]:
+        """解析 /proc/net/dev 汇总所有接口的收发字节数"""
+        rx_total = tx_total = 0
+        found = False
+        for line in lines:
+            if ':' not in line:
+                continue
+            _, data = line.split(':', 1)
+            fields = data.split()
+            if len(fields) < 9:
+                continue
+            try:
+                rx_total += int(fields[0])
+                tx_total += int(fields[8])
+                found = True
+            except ValueError:
+                continue
+        
+        if not found:
+            return None, None
+        return rx_total, tx_total
+    
+    @staticmethod
+    def _parse_loadavg(lines: List[str]) -> Optional[Decimal]:
+        """解析 /proc/loadavg 取 1 分钟负载"""
+        if not lines:
+            return None
+        parts = lines[0].split()
+        try:
+            return Decimal(parts[0])
+        except (IndexError, ArithmeticError):
+            return None
+
 class HostInfoService:
     """主机信息服务"""
     
     def __init__(self):
         self.system_collector = SystemInfoCollector()
         self.metrics_collector = PerformanceMetricsCollector()
+        self.batched_collector = BatchedMetricsCollector()
         self._collection_threads = {}
         self._stop_collection = {}
+        self._collection_latencies: Dict[int, float] = {}
         
         # 从配置获取采集间隔
         app_config = config_manager.get_app_config()
-        self.collection_interval = app_config.get('host_monitoring', {}).get('collection_interval', 60)
-        self.max_metrics_history = app_config.get('host_monitoring', {}).get('max_metrics_history', 1000)
+        monitoring_config = app_config.get('host_monitoring', {})
+        self.collection_interval = monitoring_config.get('collection_interval', 60)
+        # 采集模式: batched（单通道复合脚本）或 legacy（逐项命令）
+        self.collector_mode = monitoring_config.get('collector_mode', 'batched')
+        self.collection_timeout = monitoring_config.get('collection_timeout', 30)
     
     def collect_host_system_info(self, host: SSHHost) -> Dict[str, Any]:
         """收集主机系统信息"""
@@ -291,11 +481,17 @@ class HostInfoService:
             ) as connection:
                 
                 # 收集各项性能指标
-                cpu_usage = self.metrics_collector.collect_cpu_usage(connection)
-                memory_usage = self.metrics_collector.collect_memory_usage(connection)
-                disk_usage = self.metrics_collector.collect_disk_usage(connection)
-                network_in, network_out = self.metrics_collector.collect_network_traffic(connection)
-                load_average = self.metrics_collector.collect_load_average(connection)
+                started = time.monotonic()
+                collected = self._collect_raw_metrics(connection)
+                latency_ms = round((time.monotonic() - started) * 1000, 2)
+                self._collection_latencies[host.id] = latency_ms
+                
+                cpu_usage = collected.get('cpu_usage')
+                memory_usage = collected.get('memory_usage')
+                disk_usage = collected.get('disk_usage')
+                network_in = collected.get('network_in')
+                network_out = collected.get('network_out')
+                load_average = collected.get('load_average')
                 
                 # 创建性能指标记录
                 metrics = HostMetrics(
@@ -311,11 +507,12 @@ class HostInfoService:
                 
                 db.session.add(metrics)
                 
-                # 清理旧的性能指标记录（保留最近的记录）
-                self._cleanup_old_metrics(host.id)
-                
+                # 过期记录由定时任务按保留期统一清理，不在写入路径上执行
                 db.session.commit()
                 
+                # 更新租户最新指标快照
+                host_metrics_snapshot_service.set_host_metrics(host.tenant_id, host.id, metrics.to_dict())
+                
                 metrics_data = {
                     'cpu_usage': float(cpu_usage) if cpu_usage else None,
                     'memory_usage': float(memory_usage) if memory_usage else None,
@@ -323,36 +520,36 @@ class HostInfoService:
                     'network_in': network_in,
                     'network_out': network_out,
                     'load_average': float(load_average) if load_average else None,
-                    'collected_at': metrics.collected_at.isoformat()
+                    'collected_at': metrics.collected_at.isoformat(),
+                    'collector_mode': self.collector_mode,
+                    'collection_latency_ms': latency_ms
                 }
                 
-                logger.info(f"成功收集主机性能指标: {host.name}")
+                logger.info(f"成功收集主机性能指标: {host.name}, 模式: {self.collector_mode}, 耗时: {latency_ms}ms")
                 return metrics_data
                 
         except Exception as e:
             logger.error(f"收集主机性能指标失败 {host.name}: {str(e)}")
             raise HostInfoCollectionError(f"收集主机性能指标失败: {str(e)}")
     
-    def _cleanup_old_metrics(self, host_id: int):
-        """清理旧的性能指标记录"""
-        try:
-            # 获取该主机的指标记录数量
-            metrics_count = HostMetrics.query.filter_by(host_id=host_id).count()
-            
-            if metrics_count > self.max_metrics_history:
-                # 删除最旧的记录
-                old_metrics = HostMetrics.query.filter_by(host_id=host_id)\
-                    .order_by(HostMetrics.collected_at.asc())\
-                    .limit(metrics_count - self.max_metrics_history)\
-                    .all()
-                
-                for metric in old_metrics:
-                    db.session.delete(metric)
-                    
-                logger.info(f"清理主机 {host_id} 的 {len(old_metrics)} 条旧性能指标记录")
-                
-        except Exception as e:
-            logger.warning(f"清理旧性能指标记录失败: {str(e)}")
+    def _collect_raw_metrics(self, connection) -> Dict[str, Any]:
+        """按配置的采集模式收集原始性能指标"""
+        if self.collector_mode == 'batched':
+            try:
+                return self.batched_collector.collect(connection, timeout=self.collection_timeout)
+            except Exception as e:
+                # 目标主机不支持复合脚本时退回逐项采集
+                logger.warning(f"批量采集失败，回退到逐项采集: {str(e)}")
+        
+        network_in, network_out = self.metrics_collector.collect_network_traffic(connection)
+        return {
+            'cpu_usage': self.metrics_collector.collect_cpu_usage(connection),
+            'memory_usage': self.metrics_collector.collect_memory_usage(connection),
+            'disk_usage': self.metrics_collector.collect_disk_usage(connection),
+            'network_in': network_in,
+            'network_out': network_out,
+            'load_average': self.metrics_collector.collect_load_average(connection)
+        }
     
     def start_periodic_collection(self, host: SSHHost):
         """启动定时性能数据采集"""
@@ -420,41 +617,104 @@ class HostInfoService:
         
         logger.info(f"主机 {host.name} 的定时采集线程已停止")
     
-    def get_host_metrics_history(self, host_id: int, hours: int = 24) -> List[Dict[str, Any]]:
-        """获取主机性能指标历史"""
+    def get_host_metrics_history(self, host_id: int, hours: int = 24,
+                                 resolution: Optional[int] = None) -> List[Dict[str, Any]]:
+        """获取主机性能指标历史
+
+        按时间范围自动选择原始数据或 1分钟/5分钟/1小时 汇总数据，resolution 可显式指定（秒，0 为原始数据）
+        """
+        return self.get_host_metrics_series(host_id, hours, resolution)['points']
+    
+    def get_host_metrics_series(self, host_id: int, hours: int = 24,
+                                resolution: Optional[int] = None) -> Dict[str, Any]:
+        """获取主机性能指标时间序列（包含所选分辨率）"""
         try:
             start_time = datetime.utcnow() - timedelta(hours=hours)
-            
-            metrics = HostMetrics.query.filter(
-                HostMetrics.host_id == host_id,
-                HostMetrics.collected_at >= start_time
-            ).order_by(HostMetrics.collected_at.desc()).all()
-            
-            return [metric.to_dict() for metric in metrics]
+            return host_metrics_rollup_service.get_metrics_series(host_id, start_time, resolution=resolution)
             
         except Exception as e:
             logger.error(f"获取主机性能指标历史失败: {str(e)}")
             raise HostInfoCollectionError(f"获取主机性能指标历史失败: {str(e)}")
     
-    def get_host_latest_metrics(self, host_id: int) -> Optional[Dict[str, Any]]:
-        """获取主机最新性能指标"""
+    def get_host_latest_metrics(self, host_id: int, tenant_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """获取主机最新性能指标
+
+        提供 tenant_id 时优先读取 Redis 快照，未命中再查询数据库并回填快照
+        """
         try:
+            if tenant_id is not None:
+                cached = host_metrics_snapshot_service.get_host_metrics(tenant_id, host_id)
+                if cached:
+                    return cached
+            
             latest_metric = HostMetrics.query.filter_by(host_id=host_id)\
                 .order_by(HostMetrics.collected_at.desc()).first()
             
-            return latest_metric.to_dict() if latest_metric else None
+            if not latest_metric:
+                return None
+            
+            metrics = latest_metric.to_dict()
+            if tenant_id is not None:
+                host_metrics_snapshot_service.set_host_metrics(tenant_id, host_id, metrics)
+            return metrics
             
         except Exception as e:
             logger.error(f"获取主机最新性能指标失败: {str(e)}")
             raise HostInfoCollectionError(f"获取主机最新性能指标失败: {str(e)}")
     
+    def get_tenant_latest_metrics(self, tenant_id: int) -> Dict[int, Dict[str, Any]]:
+        """获取租户下所有主机的最新性能指标（主机ID -> 指标）
+
+        优先通过一次 HGETALL 读取 Redis 快照；快照不存在时用一次分组查询从数据库重建
+        """
+        snapshot = host_metrics_snapshot_service.get_tenant_snapshot(tenant_id)
+        if snapshot is not None:
+            return snapshot
+        
+        try:
+            latest_subquery = db.session.query(
+                HostMetrics.host_id,
+                db.func.max(HostMetrics.collected_at).label('max_collected_at')
+            ).join(
+                SSHHost, SSHHost.id == HostMetrics.host_id
+            ).filter(
+                SSHHost.tenant_id == tenant_id
+            ).group_by(HostMetrics.host_id).subquery()
+            
+            latest_metrics = HostMetrics.query.join(
+                latest_subquery,
+                db.and_(
+                    HostMetrics.host_id == latest_subquery.c.host_id,
+                    HostMetrics.collected_at == latest_subquery.c.max_collected_at
+                )
+            ).all()
+            
+            snapshot = {metric.host_id: metric.to_dict() for metric in latest_metrics}
+            host_metrics_snapshot_service.set_tenant_snapshot(tenant_id, snapshot)
+            return snapshot
+            
+        except Exception as e:
+            logger.error(f"获取租户最新性能指标失败: {str(e)}")
+            raise HostInfoCollectionError(f"获取租户最新性能指标失败: {str(e)}")
+    
+    def get_collection_latencies(self) -> Dict[int, float]:
+        """获取各主机最近一次采集耗时（毫秒）"""
+        return dict(self._collection_latencies)
+    
     def get_collection_status(self) -> Dict[str, Any]:
         """获取采集状态"""
+        latencies = list(self._collection_latencies.values())
         return {
             'active_collections': len(self._collection_threads),
             'collection_interval': self.collection_interval,
-            'max_metrics_history': self.max_metrics_history,
-            'collecting_hosts': list(self._collection_threads.keys())
+            'raw_retention_hours': host_metrics_rollup_service.raw_retention.total_seconds() / 3600,
+            'collector_mode': self.collector_mode,
+            'collecting_hosts': list(self._collection_threads.keys()),
+            'collection_latency': {
+                'hosts': len(latencies),
+                'avg_ms': round(sum(latencies) / len(latencies), 2) if latencies else None,
+                'max_ms': max(latencies) if latencies else None
+            }
         }
     
     def stop_all_collections(self):
@@ -0,0 +1,366 @@
+"""
+主机性能指标降采样服务
+将原始 host_metrics 汇总为 1 分钟 / 5 分钟 / 1 小时粒度的 min/max/avg/last，
+按查询时间范围自动选择分辨率，并负责原始数据与汇总数据的保留期清理
+"""
+import logging
+from datetime import datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, List, Optional, Any, Tuple
+
+from app.extensions import db
+from app.models.host import HostMetrics, HostMetricsRollup
+from app.core.config_manager import config_manager
+
+logger = logging.getLogger(__name__)
+
+
+class HostMetricsRollupError(Exception):
+    """主机指标降采样异常"""
+    pass
+
+
+# 汇总粒度（秒） -> 来源粒度（0 表示原始数据）
+ROLLUP_SOURCES = {
+    60: 0,
+    300: 60,
+    3600: 300,
+}
+
+RESOLUTION_NAMES = {
+    0: 'raw',
+    60: '1m',
+    300: '5m',
+    3600: '1h',
+}
+
+# 原始指标字段 -> 汇总字段前缀
+METRIC_FIELDS = {
+    'cpu': 'cpu_usage',
+    'memory': 'memory_usage',
+    'disk': 'disk_usage',
+    'load': 'load_average',
+}
+
+TWO_PLACES = Decimal('0.01')
+
+
+class HostMetricsRollupService:
+    """主机性能指标降采样服务"""
+
+    def __init__(self):
+        app_config = config_manager.get_app_config()
+        monitoring_config = app_config.get('host_monitoring', {})
+        rollup_config = monitoring_config.get('rollup', {})
+
+        self.collection_interval = monitoring_config.get('collection_interval', 60)
+        # 单条曲线的目标最大点数，用于选择分辨率
+        self.max_points = rollup_config.get('max_points', 500)
+        # 每次汇总回溯的桶数量，允许迟到数据和漏跑的周期被重新汇总
+        self.lookback_buckets = rollup_config.get('lookback_buckets', 3)
+        # 保留期
+        self.raw_retention = timedelta(hours=rollup_config.get('raw_retention_hours', 48))
+        self.rollup_retention = {
+            60: timedelta(days=rollup_config.get('retention_1m_days', 7)),
+            300: timedelta(days=rollup_config.get('retention_5m_days', 30)),
+            3600: timedelta(days=rollup_config.get('retention_1h_days', 365)),
+        }
+        self.delete_batch_size = rollup_config.get('delete_batch_size', 5000)
+
+    @staticmethod
+    def _floor_time(value: datetime, resolution: int) -> datetime:
+        """将时间向下取整到桶边界"""
+        epoch = int(value.timestamp()) if value.tzinfo else int((value - datetime(1970, 1, 1)).total_seconds())
+        return datetime(1970, 1, 1) + timedelta(seconds=epoch - epoch % resolution)
+
+    @staticmethod
+    def _quantize(value: Optional[float]) -> Optional[Decimal]:
+        """保留两位小数"""
+        if value is None:
+            return None
+        return Decimal(str(value)).quantize(TWO_PLACES, rounding=ROUND_HALF_UP)
+
+    # ==================== 汇总 ====================
+
+    def rollup(self, resolution: int, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """汇总最近已结束的若干个时间桶
+
+        每次重算 [当前桶 - lookback_buckets 个桶, 当前桶) 范围内的数据，先删除再写入，
+        保证重复执行幂等，并能补上迟到的样本
+        """
+        if resolution not in ROLLUP_SOURCES:
+            raise HostMetricsRollupError(f"不支持的汇总粒度: {resolution}")
+
+        now = now or datetime.utcnow()
+        window_end = self._floor_time(now, resolution)
+        window_start = window_end - timedelta(seconds=resolution * self.lookback_buckets)
+
+        try:
+            source = ROLLUP_SOURCES[resolution]
+            if source == 0:
+                buckets = self._aggregate_raw(resolution, window_start, window_end)
+            else:
+                buckets = self._aggregate_rollups(source, resolution, window_start, window_end)
+
+            HostMetricsRollup.query.filter(
+                HostMetricsRollup.resolution == resolution,
+                HostMetricsRollup.bucket_start >= window_start,
+                HostMetricsRollup.bucket_start < window_end
+            ).delete(synchronize_session=False)
+
+            if buckets:
+                db.session.bulk_insert_mappings(HostMetricsRollup, buckets)
+
+            db.session.commit()
+
+            logger.debug(
+                f"汇总主机指标完成: 粒度={RESOLUTION_NAMES[resolution]}, "
+                f"窗口={window_start.isoformat()}~{window_end.isoformat()}, 桶数={len(buckets)}"
+            )
+            return {
+                'resolution': RESOLUTION_NAMES[resolution],
+                'window_start': window_start.isoformat(),
+                'window_end': window_end.isoformat(),
+                'buckets': len(buckets)
+            }
+
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"汇总主机指标失败: 粒度={resolution}, 错误: {str(e)}")
+            raise HostMetricsRollupError(f"汇总主机指标失败: {str(e)}")
+
+    def _aggregate_raw(self, resolution: int, start: datetime, end: datetime) -> List[Dict[str, Any]]:
+        """从原始指标汇总"""
+        rows = db.session.query(
+            HostMetrics.host_id,
+            HostMetrics.collected_at,
+            HostMetrics.cpu_usage,
+            HostMetrics.memory_usage,
+            HostMetrics.disk_usage,
+            HostMetrics.load_average,
+            HostMetrics.network_in,
+            HostMetrics.network_out
+        ).filter(
+            HostMetrics.collected_at >= start,
+            HostMetrics.collected_at < end
+        ).order_by(HostMetrics.host_id, HostMetrics.collected_at).all()
+
+        groups: Dict[Tuple[int, datetime], Dict[str, Any]] = {}
+        for row in rows:
+            key = (row.host_id, self._floor_time(row.collected_at, resolution))
+            acc = groups.get(key)
+            if acc is None:
+                acc = groups[key] = self._new_accumulator(row.host_id, resolution, key[1])
+
+            acc['sample_count'] += 1
+            for prefix, field in METRIC_FIELDS.items():
+                value = getattr(row, field)
+                if value is not None:
+                    self._accumulate(acc, prefix, float(value), float(value), float(value), 1, float(value))
+            if row.network_in is not None:
+                acc['network_in_last'] = row.network_in
+            if row.network_out is not None:
+                acc['network_out_last'] = row.network_out
+
+        return [self._finalize(acc) for acc in groups.values()]
+
+    def _aggregate_rollups(self, source: int, resolution: int,
+                           start: datetime, end: datetime) -> List[Dict[str, Any]]:
+        """从较细粒度的汇总数据再次汇总"""
+        rows = HostMetricsRollup.query.filter(
+            HostMetricsRollup.resolution == source,
+            HostMetricsRollup.bucket_start >= start,
+            HostMetricsRollup.bucket_start < end
+        ).order_by(HostMetricsRollup.host_id, HostMetricsRollup.bucket_start).all()
+
+        groups: Dict[Tuple[int, datetime], Dict[str, Any]] = {}
+        for row in rows:
+            key = (row.host_id, self._floor_time(row.bucket_start, resolution))
+            acc = groups.get(key)
+            if acc is None:
+                acc = groups[key] = self._new_accumulator(row.host_id, resolution, key[1])
+
+            count = row.sample_count or 0
+            acc['sample_count'] += count
+            for prefix in METRIC_FIELDS:
+                avg = getattr(row, f'{prefix}_avg')
+                if avg is None:
+                    continue
+                self._accumulate(
+                    acc, prefix,
+                    float(getattr(row, f'{prefix}_min')),
+                    float(getattr(row, f'{prefix}_max')),
+                    float(avg) * count, count,
+                    float(getattr(row, f'{prefix}_last'))
+                )
+            if row.network_in_last is not None:
+                acc['network_in_last'] = row.network_in_last
+            if row.network_out_last is not None:
+                acc['network_out_last'] = row.network_out_last
+
+        return [self._finalize(acc) for acc in groups.values()]
+
+    @staticmethod
+    def _new_accumulator(host_id: int, resolution: int, bucket_start: datetime) -> Dict[str, Any]:
+        """创建单个时间桶的累加器"""
+        return {
+            'host_id': host_id,
+            'resolution': resolution,
+            'bucket_start': bucket_start,
+            'sample_count': 0,
+            'network_in_last': None,
+            'network_out_last': None,
+            'metrics': {}
+        }
+
+    @staticmethod
+    def _accumulate(acc: Dict[str, Any], prefix: str, min_value: float, max_value: float,
+                    weighted_sum: float, weight: int, last_value: float):
+        """累加单项指标（输入按时间升序）"""
+        stats = acc['metrics'].get(prefix)
+        if stats is None:
+            acc['metrics'][prefix] = {
+                'min': min_value, 'max': max_value,
+                'sum': weighted_sum, 'weight': weight, 'last': last_value
+            }
+            return
+        stats['min'] = min(stats['min'], min_value)
+        stats['max'] = max(stats['max'], max_value)
+        stats['sum'] += weighted_sum
+        stats['weight'] += weight
+        stats['last'] = last_value
+
+    def _finalize(self, acc: Dict[str, Any]) -> Dict[str, Any]:
+        """将累加器转换为待写入的汇总行"""
+        mapping = {
+            'host_id': acc['host_id'],
+            'resolution': acc['resolution'],
+            'bucket_start': acc['bucket_start'],
+            'sample_count': acc['sample_count'],
+            'network_in_last': acc['network_in_last'],
+            'network_out_last': acc['network_out_last'],
+        }
+        for prefix in METRIC_FIELDS:
+            stats = acc['metrics'].get(prefix)
+            if not stats:
+                for stat in ('min', 'max', 'avg', 'last'):
+                    mapping[f'{prefix}_{stat}'] = None
+                continue
+            avg = stats['sum'] / stats['weight'] if stats['weight'] else stats['last']
+            mapping[f'{prefix}_min'] = self._quantize(stats['min'])
+            mapping[f'{prefix}_max'] = self._quantize(stats['max'])
+            mapping[f'{prefix}_avg'] = self._quantize(avg)
+            mapping[f'{prefix}_last'] = self._quantize(stats['last'])
+        return mapping
+
+    # ==================== 查询 ====================
+
+    def select_resolution(self, start: datetime, end: datetime, now: Optional[datetime] = None) -> int:
+        """根据查询时间范围选择分辨率（秒，0 表示原始数据）
+
+        选择点数不超过 max_points 的最细粒度，同时跳过保留期已不覆盖查询起点的粒度
+        """
+        now = now or datetime.utcnow()
+        span = max((end - start).total_seconds(), 1)
+        age = now - start
+
+        candidates = [(0, self.collection_interval, self.raw_retention)]
+        candidates += [(res, res, self.rollup_retention[res]) for res in sorted(ROLLUP_SOURCES)]
+
+        for resolution, step, retention in candidates:
+            if span / step <= self.max_points and age <= retention:
+                return resolution
+        return max(ROLLUP_SOURCES)
+
+    def get_metrics_series(self, host_id: int, start: datetime, end: Optional[datetime] = None,
+                           resolution: Optional[int] = None) -> Dict[str, Any]:
+        """查询主机指标时间序列（按时间倒序）
+
+        Args:
+            host_id: 主机ID
+            start: 起始时间（UTC）
+            end: 结束时间（UTC），默认当前时间
+            resolution: 指定分辨率（秒，0 为原始数据），为空时自动选择
+        """
+        end = end or datetime.utcnow()
+        if resolution is None:
+            resolution = self.select_resolution(start, end)
+        elif resolution != 0 and resolution not in ROLLUP_SOURCES:
+            raise HostMetricsRollupError(f"不支持的查询分辨率: {resolution}")
+
+        try:
+            points = []
+            if resolution:
+                rollups = HostMetricsRollup.query.filter(
+                    HostMetricsRollup.host_id == host_id,
+                    HostMetricsRollup.resolution == resolution,
+                    HostMetricsRollup.bucket_start >= self._floor_time(start, resolution),
+                    HostMetricsRollup.bucket_start < end
+                ).order_by(HostMetricsRollup.bucket_start.desc()).all()
+                points = [rollup.to_dict() for rollup in rollups]
+
+                # 汇总尚未生成（如刚部署）时，在原始数据保留期内回退到原始数据
+                if not points and datetime.utcnow() - start <= self.raw_retention:
+                    resolution = 0
+
+            if not resolution:
+                metrics = HostMetrics.query.filter(
+                    HostMetrics.host_id == host_id,
+                    HostMetrics.collected_at >= start,
+                    HostMetrics.collected_at < end
+                ).order_by(HostMetrics.collected_at.desc()).all()
+                points = [metric.to_dict() for metric in metrics]
+
+            return {
+                'resolution': RESOLUTION_NAMES[resolution],
+                'resolution_seconds': resolution or self.collection_interval,
+                'points': points
+            }
+
+        except Exception as e:
+            logger.error(f"查询主机指标时间序列失败: {str(e)}")
+            raise HostMetricsRollupError(f"查询主机指标时间序列失败: {str(e)}")
+
+    # ==================== 保留期清理 ====================
+
+    def prune(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """按保留期分批删除过期的原始指标和汇总数据"""
+        now = now or datetime.utcnow()
+        result = {
+            'raw': self._delete_in_batches(HostMetrics, HostMetrics.collected_at < now - self.raw_retention)
+        }
+        for resolution, retention in self.rollup_retention.items():
+            result[RESOLUTION_NAMES[resolution]] = self._delete_in_batches(
+                HostMetricsRollup,
+                db.and_(
+                    HostMetricsRollup.resolution == resolution,
+                    HostMetricsRollup.bucket_start < now - retention
+                )
+            )
+
+        logger.info(f"清理过期主机指标完成: {result}")
+        return result
+
+    def _delete_in_batches(self, model, condition) -> int:
+        """分批删除，避免长事务锁表"""
+        total = 0
+        try:
+            while True:
+                ids = [row.id for row in db.session.query(model.id).filter(condition)
+                       .limit(self.delete_batch_size).all()]
+                if not ids:
+                    break
+                model.query.filter(model.id.in_(ids)).delete(synchronize_session=False)
+                db.session.commit()
+                total += len(ids)
+                if len(ids) < self.delete_batch_size:
+                    break
+            return total
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"清理过期主机指标失败: {model.__tablename__}, 错误: {str(e)}")
+            raise HostMetricsRollupError(f"清理过期主机指标失败: {str(e)}")
+
+
+# 全局主机指标降采样服务实例
+host_metrics_rollup_service = HostMetricsRollupService()
@@ -0,0 +1,156 @@
+"""
+主机最新指标快照服务
+以租户为单位在 Redis Hash 中维护每台主机的最新性能指标，
+告警评估、监控大屏和主机列表通过一次 HGETALL 读取整个租户的当前状态
+
+快照从数据库整体重建时写入主机数标记，单台主机写入/移除时同步增减；
+标记缺失（快照过期后只写入了部分主机）或主机数不一致时视为不完整，由数据库重建
+"""
+import json
+import logging
+from typing import Dict, Any, Optional
+
+from app.core.config_manager import config_manager
+
+logger = logging.getLogger(__name__)
+
+
+class HostMetricsSnapshotService:
+    """主机最新指标快照服务"""
+    
+    KEY_PREFIX = 'host:metrics:latest'
+    # 完整性标记字段：整体重建时的主机数
+    HOSTS_FIELD = '__hosts__'
+    
+    # 写入单台主机：新增主机且快照完整时主机数加一
+    SET_HOST_SCRIPT = """
+    local added = redis.call('hset', KEYS[1], ARGV[1], ARGV[2])
+    if added == 1 and redis.call('hexists', KEYS[1], ARGV[4]) == 1 then
+        redis.call('hincrby', KEYS[1], ARGV[4], 1)
+    end
+    redis.call('expire', KEYS[1], ARGV[3])
+    return added
+    """
+    
+    # 移除单台主机：快照完整时主机数减一
+    REMOVE_HOST_SCRIPT = """
+    local removed = redis.call('hdel', KEYS[1], ARGV[1])
+    if removed == 1 and redis.call('hexists', KEYS[1], ARGV[2]) == 1 then
+        redis.call('hincrby', KEYS[1], ARGV[2], -1)
+    end
+    return removed
+    """
+    
+    def __init__(self, redis_client=None):
+        self._redis = redis_client
+        app_config = config_manager.get_app_config()
+        monitoring_config = app_config.get('host_monitoring', {})
+        # 快照过期时间（秒），采集停止后快照自动失效，由数据库重建
+        self.snapshot_ttl = monitoring_config.get('snapshot_ttl', 86400)
+    
+    @property
+    def redis(self):
+        """延迟获取 Redis 客户端"""
+        if self._redis is None:
+            from app.extensions import get_redis_client
+            self._redis = get_redis_client()
+        return self._redis
+    
+    def _get_snapshot_key(self, tenant_id: int) -> str:
+        """获取租户快照缓存键"""
+        return f"{self.KEY_PREFIX}:{tenant_id}"
+    
+    @staticmethod
+    def _decode(value) -> Optional[Dict[str, Any]]:
+        """反序列化快照字段"""
+        if value is None:
+            return None
+        if isinstance(value, bytes):
+            value = value.decode('utf-8')
+        return json.loads(value)
+    
+    def set_host_metrics(self, tenant_id: int, host_id: int, metrics: Dict[str, Any]) -> bool:
+        """写入单台主机的最新指标"""
+        try:
+            self.redis.eval(
+                self.SET_HOST_SCRIPT, 1, self._get_snapshot_key(tenant_id),
+                str(host_id), json.dumps(metrics, ensure_ascii=False), self.snapshot_ttl, self.HOSTS_FIELD
+            )
+            return True
+        except Exception as e:
+            logger.warning(f"写入主机指标快照失败: tenant_id={tenant_id}, host_id={host_id}, 错误: {str(e)}")
+            return False
+    
+    def set_tenant_snapshot(self, tenant_id: int, snapshot: Dict[int, Dict[str, Any]]) -> bool:
+        """整体写入租户快照（用于从数据库重建），替换原有内容并写入完整性标记"""
+        try:
+            key = self._get_snapshot_key(tenant_id)
+            mapping = {
+                str(host_id): json.dumps(metrics, ensure_ascii=False)
+                for host_id, metrics in snapshot.items()
+            }
+            mapping[self.HOSTS_FIELD] = len(snapshot)
+            pipe = self.redis.pipeline()
+            pipe.delete(key)
+            pipe.hset(key, mapping=mapping)
+            pipe.expire(key, self.snapshot_ttl)
+            pipe.execute()
+            return True
+        except Exception as e:
+            logger.warning(f"写入租户指标快照失败: tenant_id={tenant_id}, 错误: {str(e)}")
+            return False
+    
+    def get_host_metrics(self, tenant_id: int, host_id: int) -> Optional[Dict[str, Any]]:
+        """读取单台主机的最新指标，未命中返回 None"""
+        try:
+            return self._decode(self.redis.hget(self._get_snapshot_key(tenant_id), str(host_id)))
+        except Exception as e:
+            logger.warning(f"读取主机指标快照失败: tenant_id={tenant_id}, host_id={host_id}, 错误: {str(e)}")
+            return None
+    
+    def get_tenant_snapshot(self, tenant_id: int) -> Optional[Dict[int, Dict[str, Any]]]:
+        """读取租户下所有主机的最新指标，快照不存在、不完整或 Redis 不可用时返回 None"""
+        try:
+            raw = self.redis.hgetall(self._get_snapshot_key(tenant_id))
+            if not raw:
+                return None
+            
+            snapshot = {}
+            expected_hosts = None
+            for host_id, value in raw.items():
+                if isinstance(host_id, bytes):
+                    host_id = host_id.decode('utf-8')
+                if host_id == self.HOSTS_FIELD:
+                    expected_hosts = int(value)
+                    continue
+                snapshot[int(host_id)] = self._decode(value)
+            
+            if expected_hosts is None or expected_hosts != len(snapshot):
+                logger.debug(f"租户指标快照不完整: tenant_id={tenant_id}, 标记主机数={expected_hosts}, 实际={len(snapshot)}")
+                return None
+            return snapshot
+        except Exception as e:
+            logger.warning(f"读取租户指标快照失败: tenant_id={tenant_id}, 错误: {str(e)}")
+            return None
+    
+    def remove_host(self, tenant_id: int, host_id: int) -> bool:
+        """从快照中移除主机"""
+        try:
+            self.redis.eval(self.REMOVE_HOST_SCRIPT, 1, self._get_snapshot_key(tenant_id), str(host_id), self.HOSTS_FIELD)
+            return True
+        except Exception as e:
+            logger.warning(f"移除主机指标快照失败: tenant_id={tenant_id}, host_id={host_id}, 错误: {str(e)}")
+            return False
+    
+    def invalidate_tenant(self, tenant_id: int) -> bool:
+        """删除租户快照，下次读取时从数据库重建"""
+        try:
+            self.redis.delete(self._get_snapshot_key(tenant_id))
+            return True
+        except Exception as e:
+            logger.warning(f"删除租户指标快照失败: tenant_id={tenant_id}, 错误: {str(e)}")
+            return False
+
+
+# 全局主机指标快照服务实例
+host_metrics_snapshot_service = HostMetricsSnapshotService()
@@ -6,7 +6,6 @@ import logging
 import re
 import threading
 import queue
-import time
 from typing import List, Dict, Optional, Tuple, Callable
 from datetime import datetime
 from flask import g
@@ -16,6 +15,7 @@ from kubernetes.stream import stream
 from kubernetes.stream.ws_client import WSClient
 
 from app.models.k8s_cluster import K8sCluster
+from app.services.terminal_multiplexer import terminal_multiplexer
 from .client_service import K8sClientService
 
 logger = logging.getLogger(__name__)
@@ -673,6 +673,9 @@ class K8sPodShellBridge:
     """
     K8S Pod Shell 桥接
     负责在 K8S Pod exec 和 WebSocket 之间进行数据转发
+    
+    exec WebSocket 的底层套接字注册到终端多路复用器，可读时暂停监听，
+    在 I/O 线程池中读取一帧并转发后重新注册（读取完整帧可能阻塞，不在事件循环中执行）。
     """
     
     def __init__(
@@ -702,9 +705,8 @@ class K8sPodShellBridge:
         self.created_at = datetime.utcnow()
         self.last_activity = datetime.utcnow()
         
-        # 线程控制
-        self._stop_event = threading.Event()
-        self._read_thread: Optional[threading.Thread] = None
+        self._state_lock = threading.Lock()
+        self._socket = None
         
         # 回调函数
         self._on_data_callback: Optional[Callable[[str], None]] = None
@@ -721,16 +723,11 @@ class K8sPodShellBridge:
             return True
         
         try:
+            self._socket = self.ws_client.sock.sock
             self.is_active = True
-            self._stop_event.clear()
             
-            # 启动读取线程（K8S -> WebSocket）
-            self._read_thread = threading.Thread(
-                target=self._read_loop,
-                name=f"k8s-pod-read-{self.session_id[:8]}",
-                daemon=True
-            )
-            self._read_thread.start()
+            # K8S -> WebSocket 由事件循环在套接字可读时回调
+            terminal_multiplexer.register(self._socket, self._on_socket_readable)
             
             logger.info(f"K8S Pod Shell Bridge started: {self.session_id}")
             return True
@@ -744,24 +741,15 @@ class K8sPodShellBridge:
     
     def stop(self, reason: str = "Bridge stopped"):
         """停止桥接"""
-        if not self.is_active:
-            return
+        with self._state_lock:
+            if not self.is_active:
+                return
+            self.is_active = False
         
         logger.info(f"Stopping K8S Pod Shell Bridge: {self.session_id}, reason: {reason}")
         
-        self.is_active = False
-        self._stop_event.set()
-        
-        # 等待线程结束
-        if self._read_thread and self._read_thread.is_alive():
-            self._read_thread.join(timeout=2)
-        
-        # 关闭 WebSocket 连接
-        try:
-            if self.ws_client:
-                self.ws_client.close()
-        except Exception as e:
-            logger.warning(f"Error closing K8S WebSocket: {e}")
+        # 在事件循环中注销后关闭 WebSocket 连接
+        terminal_multiplexer.call_soon(self._teardown)
         
         # 触发关闭回调
         if self._on_close_callback:
@@ -825,42 +813,72 @@ class K8sPodShellBridge:
         """设置关闭回调"""
         self._on_close_callback = callback
     
-    def _read_loop(self):
-        """读取循环：从 K8S Pod 读取数据并发送到 WebSocket"""
-        logger.info(f"Read loop started for K8S Pod Shell session: {self.session_id}")
+    def _on_socket_readable(self, sock):
+        """套接字可读回调（事件循环线程）：暂停监听并在线程池中读取"""
+        terminal_multiplexer.unregister(sock)
+        if not self.is_active:
+            return
+        terminal_multiplexer.submit(self._pump)
+    
+    def _pump(self):
+        """读取一帧数据并发送到 WebSocket（I/O 线程池）"""
+        if not self.is_active:
+            return
         
-        while not self._stop_event.is_set() and self.is_active:
-            try:
-                if not self.ws_client or not self.ws_client.is_open():
-                    logger.info(f"K8S WebSocket closed: {self.session_id}")
-                    self.stop("K8S WebSocket connection closed")
-                    break
-                
-                # 读取数据（带超时）
-                self.ws_client.update(timeout=0.1)
-                
-                # 读取 stdout
-                if self.ws_client.peek_stdout():
-                    data = self.ws_client.read_stdout()
-                    if data:
-                        self._send_output(data)
-                
-                # 读取 stderr
-                if self.ws_client.peek_stderr():
-                    data = self.ws_client.read_stderr()
-                    if data:
-                        self._send_output(data)
-                
-            except Exception as e:
-                if self.is_active:
-                    error_str = str(e)
-                    # 忽略超时错误
-                    if 'timed out' not in error_str.lower():
-                        logger.error(f"Error in K8S Pod Shell read loop: {e}")
-                        self.stop(f"Read error: {e}")
-                break
-        
-        logger.info(f"Read loop ended for K8S Pod Shell session: {self.session_id}")
+        try:
+            if not self.ws_client or not self.ws_client.is_open():
+                logger.info(f"K8S WebSocket closed: {self.session_id}")
+                self.stop("K8S WebSocket connection closed")
+                return
+            
+            self.ws_client.update(timeout=0)
+            
+            # 读取 stdout
+            if self.ws_client.peek_stdout():
+                data = self.ws_client.read_stdout()
+                if data:
+                    self._send_output(data)
+            
+            # 读取 stderr
+            if self.ws_client.peek_stderr():
+                data = self.ws_client.read_stderr()
+                if data:
+                    self._send_output(data)
+            
+            if not self.ws_client.is_open():
+                logger.info(f"K8S WebSocket closed: {self.session_id}")
+                self.stop("K8S WebSocket connection closed")
+                return
+            
+        except Exception as e:
+            if self.is_active:
+                error_str = str(e)
+                # 忽略超时错误
+                if 'timed out' not in error_str.lower():
+                    logger.error(f"Error in K8S Pod Shell read loop: {e}")
+                    self.stop(f"Read error: {e}")
+                    return
+        
+        # 恢复监听：状态检查和注册都在事件循环线程中执行，与 _teardown 的注销保持先后顺序
+        terminal_multiplexer.call_soon(self._resume_reading)
+    
+    def _resume_reading(self):
+        """会话仍活跃时重新监听套接字（事件循环线程）"""
+        if self.is_active:
+            terminal_multiplexer.register(self._socket, self._on_socket_readable)
+    
+    def _teardown(self):
+        """注销套接字并在线程池中关闭 WebSocket 连接（事件循环线程）"""
+        if self._socket is not None:
+            terminal_multiplexer.unregister(self._socket)
+        terminal_multiplexer.submit(self._close_ws_client)
+    
+    def _close_ws_client(self):
+        try:
+            if self.ws_client:
+                self.ws_client.close()
+        except Exception as e:
+            logger.warning(f"Error closing K8S WebSocket: {e}")
     
     def _send_output(self, data: str):
         """发送输出到 WebSocket"""
@@ -888,52 +906,53 @@ class K8sPodShellBridge:
 class K8sPodShellManager:
     """K8S Pod Shell 管理器"""
     
+    CLEANUP_INTERVAL = 60  # 空闲检查间隔（秒）
+    
     def __init__(self):
         self.bridges: Dict[str, K8sPodShellBridge] = {}
         self._lock = threading.Lock()
-        self._cleanup_thread: Optional[threading.Thread] = None
-        self._start_cleanup_thread()
+        self._cleanup_scheduled = False
         
         logger.info("K8S Pod Shell Manager initialized")
     
-    def _start_cleanup_thread(self):
-        """启动清理线程"""
-        if self._cleanup_thread is None or not self._cleanup_thread.is_alive():
-            self._cleanup_thread = threading.Thread(
-                target=self._cleanup_loop,
-                name="k8s-pod-shell-cleanup",
-                daemon=True
-            )
-            self._cleanup_thread.start()
+    def _ensure_cleanup_scheduled(self):
+        """首次创建桥接时在终端多路复用器上调度定期清理"""
+        with self._lock:
+            if self._cleanup_scheduled:
+                return
+            self._cleanup_scheduled = True
+        terminal_multiplexer.call_later(self.CLEANUP_INTERVAL, self._schedule_cleanup)
     
-    def _cleanup_loop(self):
-        """清理循环"""
-        while True:
-            try:
-                time.sleep(60)  # 每分钟检查一次
+    def _schedule_cleanup(self):
+        """事件循环定时器：在线程池中执行清理并调度下一次"""
+        terminal_multiplexer.submit(self._cleanup_bridges)
+        terminal_multiplexer.call_later(self.CLEANUP_INTERVAL, self._schedule_cleanup)
+    
+    def _cleanup_bridges(self):
+        """清理空闲超时和已停止的桥接"""
+        try:
+            with self._lock:
+                bridges_to_remove = []
                 
-                with self._lock:
-                    bridges_to_remove = []
-                    
-                    for session_id, bridge in self.bridges.items():
-                        # 检查空闲超时
-                        if bridge.is_idle_timeout():
-                            bridges_to_remove.append(session_id)
-                            logger.info(f"K8S Pod Shell bridge idle timeout: {session_id}")
-                        # 检查是否已停止
-                        elif not bridge.is_active:
-                            bridges_to_remove.append(session_id)
-                    
-                    for session_id in bridges_to_remove:
-                        bridge = self.bridges.pop(session_id, None)
-                        if bridge and bridge.is_active:
-                            bridge.stop("Idle timeout")
+                for session_id, bridge in self.bridges.items():
+                    # 检查空闲超时
+                    if bridge.is_idle_timeout():
+                        bridges_to_remove.append(session_id)
+                        logger.info(f"K8S Pod Shell bridge idle timeout: {session_id}")
+                    # 检查是否已停止
+                    elif not bridge.is_active:
+                        bridges_to_remove.append(session_id)
+                
+                for session_id in bridges_to_remove:
+                    bridge = self.bridges.pop(session_id, None)
+                    if bridge and bridge.is_active:
+                        bridge.stop("Idle timeout")
+                
+                if bridges_to_remove:
+                    logger.info(f"Cleaned up {len(bridges_to_remove)} K8S Pod Shell bridges")
                     
-                    if bridges_to_remove:
-                        logger.info(f"Cleaned up {len(bridges_to_remove)} K8S Pod Shell bridges")
-                        
-            except Exception as e:
-                logger.error(f"Error in K8S Pod Shell cleanup loop: {e}")
+        except Exception as e:
+            logger.error(f"Error in K8S Pod Shell cleanup loop: {e}")
     
     def create_bridge(
         self,
@@ -1034,6 +1053,7 @@ class K8sPodShellManager:
             # 添加到管理器
             with self._lock:
                 self.bridges[session_id] = bridge
+            self._ensure_cleanup_scheduled()
             
             logger.info(f"K8S Pod Shell bridge created: {session_id}, pod: {pod_name}, container: {container}")
             return True, "连接成功", bridge
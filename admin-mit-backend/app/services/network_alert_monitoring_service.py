@@ -8,7 +8,8 @@ import time
 from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Optional, Tuple, Any
 from decimal import Decimal
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, or_, select, true
+from sqlalchemy.orm import aliased
 
 from app.extensions import db
 from app.models.network import NetworkProbe, NetworkProbeResult, NetworkAlertRule, NetworkAlertRecord
@@ -57,21 +58,52 @@ class NetworkProbeResultCollector:
             logger.error(f"获取探测任务 {probe_id} 最近结果失败: {str(e)}")
             return []
     
-    def collect_all_probes_results(self, tenant_id: int) -> Dict[int, NetworkProbeResult]:
-        """收集租户下所有探测任务的最新结果"""
+    def collect_recent_results(self, tenant_id: int, count: int = 1) -> Dict[int, List[NetworkProbeResult]]:
+        """
+        一次查询收集租户下所有启用探测任务的最近N次结果（按探测时间倒序）
+        
+        通过 LATERAL 子查询对每个探测任务走 (probe_id, probed_at DESC) 索引取前N条，
+        探测任务与结果一同加载，评估时访问 result.probe 不会再触发查询。
+        """
+        try:
+            recent = select(NetworkProbeResult).where(
+                NetworkProbeResult.probe_id == NetworkProbe.id
+            ).order_by(
+                NetworkProbeResult.probed_at.desc()
+            ).limit(max(count, 1)).correlate(NetworkProbe).lateral('recent_results')
+            recent_result = aliased(NetworkProbeResult, recent)
+            
+            rows = db.session.execute(
+                select(NetworkProbe, recent_result).join(recent_result, true()).where(
+                    NetworkProbe.tenant_id == tenant_id,
+                    NetworkProbe.enabled == True
+                ).order_by(NetworkProbe.id, recent_result.probed_at.desc())
+            ).all()
+            
+            results_data: Dict[int, List[NetworkProbeResult]] = {}
+            for probe, result in rows:
+                results_data.setdefault(probe.id, []).append(result)
+            
+            return results_data
+            
+        except Exception as e:
+            logger.warning(f"批量收集租户 {tenant_id} 探测结果失败，改为逐个查询: {str(e)}")
+            db.session.rollback()
+            return self._collect_recent_results_per_probe(tenant_id, count)
+    
+    def _collect_recent_results_per_probe(self, tenant_id: int, count: int) -> Dict[int, List[NetworkProbeResult]]:
+        """逐个探测任务查询最近N次结果（批量查询不可用时的降级路径）"""
         try:
-            # 获取租户下所有启用的探测任务
             probes = NetworkProbe.query.filter(
                 NetworkProbe.tenant_id == tenant_id,
                 NetworkProbe.enabled == True
             ).all()
             
             results_data = {}
-            
             for probe in probes:
-                latest_result = self.get_probe_latest_result(probe.id)
-                if latest_result:
-                    results_data[probe.id] = latest_result
+                recent_results = self.get_probe_recent_results(probe.id, max(count, 1))
+                if recent_results:
+                    results_data[probe.id] = recent_results
                 else:
                     logger.debug(f"探测任务 {probe.name} 没有可用的结果数据")
             
@@ -80,6 +112,13 @@ class NetworkProbeResultCollector:
         except Exception as e:
             logger.error(f"收集租户 {tenant_id} 所有探测结果失败: {str(e)}")
             return {}
+    
+    def collect_all_probes_results(self, tenant_id: int) -> Dict[int, NetworkProbeResult]:
+        """收集租户下所有探测任务的最新结果"""
+        return {
+            probe_id: results[0]
+            for probe_id, results in self.collect_recent_results(tenant_id, 1).items()
+        }
 
 
 class NetworkAlertRuleEvaluator:
@@ -90,8 +129,14 @@ class NetworkAlertRuleEvaluator:
         self.failure_count_cache = {}  # 连续失败次数缓存
         self.cache_ttl = 60  # 缓存TTL（秒）
     
-    def evaluate_rule(self, rule: NetworkAlertRule, probe_results: Dict[int, NetworkProbeResult]) -> List[Dict[str, Any]]:
-        """评估单个网络探测告警规则"""
+    def evaluate_rule(self, rule: NetworkAlertRule, probe_results: Dict[int, NetworkProbeResult],
+                      recent_results: Optional[Dict[int, List[NetworkProbeResult]]] = None) -> List[Dict[str, Any]]:
+        """
+        评估单个网络探测告警规则
+        
+        提供 recent_results（每个探测任务最近N次结果）时，连续失败次数按最近的探测结果判断，
+        不依赖进程内计数，多进程/多次评估结果一致。
+        """
         try:
             if not rule.enabled:
                 return []
@@ -112,7 +157,12 @@ class NetworkAlertRuleEvaluator:
             
             if is_triggered:
                 # 检查连续失败次数
-                if self._check_consecutive_failures(rule, probe_id, is_triggered):
+                if recent_results is not None:
+                    consecutive_met = self._check_recent_failures(rule, recent_results.get(probe_id, []))
+                else:
+                    consecutive_met = self._check_consecutive_failures(rule, probe_id, is_triggered)
+                
+                if consecutive_met:
                     alert_info = {
                         'rule': rule,
                         'probe': probe_result.probe,
@@ -224,6 +274,15 @@ class NetworkAlertRuleEvaluator:
             logger.error(f"检查连续失败次数条件失败: {str(e)}")
             return True  # 出错时默认触发
     
+    def _check_recent_failures(self, rule: NetworkAlertRule, recent_results: List[NetworkProbeResult]) -> bool:
+        """按最近N次探测结果检查连续失败次数条件（recent_results 按探测时间倒序）"""
+        required = rule.consecutive_failures or 0
+        if required <= 0:
+            return True
+        if len(recent_results) < required:
+            return False
+        return all(self._evaluate_condition(rule, result)[0] for result in recent_results[:required])
+    
     def _clear_failure_count_cache(self, rule: NetworkAlertRule, probe_id: int):
         """清理连续失败次数缓存"""
         cache_key = f"failures_{rule.id}_{probe_id}"
@@ -531,14 +590,7 @@ class NetworkAlertMonitoringEngine:
         try:
             start_time = time.time()
             
-            # 1. 收集所有探测任务的最新结果
-            probe_results = self.result_collector.collect_all_probes_results(tenant_id)
-            
-            if not probe_results:
-                logger.debug(f"租户 {tenant_id} 没有可用的探测结果数据")
-                return
-            
-            # 2. 获取所有启用的告警规则
+            # 1. 获取所有启用的告警规则
             rules = NetworkAlertRule.query.filter(
                 NetworkAlertRule.tenant_id == tenant_id,
                 NetworkAlertRule.enabled == True
@@ -548,11 +600,20 @@ class NetworkAlertMonitoringEngine:
                 logger.debug(f"租户 {tenant_id} 没有启用的网络探测告警规则")
                 return
             
+            # 2. 一次查询收集所有探测任务的最近结果（条数取规则中最大的连续失败次数）
+            recent_count = max([rule.consecutive_failures or 1 for rule in rules] + [1])
+            recent_results = self.result_collector.collect_recent_results(tenant_id, recent_count)
+            probe_results = {probe_id: results[0] for probe_id, results in recent_results.items()}
+            
+            if not probe_results:
+                logger.debug(f"租户 {tenant_id} 没有可用的探测结果数据")
+                return
+            
             # 3. 评估每个规则
             total_triggered = 0
             for rule in rules:
                 try:
-                    triggered_alerts = self.rule_evaluator.evaluate_rule(rule, probe_results)
+                    triggered_alerts = self.rule_evaluator.evaluate_rule(rule, probe_results, recent_results)
                     
                     # 4. 触发告警
                     for alert_info in triggered_alerts:
@@ -605,10 +666,13 @@ class NetworkAlertMonitoringEngine:
                 }
             
             # 收集相关探测任务的结果数据
-            probe_results = self.result_collector.collect_all_probes_results(rule.tenant_id)
+            recent_results = self.result_collector.collect_recent_results(
+                rule.tenant_id, max(rule.consecutive_failures or 1, 1)
+            )
+            probe_results = {probe_id: results[0] for probe_id, results in recent_results.items()}
             
             # 评估规则
-            triggered_alerts = self.rule_evaluator.evaluate_rule(rule, probe_results)
+            triggered_alerts = self.rule_evaluator.evaluate_rule(rule, probe_results, recent_results)
             
             # 触发告警
             alert_records = []
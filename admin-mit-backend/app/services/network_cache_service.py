@@ -5,7 +5,6 @@ import json
 import logging
 from typing import Dict, Any, Optional, List
 from datetime import datetime
-from app.extensions import redis_client
 from app.core.config_manager import config_manager
 
 logger = logging.getLogger(__name__)
@@ -16,12 +15,20 @@ class NetworkCacheService:
     
     def __init__(self):
         """初始化缓存服务"""
-        self.redis = redis_client
+        self._redis = None
         redis_config = config_manager.get_redis_config()
         self.cache_config = redis_config.get('cache', {})
         self.probe_result_ttl = self.cache_config.get('network_probe_ttl', 180)  # 默认180秒
         self.default_ttl = self.cache_config.get('default_timeout', 300)
     
+    @property
+    def redis(self):
+        """延迟获取 Redis 客户端（模块导入时全局客户端尚未初始化）"""
+        if self._redis is None:
+            from app.extensions import redis_client, get_redis_client
+            self._redis = redis_client or get_redis_client()
+        return self._redis
+    
     def _get_probe_result_key(self, probe_id: int) -> str:
         """
         获取探测结果缓存键
@@ -509,6 +516,58 @@ class NetworkCacheService:
             logger.error(f"同步探测结果到缓存失败: probe_id={probe_id}, 错误: {str(e)}")
             return False
     
+    def sync_probe_results_batch(self, results: List[Dict[str, Any]]) -> bool:
+        """
+        在一个 Redis pipeline 中同步一批探测结果（最新结果、探测状态、统计缓存 TTL）
+        
+        同一探测有多条结果时只保留最新一条。
+        
+        Args:
+            results: 探测结果数据列表，需包含 probe_id、status、probed_at
+            
+        Returns:
+            bool: 是否成功
+        """
+        if not results:
+            return True
+        
+        try:
+            latest = {}
+            for result_data in results:
+                probe_id = result_data['probe_id']
+                current = latest.get(probe_id)
+                if current is None or (result_data.get('probed_at') or '') >= (current.get('probed_at') or ''):
+                    latest[probe_id] = result_data
+            
+            now = datetime.utcnow().isoformat()
+            status_map = {'success': 'success', 'timeout': 'timeout'}
+            ttl_ms = self.probe_result_ttl * 1000
+            
+            pipe = self.redis.pipeline(transaction=False)
+            for probe_id, result_data in latest.items():
+                pipe.setex(
+                    self._get_probe_result_key(probe_id),
+                    self.probe_result_ttl,
+                    json.dumps(dict(result_data, cached_at=now), ensure_ascii=False)
+                )
+                pipe.setex(
+                    self._get_probe_status_key(probe_id),
+                    300,
+                    json.dumps({
+                        'status': status_map.get(result_data.get('status'), 'failed'),
+                        'updated_at': now
+                    }, ensure_ascii=False)
+                )
+                pipe.pexpire(self._get_probe_statistics_key(probe_id), ttl_ms)
+            pipe.execute()
+            
+            logger.debug(f"批量同步探测结果到缓存: {len(latest)} 个探测")
+            return True
+            
+        except Exception as e:
+            logger.error(f"批量同步探测结果到缓存失败: {str(e)}")
+            return False
+    
     def cache_probe_group(self, group_id: int, group_data: Dict[str, Any]) -> bool:
         """
         缓存探测分组信息
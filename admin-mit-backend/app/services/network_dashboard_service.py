@@ -0,0 +1,375 @@
+"""
+网络监控大屏数据聚合服务
+概览、状态分布、协议分布与 Top 探测任务由两条 CTE 查询计算，
+结果按租户短时缓存在 Redis，并通过分布式锁保证同一时刻只有一个请求回源数据库。
+"""
+import json
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy import text
+
+from app.extensions import db
+from app.core.config_manager import config_manager
+
+logger = logging.getLogger(__name__)
+
+
+# 探测任务侧：总数、运行数、分组数、协议分布
+PROBE_SUMMARY_SQL = text("""
+    WITH probes AS (
+        SELECT id, protocol, enabled, auto_probe_enabled
+        FROM network_probes
+        WHERE tenant_id = :tenant_id
+    ),
+    protocols AS (
+        SELECT protocol, COUNT(*) AS probe_count
+        FROM probes
+        GROUP BY protocol
+    )
+    SELECT
+        (SELECT COUNT(*) FROM probes) AS total_probes,
+        (SELECT COUNT(*) FROM probes WHERE enabled AND auto_probe_enabled) AS running_probes,
+        (SELECT COUNT(*) FROM network_probe_groups WHERE tenant_id = :tenant_id) AS total_groups,
+        (SELECT COALESCE(json_object_agg(protocol, probe_count), '{}'::json) FROM protocols) AS protocol_distribution
+""")
+
+# 探测结果侧：今日结果数、最近24小时状态计数与分位数、最慢/失败最多的探测任务
+RESULT_SUMMARY_SQL = text("""
+    WITH recent AS (
+        SELECT probe_id, status, response_time, probed_at
+        FROM network_probe_results
+        WHERE tenant_id = :tenant_id AND probed_at >= :since
+    ),
+    per_probe AS (
+        SELECT
+            probe_id,
+            AVG(response_time) FILTER (WHERE status = 'success' AND response_time IS NOT NULL) AS avg_response_time,
+            COUNT(*) FILTER (WHERE status IN ('failed', 'timeout')) AS failed_count
+        FROM recent
+        GROUP BY probe_id
+    ),
+    top_slow AS (
+        SELECT p.id, p.name, p.protocol, p.target_url, ROUND(pp.avg_response_time::numeric, 2) AS average_response_time
+        FROM per_probe pp
+        JOIN network_probes p ON p.id = pp.probe_id
+        WHERE pp.avg_response_time IS NOT NULL
+        ORDER BY pp.avg_response_time DESC
+        LIMIT :top
+    ),
+    top_failed AS (
+        SELECT p.id, p.name, p.protocol, p.target_url, pp.failed_count
+        FROM per_probe pp
+        JOIN network_probes p ON p.id = pp.probe_id
+        WHERE pp.failed_count > 0
+        ORDER BY pp.failed_count DESC
+        LIMIT :top
+    )
+    SELECT
+        COUNT(*) FILTER (WHERE probed_at >= :today_start) AS total_results_today,
+        COUNT(*) FILTER (WHERE status = 'success') AS success_count,
+        COUNT(*) FILTER (WHERE status = 'failed') AS failed_count,
+        COUNT(*) FILTER (WHERE status = 'timeout') AS timeout_count,
+        PERCENTILE_CONT(ARRAY[0.5, 0.95, 0.99]) WITHIN GROUP (ORDER BY response_time)
+            FILTER (WHERE status = 'success' AND response_time IS NOT NULL) AS response_time_percentiles,
+        (SELECT COALESCE(json_agg(t ORDER BY t.average_response_time DESC), '[]'::json)
+            FROM top_slow t) AS top_slow_probes,
+        (SELECT COALESCE(json_agg(t ORDER BY t.failed_count DESC), '[]'::json)
+            FROM top_failed t) AS top_failed_probes
+    FROM recent
+""")
+
+# 最近的告警（最近10条失败或超时的探测结果）
+RECENT_ALERTS_SQL = text("""
+    SELECT r.probe_id, p.name AS probe_name, r.status, r.error_message, r.probed_at
+    FROM network_probe_results r
+    JOIN network_probes p ON p.id = r.probe_id
+    WHERE r.tenant_id = :tenant_id AND r.status IN ('failed', 'timeout')
+    ORDER BY r.probed_at DESC
+    LIMIT 10
+""")
+
+
+class NetworkDashboardService:
+    """网络监控大屏数据聚合服务"""
+
+    CACHE_PREFIX = 'network:dashboard'
+    LOCK_PREFIX = 'network:dashboard:lock'
+
+    # 仅释放自己持有的锁
+    RELEASE_LOCK_SCRIPT = """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then
+        return redis.call('DEL', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, redis_client=None):
+        self._redis = redis_client
+        self._release_script = None
+        self._local_locks: Dict[int, threading.Lock] = {}
+        self._local_locks_guard = threading.Lock()
+
+        dashboard_config = config_manager.get_app_config().get('network_probe', {}).get('dashboard', {})
+        self.cache_ttl = dashboard_config.get('cache_ttl', 5)  # 大屏数据缓存时间（秒）
+        self.lock_ttl = dashboard_config.get('lock_ttl', 10)  # 回源锁过期时间（秒）
+        self.wait_timeout = dashboard_config.get('wait_timeout', 3)  # 等待其他请求回源的最长时间（秒）
+        self.top_count = dashboard_config.get('top_count', 5)  # Top 探测任务数量
+
+    @property
+    def redis(self):
+        """延迟获取 Redis 客户端"""
+        if self._redis is None:
+            from app.extensions import redis_client, get_redis_client
+            self._redis = redis_client or get_redis_client()
+        return self._redis
+
+    def _get_cache_key(self, tenant_id: int) -> str:
+        return f"{self.CACHE_PREFIX}:{tenant_id}"
+
+    def _get_lock_key(self, tenant_id: int) -> str:
+        return f"{self.LOCK_PREFIX}:{tenant_id}"
+
+    def _get_local_lock(self, tenant_id: int) -> threading.Lock:
+        with self._local_locks_guard:
+            lock = self._local_locks.get(tenant_id)
+            if lock is None:
+                lock = self._local_locks[tenant_id] = threading.Lock()
+            return lock
+
+    # ==================== 缓存 ====================
+
+    def _get_cached(self, tenant_id: int) -> Optional[Dict[str, Any]]:
+        try:
+            cached = self.redis.get(self._get_cache_key(tenant_id))
+            return json.loads(cached) if cached else None
+        except Exception as e:
+            logger.warning(f"读取大屏缓存失败: tenant_id={tenant_id}, 错误: {str(e)}")
+            return None
+
+    def _set_cached(self, tenant_id: int, data: Dict[str, Any]):
+        try:
+            self.redis.set(self._get_cache_key(tenant_id), json.dumps(data, ensure_ascii=False), ex=self.cache_ttl)
+        except Exception as e:
+            logger.warning(f"写入大屏缓存失败: tenant_id={tenant_id}, 错误: {str(e)}")
+
+    def _acquire_lock(self, tenant_id: int) -> Optional[str]:
+        """获取回源锁，成功返回锁令牌；Redis 不可用时视为获取成功"""
+        token = uuid.uuid4().hex
+        try:
+            if self.redis.set(self._get_lock_key(tenant_id), token, nx=True, ex=self.lock_ttl):
+                return token
+            return None
+        except Exception:
+            return token
+
+    def _release_lock(self, tenant_id: int, token: str):
+        try:
+            if self._release_script is None:
+                self._release_script = self.redis.register_script(self.RELEASE_LOCK_SCRIPT)
+            self._release_script(keys=[self._get_lock_key(tenant_id)], args=[token])
+        except Exception:
+            pass
+
+    def invalidate(self, tenant_id: int):
+        """清除租户大屏缓存"""
+        try:
+            self.redis.delete(self._get_cache_key(tenant_id))
+        except Exception:
+            pass
+
+    # ==================== 获取 ====================
+
+    def get_dashboard(self, tenant_id: int) -> Dict[str, Any]:
+        """
+        获取网络监控大屏数据
+
+        缓存未命中时：同进程内的并发请求由本地锁合并，跨进程由 Redis 锁合并，
+        未拿到锁的请求等待持锁者写入缓存后直接读取。
+        """
+        cached = self._get_cached(tenant_id)
+        if cached is not None:
+            return cached
+
+        with self._get_local_lock(tenant_id):
+            cached = self._get_cached(tenant_id)
+            if cached is not None:
+                return cached
+
+            token = self._acquire_lock(tenant_id)
+            if token is None:
+                deadline = time.monotonic() + self.wait_timeout
+                while time.monotonic() < deadline:
+                    time.sleep(0.05)
+                    cached = self._get_cached(tenant_id)
+                    if cached is not None:
+                        return cached
+                logger.warning(f"等待大屏数据回源超时，直接查询: tenant_id={tenant_id}")
+
+            try:
+                data = self._compute(tenant_id)
+                self._set_cached(tenant_id, data)
+                return data
+            finally:
+                if token is not None:
+                    self._release_lock(tenant_id, token)
+
+    def _compute(self, tenant_id: int) -> Dict[str, Any]:
+        """查询数据库计算大屏数据"""
+        from app.services.network_probe_stats_service import network_probe_stats_service
+
+        now = datetime.utcnow()
+        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        last_24h_start = now - timedelta(hours=24)
+
+        # 1. 探测任务侧汇总
+        probe_row = db.session.execute(PROBE_SUMMARY_SQL, {'tenant_id': tenant_id}).mappings().one()
+        total_probes = probe_row['total_probes']
+        running_probes = probe_row['running_probes']
+        protocol_distribution = probe_row['protocol_distribution'] or {}
+
+        # 2. 探测结果侧汇总：统计聚合覆盖最近24小时时读取聚合桶，否则一次 CTE 查询
+        if network_probe_stats_service.is_covered(last_24h_start):
+            result_summary = self._summarize_from_aggregates(tenant_id, today_start, last_24h_start, now)
+        else:
+            result_summary = self._summarize_from_results(tenant_id, today_start, last_24h_start)
+
+        # 3. 最近告警
+        recent_alerts = [
+            {
+                'probe_id': row['probe_id'],
+                'probe_name': row['probe_name'],
+                'status': row['status'],
+                'error_message': row['error_message'] or '未知错误',
+                'probed_at': row['probed_at'].isoformat() + 'Z'
+            }
+            for row in db.session.execute(RECENT_ALERTS_SQL, {'tenant_id': tenant_id}).mappings()
+        ]
+
+        counts = result_summary['status_counts']
+        total_recent = sum(counts.values())
+        success_rate = (counts['success'] / total_recent * 100) if total_recent > 0 else 0
+
+        return {
+            'overview': {
+                'total_probes': total_probes,
+                'active_probes': running_probes,
+                'total_groups': probe_row['total_groups'],
+                'total_results_today': result_summary['total_results_today']
+            },
+            'probe_status': {
+                'running': running_probes,
+                'stopped': total_probes - running_probes,
+                'error': 0  # 可以根据实际情况统计错误状态
+            },
+            'recent_results': {
+                'success': counts['success'],
+                'failed': counts['failed'],
+                'timeout': counts['timeout'],
+                'success_rate': round(success_rate, 2),
+                'response_time_percentiles': result_summary['percentiles']
+            },
+            'protocol_distribution': protocol_distribution,
+            'top_slow_probes': result_summary['top_slow_probes'],
+            'top_failed_probes': result_summary['top_failed_probes'],
+            'recent_alerts': recent_alerts,
+            'timestamp': now.isoformat() + 'Z'
+        }
+
+    def _summarize_from_results(self, tenant_id: int, today_start: datetime,
+                                last_24h_start: datetime) -> Dict[str, Any]:
+        """一次 CTE 查询汇总最近24小时的探测结果"""
+        row = db.session.execute(RESULT_SUMMARY_SQL, {
+            'tenant_id': tenant_id,
+            'since': last_24h_start,
+            'today_start': today_start,
+            'top': self.top_count
+        }).mappings().one()
+
+        percentiles = row['response_time_percentiles'] or [None, None, None]
+        return {
+            'total_results_today': row['total_results_today'],
+            'status_counts': {
+                'success': row['success_count'],
+                'failed': row['failed_count'],
+                'timeout': row['timeout_count']
+            },
+            'percentiles': {
+                name: round(float(value), 2) if value is not None else None
+                for name, value in zip(('p50', 'p95', 'p99'), percentiles)
+            },
+            'top_slow_probes': [
+                {
+                    'id': probe['id'],
+                    'name': probe['name'],
+                    'average_response_time': float(probe['average_response_time']),
+                    'protocol': probe['protocol'],
+                    'target_url': probe['target_url']
+                }
+                for probe in row['top_slow_probes']
+            ],
+            'top_failed_probes': [
+                {
+                    'id': probe['id'],
+                    'name': probe['name'],
+                    'failed_count': probe['failed_count'],
+                    'protocol': probe['protocol'],
+                    'target_url': probe['target_url']
+                }
+                for probe in row['top_failed_probes']
+            ]
+        }
+
+    def _summarize_from_aggregates(self, tenant_id: int, today_start: datetime,
+                                   last_24h_start: datetime, now: datetime) -> Dict[str, Any]:
+        """从统计聚合桶汇总最近24小时的探测结果"""
+        from app.models.network import NetworkProbe
+        from app.services.network_probe_stats_service import network_probe_stats_service
+
+        summary = network_probe_stats_service.get_tenant_summary(tenant_id, last_24h_start, now, self.top_count)
+        summary_today = network_probe_stats_service.get_tenant_summary(tenant_id, today_start, now, 0)
+
+        probe_ids = [probe_id for probe_id, _ in summary['slowest_probes']] + \
+                    [probe_id for probe_id, _ in summary['most_failed_probes']]
+        probe_map = {
+            probe.id: probe for probe in NetworkProbe.query.filter(
+                NetworkProbe.tenant_id == tenant_id,
+                NetworkProbe.id.in_(probe_ids)
+            ).all()
+        } if probe_ids else {}
+
+        return {
+            'total_results_today': sum(summary_today['status_counts'].values()),
+            'status_counts': summary['status_counts'],
+            'percentiles': summary['percentiles'],
+            'top_slow_probes': [
+                {
+                    'id': probe_id,
+                    'name': probe_map[probe_id].name,
+                    'average_response_time': avg_time,
+                    'protocol': probe_map[probe_id].protocol,
+                    'target_url': probe_map[probe_id].target_url
+                }
+                for probe_id, avg_time in summary['slowest_probes']
+                if probe_id in probe_map
+            ],
+            'top_failed_probes': [
+                {
+                    'id': probe_id,
+                    'name': probe_map[probe_id].name,
+                    'failed_count': failed_count,
+                    'protocol': probe_map[probe_id].protocol,
+                    'target_url': probe_map[probe_id].target_url
+                }
+                for probe_id, failed_count in summary['most_failed_probes']
+                if probe_id in probe_map
+            ]
+        }
+
+
+# 全局网络监控大屏服务实例
+network_dashboard_service = NetworkDashboardService()
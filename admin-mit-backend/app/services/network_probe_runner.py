@@ -0,0 +1,348 @@
+"""
+网络探测异步执行器
+在单个 Worker 进程内用 asyncio 并发执行一个分片的探测任务：
+HTTP/HTTPS 探测共享 aiohttp 连接池，TCP/UDP 使用非阻塞 socket，
+并按目标地址限制并发，执行结果由调用方批量写入数据库
+"""
+import asyncio
+import logging
+import socket
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Any, Dict, List, Sequence, Tuple
+from urllib.parse import urlparse
+
+import requests
+import websocket
+
+# 尝试导入aiohttp，如果不存在则在线程池中执行同步 HTTP 请求
+try:
+    import aiohttp
+    HAS_AIOHTTP = True
+except ImportError:
+    aiohttp = None
+    HAS_AIOHTTP = False
+
+from app.models.network import NetworkProbe, NetworkProbeResult
+from app.core.config_manager import config_manager
+
+logger = logging.getLogger(__name__)
+
+
+class _UDPProbeProtocol(asyncio.DatagramProtocol):
+    """UDP 探测协议，收到第一个响应报文即完成"""
+
+    def __init__(self, future: asyncio.Future):
+        self.future = future
+
+    def datagram_received(self, data, addr):
+        if not self.future.done():
+            self.future.set_result(data)
+
+    def error_received(self, exc):
+        if not self.future.done():
+            self.future.set_exception(exc)
+
+    def connection_lost(self, exc):
+        if exc is not None and not self.future.done():
+            self.future.set_exception(exc)
+
+
+class NetworkProbeRunner:
+    """网络探测异步执行器"""
+
+    # 响应体最大保存长度，与同步探测保持一致
+    MAX_RESPONSE_BODY = 1000
+
+    def __init__(self):
+        app_config = config_manager.get_app_config()
+        runner_config = app_config.get('network_probe', {}).get('runner', {})
+
+        self.max_concurrency = runner_config.get('max_concurrency', 200)  # 单个分片的最大并发探测数
+        self.per_target_concurrency = runner_config.get('per_target_concurrency', 4)  # 同一目标的最大并发数
+        self.connection_limit = runner_config.get('connection_limit', 100)  # HTTP 连接池大小
+        self.dns_cache_ttl = runner_config.get('dns_cache_ttl', 300)  # DNS 缓存时间（秒）
+
+        self._probe_service = None
+
+    @property
+    def probe_service(self):
+        """复用同步探测服务的请求头、请求体和地址解析逻辑"""
+        if self._probe_service is None:
+            from app.services.network_probe_service import NetworkProbeService
+            self._probe_service = NetworkProbeService()
+        return self._probe_service
+
+    @staticmethod
+    def _snapshot(probe: NetworkProbe) -> SimpleNamespace:
+        """复制探测配置，避免在事件循环和线程池中访问 ORM 对象"""
+        return SimpleNamespace(
+            id=probe.id,
+            tenant_id=probe.tenant_id,
+            name=probe.name,
+            protocol=probe.protocol,
+            target_url=probe.target_url,
+            method=probe.method or 'GET',
+            headers=probe.headers,
+            body=probe.body,
+            timeout=probe.timeout
+        )
+
+    def run_shard(self, probes: Sequence[NetworkProbe], probe_type: str = 'auto') -> List[NetworkProbeResult]:
+        """
+        并发执行一个分片的探测任务
+
+        Args:
+            probes: 探测任务列表
+            probe_type: 探测类型 ('manual' 或 'auto')
+
+        Returns:
+            List[NetworkProbeResult]: 未保存的探测结果对象
+        """
+        if not probes:
+            return []
+
+        specs = [self._snapshot(probe) for probe in probes]
+        rows = asyncio.run(self._run_all(specs))
+
+        return [
+            NetworkProbeResult(probe_type=probe_type, **row)
+            for row in rows
+        ]
+
+    async def _run_all(self, specs: List[SimpleNamespace]) -> List[Dict[str, Any]]:
+        """在同一事件循环中执行全部探测"""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        target_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+        session = None
+        if HAS_AIOHTTP and any(spec.protocol in ('http', 'https') for spec in specs):
+            connector = aiohttp.TCPConnector(
+                limit=self.connection_limit,
+                limit_per_host=self.per_target_concurrency,
+                ttl_dns_cache=self.dns_cache_ttl
+            )
+            session = aiohttp.ClientSession(connector=connector)
+
+        async def run_one(spec):
+            target_key = self._target_key(spec)
+            if target_key not in target_semaphores:
+                target_semaphores[target_key] = asyncio.Semaphore(self.per_target_concurrency)
+
+            # 先占目标槽位再占全局槽位，同一目标排队的探测不会占住全局并发
+            async with target_semaphores[target_key], semaphore:
+                return await self._execute(spec, session)
+
+        try:
+            return await asyncio.gather(*[run_one(spec) for spec in specs])
+        finally:
+            if session is not None:
+                await session.close()
+
+    @staticmethod
+    def _target_key(spec: SimpleNamespace) -> str:
+        """并发限制的目标键（主机:端口）"""
+        url = spec.target_url if '://' in spec.target_url else f"{spec.protocol}://{spec.target_url}"
+        parsed = urlparse(url)
+        return f"{parsed.hostname}:{parsed.port or ''}"
+
+    async def _execute(self, spec: SimpleNamespace, session) -> Dict[str, Any]:
+        """执行单个探测，返回结果字段字典"""
+        row = {
+            'tenant_id': spec.tenant_id,
+            'probe_id': spec.id,
+            'probed_at': datetime.utcnow()
+        }
+        start_time = time.monotonic()
+
+        try:
+            if spec.protocol in ('http', 'https'):
+                if session is not None:
+                    row.update(await self._http_probe(spec, session))
+                else:
+                    row.update(await self._http_probe_in_executor(spec))
+            elif spec.protocol == 'tcp':
+                row.update(await self._tcp_probe(spec))
+            elif spec.protocol == 'udp':
+                row.update(await self._udp_probe(spec))
+            elif spec.protocol == 'websocket':
+                row.update(await self._websocket_probe(spec))
+            else:
+                row.update(status='failed', error_message=f"不支持的协议类型: {spec.protocol}")
+        except Exception as e:
+            row.update(status='failed', error_message=f"未知错误: {str(e)}")
+
+        if row.get('status') == 'success' or row.get('status_code'):
+            row['response_time'] = int((time.monotonic() - start_time) * 1000)
+
+        return row
+
+    def _truncate_body(self, content: str) -> str:
+        """截取响应体"""
+        if len(content) > self.MAX_RESPONSE_BODY:
+            return content[:self.MAX_RESPONSE_BODY] + '...[truncated]'
+        return content
+
+    async def _http_probe(self, spec: SimpleNamespace, session) -> Dict[str, Any]:
+        """HTTP/HTTPS 探测（aiohttp）"""
+        method = spec.method.upper()
+        headers = self.probe_service._prepare_headers(spec.headers)
+
+        request_kwargs = {
+            'headers': headers or None,
+            'timeout': aiohttp.ClientTimeout(total=spec.timeout),
+            'allow_redirects': True,
+            'ssl': True if spec.protocol == 'https' else False
+        }
+        if method in ('POST', 'PUT', 'PATCH') and spec.body:
+            request_kwargs['data'] = self.probe_service._prepare_request_body(spec.body, headers)
+
+        try:
+            async with session.request(method, spec.target_url, **request_kwargs) as response:
+                # 只读取需要保存的部分响应体
+                raw = await response.content.read(self.MAX_RESPONSE_BODY * 4)
+                content = raw.decode(response.charset or 'utf-8', errors='replace')
+                status_code = response.status
+        except asyncio.TimeoutError:
+            return {'status': 'timeout', 'error_message': f"请求超时 (超过 {spec.timeout} 秒)"}
+        except aiohttp.ClientConnectionError as e:
+            return {'status': 'failed', 'error_message': f"连接错误: {str(e)}"}
+        except aiohttp.ClientError as e:
+            return {'status': 'failed', 'error_message': f"请求错误: {str(e)}"}
+
+        return self._http_row(status_code, self._truncate_body(content))
+
+    async def _http_probe_in_executor(self, spec: SimpleNamespace) -> Dict[str, Any]:
+        """HTTP/HTTPS 探测（未安装 aiohttp 时在线程池中执行同步请求）"""
+        loop = asyncio.get_running_loop()
+        try:
+            response_data = await loop.run_in_executor(None, self.probe_service._make_http_request, spec)
+        except requests.exceptions.Timeout:
+            return {'status': 'timeout', 'error_message': f"请求超时 (超过 {spec.timeout} 秒)"}
+        except requests.exceptions.ConnectionError as e:
+            return {'status': 'failed', 'error_message': f"连接错误: {str(e)}"}
+        except requests.exceptions.RequestException as e:
+            return {'status': 'failed', 'error_message': f"请求错误: {str(e)}"}
+
+        return self._http_row(response_data['status_code'], response_data['response_body'])
+
+    @staticmethod
+    def _http_row(status_code: int, response_body: str) -> Dict[str, Any]:
+        """根据状态码判断成功/失败：2xx, 3xx, 4xx → success, 5xx → failed"""
+        row = {'status_code': status_code, 'response_body': response_body}
+        if status_code >= 500:
+            row.update(status='failed', error_message=f"服务器错误: HTTP {status_code}")
+        else:
+            row['status'] = 'success'
+        return row
+
+    def _parse_target(self, spec: SimpleNamespace) -> Tuple[str, int]:
+        """解析 TCP/UDP 目标地址"""
+        return self.probe_service._parse_tcp_udp_target(spec.target_url)
+
+    async def _tcp_probe(self, spec: SimpleNamespace) -> Dict[str, Any]:
+        """TCP 探测"""
+        try:
+            host, port = self._parse_target(spec)
+        except ValueError as e:
+            return {'status': 'failed', 'error_message': f"未知错误: {str(e)}"}
+
+        connect_start = time.monotonic()
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout=spec.timeout)
+        except asyncio.TimeoutError:
+            return {'status': 'timeout', 'error_message': f"TCP 连接超时 (超过 {spec.timeout} 秒)"}
+        except socket.gaierror as e:
+            return {'status': 'failed', 'error_message': f"DNS 解析失败: {str(e)}"}
+        except ConnectionRefusedError:
+            return {'status': 'failed', 'error_message': "连接被拒绝，目标端口可能未开放"}
+        except OSError as e:
+            return {'status': 'failed', 'error_message': f"网络错误: {str(e)}"}
+
+        connect_time = int((time.monotonic() - connect_start) * 1000)
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except Exception:
+            pass
+
+        return {
+            'status': 'success',
+            'status_code': 0,  # TCP 没有状态码，使用 0 表示成功
+            'response_body': f"TCP 连接成功: {host}:{port}, 连接延迟: {connect_time}ms"
+        }
+
+    async def _udp_probe(self, spec: SimpleNamespace) -> Dict[str, Any]:
+        """UDP 探测"""
+        try:
+            host, port = self._parse_target(spec)
+        except ValueError as e:
+            return {'status': 'failed', 'error_message': f"未知错误: {str(e)}"}
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        message = spec.body.encode('utf-8') if spec.body else b'ping'
+
+        transport = None
+        send_start = time.monotonic()
+        try:
+            transport, _ = await asyncio.wait_for(
+                loop.create_datagram_endpoint(lambda: _UDPProbeProtocol(future), remote_addr=(host, port)),
+                timeout=spec.timeout
+            )
+            transport.sendto(message)
+
+            try:
+                data = await asyncio.wait_for(future, timeout=spec.timeout)
+            except asyncio.TimeoutError:
+                # UDP 是无连接协议，没有收到响应不一定表示失败
+                send_time = int((time.monotonic() - send_start) * 1000)
+                return {
+                    'status': 'success',
+                    'status_code': 0,
+                    'response_body': f"UDP 数据已发送到 {host}:{port}, 发送耗时: {send_time}ms (未收到响应，这对于 UDP 是正常的)"
+                }
+
+            rtt = int((time.monotonic() - send_start) * 1000)
+            response_preview = data[:100].decode('utf-8', errors='ignore')
+            if len(data) > 100:
+                response_preview += '...'
+            return {
+                'status': 'success',
+                'status_code': 0,  # UDP 没有状态码，使用 0 表示成功
+                'response_body': f"UDP 探测成功: {host}:{port}, 往返延迟: {rtt}ms, 收到响应: {response_preview}"
+            }
+        except asyncio.TimeoutError:
+            return {'status': 'timeout', 'error_message': f"UDP 探测超时 (超过 {spec.timeout} 秒)"}
+        except socket.gaierror as e:
+            return {'status': 'failed', 'error_message': f"DNS 解析失败: {str(e)}"}
+        except OSError as e:
+            return {'status': 'failed', 'error_message': f"网络错误: {str(e)}"}
+        finally:
+            if transport is not None:
+                transport.close()
+
+    async def _websocket_probe(self, spec: SimpleNamespace) -> Dict[str, Any]:
+        """WebSocket 探测（websocket-client 为同步库，在线程池中执行）"""
+        loop = asyncio.get_running_loop()
+        try:
+            connection_data = await loop.run_in_executor(
+                None, self.probe_service._test_websocket_connection, spec
+            )
+        except websocket.WebSocketTimeoutException:
+            return {'status': 'timeout', 'error_message': f"WebSocket 连接超时 (超过 {spec.timeout} 秒)"}
+        except websocket.WebSocketConnectionClosedException as e:
+            return {'status': 'failed', 'error_message': f"WebSocket 连接关闭: {str(e)}"}
+        except websocket.WebSocketException as e:
+            return {'status': 'failed', 'error_message': f"WebSocket 错误: {str(e)}"}
+
+        return {
+            'status': 'success',
+            'status_code': 101,  # WebSocket 升级成功状态码
+            'response_body': connection_data['message']
+        }
+
+
+# 全局探测执行器实例
+network_probe_runner = NetworkProbeRunner()
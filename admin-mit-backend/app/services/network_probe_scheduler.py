@@ -1,14 +1,18 @@
 """
 网络探测任务调度服务
+自动探测的下次执行时间保存在 Redis 有序集合中（成员为探测ID，分值为下次执行时间戳），
+定时 ticker 批量取出到期的探测并按分片派发
 """
 import logging
+import time
 from typing import Dict, Any, Optional, List
-from datetime import datetime, timedelta
+from datetime import datetime
 from celery import current_app as celery_app
 from celery.result import AsyncResult
 from app.extensions import db
 from app.models.network import NetworkProbe
 from app.services.network_cache_service import network_cache_service
+from app.core.config_manager import config_manager
 
 logger = logging.getLogger(__name__)
 
@@ -16,10 +20,178 @@ logger = logging.getLogger(__name__)
 class NetworkProbeScheduler:
     """网络探测任务调度器"""
     
-    def __init__(self):
+    SCHEDULE_KEY = 'network:probe:schedule'
+    INTERVALS_KEY = 'network:probe:intervals'
+    SYNC_MARKER_KEY = 'network:probe:schedule:synced'
+    
+    # 原子地取出到期探测并按间隔推进下次执行时间，多个 ticker 并发时不会重复派发
+    POP_DUE_SCRIPT = """
+    local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'WITHSCORES', 'LIMIT', 0, ARGV[2])
+    local now = tonumber(ARGV[1])
+    local ids = {}
+    for i = 1, #due, 2 do
+        local member = due[i]
+        local interval = tonumber(redis.call('HGET', KEYS[2], member))
+        if interval then
+            local next_run = tonumber(due[i + 1]) + interval
+            if next_run <= now then
+                next_run = now + interval
+            end
+            redis.call('ZADD', KEYS[1], next_run, member)
+            table.insert(ids, member)
+        else
+            redis.call('ZREM', KEYS[1], member)
+        end
+    end
+    return ids
+    """
+    
+    def __init__(self, redis_client=None):
         """初始化调度器"""
         self.cache_service = network_cache_service
-        self._task_registry = {}  # 任务注册表：{probe_id: task_info}
+        self._redis = redis_client
+        self._pop_due_script = None
+        
+        scheduler_config = config_manager.get_app_config().get('network_probe', {}).get('scheduler', {})
+        self.batch_size = scheduler_config.get('batch_size', 1000)  # 单次取出的到期探测数
+        self.sync_interval = scheduler_config.get('sync_interval', 300)  # 与数据库对账间隔（秒）
+    
+    @property
+    def redis(self):
+        """延迟获取 Redis 客户端"""
+        if self._redis is None:
+            from app.extensions import get_redis_client
+            self._redis = get_redis_client()
+        return self._redis
+    
+    # ==================== 调度时间轮 ====================
+    
+    def schedule_probe(self, probe_id: int, interval_seconds: int, delay: Optional[float] = None) -> None:
+        """
+        将探测加入调度
+        
+        Args:
+            probe_id: 探测任务 ID
+            interval_seconds: 探测间隔（秒）
+            delay: 距首次执行的秒数，默认为一个探测间隔
+        """
+        if delay is None:
+            delay = interval_seconds
+        pipe = self.redis.pipeline()
+        pipe.hset(self.INTERVALS_KEY, probe_id, interval_seconds)
+        pipe.zadd(self.SCHEDULE_KEY, {probe_id: time.time() + delay})
+        pipe.execute()
+    
+    def unschedule_probe(self, probe_id: int) -> None:
+        """将探测移出调度"""
+        pipe = self.redis.pipeline()
+        pipe.zrem(self.SCHEDULE_KEY, probe_id)
+        pipe.hdel(self.INTERVALS_KEY, probe_id)
+        pipe.execute()
+    
+    def reschedule_interval(self, probe_id: int, old_interval: int, new_interval: int) -> None:
+        """调整已调度探测的间隔，下次执行时间按新间隔从上次执行时间重新计算"""
+        score = self.redis.zscore(self.SCHEDULE_KEY, probe_id)
+        if score is None:
+            self.schedule_probe(probe_id, new_interval)
+            return
+        
+        next_run = self._rescheduled_run(time.time(), score, old_interval, new_interval)
+        pipe = self.redis.pipeline()
+        pipe.hset(self.INTERVALS_KEY, probe_id, new_interval)
+        pipe.zadd(self.SCHEDULE_KEY, {probe_id: next_run}, xx=True)
+        pipe.execute()
+    
+    @staticmethod
+    def _rescheduled_run(now: float, score: float, old_interval: Optional[int], new_interval: int) -> float:
+        """按新间隔计算下次执行时间，旧间隔未知时不晚于一个新间隔之后"""
+        if old_interval is None:
+            return min(score, now + new_interval)
+        return max(now, score - old_interval + new_interval)
+    
+    def sync_probe(self, probe: NetworkProbe, old_interval: Optional[int] = None) -> None:
+        """根据探测任务当前配置更新调度（任务更新后调用）"""
+        try:
+            if not (probe.enabled and probe.auto_probe_enabled):
+                self.unschedule_probe(probe.id)
+            elif old_interval is not None and old_interval != probe.interval_seconds:
+                self.reschedule_interval(probe.id, old_interval, probe.interval_seconds)
+            elif self.redis.zscore(self.SCHEDULE_KEY, probe.id) is None:
+                self.schedule_probe(probe.id, probe.interval_seconds, delay=0)
+        except Exception as e:
+            logger.warning(f"同步探测调度失败: probe_id={probe.id}, error={str(e)}")
+    
+    def pop_due_probes(self, now: Optional[float] = None, limit: Optional[int] = None) -> List[int]:
+        """取出到期的探测ID，并将其下次执行时间推进一个间隔"""
+        if self._pop_due_script is None:
+            self._pop_due_script = self.redis.register_script(self.POP_DUE_SCRIPT)
+        
+        ids = self._pop_due_script(
+            keys=[self.SCHEDULE_KEY, self.INTERVALS_KEY],
+            args=[now if now is not None else time.time(), limit or self.batch_size]
+        )
+        return [int(probe_id) for probe_id in ids]
+    
+    def sync_schedule(self, force: bool = False) -> Dict[str, int]:
+        """
+        与数据库对账：补充缺失的自动探测，移除已停用的探测，修正探测间隔
+        
+        Args:
+            force: 忽略对账间隔强制执行
+        """
+        if not force and not self.redis.set(self.SYNC_MARKER_KEY, 1, nx=True, ex=self.sync_interval):
+            return {'added': 0, 'removed': 0, 'updated': 0}
+        
+        rows = db.session.query(NetworkProbe.id, NetworkProbe.interval_seconds).filter(
+            NetworkProbe.enabled == True,
+            NetworkProbe.auto_probe_enabled == True
+        ).all()
+        expected = {probe_id: interval for probe_id, interval in rows}
+        
+        scheduled = {
+            int(probe_id): score
+            for probe_id, score in self.redis.zrange(self.SCHEDULE_KEY, 0, -1, withscores=True)
+        }
+        intervals = {int(k): int(v) for k, v in self.redis.hgetall(self.INTERVALS_KEY).items()}
+        
+        now = time.time()
+        added = [probe_id for probe_id in expected if probe_id not in scheduled]
+        removed = [probe_id for probe_id in set(scheduled) | set(intervals) if probe_id not in expected]
+        updated = [
+            probe_id for probe_id, interval in expected.items()
+            if probe_id in scheduled and intervals.get(probe_id) != interval
+        ]
+        
+        pipe = self.redis.pipeline()
+        if added:
+            # 新加入的探测在一个间隔内错开首次执行时间，避免集中到期
+            pipe.zadd(self.SCHEDULE_KEY, {
+                probe_id: now + (probe_id % max(1, expected[probe_id])) for probe_id in added
+            }, nx=True)
+        if removed:
+            pipe.zrem(self.SCHEDULE_KEY, *removed)
+            pipe.hdel(self.INTERVALS_KEY, *removed)
+        if updated:
+            # 间隔变化的探测按新间隔从上次执行时间重新计算下次执行时间（与 reschedule_interval 一致）
+            pipe.zadd(self.SCHEDULE_KEY, {
+                probe_id: self._rescheduled_run(
+                    now, scheduled[probe_id], intervals.get(probe_id), expected[probe_id]
+                )
+                for probe_id in updated
+            }, xx=True)
+        if expected:
+            pipe.hset(self.INTERVALS_KEY, mapping=expected)
+        pipe.execute()
+        
+        if added or removed or updated:
+            logger.info(f"探测调度对账完成: added={len(added)}, removed={len(removed)}, updated={len(updated)}")
+        
+        return {'added': len(added), 'removed': len(removed), 'updated': len(updated)}
+    
+    def get_next_run_time(self, probe_id: int) -> Optional[datetime]:
+        """获取探测下次执行时间"""
+        score = self.redis.zscore(self.SCHEDULE_KEY, probe_id)
+        return datetime.utcfromtimestamp(score) if score is not None else None
     
     def start_auto_probe(self, probe_id: int, tenant_id: int) -> Dict[str, Any]:
         """
@@ -63,8 +235,8 @@ class NetworkProbeScheduler:
             # 立即执行一次探测
             self._execute_immediate_probe(probe_id, tenant_id)
             
-            # 注册到任务注册表
-            self._register_probe_task(probe_id, probe.interval_seconds)
+            # 加入调度，一个间隔后再次执行
+            self.schedule_probe(probe_id, probe.interval_seconds)
             
             logger.info(f"自动探测任务已启动: probe_id={probe_id}, interval={probe.interval_seconds}s")
             
@@ -116,8 +288,8 @@ class NetworkProbeScheduler:
             # 更新缓存中的探测状态
             self.cache_service.update_probe_status(probe_id, 'stopped')
             
-            # 从任务注册表中移除
-            self._unregister_probe_task(probe_id)
+            # 移出调度
+            self.unschedule_probe(probe_id)
             
             logger.info(f"自动探测任务已停止: probe_id={probe_id}")
             
@@ -238,10 +410,9 @@ class NetworkProbeScheduler:
             probe.interval_seconds = interval_seconds
             db.session.commit()
             
-            # 如果自动探测已启用，需要重新注册任务
-            if probe.auto_probe_enabled:
-                self._unregister_probe_task(probe_id)
-                self._register_probe_task(probe_id, interval_seconds)
+            # 如果自动探测已启用，直接调整调度中的下次执行时间
+            if probe.enabled and probe.auto_probe_enabled:
+                self.reschedule_interval(probe_id, old_interval, interval_seconds)
             
             logger.info(
                 f"探测间隔已更新: probe_id={probe_id}, "
@@ -292,8 +463,8 @@ class NetworkProbeScheduler:
                 db.desc('probed_at')
             ).first()
             
-            # 检查任务注册表
-            task_info = self._task_registry.get(probe_id)
+            # 检查调度
+            next_run_time = self.get_next_run_time(probe_id)
             
             status_info = {
                 'success': True,
@@ -304,8 +475,8 @@ class NetworkProbeScheduler:
                 'interval_seconds': probe.interval_seconds,
                 'status': cached_status or ('running' if probe.auto_probe_enabled else 'stopped'),
                 'last_result': last_result.to_dict() if last_result else None,
-                'task_registered': task_info is not None,
-                'next_run_time': self._calculate_next_run_time(probe_id, last_result)
+                'task_registered': next_run_time is not None,
+                'next_run_time': next_run_time.isoformat() if next_run_time else None
             }
             
             return status_info
@@ -378,8 +549,8 @@ class NetworkProbeScheduler:
             
             for probe in probes:
                 try:
-                    # 重新注册任务
-                    self._register_probe_task(probe.id, probe.interval_seconds)
+                    # 重新加入调度
+                    self.schedule_probe(probe.id, probe.interval_seconds, delay=0)
                     
                     # 更新缓存状态
                     self.cache_service.update_probe_status(probe.id, 'running')
@@ -436,62 +607,6 @@ class NetworkProbeScheduler:
         except Exception as e:
             logger.error(f"立即执行探测任务失败: probe_id={probe_id}, error={str(e)}")
     
-    def _register_probe_task(self, probe_id: int, interval_seconds: int) -> None:
-        """
-        注册探测任务到任务注册表
-        
-        Args:
-            probe_id: 探测任务 ID
-            interval_seconds: 探测间隔（秒）
-        """
-        self._task_registry[probe_id] = {
-            'interval_seconds': interval_seconds,
-            'registered_at': datetime.utcnow(),
-            'last_executed_at': None
-        }
-        
-        logger.debug(f"探测任务已注册: probe_id={probe_id}, interval={interval_seconds}s")
-    
-    def _unregister_probe_task(self, probe_id: int) -> None:
-        """
-        从任务注册表中移除探测任务
-        
-        Args:
-            probe_id: 探测任务 ID
-        """
-        if probe_id in self._task_registry:
-            del self._task_registry[probe_id]
-            logger.debug(f"探测任务已注销: probe_id={probe_id}")
-    
-    def _calculate_next_run_time(self, probe_id: int, last_result) -> Optional[str]:
-        """
-        计算下次执行时间
-        
-        Args:
-            probe_id: 探测任务 ID
-            last_result: 最近的探测结果
-            
-        Returns:
-            str: 下次执行时间（ISO 格式）
-        """
-        try:
-            task_info = self._task_registry.get(probe_id)
-            
-            if not task_info:
-                return None
-            
-            if last_result and last_result.probed_at:
-                next_run = last_result.probed_at + timedelta(
-                    seconds=task_info['interval_seconds']
-                )
-                return next_run.isoformat()
-            
-            return None
-            
-        except Exception as e:
-            logger.error(f"计算下次执行时间失败: probe_id={probe_id}, error={str(e)}")
-            return None
-    
     def get_scheduler_statistics(self) -> Dict[str, Any]:
         """
         获取调度器统计信息
@@ -507,8 +622,9 @@ class NetworkProbeScheduler:
                 auto_probe_enabled=True
             ).count()
             
-            # 统计任务注册表
-            registered_tasks = len(self._task_registry)
+            # 统计调度中的探测
+            registered_tasks = self.redis.zcard(self.SCHEDULE_KEY)
+            due_tasks = self.redis.zcount(self.SCHEDULE_KEY, '-inf', time.time())
             
             # 获取 Celery 队列信息
             try:
@@ -551,6 +667,7 @@ class NetworkProbeScheduler:
                 'total_probes': total_probes,
                 'auto_enabled_probes': auto_enabled_probes,
                 'registered_tasks': registered_tasks,
+                'due_tasks': due_tasks,
                 'celery_info': celery_info,
                 'timestamp': datetime.utcnow().isoformat()
             }
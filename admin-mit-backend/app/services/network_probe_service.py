@@ -813,9 +813,15 @@ class NetworkProbeService:
         """
         from datetime import timedelta
         
+        from app.services.network_probe_stats_service import network_probe_stats_service
+        
         end_date = datetime.utcnow()
         start_date = end_date - timedelta(days=days)
         
+        # 聚合数据覆盖查询范围时直接按小时桶计算
+        if network_probe_stats_service.is_covered(start_date):
+            return network_probe_stats_service.get_probe_statistics(probe_id, start_date, end_date)
+        
         # 查询指定时间范围内的探测结果
         results = NetworkProbeResult.query.filter(
             NetworkProbeResult.probe_id == probe_id,
@@ -828,7 +834,8 @@ class NetworkProbeService:
                 'total_probes': 0,
                 'success_rate': 0,
                 'average_response_time': 0,
-                'status_distribution': {}
+                'status_distribution': {},
+                'percentiles': {'p50': None, 'p95': None, 'p99': None}
             }
         
         # 计算统计信息
@@ -846,11 +853,20 @@ class NetworkProbeService:
             status = result.status
             status_distribution[status] = status_distribution.get(status, 0) + 1
         
+        # 响应时间分位数
+        response_times = sorted(r.response_time for r in successful_results)
+        percentiles = {
+            f"p{int(q * 100)}": response_times[min(int(q * len(response_times)), len(response_times) - 1)]
+            if response_times else None
+            for q in (0.5, 0.95, 0.99)
+        }
+        
         return {
             'total_probes': total_probes,
             'success_rate': round(success_rate, 2),
             'average_response_time': round(average_response_time, 2),
-            'status_distribution': status_distribution
+            'status_distribution': status_distribution,
+            'percentiles': percentiles
         }
 
 
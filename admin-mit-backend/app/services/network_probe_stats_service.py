@@ -0,0 +1,463 @@
+"""
+网络探测统计聚合服务
+探测结果写入时按分钟/小时增量维护每个探测任务的状态计数与响应时间直方图（Redis Hash），
+统计、历史与大屏接口按时间桶读取聚合数据，无需扫描探测结果表，并可给出 p50/p95/p99。
+"""
+import bisect
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.core.config_manager import config_manager
+
+logger = logging.getLogger(__name__)
+
+
+class NetworkProbeStatsService:
+    """网络探测统计聚合服务"""
+
+    KEY_PREFIX = 'network:probe:agg'
+    SINCE_KEY = 'network:probe:agg:since'  # 聚合数据覆盖的起始时间（Unix 秒）
+    BACKFILLED_KEY = 'network:probe:agg:backfilled'  # 已回填的小时（有序集合，成员与分数均为小时桶起点）
+
+    # 时间粒度：键标识 -> 桶宽度（秒）
+    RESOLUTIONS = {'m': 60, 'h': 3600}
+
+    # 响应时间直方图桶上界（毫秒），最后一个桶为 +inf
+    HISTOGRAM_BOUNDS = (
+        1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 200, 300, 500, 750,
+        1000, 1500, 2000, 3000, 5000, 10000, 30000
+    )
+
+    STATUSES = ('success', 'failed', 'timeout')
+
+    # 原子更新最小/最大值
+    MINMAX_SCRIPT = """
+    local value = tonumber(ARGV[1])
+    local current = tonumber(redis.call('HGET', KEYS[1], 'rt_min'))
+    if not current or value < current then
+        redis.call('HSET', KEYS[1], 'rt_min', ARGV[1])
+    end
+    value = tonumber(ARGV[2])
+    current = tonumber(redis.call('HGET', KEYS[1], 'rt_max'))
+    if not current or value > current then
+        redis.call('HSET', KEYS[1], 'rt_max', ARGV[2])
+    end
+    return 1
+    """
+
+    def __init__(self, redis_client=None):
+        self._redis = redis_client
+        self._minmax_script = None
+
+        stats_config = config_manager.get_app_config().get('network_probe', {}).get('statistics', {})
+        self.minute_retention = stats_config.get('minute_retention_hours', 48) * 3600  # 分钟桶保留时间（秒）
+        self.hour_retention = stats_config.get('hour_retention_days', 90) * 86400  # 小时桶保留时间（秒）
+
+    @property
+    def redis(self):
+        """延迟获取 Redis 客户端"""
+        if self._redis is None:
+            from app.extensions import redis_client, get_redis_client
+            self._redis = redis_client or get_redis_client()
+        return self._redis
+
+    @property
+    def minmax_script(self):
+        if self._minmax_script is None:
+            self._minmax_script = self.redis.register_script(self.MINMAX_SCRIPT)
+        return self._minmax_script
+
+    # ==================== 键 ====================
+
+    def _get_probe_key(self, resolution: str, probe_id: int, bucket: int) -> str:
+        return f"{self.KEY_PREFIX}:{resolution}:{probe_id}:{bucket}"
+
+    def _get_tenant_key(self, tenant_id: int, bucket: int) -> str:
+        return f"{self.KEY_PREFIX}:tenant:{tenant_id}:{bucket}"
+
+    @staticmethod
+    def _to_timestamp(value) -> int:
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value.rstrip('Z'))
+        if value is None:
+            value = datetime.utcnow()
+        return int((value - datetime(1970, 1, 1)).total_seconds())
+
+    @staticmethod
+    def _floor(timestamp: int, width: int) -> int:
+        return timestamp - timestamp % width
+
+    def _retention(self, resolution: str) -> int:
+        return self.minute_retention if resolution == 'm' else self.hour_retention
+
+    @classmethod
+    def _histogram_index(cls, response_time: float) -> int:
+        return bisect.bisect_left(cls.HISTOGRAM_BOUNDS, response_time)
+
+    # ==================== 写入 ====================
+
+    def _aggregate(self, results: Iterable[Dict[str, Any]]) -> Tuple[
+            Dict[str, Dict[str, float]], Dict[str, List[float]], Dict[str, int], Optional[int]]:
+        """
+        按聚合桶汇总一批探测结果
+
+        Returns:
+            Tuple: (聚合桶键 -> 字段累计值, 聚合桶键 -> [最小, 最大]响应时间, 聚合桶键 -> 过期时间, 最早的探测时间)
+        """
+        increments: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        minmax: Dict[str, List[float]] = {}
+        expires: Dict[str, int] = {}
+        earliest = None
+
+        for result in results:
+            probe_id = result.get('probe_id')
+            tenant_id = result.get('tenant_id')
+            if probe_id is None or tenant_id is None:
+                continue
+
+            timestamp = self._to_timestamp(result.get('probed_at'))
+            earliest = timestamp if earliest is None else min(earliest, timestamp)
+            status = result.get('status')
+            response_time = result.get('response_time')
+            has_rt = status == 'success' and response_time is not None
+
+            hour_bucket = self._floor(timestamp, self.RESOLUTIONS['h'])
+            for resolution, width in self.RESOLUTIONS.items():
+                key = self._get_probe_key(resolution, probe_id, self._floor(timestamp, width))
+                expires[key] = self._retention(resolution)
+                fields = increments[key]
+                fields[f"s:{status}"] += 1
+                if has_rt:
+                    fields['rt_sum'] += response_time
+                    fields['rt_count'] += 1
+                    fields[f"h:{self._histogram_index(response_time)}"] += 1
+                    bounds = minmax.get(key)
+                    if bounds is None:
+                        minmax[key] = [response_time, response_time]
+                    else:
+                        bounds[0] = min(bounds[0], response_time)
+                        bounds[1] = max(bounds[1], response_time)
+
+            tenant_key = self._get_tenant_key(tenant_id, hour_bucket)
+            expires[tenant_key] = self.hour_retention
+            fields = increments[tenant_key]
+            fields[f"s:{status}"] += 1
+            if status in ('failed', 'timeout'):
+                fields[f"p:{probe_id}:fail"] += 1
+            if has_rt:
+                fields[f"p:{probe_id}:rt_sum"] += response_time
+                fields[f"p:{probe_id}:rt_count"] += 1
+                fields[f"h:{self._histogram_index(response_time)}"] += 1
+
+        return increments, minmax, expires, earliest
+
+    def record_results(self, results: Iterable[Dict[str, Any]]):
+        """
+        将一批探测结果累加到聚合桶（一个 pipeline）
+
+        Args:
+            results: 探测结果数据，需包含 tenant_id、probe_id、status、response_time、probed_at
+        """
+        increments, minmax, expires, earliest = self._aggregate(results)
+        if not increments:
+            return
+
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.setnx(self.SINCE_KEY, earliest)
+            for key, fields in increments.items():
+                for field, amount in fields.items():
+                    if field.endswith('rt_sum'):
+                        pipe.hincrbyfloat(key, field, amount)
+                    else:
+                        pipe.hincrby(key, field, int(amount))
+                pipe.expire(key, expires[key])
+            for key, (low, high) in minmax.items():
+                self.minmax_script(keys=[key], args=[low, high], client=pipe)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"更新探测统计聚合失败: {str(e)}")
+
+    # ==================== 读取 ====================
+
+    def is_covered(self, start_time: datetime) -> bool:
+        """聚合数据是否覆盖从 start_time 开始的时间范围"""
+        try:
+            since = self.redis.get(self.SINCE_KEY)
+        except Exception:
+            return False
+        return since is not None and int(since) <= self._to_timestamp(start_time)
+
+    def _fetch(self, keys: List[str]) -> List[Dict[str, float]]:
+        """一个 pipeline 读取多个聚合桶"""
+        pipe = self.redis.pipeline(transaction=False)
+        for key in keys:
+            pipe.hgetall(key)
+        return [
+            {
+                (field.decode() if isinstance(field, bytes) else field): float(value)
+                for field, value in (raw or {}).items()
+            }
+            for raw in pipe.execute()
+        ]
+
+    def _bucket_starts(self, resolution: str, start_time: datetime, end_time: datetime,
+                       partial_start: bool = True) -> List[int]:
+        """
+        覆盖时间范围的聚合桶起点
+
+        partial_start 为 False 时跳过起点所在的不完整桶（起点向上取整），
+        汇总范围不会超出请求的时长（如最近 24 小时不会读到 25 个小时桶）
+        """
+        width = self.RESOLUTIONS[resolution]
+        start = self._to_timestamp(start_time)
+        first = self._floor(start, width)
+        if not partial_start and first < start:
+            first += width
+        last = self._to_timestamp(end_time)
+        return list(range(first, last + 1, width))
+
+    @staticmethod
+    def _merge(buckets: Iterable[Dict[str, float]]) -> Dict[str, float]:
+        merged: Dict[str, float] = defaultdict(float)
+        for bucket in buckets:
+            for field, value in bucket.items():
+                if field == 'rt_min':
+                    merged[field] = min(merged.get(field, value), value)
+                elif field == 'rt_max':
+                    merged[field] = max(merged.get(field, value), value)
+                else:
+                    merged[field] += value
+        return merged
+
+    @classmethod
+    def percentiles(cls, bucket: Dict[str, float], quantiles=(0.5, 0.95, 0.99)) -> Dict[str, Optional[float]]:
+        """
+        根据直方图估算分位数（桶内线性插值，结果限制在最小/最大值之间）
+        """
+        counts = [bucket.get(f"h:{index}", 0) for index in range(len(cls.HISTOGRAM_BOUNDS) + 1)]
+        total = sum(counts)
+        result = {}
+        for quantile in quantiles:
+            name = f"p{int(quantile * 100)}"
+            if total == 0:
+                result[name] = None
+                continue
+
+            rank = quantile * total
+            cumulative = 0
+            value = None
+            for index, count in enumerate(counts):
+                if count and cumulative + count >= rank:
+                    lower = cls.HISTOGRAM_BOUNDS[index - 1] if index > 0 else 0
+                    upper = cls.HISTOGRAM_BOUNDS[index] if index < len(cls.HISTOGRAM_BOUNDS) else bucket.get('rt_max', lower)
+                    value = lower + (upper - lower) * (rank - cumulative) / count
+                    break
+                cumulative += count
+
+            if 'rt_min' in bucket:
+                value = max(value, bucket['rt_min'])
+            if 'rt_max' in bucket:
+                value = min(value, bucket['rt_max'])
+            result[name] = round(value, 2)
+        return result
+
+    def get_probe_statistics(self, probe_id: int, start_time: datetime, end_time: datetime) -> Dict[str, Any]:
+        """
+        按小时聚合桶计算探测统计
+
+        起点所在的不完整小时桶不计入，统计范围为起点后的第一个整点到 end_time。
+
+        Returns:
+            Dict: 与 NetworkProbeService.get_probe_statistics 相同的字段，外加 percentiles
+        """
+        keys = [self._get_probe_key('h', probe_id, bucket)
+                for bucket in self._bucket_starts('h', start_time, end_time, partial_start=False)]
+        merged = self._merge(self._fetch(keys))
+
+        status_distribution = {
+            field[2:]: int(value) for field, value in merged.items() if field.startswith('s:') and value
+        }
+        total_probes = sum(status_distribution.values())
+        success_count = status_distribution.get('success', 0)
+        rt_count = merged.get('rt_count', 0)
+
+        return {
+            'total_probes': total_probes,
+            'success_rate': round(success_count / total_probes * 100, 2) if total_probes else 0,
+            'average_response_time': round(merged['rt_sum'] / rt_count, 2) if rt_count else 0,
+            'status_distribution': status_distribution,
+            'percentiles': self.percentiles(merged)
+        }
+
+    def get_probe_history(self, probe_id: int, start_time: datetime, end_time: datetime,
+                          interval_minutes: int) -> List[Dict[str, Any]]:
+        """
+        按聚合桶生成探测历史时间序列
+
+        interval 为 60 的整数倍时读取小时桶，否则读取分钟桶。
+        """
+        resolution = 'h' if interval_minutes % 60 == 0 else 'm'
+        width = self.RESOLUTIONS[resolution]
+        bucket_starts = self._bucket_starts(resolution, start_time, end_time)
+        buckets = self._fetch([self._get_probe_key(resolution, probe_id, bucket) for bucket in bucket_starts])
+
+        step = interval_minutes * 60
+        points: Dict[int, List[Dict[str, float]]] = defaultdict(list)
+        origin = bucket_starts[0] if bucket_starts else 0
+        for bucket_start, bucket in zip(bucket_starts, buckets):
+            points[origin + (bucket_start - origin) // step * step].append(bucket)
+
+        history = []
+        for point_start in range(origin, self._to_timestamp(end_time) + 1, max(step, width)):
+            merged = self._merge(points.get(point_start, []))
+            rt_count = merged.get('rt_count', 0)
+            history.append({
+                'timestamp': datetime.utcfromtimestamp(point_start).isoformat() + 'Z',
+                'success_count': int(merged.get('s:success', 0)),
+                'failed_count': int(merged.get('s:failed', 0)),
+                'timeout_count': int(merged.get('s:timeout', 0)),
+                'average_response_time': round(merged['rt_sum'] / rt_count, 2) if rt_count else None,
+                'min_response_time': merged.get('rt_min'),
+                'max_response_time': merged.get('rt_max'),
+                **self.percentiles(merged)
+            })
+        return history
+
+    def can_serve_history(self, start_time: datetime, interval_minutes: int) -> bool:
+        """聚合数据能否提供该历史查询（分钟桶仅保留有限时间）"""
+        if not self.is_covered(start_time):
+            return False
+        if interval_minutes % 60 == 0:
+            return True
+        return self._to_timestamp(datetime.utcnow()) - self._to_timestamp(start_time) <= self.minute_retention
+
+    def get_tenant_summary(self, tenant_id: int, start_time: datetime, end_time: datetime,
+                           top: int = 5) -> Dict[str, Any]:
+        """
+        租户级汇总：状态计数、响应时间分位数、最慢/失败最多的探测任务
+
+        与 get_probe_statistics 相同，起点所在的不完整小时桶不计入
+        """
+        keys = [self._get_tenant_key(tenant_id, bucket)
+                for bucket in self._bucket_starts('h', start_time, end_time, partial_start=False)]
+        merged = self._merge(self._fetch(keys))
+
+        probe_fail: Dict[int, int] = {}
+        probe_rt: Dict[int, List[float]] = defaultdict(lambda: [0.0, 0.0])
+        for field, value in merged.items():
+            if not field.startswith('p:'):
+                continue
+            _, probe_id, metric = field.split(':', 2)
+            probe_id = int(probe_id)
+            if metric == 'fail':
+                probe_fail[probe_id] = int(value)
+            elif metric == 'rt_sum':
+                probe_rt[probe_id][0] = value
+            elif metric == 'rt_count':
+                probe_rt[probe_id][1] = value
+
+        slowest = sorted(
+            ((probe_id, total / count) for probe_id, (total, count) in probe_rt.items() if count),
+            key=lambda item: item[1], reverse=True
+        )[:top]
+        most_failed = sorted(probe_fail.items(), key=lambda item: item[1], reverse=True)[:top]
+
+        return {
+            'status_counts': {status: int(merged.get(f"s:{status}", 0)) for status in self.STATUSES},
+            'percentiles': self.percentiles(merged),
+            'slowest_probes': [(probe_id, round(avg, 2)) for probe_id, avg in slowest],
+            'most_failed_probes': most_failed
+        }
+
+    # ==================== 回填 ====================
+
+    def backfill(self, hours: int = 24 * 7, batch_size: int = 5000) -> int:
+        """
+        从探测结果表回填聚合数据（回填聚合起始时间之前的结果，需在应用上下文中调用）
+
+        按小时回填：每个小时从结果表重新计算该小时的分钟桶、小时桶和租户桶，
+        在一个事务中覆盖写入并标记该小时已回填。中断后重新执行会跳过已回填的小时，
+        覆盖写入也不会把已由实时写入累加过的结果（含迟到的结果）重复计入。
+        聚合起始时间所在的小时同样整体重算，其中已实时累加的部分以结果表为准。
+
+        Returns:
+            int: 回填的结果数
+        """
+        from app.models.network import NetworkProbeResult
+
+        hour = self.RESOLUTIONS['h']
+        since = self.redis.get(self.SINCE_KEY)
+        end_timestamp = int(since) if since is not None else self._to_timestamp(datetime.utcnow())
+        start_timestamp = self._floor(end_timestamp - hours * 3600, hour)
+
+        # 清理超出小时桶保留时间的回填标记
+        now = self._to_timestamp(datetime.utcnow())
+        self.redis.zremrangebyscore(self.BACKFILLED_KEY, '-inf', f"({now - self.hour_retention}")
+        done = {
+            int(float(member))
+            for member in self.redis.zrangebyscore(self.BACKFILLED_KEY, start_timestamp, end_timestamp)
+        }
+
+        total = 0
+        skipped = 0
+        for hour_start in range(start_timestamp, end_timestamp, hour):
+            if hour_start in done:
+                skipped += 1
+                continue
+
+            query = NetworkProbeResult.query.with_entities(
+                NetworkProbeResult.tenant_id,
+                NetworkProbeResult.probe_id,
+                NetworkProbeResult.status,
+                NetworkProbeResult.response_time,
+                NetworkProbeResult.probed_at
+            ).filter(
+                NetworkProbeResult.probed_at >= datetime.utcfromtimestamp(hour_start),
+                NetworkProbeResult.probed_at < datetime.utcfromtimestamp(hour_start + hour)
+            ).execution_options(yield_per=batch_size)
+
+            results = [
+                {
+                    'tenant_id': tenant_id,
+                    'probe_id': probe_id,
+                    'status': status,
+                    'response_time': response_time,
+                    'probed_at': probed_at
+                }
+                for tenant_id, probe_id, status, response_time, probed_at in query
+            ]
+            self._overwrite_hour(hour_start, results)
+            total += len(results)
+
+        start_time = datetime.utcfromtimestamp(start_timestamp)
+        self.redis.set(self.SINCE_KEY, start_timestamp)
+        logger.info(
+            f"探测统计聚合回填完成: {total} 条, 跳过已回填的 {skipped} 个小时, 覆盖起点 {start_time.isoformat()}"
+        )
+        return total
+
+    def _overwrite_hour(self, hour_start: int, results: List[Dict[str, Any]]):
+        """在一个事务中用重新计算的值覆盖一个小时内的聚合桶，并标记该小时已回填"""
+        values, minmax, expires, _ = self._aggregate(results)
+
+        pipe = self.redis.pipeline(transaction=True)
+        for key, fields in values.items():
+            mapping = {
+                field: value if field.endswith('rt_sum') else int(value)
+                for field, value in fields.items()
+            }
+            if key in minmax:
+                mapping['rt_min'], mapping['rt_max'] = minmax[key]
+            pipe.delete(key)
+            pipe.hset(key, mapping=mapping)
+            pipe.expire(key, expires[key])
+        pipe.zadd(self.BACKFILLED_KEY, {hour_start: hour_start})
+        pipe.expire(self.BACKFILLED_KEY, self.hour_retention)
+        pipe.execute()
+
+
+# 全局探测统计聚合服务实例
+network_probe_stats_service = NetworkProbeStatsService()
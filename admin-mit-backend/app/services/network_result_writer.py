@@ -0,0 +1,429 @@
+"""
+网络探测结果批量写入服务
+每个 Worker 进程在内存中缓冲探测结果，达到行数阈值或时间阈值后用一条多行 INSERT
+（或 COPY）写入 network_probe_results，并在一个 Redis pipeline 中更新结果缓存。
+
+缓冲的结果同时追加到 Redis 中该进程的暂存列表，写库成功后再从列表中移除：
+进程正常退出时会先写完缓冲；进程异常退出时，其暂存列表由恢复任务补写入库。
+"""
+import io
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+from app.extensions import db
+from app.models.network import NetworkProbeResult
+from app.core.config_manager import config_manager
+
+logger = logging.getLogger(__name__)
+
+
+class NetworkProbeResultWriter:
+    """网络探测结果批量写入器"""
+
+    SPOOL_PREFIX = 'network:probe:results:spool'
+    RECOVERING_MARKER = ':recovering:'
+    HEARTBEAT_PREFIX = 'network:probe:results:heartbeat'
+
+    # 写入的列（created_at/updated_at 由写入器填充）
+    COLUMNS = (
+        'tenant_id', 'probe_id', 'probe_type', 'status', 'response_time', 'status_code',
+        'response_body', 'error_message', 'probed_at', 'created_at', 'updated_at'
+    )
+
+    def __init__(self, redis_client=None):
+        self._redis = redis_client
+        self._app = None
+
+        writer_config = config_manager.get_app_config().get('network_probe', {}).get('result_writer', {})
+        self.flush_rows = writer_config.get('flush_rows', 500)  # 缓冲达到该行数立即写入
+        self.flush_interval_ms = writer_config.get('flush_interval_ms', 1000)  # 缓冲最长停留时间（毫秒）
+        self.method = writer_config.get('method', 'values')  # values：多行 INSERT；copy：COPY FROM STDIN
+        self.heartbeat_ttl = writer_config.get('heartbeat_ttl', 60)  # 进程心跳过期时间（秒）
+
+        self._buffer: List[Dict[str, Any]] = []
+        self._buffer_since: Optional[float] = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self._pid = None
+        self._worker_pid = None
+        self._worker_nonce = None
+        self._stale_spools: List[str] = []  # 已弃用、待删除暂存列表的进程标识
+
+    @property
+    def redis(self):
+        """延迟获取 Redis 客户端"""
+        if self._redis is None:
+            from app.extensions import get_redis_client
+            self._redis = get_redis_client()
+        return self._redis
+
+    @property
+    def worker_id(self) -> str:
+        """当前进程标识（含随机后缀：容器重启后 PID 相同，不能沿用已退出进程的暂存列表）"""
+        if self._worker_pid != os.getpid():
+            self._worker_pid = os.getpid()
+            self._worker_nonce = uuid.uuid4().hex[:12]
+        return f"{socket.gethostname()}:{self._worker_pid}:{self._worker_nonce}"
+
+    def _get_spool_key(self, worker_id: Optional[str] = None) -> str:
+        """进程暂存列表键"""
+        return f"{self.SPOOL_PREFIX}:{worker_id or self.worker_id}"
+
+    def _get_heartbeat_key(self, worker_id: Optional[str] = None) -> str:
+        """进程心跳键"""
+        return f"{self.HEARTBEAT_PREFIX}:{worker_id or self.worker_id}"
+
+    # ==================== 写入 ====================
+
+    def start(self, app=None):
+        """启动后台刷新线程（每个进程一个，fork 后重新创建）"""
+        if app is not None:
+            self._app = app
+        if self._flusher is not None and self._flusher.is_alive() and self._pid == os.getpid():
+            return
+
+        self._pid = os.getpid()
+        self._stop_event = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name='probe-result-writer', daemon=True)
+        self._flusher.start()
+
+    @classmethod
+    def _to_row(cls, result: NetworkProbeResult) -> Dict[str, Any]:
+        """探测结果对象转为写入行"""
+        now = datetime.utcnow()
+        return {
+            'tenant_id': result.tenant_id,
+            'probe_id': result.probe_id,
+            'probe_type': result.probe_type,
+            'status': result.status,
+            'response_time': result.response_time,
+            'status_code': result.status_code,
+            'response_body': result.response_body,
+            'error_message': result.error_message,
+            'probed_at': result.probed_at or now,
+            'created_at': now,
+            'updated_at': now
+        }
+
+    @staticmethod
+    def _serialize(row: Dict[str, Any]) -> str:
+        return json.dumps({
+            key: value.isoformat() if isinstance(value, datetime) else value
+            for key, value in row.items()
+        }, ensure_ascii=False)
+
+    @classmethod
+    def _deserialize(cls, raw) -> Dict[str, Any]:
+        if isinstance(raw, bytes):
+            raw = raw.decode('utf-8')
+        row = json.loads(raw)
+        for key in ('probed_at', 'created_at', 'updated_at'):
+            if row.get(key):
+                row[key] = datetime.fromisoformat(row[key])
+        return row
+
+    def add(self, results: Sequence[NetworkProbeResult]) -> int:
+        """
+        加入待写入的探测结果
+
+        Returns:
+            int: 当前缓冲行数
+        """
+        if not results:
+            return len(self._buffer)
+
+        self.start()
+        rows = [self._to_row(result) for result in results]
+
+        with self._lock:
+            # 先写入 Redis 暂存列表，保证与内存缓冲顺序一致
+            try:
+                pipe = self.redis.pipeline()
+                pipe.rpush(self._get_spool_key(), *[self._serialize(row) for row in rows])
+                pipe.set(self._get_heartbeat_key(), 1, ex=self.heartbeat_ttl)
+                pipe.execute()
+            except Exception as e:
+                # Redis 不可用时直接写库，不冒丢失结果的风险
+                logger.warning(f"探测结果暂存失败，直接写入数据库: {str(e)}")
+                self._write_rows(rows)
+                return len(self._buffer)
+
+            self._buffer.extend(rows)
+            if self._buffer_since is None:
+                self._buffer_since = time.monotonic()
+            buffered = len(self._buffer)
+
+        if buffered >= self.flush_rows:
+            self.flush()
+        return buffered
+
+    def _flush_loop(self):
+        """后台刷新线程：按时间阈值写入并维持进程心跳"""
+        interval = self.flush_interval_ms / 1000.0
+        while not self._stop_event.wait(timeout=interval / 2):
+            try:
+                with self._lock:
+                    due = self._buffer_since is not None and time.monotonic() - self._buffer_since >= interval
+                if due:
+                    self.flush()
+                if self._stale_spools:
+                    self._drop_stale_spools()
+                self.redis.set(self._get_heartbeat_key(), 1, ex=self.heartbeat_ttl)
+            except Exception as e:
+                logger.error(f"探测结果后台写入失败: {str(e)}")
+
+    def flush(self) -> int:
+        """
+        写入当前缓冲的全部结果
+
+        Returns:
+            int: 写入的行数
+        """
+        with self._flush_lock:
+            with self._lock:
+                rows = self._buffer
+                self._buffer = []
+                self._buffer_since = None
+            if not rows:
+                return 0
+
+            try:
+                ids = self._write_rows(rows)
+            except Exception as e:
+                logger.error(f"批量写入探测结果失败，保留缓冲等待重试: {len(rows)} 行, 错误: {str(e)}")
+                with self._lock:
+                    self._buffer = rows + self._buffer
+                    self._buffer_since = time.monotonic()
+                return 0
+
+            # 写库成功后从暂存列表头部移除已写入的行
+            try:
+                self.redis.ltrim(self._get_spool_key(), len(rows), -1)
+            except Exception as e:
+                logger.warning(f"清理探测结果暂存失败，改用新的暂存列表: {str(e)}")
+                self._rotate_spool()
+
+            self._sync_cache(rows, ids)
+            return len(rows)
+
+    def _rotate_spool(self):
+        """
+        暂存列表头部残留已写库的行时改用新的暂存列表
+
+        仍在缓冲中的行转存到新列表（转存失败时直接写库），旧列表随后删除，
+        避免后续清理错位或恢复任务重复补写已写入的行
+        """
+        with self._lock:
+            stale_worker_id = self.worker_id
+            self._worker_nonce = uuid.uuid4().hex[:12]
+            self._stale_spools.append(stale_worker_id)
+
+            rows = self._buffer
+            if rows:
+                try:
+                    pipe = self.redis.pipeline()
+                    pipe.rpush(self._get_spool_key(), *[self._serialize(row) for row in rows])
+                    pipe.set(self._get_heartbeat_key(), 1, ex=self.heartbeat_ttl)
+                    pipe.execute()
+                except Exception as e:
+                    logger.warning(f"探测结果转存失败，直接写入数据库: {str(e)}")
+                    try:
+                        self._write_rows(rows)
+                        self._buffer = []
+                        self._buffer_since = None
+                    except Exception as write_error:
+                        logger.error(f"写入探测结果失败，保留在内存缓冲: {len(rows)} 行, 错误: {str(write_error)}")
+
+        self._drop_stale_spools()
+
+    def _drop_stale_spools(self):
+        """删除已弃用的暂存列表及其心跳（Redis 不可用时由后台线程重试）"""
+        for worker_id in list(self._stale_spools):
+            try:
+                self.redis.delete(self._get_spool_key(worker_id), self._get_heartbeat_key(worker_id))
+            except Exception as e:
+                logger.warning(f"删除已弃用的探测结果暂存失败，稍后重试: {str(e)}")
+                return
+            self._stale_spools.remove(worker_id)
+
+    def _write_rows(self, rows: List[Dict[str, Any]]) -> List[Optional[int]]:
+        """在一个事务中写入多行，返回新记录ID（COPY 方式不返回ID）"""
+        if self._app is not None:
+            with self._app.app_context():
+                return self._write_rows_in_context(rows)
+        return self._write_rows_in_context(rows)
+
+    def _write_rows_in_context(self, rows: List[Dict[str, Any]]) -> List[Optional[int]]:
+        """写入多行（需在应用上下文中调用）"""
+        if db.engine.dialect.name != 'postgresql':
+            db.session.execute(NetworkProbeResult.__table__.insert(), rows)
+            db.session.commit()
+            return [None] * len(rows)
+
+        connection = db.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            if self.method == 'copy':
+                ids = self._copy_rows(cursor, rows)
+            else:
+                from psycopg2.extras import execute_values
+                returned = execute_values(
+                    cursor,
+                    f"INSERT INTO network_probe_results ({', '.join(self.COLUMNS)}) VALUES %s RETURNING id",
+                    [tuple(row[column] for column in self.COLUMNS) for row in rows],
+                    page_size=len(rows),
+                    fetch=True
+                )
+                ids = [row[0] for row in returned]
+            connection.commit()
+            return ids
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+    def _copy_rows(self, cursor, rows: List[Dict[str, Any]]) -> List[Optional[int]]:
+        """通过 COPY FROM STDIN 写入"""
+        def encode(value):
+            if value is None:
+                return '\\N'
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write('\t'.join(encode(row[column]) for column in self.COLUMNS))
+            buffer.write('\n')
+        buffer.seek(0)
+
+        cursor.copy_expert(
+            f"COPY network_probe_results ({', '.join(self.COLUMNS)}) FROM STDIN",
+            buffer
+        )
+        return [None] * len(rows)
+
+    def _sync_cache(self, rows: List[Dict[str, Any]], ids: List[Optional[int]]):
+        """一个 pipeline 同步本批结果到缓存，累加统计聚合，并发布 SSE 推送事件"""
+        from app.services.network_cache_service import network_cache_service
+        from app.services.network_probe_stats_service import network_probe_stats_service
+        from app.services.network_sse_service import network_sse_service
+
+        results = [
+            {
+                'id': result_id,
+                'tenant_id': row['tenant_id'],
+                'probe_id': row['probe_id'],
+                'status': row['status'],
+                'response_time': row['response_time'],
+                'status_code': row['status_code'],
+                'error_message': row['error_message'],
+                'probed_at': row['probed_at'].isoformat() if row['probed_at'] else None,
+                'probe_type': row['probe_type']
+            }
+            for row, result_id in zip(rows, ids)
+        ]
+        network_cache_service.sync_probe_results_batch(results)
+        network_probe_stats_service.record_results(results)
+        network_sse_service.publish_probe_results(results)
+
+    def close(self):
+        """停止后台线程并写入剩余缓冲（进程退出时调用）"""
+        self._stop_event.set()
+        if self._flusher is not None and self._flusher.is_alive() and self._flusher is not threading.current_thread():
+            self._flusher.join(timeout=5)
+        remaining = self.flush()
+        if remaining:
+            logger.info(f"进程退出前写入剩余探测结果: {remaining} 行")
+        if self._stale_spools:
+            self._drop_stale_spools()
+        with self._lock:
+            if not self._buffer:
+                try:
+                    self.redis.delete(self._get_heartbeat_key())
+                except Exception:
+                    pass
+
+    # ==================== 恢复 ====================
+
+    def recover_orphaned_spools(self, batch_size: int = 1000) -> int:
+        """
+        补写已退出进程遗留的暂存探测结果
+
+        暂存列表改名为 <暂存键>:recovering:<恢复进程> 后补写；补写失败时改回原名，
+        恢复进程中途退出（心跳过期）时其认领可被其他恢复任务重新认领
+
+        Returns:
+            int: 补写的行数
+        """
+        recovered = 0
+        # 恢复期间维持本进程心跳，其他恢复任务据此判断认领是否仍有效
+        self.redis.set(self._get_heartbeat_key(), 1, ex=self.heartbeat_ttl)
+        for key in self.redis.scan_iter(match=f"{self.SPOOL_PREFIX}:*", count=100):
+            if isinstance(key, bytes):
+                key = key.decode('utf-8')
+            spool_key, _, claimer = key.partition(self.RECOVERING_MARKER)
+            owner = claimer or spool_key[len(self.SPOOL_PREFIX) + 1:]
+            if owner == self.worker_id or self.redis.exists(self._get_heartbeat_key(owner)):
+                continue
+            worker_id = spool_key[len(self.SPOOL_PREFIX) + 1:]
+
+            # 先改名认领，避免多个恢复任务重复写入
+            claim_key = f"{spool_key}{self.RECOVERING_MARKER}{self.worker_id}"
+            try:
+                if not self.redis.renamenx(key, claim_key):
+                    continue
+            except Exception:
+                continue
+
+            try:
+                while True:
+                    raw_rows = self.redis.lrange(claim_key, 0, batch_size - 1)
+                    if not raw_rows:
+                        break
+                    rows = [self._deserialize(raw) for raw in raw_rows]
+                    ids = self._write_rows(rows)
+                    self.redis.ltrim(claim_key, len(raw_rows), -1)
+                    self._sync_cache(rows, ids)
+                    recovered += len(rows)
+                    self.redis.set(self._get_heartbeat_key(), 1, ex=self.heartbeat_ttl)
+            except Exception as e:
+                logger.error(f"补写进程 {worker_id} 遗留的探测结果失败，下次恢复时重试: {str(e)}")
+                # 归还认领（已写入的行已从列表头部移除）
+                try:
+                    self.redis.renamenx(claim_key, spool_key)
+                except Exception:
+                    pass
+                continue
+
+            self.redis.delete(claim_key)
+            logger.info(f"已补写进程 {worker_id} 遗留的探测结果")
+
+        return recovered
+
+    def get_status(self) -> Dict[str, Any]:
+        """获取写入器状态"""
+        with self._lock:
+            buffered = len(self._buffer)
+        return {
+            'worker_id': self.worker_id,
+            'buffered': buffered,
+            'flush_rows': self.flush_rows,
+            'flush_interval_ms': self.flush_interval_ms,
+            'method': self.method,
+            'flusher_alive': self._flusher is not None and self._flusher.is_alive()
+        }
+
+
+# 全局探测结果写入器实例
+network_result_writer = NetworkProbeResultWriter()
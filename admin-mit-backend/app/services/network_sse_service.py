@@ -1,12 +1,17 @@
 """
 网络探测 SSE 实时推送服务
+
+探测结果由 Celery Worker 产生，SSE 流由 Web 进程持有。生产者通过 Redis pub/sub
+按探测任务频道发布事件，每个 Web 进程运行一个订阅线程，将事件分发给本进程内
+订阅该探测任务的所有 SSE 连接（同一探测任务可同时被多个浏览器标签页订阅）。
 """
 import json
 import logging
 import time
 import queue
 import threading
-from typing import Dict, Any, Optional, Generator
+import uuid
+from typing import Dict, Any, List, Optional, Generator, Set
 from datetime import datetime
 from flask import Response
 from app.services.network_cache_service import network_cache_service
@@ -15,6 +20,14 @@ from app.extensions import db
 
 logger = logging.getLogger(__name__)
 
+# 探测事件频道前缀（按探测任务划分频道）
+PROBE_EVENT_CHANNEL_PREFIX = 'network:probe:events'
+
+
+def get_probe_event_channel(probe_id: int) -> str:
+    """获取探测任务事件频道"""
+    return f"{PROBE_EVENT_CHANNEL_PREFIX}:{probe_id}"
+
 
 class SSEConnection:
     """SSE 连接对象"""
@@ -27,6 +40,7 @@ class SSEConnection:
             probe_id: 探测任务 ID
             tenant_id: 租户 ID
         """
+        self.connection_id = uuid.uuid4().hex
         self.probe_id = probe_id
         self.tenant_id = tenant_id
         self.message_queue = queue.Queue(maxsize=100)
@@ -34,7 +48,7 @@ class SSEConnection:
         self.created_at = datetime.utcnow()
         self.last_activity = datetime.utcnow()
         
-        logger.info(f"SSE 连接已创建: probe_id={probe_id}, tenant_id={tenant_id}")
+        logger.info(f"SSE 连接已创建: probe_id={probe_id}, tenant_id={tenant_id}, connection_id={self.connection_id}")
     
     def send_message(self, event: str, data: Dict[str, Any]) -> bool:
         """
@@ -51,63 +65,208 @@ class SSEConnection:
             logger.warning(f"SSE 连接已关闭，无法发送消息: probe_id={self.probe_id}")
             return False
         
+        message = {
+            'event': event,
+            'data': data,
+            'timestamp': datetime.utcnow().isoformat()
+        }
+        
         try:
-            message = {
-                'event': event,
-                'data': data,
-                'timestamp': datetime.utcnow().isoformat()
-            }
-            
             # 非阻塞方式放入队列
             self.message_queue.put_nowait(message)
-            self.last_activity = datetime.utcnow()
-            
-            logger.debug(f"消息已加入队列: probe_id={self.probe_id}, event={event}")
-            return True
-            
         except queue.Full:
-            logger.warning(f"消息队列已满: probe_id={self.probe_id}, event={event}")
-            return False
+            # 客户端消费过慢时丢弃最旧的消息，保证推送的是最新状态
+            try:
+                self.message_queue.get_nowait()
+                self.message_queue.put_nowait(message)
+            except (queue.Empty, queue.Full):
+                logger.warning(f"消息队列已满: probe_id={self.probe_id}, event={event}")
+                return False
         except Exception as e:
             logger.error(f"发送消息失败: probe_id={self.probe_id}, 错误: {str(e)}")
             return False
+        
+        logger.debug(f"消息已加入队列: probe_id={self.probe_id}, event={event}")
+        return True
     
     def get_message(self, timeout: float = 30.0) -> Optional[Dict[str, Any]]:
         """
-        从队列获取消息
+        从队列获取消息（阻塞直到有消息、连接关闭或超时）
         
         Args:
             timeout: 超时时间（秒）
             
         Returns:
-            Optional[Dict]: 消息数据，如果超时则返回 None
+            Optional[Dict]: 消息数据，如果超时或连接已关闭则返回 None
         """
         try:
             message = self.message_queue.get(timeout=timeout)
-            self.last_activity = datetime.utcnow()
-            return message
         except queue.Empty:
             return None
         except Exception as e:
             logger.error(f"获取消息失败: probe_id={self.probe_id}, 错误: {str(e)}")
             return None
+        
+        if message is None:
+            # 关闭哨兵
+            return None
+        
+        self.last_activity = datetime.utcnow()
+        return message
+    
+    def touch(self):
+        """刷新活动时间（发送心跳时调用）"""
+        self.last_activity = datetime.utcnow()
     
     def close(self):
-        """关闭连接"""
+        """关闭连接，并唤醒阻塞在队列上的 SSE 流"""
+        if not self.is_active:
+            return
         self.is_active = False
-        logger.info(f"SSE 连接已关闭: probe_id={self.probe_id}")
+        try:
+            self.message_queue.put_nowait(None)
+        except queue.Full:
+            pass
+        logger.info(f"SSE 连接已关闭: probe_id={self.probe_id}, connection_id={self.connection_id}")
+
+
+class ProbeEventBus:
+    """
+    基于 Redis pub/sub 的探测事件总线
+    
+    每个进程一个订阅线程，只订阅本进程存在 SSE 连接的探测任务频道。
+    PubSub 对象不是线程安全的，订阅/退订请求经由队列交给订阅线程执行。
+    """
+    
+    def __init__(self, on_message):
+        """
+        Args:
+            on_message: 收到事件时的回调 (probe_id, payload)
+        """
+        self._on_message = on_message
+        self._redis = None
+        self._channels: Set[str] = set()
+        self._commands: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+    
+    @property
+    def redis(self):
+        """延迟获取 Redis 客户端"""
+        if self._redis is None:
+            from app.extensions import redis_client, get_redis_client
+            self._redis = redis_client or get_redis_client()
+        return self._redis
+    
+    def _ensure_started(self):
+        """按需启动订阅线程"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._listen, name='probe-event-bus', daemon=True)
+                self._thread.start()
+                logger.info("探测事件订阅线程已启动")
+    
+    def subscribe(self, probe_id: int):
+        """订阅探测任务频道"""
+        self._ensure_started()
+        self._commands.put(('subscribe', get_probe_event_channel(probe_id)))
+    
+    def unsubscribe(self, probe_id: int):
+        """退订探测任务频道"""
+        self._commands.put(('unsubscribe', get_probe_event_channel(probe_id)))
+    
+    def publish(self, probe_id: int, payload: Dict[str, Any]) -> int:
+        """
+        发布事件
+        
+        Returns:
+            int: 收到该事件的订阅进程数
+        """
+        return self.redis.publish(get_probe_event_channel(probe_id), json.dumps(payload, ensure_ascii=False))
+    
+    def publish_many(self, events: List[Dict[str, Any]]):
+        """在一个 pipeline 中发布多条事件（每条事件需包含 probe_id）"""
+        if not events:
+            return
+        pipe = self.redis.pipeline(transaction=False)
+        for payload in events:
+            pipe.publish(get_probe_event_channel(payload['probe_id']), json.dumps(payload, ensure_ascii=False))
+        pipe.execute()
+    
+    def _apply_commands(self, pubsub, block: bool = False):
+        """执行排队的订阅/退订请求（block 为 True 时最多等待 1 秒）"""
+        while True:
+            try:
+                if block:
+                    action, channel = self._commands.get(timeout=1.0)
+                    block = False
+                else:
+                    action, channel = self._commands.get_nowait()
+            except queue.Empty:
+                return
+            if action == 'subscribe':
+                self._channels.add(channel)
+                pubsub.subscribe(channel)
+            else:
+                self._channels.discard(channel)
+                pubsub.unsubscribe(channel)
+    
+    def _listen(self):
+        """订阅线程主循环，断线后重连并恢复订阅"""
+        from app.extensions import get_redis_client
+        
+        backoff = 1
+        while True:
+            pubsub = None
+            try:
+                # 订阅连接需要独占，不与业务命令共用
+                pubsub = get_redis_client().pubsub(ignore_subscribe_messages=True)
+                if self._channels:
+                    pubsub.subscribe(*self._channels)
+                backoff = 1
+                
+                while True:
+                    # 没有订阅频道时 get_message 会立即返回，改为阻塞等待新的订阅请求
+                    self._apply_commands(pubsub, block=not pubsub.subscribed)
+                    if not pubsub.subscribed:
+                        continue
+                    
+                    message = pubsub.get_message(timeout=1.0)
+                    if not message or message.get('type') != 'message':
+                        continue
+                    
+                    try:
+                        payload = json.loads(message['data'])
+                        self._on_message(payload)
+                    except Exception as e:
+                        logger.error(f"处理探测事件失败: {str(e)}")
+                        
+            except Exception as e:
+                logger.error(f"探测事件订阅连接异常，{backoff} 秒后重连: {str(e)}")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
 
 
 class NetworkSSEService:
     """网络探测 SSE 实时推送服务类"""
     
+    HEARTBEAT_INTERVAL = 30  # 心跳间隔（秒）
+    
     def __init__(self):
         """初始化 SSE 服务"""
-        self.connections: Dict[str, SSEConnection] = {}
+        # 连接键 -> {connection_id: SSEConnection}
+        self.connections: Dict[str, Dict[str, SSEConnection]] = {}
+        # 探测任务 ID -> 本进程内的连接数（不区分租户），决定是否订阅该探测频道
+        self._probe_consumers: Dict[int, int] = {}
         self.lock = threading.Lock()
-        
-        # 启动清理线程
-        self._start_cleanup_thread()
+        self.event_bus = ProbeEventBus(self._dispatch_event)
+        self._cleanup_started = False
         
         logger.info("网络探测 SSE 服务已初始化")
     
@@ -136,90 +295,157 @@ class NetworkSSEService:
             SSEConnection: SSE 连接对象
         """
         connection_key = self._get_connection_key(probe_id, tenant_id)
+        connection = SSEConnection(probe_id, tenant_id)
         
         with self.lock:
-            # 如果已存在连接，先关闭旧连接
-            if connection_key in self.connections:
-                old_connection = self.connections[connection_key]
-                old_connection.close()
-                logger.info(f"关闭旧的 SSE 连接: {connection_key}")
+            if not self._cleanup_started:
+                self._start_cleanup_thread()
+                self._cleanup_started = True
             
-            # 创建新连接
-            connection = SSEConnection(probe_id, tenant_id)
-            self.connections[connection_key] = connection
+            consumers = self.connections.setdefault(connection_key, {})
+            consumers[connection.connection_id] = connection
             
-            logger.info(f"创建新的 SSE 连接: {connection_key}, 当前连接数: {len(self.connections)}")
+            # 订阅/退订与连接计数在同一把锁内排队，保证订阅线程按计数变化的顺序执行
+            self._probe_consumers[probe_id] = self._probe_consumers.get(probe_id, 0) + 1
+            if self._probe_consumers[probe_id] == 1:
+                self.event_bus.subscribe(probe_id)
             
-            return connection
+            logger.info(f"创建新的 SSE 连接: {connection_key}, 该探测连接数: {len(consumers)}")
+        
+        return connection
     
-    def get_connection(self, probe_id: int, tenant_id: int) -> Optional[SSEConnection]:
+    def get_connections(self, probe_id: int, tenant_id: int) -> List[SSEConnection]:
         """
-        获取 SSE 连接
+        获取探测任务在本进程内的所有 SSE 连接
         
         Args:
             probe_id: 探测任务 ID
             tenant_id: 租户 ID
             
         Returns:
-            Optional[SSEConnection]: SSE 连接对象，如果不存在则返回 None
+            List[SSEConnection]: SSE 连接列表
         """
         connection_key = self._get_connection_key(probe_id, tenant_id)
         
         with self.lock:
-            return self.connections.get(connection_key)
+            return list(self.connections.get(connection_key, {}).values())
     
-    def remove_connection(self, probe_id: int, tenant_id: int):
+    def remove_connection(self, connection: SSEConnection):
         """
         移除 SSE 连接
         
         Args:
-            probe_id: 探测任务 ID
-            tenant_id: 租户 ID
+            connection: SSE 连接对象
         """
-        connection_key = self._get_connection_key(probe_id, tenant_id)
+        connection_key = self._get_connection_key(connection.probe_id, connection.tenant_id)
+        connection.close()
         
         with self.lock:
-            if connection_key in self.connections:
-                connection = self.connections[connection_key]
-                connection.close()
+            consumers = self.connections.get(connection_key)
+            if consumers is None or consumers.pop(connection.connection_id, None) is None:
+                return
+            
+            if not consumers:
                 del self.connections[connection_key]
-                
-                logger.info(f"移除 SSE 连接: {connection_key}, 剩余连接数: {len(self.connections)}")
+            
+            remaining = self._probe_consumers.get(connection.probe_id, 1) - 1
+            if remaining > 0:
+                self._probe_consumers[connection.probe_id] = remaining
+            else:
+                self._probe_consumers.pop(connection.probe_id, None)
+                self.event_bus.unsubscribe(connection.probe_id)
+            
+            logger.info(f"移除 SSE 连接: {connection_key}, 该探测剩余连接数: {len(consumers)}")
+    
+    def _dispatch_event(self, payload: Dict[str, Any]):
+        """
+        订阅线程回调：将事件分发给本进程内的所有相关连接
+        
+        Args:
+            payload: 事件 {'probe_id', 'tenant_id', 'event', 'data'}
+        """
+        connections = self.get_connections(payload['probe_id'], payload['tenant_id'])
+        for connection in connections:
+            if connection.is_active:
+                connection.send_message(payload['event'], payload['data'])
+        
+        if connections:
+            logger.debug(
+                f"探测事件已分发: probe_id={payload['probe_id']}, event={payload['event']}, "
+                f"连接数={len(connections)}"
+            )
     
-    def broadcast_probe_result(self, probe_id: int, result_data: Dict[str, Any]):
+    def publish_event(self, probe_id: int, tenant_id: int, event: str, data: Dict[str, Any]) -> bool:
+        """
+        发布探测事件到所有 Web 进程
+        
+        Args:
+            probe_id: 探测任务 ID
+            tenant_id: 租户 ID
+            event: 事件类型
+            data: 消息数据
+            
+        Returns:
+            bool: 是否发布成功
+        """
+        payload = {'probe_id': probe_id, 'tenant_id': tenant_id, 'event': event, 'data': data}
+        try:
+            self.event_bus.publish(probe_id, payload)
+            return True
+        except Exception as e:
+            # Redis 不可用时退化为仅推送本进程内的连接
+            logger.warning(f"发布探测事件失败，仅推送本进程连接: probe_id={probe_id}, 错误: {str(e)}")
+            self._dispatch_event(payload)
+            return False
+    
+    def publish_probe_results(self, results: List[Dict[str, Any]]):
+        """
+        批量发布探测结果事件（供 Celery Worker 写入结果后调用）
+        
+        Args:
+            results: 探测结果数据列表，每项需包含 probe_id 与 tenant_id
+        """
+        events = [
+            {
+                'probe_id': result['probe_id'],
+                'tenant_id': result['tenant_id'],
+                'event': 'probe_result',
+                'data': self._format_probe_result(result)
+            }
+            for result in results
+            if result.get('probe_id') is not None and result.get('tenant_id') is not None
+        ]
+        if not events:
+            return
+        
+        try:
+            self.event_bus.publish_many(events)
+        except Exception as e:
+            logger.warning(f"批量发布探测结果失败: {len(events)} 条, 错误: {str(e)}")
+    
+    def broadcast_probe_result(self, probe_id: int, result_data: Dict[str, Any], tenant_id: Optional[int] = None):
         """
         广播探测结果到所有相关连接
         
         Args:
             probe_id: 探测任务 ID
             result_data: 探测结果数据
+            tenant_id: 租户 ID（未提供时从结果数据或数据库获取）
         """
-        # 获取探测任务的租户 ID
         try:
-            probe = NetworkProbe.query.get(probe_id)
-            if not probe:
-                logger.warning(f"探测任务不存在: probe_id={probe_id}")
-                return
-            
-            tenant_id = probe.tenant_id
-            connection = self.get_connection(probe_id, tenant_id)
-            
-            if connection and connection.is_active:
-                # 格式化推送数据
-                formatted_data = self._format_probe_result(result_data)
-                
-                # 发送消息
-                success = connection.send_message('probe_result', formatted_data)
-                
-                if success:
-                    logger.info(f"探测结果已推送: probe_id={probe_id}, tenant_id={tenant_id}")
-                    
-                    # 同步到 Redis 缓存
-                    network_cache_service.sync_probe_result_to_cache(probe_id, result_data)
-                else:
-                    logger.warning(f"探测结果推送失败: probe_id={probe_id}")
-            else:
-                logger.debug(f"无活跃的 SSE 连接: probe_id={probe_id}, tenant_id={tenant_id}")
+            tenant_id = tenant_id or result_data.get('tenant_id')
+            if tenant_id is None:
+                probe = NetworkProbe.query.get(probe_id)
+                if not probe:
+                    logger.warning(f"探测任务不存在: probe_id={probe_id}")
+                    return
+                tenant_id = probe.tenant_id
+            
+            self.publish_event(probe_id, tenant_id, 'probe_result', self._format_probe_result(result_data))
+            logger.info(f"探测结果已推送: probe_id={probe_id}, tenant_id={tenant_id}")
+            
+            # 同步到 Redis 缓存
+            network_cache_service.sync_probe_result_to_cache(probe_id, result_data)
                 
         except Exception as e:
             logger.error(f"广播探测结果失败: probe_id={probe_id}, 错误: {str(e)}")
@@ -234,27 +460,18 @@ class NetworkSSEService:
             status: 状态值
             message: 状态消息
         """
-        connection = self.get_connection(probe_id, tenant_id)
+        status_data = {
+            'probe_id': probe_id,
+            'status': status,
+            'message': message,
+            'timestamp': datetime.utcnow().isoformat()
+        }
         
-        if connection and connection.is_active:
-            status_data = {
-                'probe_id': probe_id,
-                'status': status,
-                'message': message,
-                'timestamp': datetime.utcnow().isoformat()
-            }
-            
-            success = connection.send_message('probe_status', status_data)
-            
-            if success:
-                logger.info(f"探测状态已推送: probe_id={probe_id}, status={status}")
-                
-                # 更新 Redis 缓存中的状态
-                network_cache_service.update_probe_status(probe_id, status)
-            else:
-                logger.warning(f"探测状态推送失败: probe_id={probe_id}")
-        else:
-            logger.debug(f"无活跃的 SSE 连接: probe_id={probe_id}, tenant_id={tenant_id}")
+        self.publish_event(probe_id, tenant_id, 'probe_status', status_data)
+        logger.info(f"探测状态已推送: probe_id={probe_id}, status={status}")
+        
+        # 更新 Redis 缓存中的状态
+        network_cache_service.update_probe_status(probe_id, status)
     
     def broadcast_probe_error(self, probe_id: int, tenant_id: int, error_message: str):
         """
@@ -265,23 +482,14 @@ class NetworkSSEService:
             tenant_id: 租户 ID
             error_message: 错误消息
         """
-        connection = self.get_connection(probe_id, tenant_id)
+        error_data = {
+            'probe_id': probe_id,
+            'error': error_message,
+            'timestamp': datetime.utcnow().isoformat()
+        }
         
-        if connection and connection.is_active:
-            error_data = {
-                'probe_id': probe_id,
-                'error': error_message,
-                'timestamp': datetime.utcnow().isoformat()
-            }
-            
-            success = connection.send_message('probe_error', error_data)
-            
-            if success:
-                logger.info(f"探测错误已推送: probe_id={probe_id}")
-            else:
-                logger.warning(f"探测错误推送失败: probe_id={probe_id}")
-        else:
-            logger.debug(f"无活跃的 SSE 连接: probe_id={probe_id}, tenant_id={tenant_id}")
+        self.publish_event(probe_id, tenant_id, 'probe_error', error_data)
+        logger.info(f"探测错误已推送: probe_id={probe_id}")
     
     def _format_probe_result(self, result_data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -338,26 +546,22 @@ class NetworkSSEService:
             if recent_result:
                 yield self._format_sse_message('probe_result', recent_result)
             
-            # 持续监听消息
-            heartbeat_interval = 30  # 心跳间隔（秒）
+            # 阻塞等待本地队列中的消息，直到需要发送心跳
             last_heartbeat = time.time()
             
             while connection.is_active:
-                # 获取消息（带超时）
-                message = connection.get_message(timeout=5.0)
+                wait = max(self.HEARTBEAT_INTERVAL - (time.time() - last_heartbeat), 0.1)
+                message = connection.get_message(timeout=wait)
                 
                 if message:
-                    # 发送消息
                     yield self._format_sse_message(message['event'], message['data'])
                     last_heartbeat = time.time()
-                else:
-                    # 发送心跳消息
-                    current_time = time.time()
-                    if current_time - last_heartbeat >= heartbeat_interval:
-                        yield self._format_sse_message('heartbeat', {
-                            'timestamp': datetime.utcnow().isoformat()
-                        })
-                        last_heartbeat = current_time
+                elif connection.is_active:
+                    yield self._format_sse_message('heartbeat', {
+                        'timestamp': datetime.utcnow().isoformat()
+                    })
+                    connection.touch()
+                    last_heartbeat = time.time()
                 
         except GeneratorExit:
             logger.info(f"SSE 客户端断开连接: probe_id={probe_id}, tenant_id={tenant_id}")
@@ -369,7 +573,7 @@ class NetworkSSEService:
             })
         finally:
             # 清理连接
-            self.remove_connection(probe_id, tenant_id)
+            self.remove_connection(connection)
     
     def _format_sse_message(self, event: str, data: Dict[str, Any]) -> str:
         """
@@ -473,24 +677,23 @@ class NetworkSSEService:
                     time.sleep(60)  # 每分钟检查一次
                     
                     current_time = datetime.utcnow()
-                    inactive_keys = []
+                    inactive_connections = []
                     
                     with self.lock:
-                        for key, connection in self.connections.items():
-                            # 如果连接超过 5 分钟没有活动，标记为不活跃
-                            inactive_duration = (current_time - connection.last_activity).total_seconds()
-                            if inactive_duration > 300:  # 5 分钟
-                                inactive_keys.append(key)
-                        
-                        # 移除不活跃的连接
-                        for key in inactive_keys:
-                            connection = self.connections[key]
-                            connection.close()
-                            del self.connections[key]
-                            logger.info(f"清理不活跃的 SSE 连接: {key}")
+                        for consumers in self.connections.values():
+                            for connection in consumers.values():
+                                # 如果连接超过 5 分钟没有活动（含心跳），标记为不活跃
+                                inactive_duration = (current_time - connection.last_activity).total_seconds()
+                                if inactive_duration > 300 or not connection.is_active:  # 5 分钟
+                                    inactive_connections.append(connection)
+                    
+                    # 移除不活跃的连接
+                    for connection in inactive_connections:
+                        self.remove_connection(connection)
+                        logger.info(f"清理不活跃的 SSE 连接: probe_id={connection.probe_id}")
                     
-                    if inactive_keys:
-                        logger.info(f"清理了 {len(inactive_keys)} 个不活跃的 SSE 连接")
+                    if inactive_connections:
+                        logger.info(f"清理了 {len(inactive_connections)} 个不活跃的 SSE 连接")
                         
                 except Exception as e:
                     logger.error(f"清理 SSE 连接时出错: {str(e)}")
@@ -508,12 +711,14 @@ class NetworkSSEService:
             Dict: 统计信息
         """
         with self.lock:
-            active_connections = sum(1 for conn in self.connections.values() if conn.is_active)
+            all_connections = [conn for consumers in self.connections.values() for conn in consumers.values()]
+            active_connections = sum(1 for conn in all_connections if conn.is_active)
             
             return {
-                'total_connections': len(self.connections),
+                'total_connections': len(all_connections),
                 'active_connections': active_connections,
-                'inactive_connections': len(self.connections) - active_connections,
+                'inactive_connections': len(all_connections) - active_connections,
+                'subscribed_probes': len(self.connections),
                 'timestamp': datetime.utcnow().isoformat()
             }
 
@@ -7,8 +7,13 @@ Redis 连接管理器
 Requirements: 2.1, 2.4, 2.5
 """
 import json
+import hashlib
 import logging
-from typing import Dict, Optional, Tuple, Union
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple, Union
 from threading import Lock
 
 import redis
@@ -20,10 +25,14 @@ from redis.exceptions import (
     ClusterError,
 )
 
+from app.core.config_manager import config_manager
 from app.models.redis_connection import RedisConnection
 
 logger = logging.getLogger(__name__)
 
+# 连接配置变更通知频道，消息内容为连接键 "{tenant_id}:{conn_id}"
+CONFIG_CHANGED_CHANNEL = 'redis_management:connection_config_changed'
+
 
 class RedisError(Exception):
     """Redis 操作基础异常"""
@@ -45,12 +54,102 @@ class RedisTimeoutException(RedisError):
     pass
 
 
+def _iter_client_pools(client: Union[redis.Redis, RedisCluster]):
+    """遍历客户端使用的连接池（集群模式为每个节点的连接池）"""
+    if isinstance(client, RedisCluster):
+        for node in client.get_nodes():
+            if node.redis_connection is not None:
+                yield node.redis_connection.connection_pool
+    else:
+        yield client.connection_pool
+
+
+def _close_client(client: Union[redis.Redis, RedisCluster]):
+    """
+    关闭客户端并断开其连接池
+    
+    redis-py 的 Redis.close() 只在自建连接池时断开连接，显式传入的
+    BlockingConnectionPool 需要单独 disconnect，否则连接一直保留到进程退出。
+    """
+    pools = list(_iter_client_pools(client))
+    try:
+        client.close()
+    finally:
+        for pool in pools:
+            pool.disconnect()
+
+
+class PooledRedisClient:
+    """
+    连接池缓存条目
+    
+    记录一个连接配置对应的客户端（及其连接池）、创建时的配置指纹和使用统计。
+    """
+    
+    def __init__(self, client: Union[redis.Redis, RedisCluster], fingerprint: str):
+        self.client = client
+        self.fingerprint = fingerprint
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.last_health_check: Optional[float] = None
+        self.errors = 0  # 健康检查失败累计次数
+        self.consecutive_failures = 0
+    
+    def touch(self):
+        self.last_used = time.time()
+    
+    def _iter_pools(self):
+        return _iter_client_pools(self.client)
+    
+    def close(self):
+        """关闭客户端并断开其连接池中的所有连接"""
+        _close_client(self.client)
+    
+    @staticmethod
+    def _pool_usage(pool) -> Tuple[int, int, int]:
+        """返回连接池的 (已创建, 使用中, 空闲) 连接数"""
+        if isinstance(pool, redis.BlockingConnectionPool):
+            created = len([conn for conn in pool._connections if conn is not None])
+            idle = len([conn for conn in list(pool.pool.queue) if conn is not None])
+            return created, max(created - idle, 0), idle
+        return pool._created_connections, len(pool._in_use_connections), len(pool._available_connections)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取连接池统计"""
+        created = in_use = idle = 0
+        for pool in self._iter_pools():
+            try:
+                pool_created, pool_in_use, pool_idle = self._pool_usage(pool)
+            except Exception:
+                continue
+            created += pool_created
+            in_use += pool_in_use
+            idle += pool_idle
+        
+        return {
+            'in_use': in_use,
+            'idle': idle,
+            'created': created,
+            'errors': self.errors,
+            'consecutive_failures': self.consecutive_failures,
+            'created_at': datetime.fromtimestamp(self.created_at).isoformat(),
+            'last_used': datetime.fromtimestamp(self.last_used).isoformat(),
+            'last_health_check': (
+                datetime.fromtimestamp(self.last_health_check).isoformat()
+                if self.last_health_check else None
+            )
+        }
+
+
 class RedisConnectionManager:
     """
     Redis 连接管理器
     
     管理活跃的 Redis 连接，支持单机和集群模式。
-    使用连接池管理连接，确保连接复用和资源释放。
+    每个连接配置对应一个客户端及其连接池，以有界 LRU 缓存：超过 max_pools 时
+    关闭最久未使用的连接池，后台线程定期关闭空闲连接池并对其余连接池做健康检查。
+    解密后的连接配置在内存中缓存 config_ttl 秒，连接配置更新或删除时通过 Redis pub/sub
+    通知所有进程立即失效；缓存过期后重新读取配置，配置未变化则继续复用原连接池。
     
     连接键格式: "{tenant_id}:{conn_id}"
     """
@@ -72,8 +171,23 @@ class RedisConnectionManager:
         if self._initialized:
             return
         
-        self._connections: Dict[str, Union[redis.Redis, RedisCluster]] = {}
+        pool_config = config_manager.get_app_config().get('redis_management', {}).get('connection_pool', {})
+        self.max_pools = pool_config.get('max_pools', 50)  # 最多缓存的连接池数量
+        self.max_connections = pool_config.get('max_connections', 20)  # 单个连接池最大连接数
+        self.pool_timeout = pool_config.get('pool_timeout', 5)  # 连接池耗尽时等待空闲连接的时间（秒）
+        self.idle_timeout = pool_config.get('idle_timeout', 600)  # 连接池空闲关闭时间（秒）
+        self.health_check_interval = pool_config.get('health_check_interval', 30)  # 健康检查间隔（秒）
+        self.max_health_failures = pool_config.get('max_health_failures', 3)  # 连续失败次数达到后关闭连接池
+        self.config_ttl = pool_config.get('config_ttl', 60)  # 连接配置缓存时间（秒）
+        
+        self._connections: 'OrderedDict[str, PooledRedisClient]' = OrderedDict()
+        self._configs: Dict[str, Tuple[Dict[str, Any], float]] = {}
         self._connection_lock = Lock()
+        self._create_locks: Dict[str, Lock] = {}
+        self._evictions = 0
+        self._health_thread: Optional[threading.Thread] = None
+        self._listener_thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
         self._initialized = True
         logger.info("Redis Connection Manager initialized")
     
@@ -119,7 +233,8 @@ class RedisConnectionManager:
             # 处理密码：如果密码为空字符串或 None，不设置密码
             redis_password = password if password and password.strip() else None
             
-            client = redis.Redis(
+            # 有界阻塞连接池：连接耗尽时等待 pool_timeout 秒，而不是无限创建连接
+            pool = redis.BlockingConnectionPool(
                 host=host,
                 port=port,
                 password=redis_password,
@@ -128,7 +243,11 @@ class RedisConnectionManager:
                 socket_connect_timeout=timeout,
                 decode_responses=True,
                 retry_on_timeout=True,
+                health_check_interval=self.health_check_interval,
+                max_connections=self.max_connections,
+                timeout=self.pool_timeout,
             )
+            client = redis.Redis(connection_pool=pool)
             # 测试连接
             client.ping()
             logger.info(f"Connected to Redis standalone at {host}:{port}")
@@ -209,6 +328,8 @@ class RedisConnectionManager:
                 socket_connect_timeout=timeout,
                 decode_responses=True,
                 skip_full_coverage_check=True,
+                health_check_interval=self.health_check_interval,
+                max_connections=self.max_connections,
             )
             # 测试连接
             client.ping()
@@ -236,21 +357,146 @@ class RedisConnectionManager:
             logger.error(f"Unexpected error connecting to Redis cluster: {e}")
             raise RedisConnectionException(f"集群连接失败: {str(e)}")
     
+    # ==================== 连接配置缓存 ====================
+    
+    @staticmethod
+    def _snapshot_config(connection_config: Union[RedisConnection, Dict[str, Any]]) -> Dict[str, Any]:
+        """提取建立连接所需的配置字段（密码应已解密）"""
+        if isinstance(connection_config, dict):
+            return dict(connection_config)
+        return {
+            'connection_type': connection_config.connection_type,
+            'host': connection_config.host,
+            'port': connection_config.port,
+            'password': connection_config.password,
+            'database': connection_config.database,
+            'cluster_nodes': connection_config.cluster_nodes,
+            'timeout': connection_config.timeout,
+            'status': connection_config.status,
+        }
+    
+    @staticmethod
+    def _fingerprint(settings: Dict[str, Any]) -> str:
+        """连接配置指纹，用于判断缓存的连接池是否仍与配置一致"""
+        raw = json.dumps(
+            {field: value for field, value in settings.items() if field != 'status'},
+            sort_keys=True, default=str
+        )
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+    
+    def _get_cached_config(self, connection_key: str) -> Optional[Dict[str, Any]]:
+        """获取未过期的缓存配置（需持有 _connection_lock）"""
+        cached = self._configs.get(connection_key)
+        if cached is None:
+            return None
+        settings, loaded_at = cached
+        if time.time() - loaded_at >= self.config_ttl:
+            return None
+        return settings
+    
+    def invalidate_config(self, conn_id: int, tenant_id: int) -> bool:
+        """
+        使缓存的连接配置失效并关闭对应连接池（连接配置更新或删除时调用）
+        
+        Args:
+            conn_id: 连接配置 ID
+            tenant_id: 租户 ID
+            
+        Returns:
+            bool: 是否关闭了连接池
+        """
+        connection_key = self._get_connection_key(conn_id, tenant_id)
+        
+        with self._connection_lock:
+            self._configs.pop(connection_key, None)
+            return self._close_client_internal(connection_key)
+    
+    def notify_config_changed(self, conn_id: int, tenant_id: int):
+        """连接配置更新或删除后使本进程缓存失效，并通知其他进程"""
+        self.invalidate_config(conn_id, tenant_id)
+        try:
+            from app.extensions import redis_client, get_redis_client
+            (redis_client or get_redis_client()).publish(
+                CONFIG_CHANGED_CHANNEL, self._get_connection_key(conn_id, tenant_id)
+            )
+        except Exception as e:
+            # 通知失败时其他进程在配置缓存过期后生效
+            logger.warning(f"Failed to publish Redis connection config change: {e}")
+    
+    def _ensure_config_listener(self):
+        """按需启动连接配置变更订阅线程"""
+        if self._listener_thread is not None and self._listener_thread.is_alive():
+            return
+        with self._connection_lock:
+            if self._listener_thread is None or not self._listener_thread.is_alive():
+                self._listener_thread = threading.Thread(
+                    target=self._listen_config_changes,
+                    name='redis-config-listener',
+                    daemon=True
+                )
+                self._listener_thread.start()
+    
+    def _listen_config_changes(self):
+        """订阅连接配置变更通知，断线后重连"""
+        from app.extensions import get_redis_client
+        
+        backoff = 1
+        while not self._stop_event.is_set():
+            pubsub = None
+            try:
+                # 订阅连接需要独占，不与业务命令共用
+                pubsub = get_redis_client().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CONFIG_CHANGED_CHANNEL)
+                backoff = 1
+                
+                # 断线期间可能错过通知，重新订阅后丢弃所有缓存配置（配置未变化的连接池仍会复用）
+                with self._connection_lock:
+                    self._configs.clear()
+                
+                while not self._stop_event.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if not message or message.get('type') != 'message':
+                        continue
+                    tenant_id, _, conn_id = str(message['data']).partition(':')
+                    try:
+                        self.invalidate_config(int(conn_id), int(tenant_id))
+                    except (TypeError, ValueError):
+                        continue
+                    logger.debug(f"Redis connection config changed: {message['data']}")
+                    
+            except Exception as e:
+                logger.error(f"Redis connection config listener error, reconnecting in {backoff}s: {e}")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+    
+    # ==================== 客户端获取 ====================
+    
     def get_client(
         self,
         conn_id: int,
         tenant_id: int,
-        connection_config: Optional[RedisConnection] = None
+        connection_config: Optional[Union[RedisConnection, Dict[str, Any]]] = None,
+        config_loader: Optional[Callable[[], Union[RedisConnection, Dict[str, Any], None]]] = None
     ) -> Union[redis.Redis, RedisCluster]:
         """
         获取 Redis 客户端
         
-        如果连接已存在且有效，返回现有连接；否则创建新连接。
+        连接配置缓存未过期且已有连接池时直接返回（不查询数据库、不发送 PING，
+        连接有效性由连接池的 health_check_interval 和后台健康检查保证）；
+        否则重新获取配置，配置未变化时复用原连接池，变化时重建连接池。
         
         Args:
             conn_id: 连接配置 ID
             tenant_id: 租户 ID
-            connection_config: 连接配置对象（可选，如果不提供则从数据库查询）
+            connection_config: 连接配置（可选，密码需已解密）
+            config_loader: 配置加载函数（可选，缓存过期时调用，返回密码已解密的配置）；
+                两者都不提供时从数据库查询
             
         Returns:
             Union[redis.Redis, RedisCluster]: Redis 客户端实例
@@ -261,52 +507,99 @@ class RedisConnectionManager:
             ValueError: 连接配置不存在
         """
         connection_key = self._get_connection_key(conn_id, tenant_id)
+        self._ensure_health_thread()
+        self._ensure_config_listener()
         
         with self._connection_lock:
-            # 检查是否已有连接
-            if connection_key in self._connections:
-                client = self._connections[connection_key]
-                try:
-                    # 验证连接是否有效
-                    client.ping()
-                    return client
-                except Exception as e:
-                    logger.warning(f"Existing connection invalid, reconnecting: {e}")
-                    # 连接无效，移除并重新创建
-                    self._close_client_internal(connection_key)
-            
-            # 获取连接配置
-            if connection_config is None:
-                connection_config = RedisConnection.get_by_tenant(conn_id, tenant_id)
-                if connection_config is None:
+            entry = self._connections.get(connection_key)
+            settings = self._get_cached_config(connection_key)
+            if entry is not None and settings is not None and connection_config is None:
+                self._connections.move_to_end(connection_key)
+                entry.touch()
+                return entry.client
+            create_lock = self._create_locks.setdefault(connection_key, Lock())
+        
+        # 同一连接的创建串行进行，不阻塞其他连接的获取
+        with create_lock:
+            if connection_config is not None:
+                settings = self._snapshot_config(connection_config)
+            elif settings is None:
+                loaded = config_loader() if config_loader else RedisConnection.get_by_tenant(conn_id, tenant_id)
+                if loaded is None:
                     raise ValueError(f"连接配置不存在: ID={conn_id}")
+                settings = self._snapshot_config(loaded)
             
             # 检查连接配置状态
-            if connection_config.status != 1:
+            if settings.get('status') != 1:
+                self.invalidate_config(conn_id, tenant_id)
                 raise RedisConnectionException("连接配置已禁用")
             
+            fingerprint = self._fingerprint(settings)
+            with self._connection_lock:
+                self._configs[connection_key] = (settings, time.time())
+                entry = self._connections.get(connection_key)
+                if entry is not None and entry.fingerprint == fingerprint:
+                    self._connections.move_to_end(connection_key)
+                    entry.touch()
+                    return entry.client
+            
             # 根据连接类型创建客户端
-            if connection_config.connection_type == 'cluster':
+            if settings.get('connection_type') == 'cluster':
                 client = self._create_cluster_client(
-                    cluster_nodes=connection_config.cluster_nodes,
-                    password=connection_config.password,
-                    timeout=connection_config.timeout or 5
+                    cluster_nodes=settings.get('cluster_nodes'),
+                    password=settings.get('password'),
+                    timeout=settings.get('timeout') or 5
                 )
             else:
                 client = self._create_standalone_client(
-                    host=connection_config.host,
-                    port=connection_config.port or 6379,
-                    password=connection_config.password,
-                    database=connection_config.database or 0,
-                    timeout=connection_config.timeout or 5
+                    host=settings.get('host'),
+                    port=settings.get('port') or 6379,
+                    password=settings.get('password'),
+                    database=settings.get('database') or 0,
+                    timeout=settings.get('timeout') or 5
                 )
             
-            # 保存连接
-            self._connections[connection_key] = client
-            logger.info(f"Created new Redis connection: {connection_key}")
+            with self._connection_lock:
+                # 配置已变化，替换旧连接池
+                self._close_client_internal(connection_key)
+                self._connections[connection_key] = PooledRedisClient(client, fingerprint)
+                self._evict_lru()
             
+            logger.info(f"Created new Redis connection: {connection_key}")
             return client
     
+    def get_existing_client(self, conn_id: int, tenant_id: int) -> Optional[Union[redis.Redis, RedisCluster]]:
+        """
+        获取已建立且连接配置缓存未过期的 Redis 客户端（不查询连接配置、不发送 PING）
+        
+        连接断开时由客户端连接池在下一条命令时自动重连；
+        连接配置变更或删除时（包括其他进程的变更通知）会先关闭该客户端。
+        
+        Args:
+            conn_id: 连接配置 ID
+            tenant_id: 租户 ID
+            
+        Returns:
+            Optional[Union[redis.Redis, RedisCluster]]: 客户端实例，未建立连接或配置缓存过期时返回 None
+        """
+        connection_key = self._get_connection_key(conn_id, tenant_id)
+        
+        with self._connection_lock:
+            entry = self._connections.get(connection_key)
+            if entry is None or self._get_cached_config(connection_key) is None:
+                return None
+            self._connections.move_to_end(connection_key)
+            entry.touch()
+            return entry.client
+    
+    def _evict_lru(self):
+        """超过 max_pools 时关闭最久未使用的连接池（需持有 _connection_lock）"""
+        while len(self._connections) > self.max_pools:
+            connection_key = next(iter(self._connections))
+            self._close_client_internal(connection_key)
+            self._evictions += 1
+            logger.info(f"Evicted least recently used Redis pool: {connection_key}")
+    
     def _close_client_internal(self, connection_key: str) -> bool:
         """
         内部方法：关闭指定连接（不加锁）
@@ -321,8 +614,8 @@ class RedisConnectionManager:
             return False
         
         try:
-            client = self._connections.pop(connection_key)
-            client.close()
+            entry = self._connections.pop(connection_key)
+            entry.close()
             logger.info(f"Closed Redis connection: {connection_key}")
             return True
         except Exception as e:
@@ -331,7 +624,7 @@ class RedisConnectionManager:
     
     def close_client(self, conn_id: int, tenant_id: int) -> bool:
         """
-        关闭指定连接
+        关闭指定连接并清除缓存的连接配置
         
         Args:
             conn_id: 连接配置 ID
@@ -340,10 +633,7 @@ class RedisConnectionManager:
         Returns:
             bool: 是否成功关闭
         """
-        connection_key = self._get_connection_key(conn_id, tenant_id)
-        
-        with self._connection_lock:
-            return self._close_client_internal(connection_key)
+        return self.invalidate_config(conn_id, tenant_id)
     
     def close_all_clients(self, tenant_id: Optional[int] = None) -> int:
         """
@@ -370,6 +660,7 @@ class RedisConnectionManager:
                         keys_to_close.append(key)
             
             for key in keys_to_close:
+                self._configs.pop(key, None)
                 if self._close_client_internal(key):
                     closed_count += 1
         
@@ -381,6 +672,8 @@ class RedisConnectionManager:
         """
         检查连接是否有效
         
+        使用后台健康检查的结果，不在请求路径上发送 PING。
+        
         Args:
             conn_id: 连接配置 ID
             tenant_id: 租户 ID
@@ -391,16 +684,113 @@ class RedisConnectionManager:
         connection_key = self._get_connection_key(conn_id, tenant_id)
         
         with self._connection_lock:
-            if connection_key not in self._connections:
-                return False
-            
+            entry = self._connections.get(connection_key)
+            return entry is not None and entry.consecutive_failures == 0
+    
+    # ==================== 健康检查与空闲回收 ====================
+    
+    def _ensure_health_thread(self):
+        """启动后台健康检查线程（每个进程一个，延迟启动）"""
+        if self._health_thread is not None and self._health_thread.is_alive():
+            return
+        with self._connection_lock:
+            if self._health_thread is not None and self._health_thread.is_alive():
+                return
+            self._stop_event = threading.Event()
+            self._health_thread = threading.Thread(
+                target=self._health_loop, name='redis-pool-health', daemon=True
+            )
+            self._health_thread.start()
+    
+    def _health_loop(self):
+        while not self._stop_event.wait(timeout=self.health_check_interval):
             try:
-                client = self._connections[connection_key]
-                client.ping()
-                return True
+                self.run_health_checks()
             except Exception as e:
-                logger.warning(f"Connection check failed for {connection_key}: {e}")
-                return False
+                logger.error(f"Redis pool health check failed: {e}")
+    
+    def run_health_checks(self) -> Dict[str, int]:
+        """
+        关闭空闲连接池，并对其余连接池执行 PING 健康检查
+        
+        PING 在锁外执行，连续失败 max_health_failures 次的连接池被关闭，
+        下次获取时按缓存配置重建。
+        
+        Returns:
+            dict: 本轮关闭的空闲连接池数量和失败关闭的连接池数量
+        """
+        now = time.time()
+        idle_closed = 0
+        with self._connection_lock:
+            for connection_key in [key for key, entry in self._connections.items()
+                                   if now - entry.last_used >= self.idle_timeout]:
+                if self._close_client_internal(connection_key):
+                    idle_closed += 1
+            # 清理既无连接池又已过期的配置缓存
+            for connection_key in [key for key, (_, loaded_at) in self._configs.items()
+                                   if key not in self._connections and now - loaded_at >= self.config_ttl]:
+                self._configs.pop(connection_key, None)
+                self._create_locks.pop(connection_key, None)
+            entries = list(self._connections.items())
+        
+        failed_closed = 0
+        for connection_key, entry in entries:
+            try:
+                entry.client.ping()
+                entry.consecutive_failures = 0
+            except Exception as e:
+                entry.errors += 1
+                entry.consecutive_failures += 1
+                logger.warning(f"Health check failed for {connection_key}: {e}")
+            entry.last_health_check = time.time()
+            
+            if entry.consecutive_failures >= self.max_health_failures:
+                with self._connection_lock:
+                    if self._connections.get(connection_key) is entry and self._close_client_internal(connection_key):
+                        failed_closed += 1
+        
+        if idle_closed or failed_closed:
+            logger.info(f"Redis pool maintenance: closed {idle_closed} idle, {failed_closed} unhealthy")
+        return {'idle_closed': idle_closed, 'failed_closed': failed_closed}
+    
+    def shutdown(self):
+        """停止后台健康检查线程并关闭所有连接"""
+        self._stop_event.set()
+        self.close_all_clients()
+    
+    # ==================== 连接池统计 ====================
+    
+    def get_pool_stats(self, conn_id: int, tenant_id: int) -> Optional[Dict[str, Any]]:
+        """
+        获取指定连接的连接池统计
+        
+        Args:
+            conn_id: 连接配置 ID
+            tenant_id: 租户 ID
+            
+        Returns:
+            Optional[dict]: 统计信息（in_use, idle, created, errors 等），未建立连接时返回 None
+        """
+        connection_key = self._get_connection_key(conn_id, tenant_id)
+        
+        with self._connection_lock:
+            entry = self._connections.get(connection_key)
+        if entry is None:
+            return None
+        
+        stats = entry.get_stats()
+        stats['max_connections'] = self.max_connections
+        return stats
+    
+    def get_pool_overview(self) -> Dict[str, Any]:
+        """获取连接池缓存整体情况"""
+        with self._connection_lock:
+            return {
+                'pools': len(self._connections),
+                'max_pools': self.max_pools,
+                'cached_configs': len(self._configs),
+                'evictions': self._evictions
+            }
     
     def test_connection(
         self,
@@ -461,7 +851,7 @@ class RedisConnectionManager:
         finally:
             if client:
                 try:
-                    client.close()
+                    _close_client(client)
                 except Exception:
                     pass
     
@@ -0,0 +1,453 @@
+"""
+Redis 键空间分析服务
+
+由 Celery 任务分片执行：每个分片在限定时间内以 SCAN 增量扫描受管 Redis 实例，
+按批次获取键的类型、TTL 与按类型的大小（STRLEN/HLEN/LLEN/SCARD/ZCARD/XLEN），
+只对大小候选键和按键随机抽样的键执行 MEMORY USAGE，按键前缀、类型、TTL 区间
+汇总键数量与估算内存，并记录最大的键。每个分片结束时将游标与汇总结果保存到平台 Redis，
+下一个分片（或任务中断后重新启动）从保存的游标继续扫描。
+"""
+import heapq
+import json
+import logging
+import random
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from app.core.config_manager import config_manager
+
+logger = logging.getLogger(__name__)
+
+
+class KeyspaceAnalysisError(Exception):
+    """键空间分析异常"""
+    pass
+
+
+class KeyspaceSliceBusyError(KeyspaceAnalysisError):
+    """同一连接已有分析分片正在执行（调用方应稍后重试）"""
+    pass
+
+
+class RedisKeyspaceAnalyzer:
+    """Redis 键空间分析器"""
+
+    STATE_PREFIX = 'redis:keyspace:analysis'
+    LOCK_PREFIX = 'redis:keyspace:analysis:lock'
+
+    # 分析状态
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_CANCELLED = 'cancelled'
+    STATUS_FAILED = 'failed'
+
+    OTHER_PREFIX = '<other>'
+
+    # TTL 区间（上界秒数, 名称）
+    TTL_BUCKETS = (
+        (3600, '<1h'),
+        (86400, '1h-1d'),
+        (7 * 86400, '1d-7d'),
+        (30 * 86400, '7d-30d'),
+    )
+
+    # 仅当保存的状态仍属于该运行且未被取消时写入，避免分片结束时覆盖取消或重新开始
+    SAVE_IF_RUNNING_SCRIPT = """
+    local raw = redis.call('GET', KEYS[1])
+    if not raw then
+        return 0
+    end
+    local current = cjson.decode(raw)
+    if current['run_id'] ~= ARGV[2] or current['status'] ~= 'running' then
+        return 0
+    end
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+    return 1
+    """
+
+    # 仅释放自己持有的分片锁，避免锁过期后误删其他分片的锁
+    RELEASE_LOCK_SCRIPT = """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then
+        return redis.call('DEL', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, redis_client=None):
+        self._redis = redis_client
+        self._save_script = None
+        self._release_script = None
+
+        analyzer_config = config_manager.get_app_config().get('redis_management', {}).get('keyspace_analysis', {})
+        self.batch_size = analyzer_config.get('batch_size', 500)  # 每批 SCAN 的 COUNT
+        self.batch_pause_ms = analyzer_config.get('batch_pause_ms', 50)  # 批次间暂停（毫秒），避免持续占用实例
+        self.max_keys_per_second = analyzer_config.get('max_keys_per_second', 5000)  # 扫描速率上限
+        self.slice_seconds = analyzer_config.get('slice_seconds', 30)  # 单个任务分片执行时长（秒）
+        self.memory_sample_rate = analyzer_config.get('memory_sample_rate', 0.1)  # MEMORY USAGE 抽样比例
+        self.prefix_separator = analyzer_config.get('prefix_separator', ':')
+        self.prefix_depth = analyzer_config.get('prefix_depth', 2)  # 前缀取键名的前 N 段
+        self.max_prefixes = analyzer_config.get('max_prefixes', 2000)  # 最多跟踪的前缀数量
+        self.top_keys = analyzer_config.get('top_keys', 50)  # 记录最大的键数量
+        self.state_ttl = analyzer_config.get('state_ttl', 7 * 86400)  # 分析结果保留时间（秒）
+
+    @property
+    def redis(self):
+        """延迟获取平台 Redis 客户端（保存分析状态）"""
+        if self._redis is None:
+            from app.extensions import redis_client, get_redis_client
+            self._redis = redis_client or get_redis_client()
+        return self._redis
+
+    def _get_state_key(self, tenant_id: int, conn_id: int) -> str:
+        return f"{self.STATE_PREFIX}:{tenant_id}:{conn_id}"
+
+    def _get_lock_key(self, tenant_id: int, conn_id: int) -> str:
+        return f"{self.LOCK_PREFIX}:{tenant_id}:{conn_id}"
+
+    # ==================== 状态 ====================
+
+    def get_state(self, tenant_id: int, conn_id: int) -> Optional[Dict[str, Any]]:
+        """获取分析状态（含汇总结果）"""
+        raw = self.redis.get(self._get_state_key(tenant_id, conn_id))
+        return json.loads(raw) if raw else None
+
+    def _save_state(self, state: Dict[str, Any]):
+        state['updated_at'] = datetime.utcnow().isoformat()
+        self.redis.set(
+            self._get_state_key(state['tenant_id'], state['conn_id']),
+            json.dumps(state, ensure_ascii=False),
+            ex=self.state_ttl
+        )
+
+    def _save_if_running(self, state: Dict[str, Any], run_id: str) -> bool:
+        """保存分片结果，状态已被取消或重新开始时放弃写入并返回 False"""
+        if self._save_script is None:
+            self._save_script = self.redis.register_script(self.SAVE_IF_RUNNING_SCRIPT)
+        state['updated_at'] = datetime.utcnow().isoformat()
+        return bool(self._save_script(
+            keys=[self._get_state_key(state['tenant_id'], state['conn_id'])],
+            args=[json.dumps(state, ensure_ascii=False), run_id, self.state_ttl]
+        ))
+
+    def _release_lock(self, lock_key: str, token: str):
+        try:
+            if self._release_script is None:
+                self._release_script = self.redis.register_script(self.RELEASE_LOCK_SCRIPT)
+            self._release_script(keys=[lock_key], args=[token])
+        except Exception as e:
+            logger.warning(f"Failed to release keyspace analysis lock {lock_key}: {e}")
+
+    def _is_cancelled(self, tenant_id: int, conn_id: int, run_id: str) -> bool:
+        """保存的状态是否已不属于该运行（被取消、重新开始或过期）"""
+        latest = self.get_state(tenant_id, conn_id)
+        return latest is None or latest['run_id'] != run_id or latest['status'] != self.STATUS_RUNNING
+
+    def start(self, tenant_id: int, conn_id: int, pattern: str = '*', database: Optional[int] = None,
+              restart: bool = False) -> Tuple[Dict[str, Any], bool]:
+        """
+        创建或恢复分析任务
+
+        Args:
+            tenant_id: 租户 ID
+            conn_id: 连接配置 ID
+            pattern: 键名匹配模式
+            database: 数据库索引（可选，仅单机模式有效）
+            restart: 是否丢弃已有进度重新开始
+
+        Returns:
+            tuple: (分析状态, 是否需要调度分片任务)；分片链仍在正常推进时无需重复调度
+        """
+        state = self.get_state(tenant_id, conn_id)
+        resumable = state is not None and state['status'] in (self.STATUS_RUNNING, self.STATUS_FAILED)
+        if resumable and not restart:
+            if state['status'] == self.STATUS_RUNNING and self._is_progressing(state):
+                return state, False
+            state['status'] = self.STATUS_RUNNING
+            state['error'] = None
+            self._save_state(state)
+            return state, True
+
+        now = datetime.utcnow().isoformat()
+        state = {
+            'run_id': uuid.uuid4().hex,
+            'tenant_id': tenant_id,
+            'conn_id': conn_id,
+            'pattern': pattern or '*',
+            'database': database,
+            'status': self.STATUS_RUNNING,
+            'cursor': 0,
+            'scanned_keys': 0,
+            'sampled_keys': 0,
+            'estimated_bytes': 0,
+            'by_prefix': {},
+            'by_type': {},
+            'by_ttl': {},
+            'top_keys': [],
+            'size_candidates': {},
+            'started_at': now,
+            'finished_at': None,
+            'error': None
+        }
+        self._save_state(state)
+        return state, True
+
+    def _is_progressing(self, state: Dict[str, Any]) -> bool:
+        """分片链是否仍在推进（最近一个分片周期内保存过进度）"""
+        updated_at = state.get('updated_at')
+        if not updated_at:
+            return False
+        idle = (datetime.utcnow() - datetime.fromisoformat(updated_at)).total_seconds()
+        return idle < self.slice_seconds * 2 + 60
+
+    def cancel(self, tenant_id: int, conn_id: int) -> Optional[Dict[str, Any]]:
+        """
+        取消分析
+
+        正在执行的分片在下一批次开始前检查到取消后停止，不保存本分片的进度；
+        已保存的汇总结果保留
+        """
+        state = self.get_state(tenant_id, conn_id)
+        if state is None or state['status'] != self.STATUS_RUNNING:
+            return state
+        state['status'] = self.STATUS_CANCELLED
+        state['finished_at'] = datetime.utcnow().isoformat()
+        self._save_state(state)
+        return state
+
+    # ==================== 汇总 ====================
+
+    def _prefix_of(self, key: str) -> str:
+        parts = key.split(self.prefix_separator)
+        if len(parts) <= 1:
+            return key if len(key) <= 64 else self.OTHER_PREFIX
+        return self.prefix_separator.join(parts[:min(self.prefix_depth, len(parts) - 1)]) + self.prefix_separator + '*'
+
+    def _ttl_bucket(self, ttl: int) -> str:
+        if ttl is None or ttl < 0:
+            return 'no_ttl' if ttl == -1 else 'unknown'
+        for upper, name in self.TTL_BUCKETS:
+            if ttl < upper:
+                return name
+        return '>30d'
+
+    @staticmethod
+    def _accumulate(bucket: Dict[str, Dict[str, float]], name: str, count: int, size: float):
+        entry = bucket.get(name)
+        if entry is None:
+            entry = bucket[name] = {'count': 0, 'bytes': 0, 'sampled': 0}
+        entry['count'] += count
+        entry['bytes'] += size
+
+    def _select_candidates(self, state: Dict[str, Any], key_infos: List[Dict[str, Any]]) -> List[str]:
+        """
+        按类型维护大小（字符串长度或元素数量）最大的候选键，返回本批新进入候选的键
+
+        不同类型的大小单位不同，候选按类型分别保留 top_keys 个；只对候选键获取
+        MEMORY USAGE，再按实际内存选出最大的键
+        """
+        candidates = state.setdefault('size_candidates', {})
+        entered = []
+        heaps: Dict[str, List[Tuple[int, str]]] = {}
+        members: Dict[str, set] = {}
+
+        for info in key_infos:
+            size = info.get('size')
+            if size is None:
+                continue
+            key_type = info['type']
+            if key_type not in heaps:
+                heaps[key_type] = [tuple(entry) for entry in candidates.get(key_type, [])]
+                heapq.heapify(heaps[key_type])
+                members[key_type] = {key for _, key in heaps[key_type]}
+            heap, heap_members = heaps[key_type], members[key_type]
+            # SCAN 可能重复返回同一个键，已在候选中的不再加入
+            if info['key'] in heap_members:
+                continue
+            if len(heap) < self.top_keys:
+                heapq.heappush(heap, (size, info['key']))
+            elif size > heap[0][0]:
+                _, evicted = heapq.heapreplace(heap, (size, info['key']))
+                heap_members.discard(evicted)
+            else:
+                continue
+            heap_members.add(info['key'])
+            entered.append(info['key'])
+
+        for key_type, heap in heaps.items():
+            candidates[key_type] = [list(entry) for entry in heap]
+        return entered
+
+    def _apply_batch(self, state: Dict[str, Any], key_infos: List[Dict[str, Any]],
+                     memory: Dict[str, Optional[int]], sampled: set):
+        """
+        将一批键信息累加到汇总结果
+
+        Args:
+            memory: 已获取 MEMORY USAGE 的键（候选键与抽样键）-> 内存字节数
+            sampled: 按键随机抽样的键，只有这些键的内存按抽样比例放大计入估算总量
+        """
+        scale = 1.0 / self.memory_sample_rate if self.memory_sample_rate > 0 else 0
+        # 堆元素为 (内存, 键名, 信息)，键名唯一，比较不会落到信息字典上
+        top_heap = [(item['bytes'], item['key'], item) for item in state['top_keys']]
+        heapq.heapify(top_heap)
+        top_members = {item['key'] for item in state['top_keys']}
+
+        for info in key_infos:
+            key = info['key']
+            key_memory = memory.get(key)
+            sampled_memory = key_memory if key in sampled else None
+            estimated = (sampled_memory or 0) * scale
+
+            prefix = self._prefix_of(key)
+            if prefix not in state['by_prefix'] and len(state['by_prefix']) >= self.max_prefixes:
+                prefix = self.OTHER_PREFIX
+
+            for bucket, name in (
+                (state['by_prefix'], prefix),
+                (state['by_type'], info['type']),
+                (state['by_ttl'], self._ttl_bucket(info['ttl']))
+            ):
+                self._accumulate(bucket, name, 1, estimated)
+                if sampled_memory is not None:
+                    bucket[name]['sampled'] += 1
+
+            state['scanned_keys'] += 1
+            state['estimated_bytes'] += estimated
+            if sampled_memory is not None:
+                state['sampled_keys'] += 1
+
+            # 候选键和抽样键都参与最大键排名；SCAN 可能重复返回同一个键，已在列表中的不再加入
+            if key_memory is None or key in top_members:
+                continue
+            item = {'key': key, 'type': info['type'], 'ttl': info['ttl'], 'bytes': key_memory}
+            if len(top_heap) < self.top_keys:
+                heapq.heappush(top_heap, (key_memory, key, item))
+                top_members.add(key)
+            elif key_memory > top_heap[0][0]:
+                _, evicted, _ = heapq.heapreplace(top_heap, (key_memory, key, item))
+                top_members.discard(evicted)
+                top_members.add(key)
+
+        state['top_keys'] = [item for _, _, item in sorted(top_heap, key=lambda entry: entry[0], reverse=True)]
+
+    # ==================== 执行 ====================
+
+    def run_slice(self, tenant_id: int, conn_id: int, run_id: str) -> Dict[str, Any]:
+        """
+        执行一个分析分片（需在应用上下文中调用）
+
+        Returns:
+            dict: 分析状态；status 仍为 running 时需要继续调度下一个分片
+        """
+        from app.services.redis_management_service import redis_management_service
+
+        lock_key = self._get_lock_key(tenant_id, conn_id)
+        lock_token = uuid.uuid4().hex
+        if not self.redis.set(lock_key, lock_token, nx=True, ex=self.slice_seconds * 2 + 60):
+            raise KeyspaceSliceBusyError("已有分析分片正在执行")
+
+        state = None
+        try:
+            state = self.get_state(tenant_id, conn_id)
+            if state is None or state['run_id'] != run_id or state['status'] != self.STATUS_RUNNING:
+                return state or {}
+
+            deadline = time.monotonic() + self.slice_seconds
+            cursor: Union[int, str] = state['cursor']
+            min_batch_seconds = self.batch_size / self.max_keys_per_second if self.max_keys_per_second else 0
+
+            first_batch = True
+            while time.monotonic() < deadline:
+                # 分片开始时已检查过状态，之后每批次前检查是否已取消
+                if not first_batch and self._is_cancelled(tenant_id, conn_id, run_id):
+                    return self.get_state(tenant_id, conn_id) or {}
+                first_batch = False
+
+                batch_started = time.monotonic()
+
+                # 每个键都获取按类型大小；MEMORY USAGE 只对大小候选键和按键随机抽样的键执行
+                page = redis_management_service.scan_keys(
+                    conn_id=conn_id,
+                    pattern=state['pattern'],
+                    cursor=cursor,
+                    count=self.batch_size,
+                    database=state['database'],
+                    tenant_id=tenant_id,
+                    with_size=True
+                )
+                key_infos = [info for info in page['keys'] if info['type'] != 'none']  # 扫描与查询之间已被删除
+                sampled = {info['key'] for info in key_infos if random.random() < self.memory_sample_rate}
+                measure = sampled.union(self._select_candidates(state, key_infos))
+                memory = redis_management_service.get_keys_memory(
+                    conn_id=conn_id,
+                    keys=list(measure),
+                    database=state['database'],
+                    tenant_id=tenant_id
+                ) if measure else {}
+                self._apply_batch(state, key_infos, memory, sampled)
+                cursor = page['cursor']
+                state['cursor'] = cursor
+
+                if cursor in (0, '0'):
+                    state['status'] = self.STATUS_COMPLETED
+                    state['finished_at'] = datetime.utcnow().isoformat()
+                    break
+
+                # 限速：批次间固定暂停，并保证不超过每秒扫描键数上限
+                elapsed = time.monotonic() - batch_started
+                time.sleep(max(self.batch_pause_ms / 1000.0, min_batch_seconds - elapsed))
+
+            # 保存与取消检查原子执行，已被取消或重新开始时放弃本分片进度
+            if not self._save_if_running(state, run_id):
+                return self.get_state(tenant_id, conn_id) or {}
+            return state
+
+        except KeyspaceAnalysisError:
+            raise
+        except Exception as e:
+            logger.error(f"Keyspace analysis slice failed for connection {conn_id}: {e}")
+            if state is not None and state.get('run_id') == run_id:
+                state['status'] = self.STATUS_FAILED
+                state['error'] = str(e)
+                self._save_if_running(state, run_id)
+            raise KeyspaceAnalysisError(f"键空间分析失败: {str(e)}")
+        finally:
+            self._release_lock(lock_key, lock_token)
+
+    def build_report(self, state: Optional[Dict[str, Any]], top_prefixes: int = 50) -> Optional[Dict[str, Any]]:
+        """生成分析报告（前缀按估算内存排序截取）"""
+        if state is None:
+            return None
+
+        def ranked(bucket: Dict[str, Dict[str, float]], limit: Optional[int] = None) -> List[Dict[str, Any]]:
+            items = sorted(bucket.items(), key=lambda item: (item[1]['bytes'], item[1]['count']), reverse=True)
+            return [
+                {'name': name, 'count': entry['count'], 'estimated_bytes': int(entry['bytes']),
+                 'sampled': entry['sampled']}
+                for name, entry in (items[:limit] if limit else items)
+            ]
+
+        return {
+            'run_id': state['run_id'],
+            'status': state['status'],
+            'pattern': state['pattern'],
+            'database': state['database'],
+            'scanned_keys': state['scanned_keys'],
+            'sampled_keys': state['sampled_keys'],
+            'estimated_bytes': int(state['estimated_bytes']),
+            'memory_sample_rate': self.memory_sample_rate,
+            'by_prefix': ranked(state['by_prefix'], top_prefixes),
+            'by_type': ranked(state['by_type']),
+            'by_ttl': ranked(state['by_ttl']),
+            'top_keys': state['top_keys'],
+            'started_at': state['started_at'],
+            'updated_at': state.get('updated_at'),
+            'finished_at': state['finished_at'],
+            'error': state['error']
+        }
+
+
+# 全局键空间分析器实例
+redis_keyspace_analyzer = RedisKeyspaceAnalyzer()
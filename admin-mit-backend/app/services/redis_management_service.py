@@ -10,13 +10,16 @@ import os
 import json
 import base64
 import logging
-from typing import Dict, List, Optional, Tuple, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple, Any, Union
 
 from flask import g
+from redis.cluster import RedisCluster
 from sqlalchemy.exc import IntegrityError
 from cryptography.fernet import Fernet
 
 from app.extensions import db
+from app.core.config_manager import config_manager
 from app.models.redis_connection import RedisConnection
 from app.services.redis_connection_manager import (
     redis_connection_manager,
@@ -154,6 +157,14 @@ class RedisManagementService:
         """初始化服务"""
         self._encryption_service = password_encryption_service
         self._connection_manager = redis_connection_manager
+        
+        # 集合类型分页读取配置
+        collection_config = config_manager.get_app_config().get('redis_management', {}).get('collection_read', {})
+        self.collection_page_size = collection_config.get('page_size', 200)  # 默认每页元素数量
+        self.collection_max_page_size = collection_config.get('max_page_size', 1000)  # 每页元素数量上限
+        self.collection_max_page_bytes = collection_config.get('max_page_bytes', 1048576)  # 每页字节预算
+        self.collection_scan_batch = collection_config.get('scan_batch', 100)  # 单次 SCAN/RANGE 命令的元素数量
+        self.collection_scan_max_batches = collection_config.get('scan_max_batches', 100)  # 单页最多执行的 SCAN 次数
     
     # ==================== 连接配置 CRUD ====================
     
@@ -312,8 +323,8 @@ class RedisManagementService:
             
             db.session.commit()
             
-            # 如果连接已建立，关闭旧连接
-            self._connection_manager.close_client(connection_id, tenant_id)
+            # 关闭旧连接，并通知其他进程丢弃缓存的连接配置
+            self._connection_manager.notify_config_changed(connection_id, tenant_id)
             
             logger.info(f"Updated Redis connection: {connection.name} (ID: {connection.id})")
             return connection
@@ -352,13 +363,13 @@ class RedisManagementService:
             raise ValueError(f"连接配置不存在: ID={connection_id}")
         
         try:
-            # 关闭活跃连接
-            self._connection_manager.close_client(connection_id, tenant_id)
-            
             # 删除配置
             db.session.delete(connection)
             db.session.commit()
             
+            # 关闭活跃连接，并通知其他进程丢弃缓存的连接配置
+            self._connection_manager.notify_config_changed(connection_id, tenant_id)
+            
             logger.info(f"Deleted Redis connection: ID={connection_id}")
             return True
             
@@ -587,10 +598,30 @@ class RedisManagementService:
         if tenant_id is None:
             raise ValueError("租户ID不能为空")
         
-        # 获取连接配置
+        # 连接池和解密后的连接配置由连接管理器缓存，缓存过期时才读取数据库
+        try:
+            return self._connection_manager.get_client(
+                conn_id=conn_id,
+                tenant_id=tenant_id,
+                config_loader=lambda: self._load_connection_settings(conn_id, tenant_id)
+            )
+        except Exception as e:
+            logger.error(f"Failed to get Redis client for connection {conn_id}: {e}")
+            raise
+    
+    def _load_connection_settings(self, conn_id: int, tenant_id: int) -> Optional[Dict[str, Any]]:
+        """
+        从数据库读取连接配置并解密密码
+        
+        Returns:
+            dict: 建立连接所需的配置，连接配置不存在时返回 None
+            
+        Raises:
+            RedisConnectionException: 密码解密失败
+        """
         connection = RedisConnection.get_by_tenant(conn_id, tenant_id)
         if not connection:
-            raise ValueError(f"连接配置不存在: ID={conn_id}")
+            return None
         
         # 解密密码
         decrypted_password = None
@@ -604,47 +635,45 @@ class RedisManagementService:
         else:
             logger.debug(f"No password set for connection {conn_id}")
         
-        # 临时设置解密后的密码用于连接
-        original_password = connection.password
-        connection.password = decrypted_password
-        
-        try:
-            client = self._connection_manager.get_client(
-                conn_id=conn_id,
-                tenant_id=tenant_id,
-                connection_config=connection
-            )
-            logger.info(f"Successfully got Redis client for connection {conn_id}")
-            return client
-        except Exception as e:
-            logger.error(f"Failed to get Redis client for connection {conn_id}: {e}")
-            raise
-        finally:
-            # 恢复加密密码
-            if original_password is not None:
-                connection.password = original_password
+        return {
+            'connection_type': connection.connection_type,
+            'host': connection.host,
+            'port': connection.port,
+            'password': decrypted_password,
+            'database': connection.database,
+            'cluster_nodes': connection.cluster_nodes,
+            'timeout': connection.timeout,
+            'status': connection.status,
+        }
     
     def scan_keys(
         self,
         conn_id: int,
         pattern: str = '*',
-        cursor: int = 0,
+        cursor: Union[int, str] = 0,
         count: int = 50,
         database: Optional[int] = None,
-        tenant_id: Optional[int] = None
+        tenant_id: Optional[int] = None,
+        with_memory: bool = False,
+        with_size: bool = False
     ) -> Dict[str, Any]:
         """
         扫描 Redis 键列表
         
-        使用 SCAN 命令进行增量迭代，避免阻塞服务器。
+        使用 SCAN 命令进行增量迭代，避免阻塞服务器。本页所有键的 TYPE/TTL
+        （以及可选的 MEMORY USAGE）在一个 pipeline 中批量获取，可选的按类型
+        大小（STRLEN/HLEN/LLEN/SCARD/ZCARD/XLEN）在第二个 pipeline 中获取；
+        集群模式下并行扫描所有主节点，游标为各节点游标组合后的字符串。
         
         Args:
             conn_id: 连接配置 ID
             pattern: 键名匹配模式 (默认 '*')
-            cursor: 游标位置 (默认 0)
+            cursor: 游标位置 (默认 0；集群模式为上一页返回的游标字符串)
             count: 每次扫描返回的建议数量 (默认 50)
             database: 数据库索引 (可选，仅单机模式有效)
             tenant_id: 租户 ID (可选)
+            with_memory: 是否获取键的内存占用 (默认 False)
+            with_size: 是否获取键的按类型大小（字符串长度或元素数量，默认 False）
             
         Returns:
             dict: 包含键列表和游标信息的字典
@@ -669,38 +698,22 @@ class RedisManagementService:
             count = 50
         if count > 1000:
             count = 1000
-        if cursor < 0:
-            cursor = 0
         
         try:
             client = self._get_redis_client(conn_id, tenant_id)
             
-            # 如果指定了数据库且是单机模式，切换数据库
-            connection = RedisConnection.get_by_tenant(conn_id, tenant_id)
-            if database is not None and connection.connection_type == 'standalone':
-                client.select(database)
-            
-            # 使用 SCAN 命令扫描键
-            next_cursor, keys = client.scan(cursor=cursor, match=pattern, count=count)
-            
-            # 获取每个键的类型和 TTL
-            key_infos = []
-            for key in keys:
+            if isinstance(client, RedisCluster):
+                next_cursor, key_infos = self._scan_cluster_page(
+                    client, pattern, cursor, count, with_memory, with_size
+                )
+            else:
                 try:
-                    key_type = client.type(key)
-                    ttl = client.ttl(key)
-                    key_infos.append({
-                        'key': key,
-                        'type': key_type,
-                        'ttl': ttl  # -1 表示永不过期, -2 表示键不存在
-                    })
-                except Exception as e:
-                    logger.warning(f"Failed to get info for key {key}: {e}")
-                    key_infos.append({
-                        'key': key,
-                        'type': 'unknown',
-                        'ttl': -2
-                    })
+                    cursor = max(int(cursor or 0), 0)
+                except (TypeError, ValueError):
+                    raise ValueError("游标格式错误")
+                next_cursor, key_infos = self._scan_standalone_page(
+                    client, pattern, cursor, count, database, with_memory, with_size
+                )
             
             return {
                 'cursor': next_cursor,
@@ -708,14 +721,292 @@ class RedisManagementService:
                 'total_scanned': len(key_infos)
             }
             
-        except RedisConnectionException:
-            raise
-        except RedisTimeoutException:
+        except (RedisConnectionException, RedisTimeoutException, ValueError):
             raise
         except Exception as e:
             logger.error(f"Failed to scan keys: {e}")
             raise RedisOperationError(f"扫描键失败: {str(e)}")
     
+    def iter_keys(
+        self,
+        conn_id: int,
+        pattern: str = '*',
+        count: int = 500,
+        database: Optional[int] = None,
+        tenant_id: Optional[int] = None,
+        with_memory: bool = False,
+        limit: Optional[int] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        按页迭代扫描 Redis 键，直到扫描完成或达到 limit
+        
+        Args:
+            conn_id: 连接配置 ID
+            pattern: 键名匹配模式
+            count: 每页扫描的建议数量
+            database: 数据库索引 (可选，仅单机模式有效)
+            tenant_id: 租户 ID (可选)
+            with_memory: 是否获取键的内存占用
+            limit: 最多返回的键数量 (可选)
+            
+        Yields:
+            dict: 与 scan_keys 返回格式相同的单页结果
+        """
+        if tenant_id is None:
+            tenant_id = getattr(g, 'tenant_id', None)
+        
+        cursor: Union[int, str] = 0
+        returned = 0
+        while True:
+            page = self.scan_keys(
+                conn_id=conn_id,
+                pattern=pattern,
+                cursor=cursor,
+                count=count,
+                database=database,
+                tenant_id=tenant_id,
+                with_memory=with_memory
+            )
+            if limit is not None and returned + len(page['keys']) > limit:
+                page['keys'] = page['keys'][:limit - returned]
+                page['total_scanned'] = len(page['keys'])
+            
+            returned += len(page['keys'])
+            yield page
+            
+            cursor = page['cursor']
+            if cursor in (0, '0') or (limit is not None and returned >= limit):
+                return
+    
+    def _scan_standalone_page(
+        self,
+        client,
+        pattern: str,
+        cursor: int,
+        count: int,
+        database: Optional[int],
+        with_memory: bool,
+        with_size: bool = False
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """单机模式扫描一页键并批量获取键信息"""
+        default_db = client.connection_pool.connection_kwargs.get('db', 0)
+        switch_db = database is not None and database != default_db
+        
+        if switch_db:
+            # SELECT 与 SCAN 放在同一个 pipeline 中，保证在同一连接上执行
+            pipe = client.pipeline(transaction=False)
+            pipe.select(database)
+            pipe.scan(cursor=cursor, match=pattern, count=count)
+            pipe.select(default_db)
+            next_cursor, keys = pipe.execute()[1]
+        else:
+            next_cursor, keys = client.scan(cursor=cursor, match=pattern, count=count)
+        
+        key_infos = self._describe_keys(
+            client, keys, with_memory,
+            database=database if switch_db else None,
+            default_db=default_db,
+            with_size=with_size
+        )
+        return next_cursor, key_infos
+    
+    def _scan_cluster_page(
+        self,
+        client: RedisCluster,
+        pattern: str,
+        cursor: Union[int, str],
+        count: int,
+        with_memory: bool,
+        with_size: bool = False
+    ) -> Tuple[str, List[Dict[str, Any]]]:
+        """集群模式并行扫描所有主节点的一页键，返回组合游标"""
+        primaries = {node.name: node for node in client.get_primaries()}
+        node_cursors = self._decode_cluster_cursor(cursor, primaries.keys())
+        
+        def scan_node(node_name: str) -> Tuple[str, int, List[Dict[str, Any]]]:
+            node_client = client.get_redis_connection(primaries[node_name])
+            next_cursor, keys = node_client.scan(cursor=node_cursors[node_name], match=pattern, count=count)
+            return node_name, next_cursor, self._describe_keys(node_client, keys, with_memory, with_size=with_size)
+        
+        pending = [name for name in node_cursors if name in primaries]
+        if not pending:
+            return '0', []
+        
+        key_infos: List[Dict[str, Any]] = []
+        next_cursors: Dict[str, int] = {}
+        with ThreadPoolExecutor(max_workers=min(len(pending), 16)) as executor:
+            for node_name, next_cursor, node_keys in executor.map(scan_node, pending):
+                key_infos.extend(node_keys)
+                if next_cursor != 0:
+                    next_cursors[node_name] = next_cursor
+        
+        return self._encode_cluster_cursor(next_cursors), key_infos
+    
+    @staticmethod
+    def _decode_cluster_cursor(cursor: Union[int, str], node_names) -> Dict[str, int]:
+        """解析集群组合游标；初始游标表示从所有主节点开始"""
+        if cursor in (0, '0', None, ''):
+            return {name: 0 for name in node_names}
+        try:
+            padded = str(cursor) + '=' * (-len(str(cursor)) % 4)
+            return {name: int(value) for name, value in json.loads(base64.urlsafe_b64decode(padded)).items()}
+        except Exception:
+            raise ValueError("游标格式错误")
+    
+    @staticmethod
+    def _encode_cluster_cursor(node_cursors: Dict[str, int]) -> str:
+        """生成集群组合游标；所有节点扫描完成时返回 '0'"""
+        if not node_cursors:
+            return '0'
+        raw = json.dumps(node_cursors, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+    
+    def _describe_keys(
+        self,
+        client,
+        keys: List[str],
+        with_memory: bool = False,
+        database: Optional[int] = None,
+        default_db: int = 0,
+        with_size: bool = False
+    ) -> List[Dict[str, Any]]:
+        """在一个 pipeline 中批量获取键的类型、TTL 和内存占用，按需在第二个 pipeline 中获取按类型大小"""
+        if not keys:
+            return []
+        
+        commands_per_key = 3 if with_memory else 2
+        pipe = client.pipeline(transaction=False)
+        if database is not None:
+            pipe.select(database)
+        for key in keys:
+            pipe.type(key)
+            pipe.ttl(key)
+            if with_memory:
+                pipe.memory_usage(key)
+        if database is not None:
+            pipe.select(default_db)
+        
+        replies = pipe.execute(raise_on_error=False)
+        if database is not None:
+            replies = replies[1:-1]
+        
+        key_infos = []
+        for index, key in enumerate(keys):
+            reply = replies[index * commands_per_key:(index + 1) * commands_per_key]
+            if isinstance(reply[0], Exception) or isinstance(reply[1], Exception):
+                logger.warning(f"Failed to get info for key {key}: {reply[0] if isinstance(reply[0], Exception) else reply[1]}")
+                info = {'key': key, 'type': 'unknown', 'ttl': -2}
+            else:
+                info = {
+                    'key': key,
+                    'type': reply[0],
+                    'ttl': reply[1]  # -1 表示永不过期, -2 表示键不存在
+                }
+            if with_memory:
+                info['memory'] = None if isinstance(reply[2], Exception) else reply[2]
+            key_infos.append(info)
+        
+        if with_size:
+            self._attach_sizes(client, key_infos, database, default_db)
+        return key_infos
+    
+    # 按类型获取大小的命令（字符串为字节数，其余为元素数量）
+    KEY_SIZE_COMMANDS = {
+        'string': 'strlen',
+        'hash': 'hlen',
+        'list': 'llen',
+        'set': 'scard',
+        'zset': 'zcard',
+        'stream': 'xlen',
+    }
+    
+    def _attach_sizes(
+        self,
+        client,
+        key_infos: List[Dict[str, Any]],
+        database: Optional[int] = None,
+        default_db: int = 0
+    ):
+        """在一个 pipeline 中按类型获取键大小，写入 info['size']（未知类型或失败时为 None）"""
+        sized = [info for info in key_infos if info['type'] in self.KEY_SIZE_COMMANDS]
+        for info in key_infos:
+            info['size'] = None
+        if not sized:
+            return
+        
+        pipe = client.pipeline(transaction=False)
+        if database is not None:
+            pipe.select(database)
+        for info in sized:
+            getattr(pipe, self.KEY_SIZE_COMMANDS[info['type']])(info['key'])
+        if database is not None:
+            pipe.select(default_db)
+        
+        replies = pipe.execute(raise_on_error=False)
+        if database is not None:
+            replies = replies[1:-1]
+        for info, reply in zip(sized, replies):
+            info['size'] = None if isinstance(reply, Exception) else reply
+    
+    def get_keys_memory(
+        self,
+        conn_id: int,
+        keys: List[str],
+        database: Optional[int] = None,
+        tenant_id: Optional[int] = None
+    ) -> Dict[str, Optional[int]]:
+        """
+        在一个 pipeline 中批量获取指定键的 MEMORY USAGE
+        
+        Args:
+            conn_id: 连接配置 ID
+            keys: 键名列表
+            database: 数据库索引 (可选，仅单机模式有效)
+            tenant_id: 租户 ID (可选)
+            
+        Returns:
+            dict: 键名 -> 内存占用字节数（键已删除或获取失败时为 None）
+        """
+        if tenant_id is None:
+            tenant_id = getattr(g, 'tenant_id', None)
+        
+        if tenant_id is None:
+            raise ValueError("租户ID不能为空")
+        
+        if not keys:
+            return {}
+        
+        try:
+            client = self._get_redis_client(conn_id, tenant_id)
+            
+            switch_db = False
+            default_db = 0
+            if not isinstance(client, RedisCluster):
+                default_db = client.connection_pool.connection_kwargs.get('db', 0)
+                switch_db = database is not None and database != default_db
+            
+            pipe = client.pipeline(transaction=False)
+            if switch_db:
+                pipe.select(database)
+            for key in keys:
+                pipe.memory_usage(key)
+            if switch_db:
+                pipe.select(default_db)
+            
+            replies = pipe.execute(raise_on_error=False)
+            if switch_db:
+                replies = replies[1:-1]
+            return {
+                key: None if isinstance(reply, Exception) else reply
+                for key, reply in zip(keys, replies)
+            }
+            
+        except (RedisConnectionException, RedisTimeoutException, ValueError):
+            raise
+        except Exception as e:
+            logger.error(f"Failed to get keys memory: {e}")
+            raise RedisOperationError(f"获取键内存占用失败: {str(e)}")
+    
     def get_key_info(
         self,
         conn_id: int,
@@ -827,7 +1118,10 @@ class RedisManagementService:
                 - key: 键名
                 - type: 键类型
                 - ttl: 过期时间
-                - value: 键值（格式取决于类型）
+                - value: 键值（格式取决于类型，集合类型只包含第一页）
+                - total: 集合元素总数（非集合类型为 None）
+                - truncated: 集合是否只返回了部分元素
+                - next_cursor: 下一页游标或起始索引（未截断时为 None）
                 
         Raises:
             ValueError: 参数验证失败
@@ -857,22 +1151,15 @@ class RedisManagementService:
             # 获取 TTL
             ttl = client.ttl(key)
             
-            # 根据类型获取值
+            # 根据类型获取值；集合类型只读取第一页，并返回元素总数和是否被截断
             value = None
+            total = None
+            truncated = False
+            next_cursor = None
             if key_type == 'string':
                 value = client.get(key)
-            elif key_type == 'list':
-                # 获取列表所有元素（限制最大数量）
-                value = client.lrange(key, 0, 999)
-            elif key_type == 'set':
-                # 获取集合所有成员（限制最大数量）
-                value = list(client.smembers(key))[:1000]
-            elif key_type == 'zset':
-                # 获取有序集合所有成员及分数
-                value = client.zrange(key, 0, 999, withscores=True)
-            elif key_type == 'hash':
-                # 获取哈希所有字段
-                value = client.hgetall(key)
+            elif key_type in self.COLLECTION_LENGTH_COMMANDS:
+                value, total, truncated, next_cursor = self._read_collection_preview(client, key, key_type)
             elif key_type == 'stream':
                 # 获取流的最近消息
                 value = client.xrange(key, count=100)
@@ -883,7 +1170,10 @@ class RedisManagementService:
                 'key': key,
                 'type': key_type,
                 'ttl': ttl,
-                'value': value
+                'value': value,
+                'total': total,
+                'truncated': truncated,
+                'next_cursor': next_cursor
             }
             
         except RedisConnectionException:
@@ -903,7 +1193,8 @@ class RedisManagementService:
         value: Any,
         key_type: str = 'string',
         ttl: Optional[int] = None,
-        tenant_id: Optional[int] = None
+        tenant_id: Optional[int] = None,
+        reject_truncated: bool = False
     ) -> bool:
         """
         设置键值
@@ -915,6 +1206,8 @@ class RedisManagementService:
             key_type: 键类型 ('string', 'list', 'set', 'zset', 'hash')
             ttl: 过期时间（秒），None 表示永不过期
             tenant_id: 租户 ID (可选)
+            reject_truncated: 已有集合超过单页读取上限（键详情只返回部分元素）时拒绝整体替换，
+                避免按部分内容保存时删除未读取的元素
             
         Returns:
             bool: 是否设置成功
@@ -937,6 +1230,15 @@ class RedisManagementService:
         try:
             client = self._get_redis_client(conn_id, tenant_id)
             
+            if reject_truncated:
+                existing_type = client.type(key)
+                if existing_type in self.COLLECTION_LENGTH_COMMANDS:
+                    _, total, truncated, _ = self._read_collection_preview(client, key, existing_type)
+                    if truncated:
+                        raise ValueError(
+                            f"集合元素过多（共 {total} 个），不能整体替换，请使用字段/成员级操作修改"
+                        )
+            
             # 根据类型设置值
             if key_type == 'string':
                 if ttl and ttl > 0:
@@ -1350,10 +1652,13 @@ class RedisManagementService:
         start: int = 0,
         stop: int = -1,
         tenant_id: Optional[int] = None
-    ) -> Optional[List[str]]:
+    ) -> Optional[Tuple[List[str], Optional[int]]]:
         """
         获取 List 指定范围的元素
         
+        单次返回的元素数量不超过 max_page_size，字节数不超过 max_page_bytes，
+        超出部分需调用方以返回的下一起始索引继续读取。
+        
         Args:
             conn_id: 连接配置 ID
             key: 键名
@@ -1362,7 +1667,8 @@ class RedisManagementService:
             tenant_id: 租户 ID (可选)
             
         Returns:
-            list: 元素列表，如果键不存在返回 None
+            tuple: (元素列表, 下一起始索引)，范围已读完时下一起始索引为 None；
+                   如果键不存在返回 None
             
         Raises:
             ValueError: 参数验证失败
@@ -1391,7 +1697,11 @@ class RedisManagementService:
             if key_type != 'list':
                 raise ValueError(f"键类型不是 list: {key_type}")
             
-            return client.lrange(key, start, stop)
+            start, stop, count = self._bound_range(client.llen(key), start, stop)
+            items, position, _ = self._read_range_window(
+                client, key, 'list', start, count, self.collection_max_page_bytes
+            )
+            return items, (position if position <= stop else None)
             
         except RedisConnectionException:
             raise
@@ -1720,10 +2030,13 @@ class RedisManagementService:
         stop: int = -1,
         withscores: bool = True,
         tenant_id: Optional[int] = None
-    ) -> Optional[List]:
+    ) -> Optional[Tuple[List, Optional[int]]]:
         """
         获取 ZSet 指定范围的成员
         
+        单次返回的元素数量不超过 max_page_size，字节数不超过 max_page_bytes，
+        超出部分需调用方以返回的下一起始索引继续读取。
+        
         Args:
             conn_id: 连接配置 ID
             key: 键名
@@ -1733,8 +2046,9 @@ class RedisManagementService:
             tenant_id: 租户 ID (可选)
             
         Returns:
-            list: 成员列表（如果 withscores=True，返回 [(member, score), ...]）
-                  如果键不存在返回 None
+            tuple: (成员列表, 下一起始索引)，范围已读完时下一起始索引为 None；
+                   成员列表在 withscores=True 时为 [(member, score), ...]
+                   如果键不存在返回 None
             
         Raises:
             ValueError: 参数验证失败
@@ -1763,7 +2077,14 @@ class RedisManagementService:
             if key_type != 'zset':
                 raise ValueError(f"键类型不是 zset: {key_type}")
             
-            return client.zrange(key, start, stop, withscores=withscores)
+            start, stop, count = self._bound_range(client.zcard(key), start, stop)
+            items, position, _ = self._read_range_window(
+                client, key, 'zset', start, count, self.collection_max_page_bytes, withscores=withscores
+            )
+            next_start = position if position <= stop else None
+            if withscores:
+                return [(item['member'], item['score']) for item in items], next_start
+            return items, next_start
             
         except RedisConnectionException:
             raise
@@ -1900,6 +2221,283 @@ class RedisManagementService:
             logger.error(f"Failed to remove from zset: {e}")
             raise RedisOperationError(f"删除 ZSet 成员失败: {str(e)}")
     
+    # ==================== 集合类型分页读取 ====================
+    
+    # 集合类型对应的长度命令
+    COLLECTION_LENGTH_COMMANDS = {
+        'hash': 'hlen',
+        'list': 'llen',
+        'set': 'scard',
+        'zset': 'zcard',
+    }
+    
+    @staticmethod
+    def _item_bytes(item: Any) -> int:
+        """估算单个元素序列化后的字节数"""
+        if isinstance(item, dict):
+            return sum(len(str(value).encode('utf-8')) for value in item.values())
+        return len(str(item).encode('utf-8'))
+    
+    def scan_collection(
+        self,
+        conn_id: int,
+        key: str,
+        cursor: Union[int, str] = 0,
+        count: Optional[int] = None,
+        match: Optional[str] = None,
+        max_bytes: Optional[int] = None,
+        tenant_id: Optional[int] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        分页读取 Hash/List/Set/ZSet 的元素
+        
+        Hash/Set/ZSet 使用 HSCAN/SSCAN/ZSCAN 增量迭代，List 使用有限窗口的 LRANGE，
+        避免 HGETALL/SMEMBERS 一次取出大集合阻塞 Redis、占满 API 进程内存。
+        每页在元素数量和字节预算任一达到上限时结束；SCAN 类命令的单次返回不可拆分，
+        因此以较小的 COUNT 多次迭代，单页最多超出预算一个批次。
+        匹配模式命中稀少时单页最多执行 scan_max_batches 次 SCAN，返回已读到的元素和中间游标，
+        此时本页可能为空但游标不为 0，调用方继续以游标请求即可。
+        
+        Args:
+            conn_id: 连接配置 ID
+            key: 键名
+            cursor: 游标 (默认 0；List 为下一页起始索引)
+            count: 每页元素数量上限 (默认使用配置 page_size)
+            match: 字段/成员匹配模式 (可选，List 不支持)
+            max_bytes: 每页字节预算 (默认使用配置 max_page_bytes)
+            tenant_id: 租户 ID (可选)
+            
+        Returns:
+            dict: 单页结果，如果键不存在返回 None
+                - key: 键名
+                - type: 键类型
+                - total: 集合元素总数
+                - cursor: 下一页游标 (0 表示读取完成)
+                - items: 元素列表（hash 为 {field, value}，zset 为 {member, score}）
+                - item_count: 本页元素数量
+                - bytes: 本页元素字节数
+                
+        Raises:
+            ValueError: 参数验证失败
+            RedisOperationError: Redis 操作失败
+        """
+        if tenant_id is None:
+            tenant_id = getattr(g, 'tenant_id', None)
+        
+        if tenant_id is None:
+            raise ValueError("租户ID不能为空")
+        
+        if not key:
+            raise ValueError("键名不能为空")
+        
+        count = min(max(count or self.collection_page_size, 1), self.collection_max_page_size)
+        max_bytes = min(max(max_bytes or self.collection_max_page_bytes, 1), self.collection_max_page_bytes)
+        try:
+            cursor = max(int(cursor or 0), 0)
+        except (TypeError, ValueError):
+            raise ValueError("游标格式错误")
+        
+        try:
+            client = self._get_redis_client(conn_id, tenant_id)
+            
+            # 键不存在时 TYPE 返回 none
+            key_type = client.type(key)
+            if key_type == 'none':
+                return None
+            if key_type not in self.COLLECTION_LENGTH_COMMANDS:
+                raise ValueError(f"键类型不是集合类型: {key_type}")
+            total = getattr(client, self.COLLECTION_LENGTH_COMMANDS[key_type])(key)
+            
+            if key_type == 'list':
+                if match:
+                    raise ValueError("List 不支持匹配模式")
+                items, next_cursor, page_bytes = self._read_range_window(
+                    client, key, key_type, cursor, count, max_bytes
+                )
+                if next_cursor >= total:
+                    next_cursor = 0
+            else:
+                items, next_cursor, page_bytes = self._scan_collection_page(
+                    client, key, key_type, cursor, count, match, max_bytes
+                )
+            
+            return {
+                'key': key,
+                'type': key_type,
+                'total': total,
+                'cursor': next_cursor,
+                'items': items,
+                'item_count': len(items),
+                'bytes': page_bytes
+            }
+            
+        except (RedisConnectionException, RedisTimeoutException, ValueError):
+            raise
+        except Exception as e:
+            logger.error(f"Failed to scan collection: {e}")
+            raise RedisOperationError(f"读取集合元素失败: {str(e)}")
+    
+    def iter_collection(
+        self,
+        conn_id: int,
+        key: str,
+        count: Optional[int] = None,
+        match: Optional[str] = None,
+        max_bytes: Optional[int] = None,
+        tenant_id: Optional[int] = None,
+        limit: Optional[int] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        按页迭代读取集合元素，直到读取完成或达到 limit
+        
+        Args:
+            conn_id: 连接配置 ID
+            key: 键名
+            count: 每页元素数量上限
+            match: 字段/成员匹配模式 (可选)
+            max_bytes: 每页字节预算
+            tenant_id: 租户 ID (可选)
+            limit: 最多返回的元素数量 (可选)
+            
+        Yields:
+            dict: 与 scan_collection 返回格式相同的单页结果；键不存在时不产生任何页
+        """
+        if tenant_id is None:
+            tenant_id = getattr(g, 'tenant_id', None)
+        
+        cursor = 0
+        returned = 0
+        while True:
+            page = self.scan_collection(
+                conn_id=conn_id,
+                key=key,
+                cursor=cursor,
+                count=count,
+                match=match,
+                max_bytes=max_bytes,
+                tenant_id=tenant_id
+            )
+            if page is None:
+                return
+            if limit is not None and returned + page['item_count'] > limit:
+                page['items'] = page['items'][:limit - returned]
+                page['item_count'] = len(page['items'])
+            
+            returned += page['item_count']
+            yield page
+            
+            cursor = page['cursor']
+            if cursor == 0 or (limit is not None and returned >= limit):
+                return
+    
+    def _scan_collection_page(
+        self,
+        client,
+        key: str,
+        key_type: str,
+        cursor: int,
+        count: int,
+        match: Optional[str],
+        max_bytes: int
+    ) -> Tuple[List[Any], int, int]:
+        """以 HSCAN/SSCAN/ZSCAN 读取一页元素，返回 (元素, 下一游标, 字节数)"""
+        batch_count = min(count, self.collection_scan_batch)
+        items: List[Any] = []
+        page_bytes = 0
+        
+        for _ in range(max(self.collection_scan_max_batches, 1)):
+            if key_type == 'hash':
+                cursor, fields = client.hscan(key, cursor=cursor, match=match, count=batch_count)
+                batch = [{'field': field, 'value': value} for field, value in fields.items()]
+            elif key_type == 'set':
+                cursor, batch = client.sscan(key, cursor=cursor, match=match, count=batch_count)
+            else:
+                cursor, members = client.zscan(key, cursor=cursor, match=match, count=batch_count)
+                batch = [{'member': member, 'score': score} for member, score in members]
+            
+            items.extend(batch)
+            page_bytes += sum(self._item_bytes(item) for item in batch)
+            if cursor == 0 or len(items) >= count or page_bytes >= max_bytes:
+                break
+        
+        # 达到迭代上限时返回中间游标，避免稀疏匹配时单次请求遍历整个集合
+        return items, cursor, page_bytes
+    
+    def _bound_range(self, length: int, start: int, stop: int) -> Tuple[int, int, int]:
+        """将 LRANGE/ZRANGE 的起止索引（支持负数）换算为 (起始索引, 结束索引, 受限的元素数量)"""
+        if start < 0:
+            start = max(length + start, 0)
+        if stop < 0:
+            stop = length + stop
+        stop = min(stop, length - 1)
+        return start, stop, max(min(stop - start + 1, self.collection_max_page_size), 0)
+    
+    def _read_range_window(
+        self,
+        client,
+        key: str,
+        key_type: str,
+        start: int,
+        count: int,
+        max_bytes: int,
+        withscores: bool = True
+    ) -> Tuple[List[Any], int, int]:
+        """
+        按索引窗口读取 List/ZSet 元素，返回 (元素, 下一起始索引, 字节数)
+        
+        每次 LRANGE/ZRANGE 最多取 collection_scan_batch 个元素，字节预算用尽即停止，
+        至少返回一个元素保证翻页前进。
+        """
+        items: List[Any] = []
+        page_bytes = 0
+        position = start
+        
+        while len(items) < count:
+            batch_size = min(count - len(items), self.collection_scan_batch)
+            stop = position + batch_size - 1
+            if key_type == 'list':
+                batch = client.lrange(key, position, stop)
+            elif withscores:
+                batch = [{'member': member, 'score': score}
+                         for member, score in client.zrange(key, position, stop, withscores=True)]
+            else:
+                batch = client.zrange(key, position, stop)
+            
+            for item in batch:
+                item_bytes = self._item_bytes(item)
+                if items and page_bytes + item_bytes > max_bytes:
+                    return items, position, page_bytes
+                items.append(item)
+                page_bytes += item_bytes
+                position += 1
+            
+            if len(batch) < batch_size:
+                break
+        
+        return items, position, page_bytes
+    
+    def _read_collection_preview(self, client, key: str, key_type: str) -> Tuple[Any, int, bool, Optional[int]]:
+        """
+        读取集合第一页（受数量和字节预算限制），返回 (值, 元素总数, 是否截断, 下一页游标/起始索引)
+        
+        List/ZSet 的下一页位置为起始索引，Hash/Set 为 HSCAN/SSCAN 游标
+        """
+        total = getattr(client, self.COLLECTION_LENGTH_COMMANDS[key_type])(key)
+        if key_type in ('list', 'zset'):
+            items, next_position, _ = self._read_range_window(
+                client, key, key_type, 0, self.collection_max_page_size, self.collection_max_page_bytes
+            )
+            value = items if key_type == 'list' else [(item['member'], item['score']) for item in items]
+        else:
+            items, next_position, _ = self._scan_collection_page(
+                client, key, key_type, 0, self.collection_max_page_size, None, self.collection_max_page_bytes
+            )
+            value = {item['field']: item['value'] for item in items} if key_type == 'hash' else list(set(items))
+        
+        # SCAN 可能重复返回元素，以去重后的数量判断是否读完
+        truncated = len(value) < total
+        return value, total, truncated, next_position if truncated else None
+    
     # ==================== 服务器信息 ====================
     
     def get_server_info(
@@ -1945,6 +2543,7 @@ class RedisManagementService:
                 - master_host: 主节点地址（如果是从节点）
                 - master_port: 主节点端口（如果是从节点）
                 - db_info: 各数据库键数量信息
+                - pool_stats: 平台到该实例的连接池统计 (in_use, idle, created, errors)
                 
         Raises:
             ValueError: 参数验证失败
@@ -2037,6 +2636,9 @@ class RedisManagementService:
             total = hits + misses
             result['hit_rate'] = round(hits / total * 100, 2) if total > 0 else 0
             
+            # 平台侧连接池统计
+            result['pool_stats'] = self._connection_manager.get_pool_stats(conn_id, tenant_id)
+            
             logger.info(f"Retrieved server info for connection {conn_id}")
             return result
             
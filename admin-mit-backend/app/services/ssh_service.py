@@ -6,7 +6,8 @@ import paramiko
 import threading
 import time
 import logging
-from typing import Dict, Optional, Tuple, Any
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Dict, List, Optional, Tuple, Any
 from datetime import datetime, timedelta
 from contextlib import contextmanager
 from app.core.config_manager import config_manager
@@ -20,21 +21,48 @@ class SSHConnectionError(Exception):
     pass
 
 
+class SSHChannelTimeoutError(SSHConnectionError):
+    """等待 SSH 通道超时（连接繁忙而非失效）"""
+    pass
+
+
 class SSHConnection:
-    """SSH 连接封装类"""
+    """
+    SSH 连接封装类
+    
+    一个 SSHConnection 对应一个 paramiko Transport。SSH 协议支持在同一 Transport 上
+    复用多个通道，命令执行不再串行：每条命令打开独立通道并发执行，
+    同时打开的通道数（含交互式 shell、SFTP）受 max_channels 限制，
+    超出时等待其他通道结束（服务端 sshd 默认 MaxSessions 为 10）。
+    """
     
     def __init__(self, hostname: str, port: int, username: str, 
-                 password: str = None, private_key: str = None, timeout: int = 30):
+                 password: str = None, private_key: str = None, timeout: int = 30,
+                 max_channels: int = 8, channel_wait_timeout: int = 30):
         self.hostname = hostname
         self.port = port
         self.username = username
         self.password = password
         self.private_key = private_key
         self.timeout = timeout
+        self.max_channels = max_channels
+        self.channel_wait_timeout = channel_wait_timeout
         self.client = None
         self.last_used = datetime.now()
         self.is_connected = False
         self._lock = threading.Lock()
+        
+        # 通道计数：短时命令通道计数，长时通道（shell/SFTP）按是否关闭统计
+        self._channel_cond = threading.Condition()
+        self._exec_channels = 0
+        self._long_lived_channels = []
+        self.channel_waiters = 0
+        self.channel_waits = 0
+        self.channel_wait_time = 0.0
+        
+        # 连接池回收状态：从池中取出后到打开通道前保留一段时间，回收后不再打开通道
+        self._reserved_until = 0.0
+        self._retired = False
     
     def connect(self) -> bool:
         """建立 SSH 连接"""
@@ -107,28 +135,119 @@ class SSHConnection:
                 finally:
                     self.client = None
                     self.is_connected = False
+        with self._channel_cond:
+            self._channel_cond.notify_all()
+    
+    # ==================== 通道管理 ====================
+    
+    @property
+    def active_channels(self) -> int:
+        """当前打开的通道数"""
+        with self._channel_cond:
+            return self._count_channels()
+    
+    def _count_channels(self) -> int:
+        """统计打开的通道数（需持有 _channel_cond）"""
+        self._long_lived_channels = [channel for channel in self._long_lived_channels if not channel.closed]
+        return self._exec_channels + len(self._long_lived_channels)
+    
+    def has_capacity(self) -> bool:
+        """是否还能打开新通道"""
+        return self.active_channels < self.max_channels
+    
+    def reserve(self, seconds: float):
+        """从连接池取出时保留连接，避免在打开通道前被回收"""
+        with self._channel_cond:
+            self._reserved_until = max(self._reserved_until, time.monotonic() + seconds)
+    
+    def try_retire(self) -> bool:
+        """没有打开的通道、等待者和保留时标记为已回收，之后不再打开通道（检查与标记是原子的）"""
+        with self._channel_cond:
+            if self._retired:
+                return True
+            if self._count_channels() > 0 or self.channel_waiters > 0 or time.monotonic() < self._reserved_until:
+                return False
+            self._retired = True
+            return True
+    
+    def _acquire_channel(self, timeout: Optional[float] = None):
+        """占用一个通道名额，名额用尽时等待（长时通道关闭不会通知，因此定期重新统计）"""
+        timeout = self.channel_wait_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._channel_cond:
+            if self._retired:
+                raise SSHConnectionError("SSH 连接已被连接池回收")
+            if self._count_channels() < self.max_channels:
+                self._exec_channels += 1
+                return
+            
+            self.channel_waiters += 1
+            started = time.monotonic()
+            try:
+                while self._count_channels() >= self.max_channels:
+                    if not self.is_connected or self._retired:
+                        raise SSHConnectionError("SSH 连接已断开")
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise SSHChannelTimeoutError(f"等待 SSH 通道超时: 已打开 {self.max_channels} 个通道")
+                    self._channel_cond.wait(timeout=min(remaining, 0.5))
+                self._exec_channels += 1
+            finally:
+                self.channel_waiters -= 1
+                self.channel_waits += 1
+                self.channel_wait_time += time.monotonic() - started
+    
+    def _release_channel(self):
+        with self._channel_cond:
+            self._exec_channels -= 1
+            self._channel_cond.notify()
+    
+    def _track_channel(self, channel):
+        """将长时通道转为按关闭状态统计"""
+        with self._channel_cond:
+            self._exec_channels -= 1
+            self._long_lived_channels.append(channel)
     
     def execute_command(self, command: str, timeout: int = 30) -> Tuple[str, str, int]:
-        """执行 SSH 命令"""
+        """执行 SSH 命令（在独立通道中执行，同一连接上的多条命令可并发）"""
         if not self.is_connected or not self.client:
             raise SSHConnectionError("SSH 连接未建立")
         
+        self._acquire_channel()
         try:
-            with self._lock:
-                stdin, stdout, stderr = self.client.exec_command(command, timeout=timeout)
-                
-                # 读取输出
-                stdout_data = stdout.read().decode('utf-8', errors='ignore')
-                stderr_data = stderr.read().decode('utf-8', errors='ignore')
-                exit_code = stdout.channel.recv_exit_status()
-                
-                self.last_used = datetime.now()
-                
-                return stdout_data, stderr_data, exit_code
-                
+            stdin, stdout, stderr = self.client.exec_command(command, timeout=timeout)
+            
+            # 读取输出
+            stdout_data = stdout.read().decode('utf-8', errors='ignore')
+            stderr_data = stderr.read().decode('utf-8', errors='ignore')
+            exit_code = stdout.channel.recv_exit_status()
+            
+            self.last_used = datetime.now()
+            
+            return stdout_data, stderr_data, exit_code
+            
+        except SSHConnectionError:
+            raise
         except Exception as e:
             logger.error(f"执行 SSH 命令失败: {command}, 错误: {str(e)}")
             raise SSHConnectionError(f"执行命令失败: {str(e)}")
+        finally:
+            self._release_channel()
+    
+    def invoke_shell(self, term: str = 'xterm', width: int = 80, height: int = 24):
+        """打开交互式 shell 通道（计入通道数，通道关闭后释放名额）"""
+        if not self.is_connected or not self.client:
+            raise SSHConnectionError("SSH 连接未建立")
+        
+        self._acquire_channel()
+        try:
+            channel = self.client.invoke_shell(term=term, width=width, height=height)
+        except Exception:
+            self._release_channel()
+            raise
+        self._track_channel(channel)
+        self.last_used = datetime.now()
+        return channel
     
     def is_alive(self) -> bool:
         """检查连接是否存活"""
@@ -146,28 +265,65 @@ class SSHConnection:
         return False
     
     def get_sftp(self):
-        """获取 SFTP 客户端"""
+        """获取 SFTP 客户端（计入通道数，关闭后释放名额）"""
         if not self.is_connected or not self.client:
             raise SSHConnectionError("SSH 连接未建立")
         
+        self._acquire_channel()
         try:
-            return self.client.open_sftp()
+            sftp = self.client.open_sftp()
         except Exception as e:
+            self._release_channel()
             logger.error(f"创建 SFTP 客户端失败: {str(e)}")
             raise SSHConnectionError(f"创建 SFTP 客户端失败: {str(e)}")
+        self._track_channel(sftp.get_channel())
+        return sftp
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取连接的通道统计"""
+        with self._channel_cond:
+            active = self._count_channels()
+            return {
+                'active_channels': active,
+                'max_channels': self.max_channels,
+                'channel_waiters': self.channel_waiters,
+                'channel_waits': self.channel_waits,
+                'avg_channel_wait_ms': round(self.channel_wait_time / self.channel_waits * 1000, 2)
+                if self.channel_waits else 0,
+                'last_used': self.last_used.isoformat()
+            }
 
 
 class SSHConnectionPool:
-    """SSH 连接池管理"""
+    """
+    SSH 连接池管理
+    
+    连接池锁只保护内部字典，不在持锁期间建立连接：同一主机的并发请求共享
+    同一次握手（按连接键记录进行中的握手 Future），一个不可达主机的连接超时
+    不会阻塞其他主机。每个主机可按需建立多个 Transport，现有连接的通道
+    全部占满且未达到 max_transports_per_host 时再建立新连接。
+    """
     
     def __init__(self, max_connections: int = 10, connection_timeout: int = 30, 
-                 idle_timeout: int = 300):
-        self.max_connections = max_connections
+                 idle_timeout: int = 300, max_channels_per_transport: int = 8,
+                 max_transports_per_host: int = 3, channel_wait_timeout: int = 30):
+        self.max_connections = max_connections  # 所有主机的 Transport 总数上限
         self.connection_timeout = connection_timeout
         self.idle_timeout = idle_timeout  # 空闲超时时间（秒）
-        self.connections: Dict[str, SSHConnection] = {}
+        self.max_channels_per_transport = max_channels_per_transport
+        self.max_transports_per_host = max_transports_per_host
+        self.channel_wait_timeout = channel_wait_timeout
+        self.connections: Dict[str, List[SSHConnection]] = {}
+        self._pending: Dict[str, Future] = {}
         self._lock = threading.Lock()
         self._cleanup_thread = None
+        
+        # 握手指标
+        self.handshakes = 0
+        self.handshake_failures = 0
+        self.shared_handshakes = 0  # 等待其他请求发起的握手的次数
+        self.handshake_time = 0.0
+        self.max_handshake_time = 0.0
         self._start_cleanup_thread()
     
     def _start_cleanup_thread(self):
@@ -182,21 +338,27 @@ class SSHConnectionPool:
             try:
                 time.sleep(60)  # 每分钟检查一次
                 current_time = datetime.now()
+                connections_to_close = []
                 
                 with self._lock:
-                    connections_to_remove = []
-                    
-                    for key, connection in self.connections.items():
-                        # 检查连接是否超时或不可用
-                        if (current_time - connection.last_used).seconds > self.idle_timeout or not connection.is_alive():
-                            connections_to_remove.append(key)
-                    
-                    # 移除超时的连接
-                    for key in connections_to_remove:
-                        connection = self.connections.pop(key, None)
-                        if connection:
-                            connection.disconnect()
-                            logger.info(f"清理空闲 SSH 连接: {key}")
+                    for key in list(self.connections.keys()):
+                        keep = []
+                        for connection in self.connections[key]:
+                            # 检查连接是否超时（且没有打开的通道）或不可用
+                            idle = (current_time - connection.last_used).total_seconds() > self.idle_timeout
+                            if not connection.is_alive() or (idle and connection.try_retire()):
+                                connections_to_close.append((key, connection))
+                            else:
+                                keep.append(connection)
+                        if keep:
+                            self.connections[key] = keep
+                        else:
+                            del self.connections[key]
+                
+                # 断开连接在锁外进行
+                for key, connection in connections_to_close:
+                    connection.disconnect()
+                    logger.info(f"清理空闲 SSH 连接: {key}")
                             
             except Exception as e:
                 logger.error(f"清理空闲连接时出错: {str(e)}")
@@ -207,74 +369,196 @@ class SSHConnectionPool:
     
     def get_connection(self, hostname: str, port: int, username: str, 
                       password: str = None, private_key: str = None) -> SSHConnection:
-        """获取 SSH 连接"""
+        """
+        获取 SSH 连接
+        
+        优先返回通道占用最少且仍有余量的连接；没有可用连接时发起握手
+        （同一主机已有进行中的握手则等待其结果）；主机连接数已达上限时
+        返回占用最少的连接，由通道等待完成排队。
+        """
         connection_key = self._get_connection_key(hostname, port, username)
+        dead_connections = []
         
         with self._lock:
-            # 检查是否已有可用连接
-            if connection_key in self.connections:
-                connection = self.connections[connection_key]
-                if connection.is_alive():
-                    connection.last_used = datetime.now()
-                    return connection
-                else:
-                    # 连接已断开，移除并重新创建
-                    connection.disconnect()
-                    del self.connections[connection_key]
+            alive = []
+            for connection in self.connections.get(connection_key, []):
+                (alive if connection.is_alive() else dead_connections).append(connection)
+            if alive:
+                self.connections[connection_key] = alive
+            else:
+                self.connections.pop(connection_key, None)
             
-            # 检查连接池是否已满
-            if len(self.connections) >= self.max_connections:
-                # 移除最旧的连接
-                oldest_key = min(self.connections.keys(), 
-                               key=lambda k: self.connections[k].last_used)
-                oldest_connection = self.connections.pop(oldest_key)
-                oldest_connection.disconnect()
-                logger.info(f"连接池已满，移除最旧连接: {oldest_key}")
+            candidate = min(alive, key=lambda conn: conn.active_channels) if alive else None
+            future = self._pending.get(connection_key)
             
-            # 创建新连接
-            connection = SSHConnection(
-                hostname=hostname,
-                port=port,
-                username=username,
-                password=password,
-                private_key=private_key,
-                timeout=self.connection_timeout
-            )
+            if candidate is not None and candidate.has_capacity():
+                action = 'use'
+            elif future is not None:
+                # 同一主机已有进行中的握手，共享其结果
+                action = 'wait'
+                self.shared_handshakes += 1
+            elif len(alive) < self.max_transports_per_host:
+                action = 'connect'
+                future = Future()
+                self._pending[connection_key] = future
+                dead_connections.extend(self._evict_for_new_connection())
+            else:
+                # 主机连接数已达上限，在占用最少的连接上等待通道
+                action = 'use'
             
-            # 建立连接
+            if action == 'use':
+                candidate.last_used = datetime.now()
+                candidate.reserve(self.channel_wait_timeout)
+        
+        # 断开连接在锁外进行
+        for connection in dead_connections:
+            connection.disconnect()
+        
+        if action == 'connect':
+            return self._handshake(connection_key, future, hostname, port, username, password, private_key)
+        if action == 'wait':
+            try:
+                return future.result(timeout=self.connection_timeout + 5)
+            except FutureTimeoutError:
+                raise SSHConnectionError(f"等待 SSH 连接超时: {connection_key}")
+        return candidate
+    
+    def _evict_for_new_connection(self) -> List[SSHConnection]:
+        """Transport 总数达到上限时移除最久未使用的空闲连接（需持有 _lock）"""
+        total = sum(len(conns) for conns in self.connections.values()) + len(self._pending) - 1
+        if total < self.max_connections:
+            return []
+        
+        candidates = sorted(
+            ((connection.last_used, key, connection)
+             for key, conns in self.connections.items()
+             for connection in conns),
+            key=lambda item: item[0]
+        )
+        for _, oldest_key, oldest_connection in candidates:
+            # 回收标记与通道检查在连接的通道锁内原子完成，回收后其他线程无法再在其上打开通道
+            if not oldest_connection.try_retire():
+                continue
+            self.connections[oldest_key].remove(oldest_connection)
+            if not self.connections[oldest_key]:
+                del self.connections[oldest_key]
+            logger.info(f"连接池已满，移除最旧连接: {oldest_key}")
+            return [oldest_connection]
+        
+        logger.warning(f"SSH 连接池已满且没有空闲连接，超额建立连接: {total + 1}/{self.max_connections}")
+        return []
+    
+    def _handshake(self, connection_key: str, future: Future, hostname: str, port: int,
+                   username: str, password: str = None, private_key: str = None) -> SSHConnection:
+        """在锁外建立连接，并将结果通知等待同一握手的其他请求"""
+        connection = SSHConnection(
+            hostname=hostname,
+            port=port,
+            username=username,
+            password=password,
+            private_key=private_key,
+            timeout=self.connection_timeout,
+            max_channels=self.max_channels_per_transport,
+            channel_wait_timeout=self.channel_wait_timeout
+        )
+        
+        started = time.monotonic()
+        try:
             connection.connect()
-            self.connections[connection_key] = connection
-            
-            return connection
+        except Exception as e:
+            with self._lock:
+                self.handshake_failures += 1
+                self._pending.pop(connection_key, None)
+            future.set_exception(e)
+            raise
+        
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self.handshakes += 1
+            self.handshake_time += elapsed
+            self.max_handshake_time = max(self.max_handshake_time, elapsed)
+            connection.reserve(self.channel_wait_timeout)
+            self.connections.setdefault(connection_key, []).append(connection)
+            self._pending.pop(connection_key, None)
+        future.set_result(connection)
+        return connection
     
     def remove_connection(self, hostname: str, port: int, username: str):
-        """移除指定连接"""
+        """移除指定主机的所有连接"""
         connection_key = self._get_connection_key(hostname, port, username)
         
         with self._lock:
-            connection = self.connections.pop(connection_key, None)
-            if connection:
-                connection.disconnect()
-                logger.info(f"移除 SSH 连接: {connection_key}")
+            connections = self.connections.pop(connection_key, [])
+        
+        for connection in connections:
+            connection.disconnect()
+        if connections:
+            logger.info(f"移除 SSH 连接: {connection_key}")
+    
+    def discard_connection(self, connection: SSHConnection) -> bool:
+        """
+        移除出错的连接
+        
+        只移除已断开或没有打开通道的连接，同一 Transport 上仍在使用的交互式 shell 不受影响
+        
+        Returns:
+            bool: 是否已移除
+        """
+        connection_key = self._get_connection_key(connection.hostname, connection.port, connection.username)
+        
+        with self._lock:
+            if connection.is_alive() and not connection.try_retire():
+                return False
+            conns = self.connections.get(connection_key, [])
+            if connection in conns:
+                conns.remove(connection)
+                if not conns:
+                    del self.connections[connection_key]
+        
+        connection.disconnect()
+        logger.info(f"移除 SSH 连接: {connection_key}")
+        return True
     
     def close_all(self):
         """关闭所有连接"""
         with self._lock:
-            for connection in self.connections.values():
-                connection.disconnect()
+            connections = [conn for conns in self.connections.values() for conn in conns]
             self.connections.clear()
-            logger.info("已关闭所有 SSH 连接")
+        
+        for connection in connections:
+            connection.disconnect()
+        logger.info("已关闭所有 SSH 连接")
     
     def get_pool_status(self) -> Dict[str, Any]:
         """获取连接池状态"""
         with self._lock:
-            active_connections = sum(1 for conn in self.connections.values() if conn.is_alive())
-            return {
-                'total_connections': len(self.connections),
-                'active_connections': active_connections,
-                'max_connections': self.max_connections,
-                'connection_keys': list(self.connections.keys())
+            hosts = {key: list(conns) for key, conns in self.connections.items()}
+            pending = list(self._pending.keys())
+            handshakes = self.handshakes
+            metrics = {
+                'handshakes': handshakes,
+                'handshake_failures': self.handshake_failures,
+                'shared_handshakes': self.shared_handshakes,
+                'avg_handshake_ms': round(self.handshake_time / handshakes * 1000, 2) if handshakes else 0,
+                'max_handshake_ms': round(self.max_handshake_time * 1000, 2),
+                'pending_handshakes': len(pending)
             }
+        
+        host_stats = {key: [conn.get_stats() for conn in conns] for key, conns in hosts.items()}
+        total_connections = sum(len(conns) for conns in hosts.values())
+        active_connections = sum(1 for conns in hosts.values() for conn in conns if conn.is_alive())
+        metrics['channel_waiters'] = sum(stat['channel_waiters'] for stats in host_stats.values() for stat in stats)
+        
+        return {
+            'total_connections': total_connections,
+            'active_connections': active_connections,
+            'max_connections': self.max_connections,
+            'max_transports_per_host': self.max_transports_per_host,
+            'max_channels_per_transport': self.max_channels_per_transport,
+            'connection_keys': list(hosts.keys()),
+            'hosts': host_stats,
+            'metrics': metrics
+        }
 
 
 class SSHService:
@@ -288,7 +572,10 @@ class SSHService:
         self.connection_pool = SSHConnectionPool(
             max_connections=ssh_config.get('max_connections', 10),
             connection_timeout=ssh_config.get('connection_timeout', 30),
-            idle_timeout=ssh_config.get('idle_timeout', 300)
+            idle_timeout=ssh_config.get('idle_timeout', 300),
+            max_channels_per_transport=ssh_config.get('max_channels_per_transport', 8),
+            max_transports_per_host=ssh_config.get('max_transports_per_host', 3),
+            channel_wait_timeout=ssh_config.get('channel_wait_timeout', 30)
         )
         
         self.password_service = PasswordDecryptService()
@@ -350,6 +637,8 @@ class SSHService:
             
             yield connection
             
+        except SSHChannelTimeoutError:
+            raise
         except Exception as e:
             logger.error(f"获取 SSH 连接失败: {str(e)}")
             raise SSHConnectionError(f"获取 SSH 连接失败: {str(e)}")
@@ -364,6 +653,7 @@ class SSHService:
         last_error = None
         
         for attempt in range(self.retry_attempts):
+            connection = None
             try:
                 with self.get_connection(hostname, port, username, auth_type, password, private_key) as connection:
                     return connection.execute_command(command, timeout)
@@ -373,8 +663,10 @@ class SSHService:
                 if attempt < self.retry_attempts - 1:
                     logger.warning(f"SSH 命令执行失败，第 {attempt + 1} 次重试: {str(e)}")
                     time.sleep(self.retry_delay)
-                    # 移除可能有问题的连接
-                    self.connection_pool.remove_connection(hostname, port, username)
+                    # 通道等待超时说明连接繁忙而非失效，不移除；其他错误只移除本次使用的连接
+                    # （已断开或没有打开的通道时才移除，不影响同一 Transport 上的交互式 shell）
+                    if connection is not None and not isinstance(e, SSHChannelTimeoutError):
+                        self.connection_pool.discard_connection(connection)
                 else:
                     logger.error(f"SSH 命令执行失败，已达到最大重试次数: {str(e)}")
         
@@ -4,11 +4,11 @@ SSH 终端桥接服务
 提供高性能、低延迟的 SSH 终端连接
 集成命令过滤和审计日志功能
 """
+import codecs
 import threading
 import time
 import logging
 import queue
-import select
 from typing import Dict, Optional, Any, Tuple, Callable
 from datetime import datetime
 from dataclasses import dataclass
@@ -17,6 +17,7 @@ from app.services.ssh_service import ssh_service, SSHConnectionError
 from app.services.websocket_service import websocket_service
 from app.services.command_filter_service import command_filter_service
 from app.services.webshell_audit_service import webshell_audit_service
+from app.services.terminal_multiplexer import terminal_multiplexer, SessionInputQueue, TimerHandle
 from app.extensions import socketio
 
 logger = logging.getLogger(__name__)
@@ -25,18 +26,23 @@ logger = logging.getLogger(__name__)
 @dataclass
 class TerminalBridgeConfig:
     """终端桥接配置"""
-    buffer_size: int = 4096  # 读取缓冲区大小
-    read_timeout: float = 0.01  # 读取超时（秒）
     write_queue_size: int = 1000  # 写入队列大小
+    write_timeout: float = 10.0  # 写入 SSH 通道超时（秒），远端长时间不读取输入时断开会话
     heartbeat_interval: int = 30  # 心跳间隔（秒）
     idle_timeout: int = 1800  # 空闲超时（秒）
-    max_output_rate: int = 100000  # 最大输出速率（字节/秒）
+    frame_max_bytes: int = 16384  # 单个输出帧最大字节数
+    frame_max_delay: float = 0.016  # 输出帧最长合并等待时间（秒）
+    max_inflight_frames: int = 8  # 客户端未确认的输出帧上限，超出后暂停读取 SSH 通道
+    ack_timeout: float = 5.0  # 等待客户端确认的超时时间（秒），超时后重置未确认计数
 
 
 class SSHTerminalBridge:
     """
     SSH 终端桥接
     负责在 SSH 通道和 WebSocket 之间进行数据转发
+    
+    读取由终端多路复用器的事件循环驱动，输入经会话输入队列在 I/O 线程池中写入，
+    流控状态（输出帧、未确认帧计数、暂停读取）只在事件循环线程中修改。
     """
     
     def __init__(
@@ -47,7 +53,8 @@ class SSHTerminalBridge:
         host_id: int,
         tenant_id: int,
         config: TerminalBridgeConfig = None,
-        socket_sid: str = None
+        socket_sid: str = None,
+        binary_output: bool = False
     ):
         self.session_id = session_id
         self.ssh_channel = ssh_channel
@@ -56,23 +63,28 @@ class SSHTerminalBridge:
         self.tenant_id = tenant_id
         self.config = config or TerminalBridgeConfig()
         self.socket_sid = socket_sid  # Socket.IO session ID，用于直接发送消息
+        # 客户端支持二进制帧时直接发送原始字节，否则发送解码后的文本；两种模式都通过 ack 回执进行流控
+        self.binary_output = binary_output
         
         # 状态
         self.is_active = False
         self.created_at = datetime.utcnow()
         self.last_activity = datetime.utcnow()
         
-        # 线程控制
-        self._stop_event = threading.Event()
-        self._read_thread: Optional[threading.Thread] = None
-        self._write_thread: Optional[threading.Thread] = None
+        self._state_lock = threading.Lock()
+        
+        # 输入队列（启动时创建）
+        self._input_queue: Optional[SessionInputQueue] = None
         
-        # 写入队列
-        self._write_queue: queue.Queue = queue.Queue(maxsize=self.config.write_queue_size)
+        # 输出帧合并与流控（仅在事件循环线程中访问）
+        self._frame = bytearray()
+        self._frame_timer: Optional[TimerHandle] = None
+        self._inflight_frames = 0
+        self._reading_paused = False
+        self._ack_timer: Optional[TimerHandle] = None
         
-        # 输出速率控制
-        self._output_bytes = 0
-        self._output_start_time = time.time()
+        # 文本模式下的增量解码器，保留跨帧截断的 UTF-8 序列
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
         
         # 回调函数
         self._on_data_callback: Optional[Callable[[str], None]] = None
@@ -92,28 +104,20 @@ class SSHTerminalBridge:
             return True
         
         try:
-            # 设置通道为非阻塞模式
-            self.ssh_channel.settimeout(self.config.read_timeout)
-            self.ssh_channel.setblocking(False)
-            
-            self.is_active = True
-            self._stop_event.clear()
+            # 通道可读后 recv 立即返回，超时只作用于写入；PTY 下 stderr 合并到 stdout
+            self.ssh_channel.settimeout(self.config.write_timeout)
+            self.ssh_channel.set_combine_stderr(True)
             
-            # 启动读取线程（SSH -> WebSocket）
-            self._read_thread = threading.Thread(
-                target=self._read_loop,
-                name=f"ssh-read-{self.session_id[:8]}",
-                daemon=True
+            self._input_queue = SessionInputQueue(
+                terminal_multiplexer,
+                self._write_to_channel,
+                maxsize=self.config.write_queue_size,
+                on_error=self._on_write_error
             )
-            self._read_thread.start()
+            self.is_active = True
             
-            # 启动写入线程（WebSocket -> SSH）
-            self._write_thread = threading.Thread(
-                target=self._write_loop,
-                name=f"ssh-write-{self.session_id[:8]}",
-                daemon=True
-            )
-            self._write_thread.start()
+            # SSH -> WebSocket 由事件循环在通道可读时回调
+            terminal_multiplexer.register(self.ssh_channel, self._on_channel_readable)
             
             logger.info(f"SSH Terminal Bridge started: {self.session_id}, socket_sid: {self.socket_sid}")
             return True
@@ -127,32 +131,18 @@ class SSHTerminalBridge:
     
     def stop(self, reason: str = "Bridge stopped"):
         """停止桥接"""
-        if not self.is_active:
-            return
+        with self._state_lock:
+            if not self.is_active:
+                return
+            self.is_active = False
         
         logger.info(f"Stopping SSH Terminal Bridge: {self.session_id}, reason: {reason}")
         
-        self.is_active = False
-        self._stop_event.set()
-        
-        # 等待线程结束
-        if self._read_thread and self._read_thread.is_alive():
-            self._read_thread.join(timeout=2)
+        if self._input_queue:
+            self._input_queue.close()
         
-        if self._write_thread and self._write_thread.is_alive():
-            # 发送空数据唤醒写入线程
-            try:
-                self._write_queue.put_nowait(None)
-            except queue.Full:
-                pass
-            self._write_thread.join(timeout=2)
-        
-        # 关闭 SSH 通道
-        try:
-            if self.ssh_channel:
-                self.ssh_channel.close()
-        except Exception as e:
-            logger.warning(f"Error closing SSH channel: {e}")
+        # 在事件循环中注销并关闭通道，保证不会再有读回调
+        terminal_multiplexer.call_soon(self._teardown)
         
         # 触发关闭回调
         if self._on_close_callback:
@@ -194,7 +184,7 @@ class SSHTerminalBridge:
                     if len(data) >= 3 and data[1] == '[':
                         if data[2] in ('A', 'B'):  # 上下方向键
                             self._command_buffer = ""
-                    self._write_queue.put(data, timeout=1)
+                    self._enqueue_input(data)
                     self.last_activity = datetime.utcnow()
                     return True, ""
                 
@@ -215,7 +205,7 @@ class SSHTerminalBridge:
                         self._command_buffer = self._command_buffer.rsplit(None, 1)[0] if ' ' in self._command_buffer else ""
                     
                     # 直接发送控制字符
-                    self._write_queue.put(data, timeout=1)
+                    self._enqueue_input(data)
                     self.last_activity = datetime.utcnow()
                     return True, ""
                 
@@ -223,7 +213,7 @@ class SSHTerminalBridge:
                 if len(data) == 1 and first_char == 127:
                     if self._command_buffer:
                         self._command_buffer = self._command_buffer[:-1]
-                    self._write_queue.put(data, timeout=1)
+                    self._enqueue_input(data)
                     self.last_activity = datetime.utcnow()
                     return True, ""
             
@@ -253,13 +243,13 @@ class SSHTerminalBridge:
                     self._log_command_execution(command)
                 
                 # 发送回车执行命令
-                self._write_queue.put(data, timeout=1)
+                self._enqueue_input(data)
                 self.last_activity = datetime.utcnow()
                 return True, ""
             else:
                 # 非回车输入，累积到缓冲区并发送
                 self._command_buffer += data
-                self._write_queue.put(data, timeout=1)
+                self._enqueue_input(data)
                 self.last_activity = datetime.utcnow()
                 return True, ""
             
@@ -438,155 +428,228 @@ class SSHTerminalBridge:
         """设置关闭回调"""
         self._on_close_callback = callback
     
-    def _read_loop(self):
-        """读取循环：从 SSH 读取数据并发送到 WebSocket"""
-        buffer = b""
-        logger.info(f"Read loop started for session: {self.session_id}")
+    def _enqueue_input(self, data: str):
+        """加入输入队列，队列已满时抛出 queue.Full"""
+        if not self._input_queue or not self._input_queue.put(data):
+            raise queue.Full()
+    
+    def _write_to_channel(self, data):
+        """写入 SSH 通道（在 I/O 线程池中执行）"""
+        if not self.is_active:
+            return
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self.ssh_channel.sendall(data)
+        self.last_activity = datetime.utcnow()
+    
+    def _on_write_error(self, error: Exception):
+        """写入失败时停止桥接"""
+        if self.is_active:
+            logger.error(f"Error writing to SSH channel: {error}")
+            self.stop(f"Write error: {error}")
+    
+    def _on_channel_readable(self, channel: paramiko.Channel):
+        """
+        通道可读回调（事件循环线程）
         
-        while not self._stop_event.is_set() and self.is_active:
-            try:
-                # 检查通道是否有数据可读
-                if self.ssh_channel.recv_ready():
-                    data = self.ssh_channel.recv(self.config.buffer_size)
-                    
-                    if not data:
-                        # 连接已关闭
-                        logger.info(f"SSH channel closed: {self.session_id}")
-                        self.stop("SSH connection closed")
-                        break
-                    
-                    buffer += data
-                    logger.debug(f"Received {len(data)} bytes from SSH for session: {self.session_id}")
-                    
-                    # 速率控制
-                    self._output_bytes += len(data)
-                    elapsed = time.time() - self._output_start_time
-                    
-                    if elapsed >= 1.0:
-                        # 重置计数器
-                        self._output_bytes = 0
-                        self._output_start_time = time.time()
-                    elif self._output_bytes > self.config.max_output_rate:
-                        # 超过速率限制，等待
-                        time.sleep(0.1)
-                    
-                    # 尝试解码并发送
-                    try:
-                        text = buffer.decode('utf-8')
-                        buffer = b""
-                        self._send_output(text)
-                    except UnicodeDecodeError:
-                        # 可能是不完整的 UTF-8 序列，保留在缓冲区
-                        if len(buffer) > self.config.buffer_size * 2:
-                            # 缓冲区太大，强制解码
-                            text = buffer.decode('utf-8', errors='replace')
-                            buffer = b""
-                            self._send_output(text)
-                
-                # 检查 stderr
-                if self.ssh_channel.recv_stderr_ready():
-                    stderr_data = self.ssh_channel.recv_stderr(self.config.buffer_size)
-                    if stderr_data:
-                        try:
-                            text = stderr_data.decode('utf-8', errors='replace')
-                            self._send_output(text)
-                        except Exception as e:
-                            logger.warning(f"Error decoding stderr: {e}")
-                
-                # 检查通道状态
-                if self.ssh_channel.exit_status_ready():
-                    exit_status = self.ssh_channel.recv_exit_status()
-                    logger.info(f"SSH channel exit status: {exit_status}")
-                    self.stop(f"SSH process exited with status {exit_status}")
-                    break
-                
-                # 短暂休眠避免 CPU 占用过高
-                time.sleep(0.001)
-                
-            except socket.timeout:
-                continue
-            except Exception as e:
-                if self.is_active:
-                    logger.error(f"Error in read loop: {e}")
-                    import traceback
-                    traceback.print_exc()
-                    self.stop(f"Read error: {e}")
-                break
-        
-        # 发送剩余缓冲区数据
-        if buffer:
-            try:
-                text = buffer.decode('utf-8', errors='replace')
-                self._send_output(text)
-            except Exception:
-                pass
+        输出按大小（frame_max_bytes）和时间（frame_max_delay）合并为帧发送。
+        """
+        if not self.is_active:
+            # 已停止但注销尚未执行，先注销避免通道持续可读时空转
+            terminal_multiplexer.unregister(channel)
+            return
+        
+        room = self.config.frame_max_bytes - len(self._frame)
+        if room <= 0:
+            self._pause_reading()
+            return
+        
+        try:
+            data = channel.recv(room)
+        except Exception as e:
+            self._close_from_loop(f"Read error: {e}")
+            return
+        
+        if not data:
+            # 通道 EOF：远端进程退出或连接关闭
+            if channel.exit_status_ready():
+                exit_status = channel.recv_exit_status()
+                logger.info(f"SSH channel exit status: {exit_status}")
+                reason = f"SSH process exited with status {exit_status}"
+            else:
+                logger.info(f"SSH channel closed: {self.session_id}")
+                reason = "SSH connection closed"
+            self._close_from_loop(reason)
+            return
         
-        logger.info(f"Read loop ended for session: {self.session_id}")
+        self._frame += data
+        if len(self._frame) >= self.config.frame_max_bytes:
+            self._flush_frame()
+        elif self._frame_timer is None:
+            self._frame_timer = terminal_multiplexer.call_later(
+                self.config.frame_max_delay, self._flush_frame
+            )
     
-    def _write_loop(self):
-        """写入循环：从队列读取数据并发送到 SSH"""
-        while not self._stop_event.is_set() and self.is_active:
-            try:
-                # 从队列获取数据
-                data = self._write_queue.get(timeout=0.1)
-                
-                if data is None:
-                    # 停止信号
-                    break
-                
-                if not self.ssh_channel or not self.is_active:
-                    break
-                
-                # 发送数据到 SSH
-                if isinstance(data, str):
-                    data = data.encode('utf-8')
-                
-                self.ssh_channel.send(data)
-                self.last_activity = datetime.utcnow()
-                
-            except queue.Empty:
-                continue
-            except Exception as e:
-                if self.is_active:
-                    logger.error(f"Error in write loop: {e}")
-                    self.stop(f"Write error: {e}")
-                break
+    def _flush_frame(self):
+        """
+        发送当前输出帧（事件循环线程）
+        
+        未确认帧达到上限时暂停读取通道并保留当前帧，由 SSH 通道窗口
+        将背压传递到远端进程，收到客户端确认后恢复。
+        """
+        if self._frame_timer is not None:
+            self._frame_timer.cancel()
+            self._frame_timer = None
+        if not self._frame or not self.is_active:
+            return
+        
+        if self._uses_flow_control() and self._inflight_frames >= self.config.max_inflight_frames:
+            self._pause_reading()
+            return
+        
+        frame = bytes(self._frame)
+        self._frame.clear()
+        # 文本模式下解码器可能暂存不完整的字符而不发送，只有实际发出的帧计入未确认数
+        if self._send_output(frame):
+            self._inflight_frames += 1
     
-    def _send_output(self, data: str):
-        """发送输出到 WebSocket"""
-        if not data:
+    def _pause_reading(self):
+        """暂停读取通道，等待客户端确认"""
+        if self._reading_paused:
+            return
+        self._reading_paused = True
+        terminal_multiplexer.unregister(self.ssh_channel)
+        self._ack_timer = terminal_multiplexer.call_later(
+            self.config.ack_timeout, self._on_ack_timeout
+        )
+    
+    def _resume_reading(self):
+        """发送保留的输出帧并恢复读取通道"""
+        if self._ack_timer is not None:
+            self._ack_timer.cancel()
+            self._ack_timer = None
+        self._reading_paused = False
+        self._flush_frame()
+        if self.is_active and not self._reading_paused:
+            terminal_multiplexer.register(self.ssh_channel, self._on_channel_readable)
+    
+    def _on_ack_timeout(self):
+        """
+        等待客户端确认超时（如客户端重连丢失回执），重置计数继续发送，
+        避免会话永久挂起
+        """
+        self._ack_timer = None
+        if not self._reading_paused or not self.is_active:
             return
+        logger.warning(
+            f"Output ack timeout for session: {self.session_id}, "
+            f"inflight frames: {self._inflight_frames}"
+        )
+        self._inflight_frames = 0
+        self._resume_reading()
+    
+    def _uses_flow_control(self) -> bool:
+        """是否启用基于客户端 ack 的流控（仅直接发送到单个 Socket.IO 连接时可用）"""
+        return bool(self.socket_sid)
+    
+    def _on_frame_ack(self, *args):
+        """客户端确认收到输出帧（Socket.IO 线程），转交事件循环处理"""
+        terminal_multiplexer.call_soon(self._handle_frame_ack)
+    
+    def _handle_frame_ack(self):
+        if self._inflight_frames > 0:
+            self._inflight_frames -= 1
+        if self._reading_paused and self._inflight_frames < self.config.max_inflight_frames:
+            self._resume_reading()
+    
+    def reset_flow_control(self):
+        """重置流控计数（Socket.IO 连接变更后旧连接的回执不会再到达）"""
+        terminal_multiplexer.call_soon(self._handle_flow_reset)
+    
+    def _handle_flow_reset(self):
+        self._inflight_frames = 0
+        if self._reading_paused:
+            self._resume_reading()
+    
+    def _close_from_loop(self, reason: str):
+        """事件循环中检测到通道结束：发送剩余输出，注销通道后在线程池中停止桥接"""
+        if self._frame:
+            frame = bytes(self._frame)
+            self._frame.clear()
+            self._send_output(frame)
+        terminal_multiplexer.unregister(self.ssh_channel)
+        terminal_multiplexer.submit(self.stop, reason)
+    
+    def _teardown(self):
+        """注销并关闭 SSH 通道（事件循环线程）"""
+        for timer in (self._frame_timer, self._ack_timer):
+            if timer is not None:
+                timer.cancel()
+        self._frame_timer = None
+        self._ack_timer = None
+        self._frame.clear()
+        
+        terminal_multiplexer.unregister(self.ssh_channel)
+        # 关闭通道可能等待传输层，放到线程池执行
+        terminal_multiplexer.submit(self._close_channel)
+    
+    def _close_channel(self):
+        try:
+            if self.ssh_channel:
+                self.ssh_channel.close()
+        except Exception as e:
+            logger.warning(f"Error closing SSH channel: {e}")
+    
+    def _send_output(self, data: bytes) -> bool:
+        """
+        发送输出到 WebSocket
+        
+        Returns:
+            bool: 是否发出了等待客户端确认的输出帧
+        """
+        if not data:
+            return False
         
         self.last_activity = datetime.utcnow()
         
+        text = None
+        if not self.binary_output or self._on_data_callback:
+            text = self._decoder.decode(data)
+        
         # 触发数据回调
-        if self._on_data_callback:
+        if self._on_data_callback and text:
             try:
-                self._on_data_callback(data)
+                self._on_data_callback(text)
             except Exception as e:
                 logger.error(f"Error in data callback: {e}")
         
-        # 发送到 WebSocket
+        # 发送到 WebSocket：二进制模式发送原始字节，文本模式发送解码后的字符串
+        payload = data if self.binary_output else text
+        if not payload:
+            return False
+        
         try:
             output_data = {
                 'session_id': self.session_id,
-                'data': data,
+                'data': payload,
                 'timestamp': datetime.utcnow().isoformat()
             }
             
             # 优先使用 Socket.IO session ID 直接发送
             if self.socket_sid:
-                socketio.emit('webshell_output', output_data, to=self.socket_sid)
-                logger.debug(f"Sent output to socket_sid: {self.socket_sid}")
-            else:
-                # 回退到用户房间广播
-                websocket_service.send_to_user(
-                    self.user_id,
-                    'webshell_output',
-                    output_data
-                )
+                socketio.emit('webshell_output', output_data, to=self.socket_sid,
+                              callback=self._on_frame_ack)
+                logger.debug(f"Sent {len(data)} bytes to socket_sid: {self.socket_sid}")
+                return True
+            # 回退到用户房间广播
+            websocket_service.send_to_user(
+                self.user_id,
+                'webshell_output',
+                output_data
+            )
         except Exception as e:
             logger.error(f"Error sending output to WebSocket: {e}")
+        return False
     
     def is_idle_timeout(self) -> bool:
         """检查是否空闲超时"""
@@ -600,52 +663,53 @@ class SSHTerminalBridge:
 class SSHTerminalBridgeManager:
     """SSH 终端桥接管理器"""
     
+    CLEANUP_INTERVAL = 60  # 空闲检查间隔（秒）
+    
     def __init__(self):
         self.bridges: Dict[str, SSHTerminalBridge] = {}
         self._lock = threading.Lock()
-        self._cleanup_thread: Optional[threading.Thread] = None
-        self._start_cleanup_thread()
+        self._cleanup_scheduled = False
         
         logger.info("SSH Terminal Bridge Manager initialized")
     
-    def _start_cleanup_thread(self):
-        """启动清理线程"""
-        if self._cleanup_thread is None or not self._cleanup_thread.is_alive():
-            self._cleanup_thread = threading.Thread(
-                target=self._cleanup_loop,
-                name="ssh-bridge-cleanup",
-                daemon=True
-            )
-            self._cleanup_thread.start()
+    def _ensure_cleanup_scheduled(self):
+        """首次创建桥接时在多路复用器上调度定期清理（不再占用独立线程）"""
+        with self._lock:
+            if self._cleanup_scheduled:
+                return
+            self._cleanup_scheduled = True
+        terminal_multiplexer.call_later(self.CLEANUP_INTERVAL, self._schedule_cleanup)
     
-    def _cleanup_loop(self):
-        """清理循环"""
-        while True:
-            try:
-                time.sleep(60)  # 每分钟检查一次
+    def _schedule_cleanup(self):
+        """事件循环定时器：在线程池中执行清理并调度下一次"""
+        terminal_multiplexer.submit(self._cleanup_bridges)
+        terminal_multiplexer.call_later(self.CLEANUP_INTERVAL, self._schedule_cleanup)
+    
+    def _cleanup_bridges(self):
+        """清理空闲超时和已停止的桥接"""
+        try:
+            with self._lock:
+                bridges_to_remove = []
                 
-                with self._lock:
-                    bridges_to_remove = []
-                    
-                    for session_id, bridge in self.bridges.items():
-                        # 检查空闲超时
-                        if bridge.is_idle_timeout():
-                            bridges_to_remove.append(session_id)
-                            logger.info(f"Bridge idle timeout: {session_id}")
-                        # 检查是否已停止
-                        elif not bridge.is_active:
-                            bridges_to_remove.append(session_id)
-                    
-                    for session_id in bridges_to_remove:
-                        bridge = self.bridges.pop(session_id, None)
-                        if bridge and bridge.is_active:
-                            bridge.stop("Idle timeout")
+                for session_id, bridge in self.bridges.items():
+                    # 检查空闲超时
+                    if bridge.is_idle_timeout():
+                        bridges_to_remove.append(session_id)
+                        logger.info(f"Bridge idle timeout: {session_id}")
+                    # 检查是否已停止
+                    elif not bridge.is_active:
+                        bridges_to_remove.append(session_id)
+                
+                for session_id in bridges_to_remove:
+                    bridge = self.bridges.pop(session_id, None)
+                    if bridge and bridge.is_active:
+                        bridge.stop("Idle timeout")
+                
+                if bridges_to_remove:
+                    logger.info(f"Cleaned up {len(bridges_to_remove)} bridges")
                     
-                    if bridges_to_remove:
-                        logger.info(f"Cleaned up {len(bridges_to_remove)} bridges")
-                        
-            except Exception as e:
-                logger.error(f"Error in cleanup loop: {e}")
+        except Exception as e:
+            logger.error(f"Error in cleanup loop: {e}")
     
     def create_bridge(
         self,
@@ -663,11 +727,15 @@ class SSHTerminalBridgeManager:
         rows: int = 24,
         config: TerminalBridgeConfig = None,
         socket_sid: str = None,
-        ip_address: str = None
+        ip_address: str = None,
+        binary_output: bool = False
     ) -> Tuple[bool, str, Optional[SSHTerminalBridge]]:
         """
         创建终端桥接
         
+        Args:
+            binary_output: 客户端是否支持二进制输出帧（否则发送文本帧）
+        
         Returns:
             (success, message, bridge)
         """
@@ -693,7 +761,7 @@ class SSHTerminalBridgeManager:
             
             # 创建 shell 通道
             try:
-                ssh_channel = ssh_connection.client.invoke_shell(
+                ssh_channel = ssh_connection.invoke_shell(
                     term='xterm-256color',
                     width=cols,
                     height=rows
@@ -709,7 +777,8 @@ class SSHTerminalBridgeManager:
                 host_id=host_id,
                 tenant_id=tenant_id,
                 config=config,
-                socket_sid=socket_sid
+                socket_sid=socket_sid,
+                binary_output=binary_output
             )
             
             # 设置 IP 地址（用于审计日志）
@@ -723,6 +792,7 @@ class SSHTerminalBridgeManager:
             # 添加到管理器
             with self._lock:
                 self.bridges[session_id] = bridge
+            self._ensure_cleanup_scheduled()
             
             logger.info(f"Bridge created: {session_id}, socket_sid: {socket_sid}")
             return True, "Bridge created successfully", bridge
@@ -742,6 +812,7 @@ class SSHTerminalBridgeManager:
             bridge = self.bridges.get(session_id)
             if bridge:
                 bridge.socket_sid = socket_sid
+                bridge.reset_flow_control()
                 logger.info(f"Updated socket_sid for bridge {session_id}: {socket_sid}")
                 return True
             return False
@@ -777,7 +848,8 @@ class SSHTerminalBridgeManager:
             return {
                 'total_bridges': len(self.bridges),
                 'active_bridges': active_count,
-                'session_ids': list(self.bridges.keys())
+                'session_ids': list(self.bridges.keys()),
+                'multiplexer': terminal_multiplexer.get_stats()
             }
     
     def close_all(self):
@@ -790,8 +862,5 @@ class SSHTerminalBridgeManager:
         logger.info("All bridges closed")
 
 
-# 需要导入 socket 模块
-import socket
-
 # 全局桥接管理器实例
 ssh_terminal_bridge_manager = SSHTerminalBridgeManager()
@@ -0,0 +1,323 @@
+"""
+终端 I/O 多路复用器
+由单个 selector 事件循环驱动所有终端会话（SSH 通道、Pod exec WebSocket）的读取，
+写入和可能阻塞的操作交给固定大小的线程池，替代每个会话独立的读写线程
+"""
+import heapq
+import itertools
+import logging
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.core.config_manager import config_manager
+
+logger = logging.getLogger(__name__)
+
+
+class TimerHandle:
+    """定时回调句柄"""
+
+    __slots__ = ('when', 'callback', 'args', 'cancelled')
+
+    def __init__(self, when: float, callback: Callable, args: tuple):
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        """取消定时回调（回调执行前有效）"""
+        self.cancelled = True
+
+
+class SessionInputQueue:
+    """
+    会话输入队列
+
+    输入按会话排队，由多路复用器的线程池串行写入：同一会话同时最多占用一个工作线程，
+    单次最多写入 max_batch 条后让出线程，避免大段粘贴独占线程池。
+    """
+
+    def __init__(self, multiplexer: 'TerminalMultiplexer', writer: Callable[[Any], None],
+                 maxsize: int = 1000, max_batch: int = 64,
+                 on_error: Optional[Callable[[Exception], None]] = None):
+        self._multiplexer = multiplexer
+        self._writer = writer
+        self._maxsize = maxsize
+        self._max_batch = max_batch
+        self._on_error = on_error
+        self._items: deque = deque()
+        self._lock = threading.Lock()
+        self._scheduled = False
+        self._closed = False
+
+    def put(self, data: Any) -> bool:
+        """加入输入数据，队列已满或已关闭时返回 False"""
+        with self._lock:
+            if self._closed or len(self._items) >= self._maxsize:
+                return False
+            self._items.append(data)
+            if self._scheduled:
+                return True
+            self._scheduled = True
+        self._multiplexer.submit(self._drain)
+        return True
+
+    def close(self):
+        """关闭队列并丢弃未写入的数据"""
+        with self._lock:
+            self._closed = True
+            self._items.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _drain(self):
+        """在线程池中按顺序写入排队的数据"""
+        for _ in range(self._max_batch):
+            with self._lock:
+                if self._closed or not self._items:
+                    self._scheduled = False
+                    return
+                data = self._items.popleft()
+            try:
+                self._writer(data)
+            except Exception as e:
+                with self._lock:
+                    self._closed = True
+                    self._items.clear()
+                    self._scheduled = False
+                if self._on_error:
+                    self._on_error(e)
+                return
+
+        # 本轮写满批次，重新排队让其他会话的写入先执行
+        self._multiplexer.submit(self._drain)
+
+
+class TerminalMultiplexer:
+    """
+    终端 I/O 多路复用器
+
+    - register/unregister/call_soon/call_later 线程安全，实际操作在事件循环线程中执行；
+      在事件循环线程中调用 register/unregister 立即生效，便于回调中先检查会话状态再注册
+    - 读回调在事件循环线程中执行，必须是非阻塞的（通道可读后的 recv 不会阻塞）
+    - submit 将可能阻塞的操作（写入、关闭连接、会话清理）交给线程池
+    """
+
+    def __init__(self, io_workers: int = 8, poll_interval: float = 1.0):
+        self.io_workers = io_workers
+        self.poll_interval = poll_interval
+
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._selector: Optional[selectors.BaseSelector] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._wakeup_r: Optional[socket.socket] = None
+        self._wakeup_w: Optional[socket.socket] = None
+
+        # 待执行回调与定时器（定时器堆只在事件循环线程中访问）
+        self._ready: deque = deque()
+        self._timers: list = []
+        self._timer_seq = itertools.count()
+
+        self._stats = {
+            'loop_iterations': 0,
+            'read_callbacks': 0,
+            'callback_errors': 0,
+            'tasks_submitted': 0
+        }
+
+    # ==================== 公共接口 ====================
+
+    def register(self, fileobj: Any, callback: Callable[[Any], None]):
+        """注册可读事件，fileobj 可读时在事件循环线程中调用 callback(fileobj)"""
+        if self.in_loop_thread():
+            self._register(fileobj, callback)
+        else:
+            self.call_soon(self._register, fileobj, callback)
+
+    def unregister(self, fileobj: Any):
+        """取消注册（暂停读取或会话结束）"""
+        if self.in_loop_thread():
+            self._unregister(fileobj)
+        else:
+            self.call_soon(self._unregister, fileobj)
+
+    def call_soon(self, callback: Callable, *args):
+        """在事件循环线程中尽快执行回调"""
+        self._ensure_started()
+        self._ready.append((callback, args))
+        if threading.current_thread() is not self._thread:
+            self._wakeup()
+
+    def call_later(self, delay: float, callback: Callable, *args) -> TimerHandle:
+        """在事件循环线程中延迟执行回调"""
+        handle = TimerHandle(time.monotonic() + delay, callback, args)
+        self.call_soon(self._push_timer, handle)
+        return handle
+
+    def submit(self, fn: Callable, *args) -> Future:
+        """在 I/O 线程池中执行可能阻塞的操作"""
+        self._ensure_started()
+        with self._lock:
+            self._stats['tasks_submitted'] += 1
+        return self._executor.submit(self._run_task, fn, args)
+
+    def in_loop_thread(self) -> bool:
+        """当前是否在事件循环线程中"""
+        return threading.current_thread() is self._thread
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取多路复用器统计信息"""
+        registered = 0
+        if self._selector is not None:
+            try:
+                # 减去内部唤醒套接字
+                registered = max(len(self._selector.get_map()) - 1, 0)
+            except Exception:
+                pass
+        with self._lock:
+            stats = dict(self._stats)
+        return {
+            'running': bool(self._thread and self._thread.is_alive()),
+            'io_workers': self.io_workers,
+            'registered': registered,
+            'pending_callbacks': len(self._ready),
+            'pending_timers': len(self._timers),
+            **stats
+        }
+
+    # ==================== 事件循环 ====================
+
+    def _ensure_started(self):
+        """首次使用时启动事件循环线程和线程池"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            if self._selector is None:
+                self._selector = selectors.DefaultSelector()
+                self._wakeup_r, self._wakeup_w = socket.socketpair()
+                self._wakeup_r.setblocking(False)
+                self._wakeup_w.setblocking(False)
+                self._selector.register(self._wakeup_r, selectors.EVENT_READ, None)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.io_workers,
+                    thread_name_prefix='terminal-io'
+                )
+            self._thread = threading.Thread(
+                target=self._run,
+                name='terminal-mux',
+                daemon=True
+            )
+            self._thread.start()
+            logger.info(f"Terminal multiplexer started with {self.io_workers} I/O workers")
+
+    def _wakeup(self):
+        """唤醒阻塞在 select 上的事件循环"""
+        try:
+            self._wakeup_w.send(b'\0')
+        except (BlockingIOError, OSError):
+            # 缓冲区已满说明已有未处理的唤醒信号
+            pass
+
+    def _drain_wakeup(self):
+        try:
+            while self._wakeup_r.recv(4096):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+    def _run(self):
+        """事件循环主体"""
+        while True:
+            try:
+                with self._lock:
+                    self._stats['loop_iterations'] += 1
+
+                # 执行本轮开始前已排队的回调（注册/注销先于 select 生效）
+                for _ in range(len(self._ready)):
+                    callback, args = self._ready.popleft()
+                    self._invoke(callback, *args)
+
+                if self._ready:
+                    timeout = 0
+                elif self._timers:
+                    timeout = min(self.poll_interval, max(self._timers[0][0] - time.monotonic(), 0))
+                else:
+                    timeout = self.poll_interval
+
+                for key, _ in self._selector.select(timeout):
+                    if key.data is None:
+                        self._drain_wakeup()
+                        continue
+                    with self._lock:
+                        self._stats['read_callbacks'] += 1
+                    self._invoke(key.data, key.fileobj)
+
+                now = time.monotonic()
+                while self._timers and self._timers[0][0] <= now:
+                    _, _, handle = heapq.heappop(self._timers)
+                    if not handle.cancelled:
+                        self._invoke(handle.callback, *handle.args)
+
+            except Exception as e:
+                logger.error(f"Error in terminal multiplexer loop: {e}")
+                time.sleep(0.1)
+
+    def _invoke(self, callback: Callable, *args):
+        try:
+            callback(*args)
+        except Exception as e:
+            with self._lock:
+                self._stats['callback_errors'] += 1
+            logger.error(f"Error in terminal multiplexer callback {getattr(callback, '__qualname__', callback)}: {e}")
+
+    def _run_task(self, fn: Callable, args: tuple):
+        try:
+            return fn(*args)
+        except Exception as e:
+            logger.error(f"Error in terminal I/O task {getattr(fn, '__qualname__', fn)}: {e}")
+
+    def _push_timer(self, handle: TimerHandle):
+        heapq.heappush(self._timers, (handle.when, next(self._timer_seq), handle))
+
+    def _register(self, fileobj: Any, callback: Callable[[Any], None]):
+        try:
+            # 已注册（同一对象重新注册，或旧对象关闭后文件描述符被复用）时先移除旧注册
+            key = self._selector.get_key(fileobj)
+        except (KeyError, ValueError):
+            key = None
+        try:
+            if key is not None:
+                self._selector.unregister(key.fileobj)
+            self._selector.register(fileobj, selectors.EVENT_READ, callback)
+        except (KeyError, ValueError, OSError) as e:
+            # 通道在注册前已关闭
+            logger.warning(f"Failed to register terminal channel: {e}")
+
+    def _unregister(self, fileobj: Any):
+        try:
+            self._selector.unregister(fileobj)
+        except (KeyError, ValueError, OSError):
+            pass
+
+
+def _create_terminal_multiplexer() -> TerminalMultiplexer:
+    """根据配置创建多路复用器"""
+    ssh_config = config_manager.get_app_config().get('ssh', {})
+    return TerminalMultiplexer(
+        io_workers=ssh_config.get('terminal_io_workers', 8)
+    )
+
+
+# 全局终端多路复用器实例（首次使用时启动）
+terminal_multiplexer = _create_terminal_multiplexer()
@@ -10,6 +10,7 @@ from flask import g, request
 from sqlalchemy import desc, and_, or_
 from app.extensions import db
 from app.models.webshell_audit import WebShellAuditLog
+from app.services.webshell_audit_writer import webshell_audit_writer
 import logging
 
 logger = logging.getLogger(__name__)
@@ -62,10 +63,14 @@ class WebShellAuditService:
         error: Optional[str] = None,
         block_reason: Optional[str] = None,
         ip_address: Optional[str] = None,
-        execution_time: Optional[float] = None
+        execution_time: Optional[float] = None,
+        sync: bool = False
     ) -> Optional[WebShellAuditLog]:
         """
         记录命令执行日志
+
+        默认交给审计日志写入器缓冲后批量写入（不阻塞终端），
+        写入器关闭或 sync=True 时同步写入并返回创建的对象。
         
         Args:
             user_id: 用户ID
@@ -79,9 +84,10 @@ class WebShellAuditService:
             block_reason: 阻止原因
             ip_address: 客户端IP地址
             execution_time: 执行时间（秒）
+            sync: 是否同步写入数据库
             
         Returns:
-            创建的审计日志对象，失败返回None
+            同步写入时返回创建的审计日志对象；异步写入或失败返回None
         """
         try:
             # 获取租户ID
@@ -98,6 +104,26 @@ class WebShellAuditService:
             
             # 截断输出
             output_summary = WebShellAuditService.truncate_output(output)
+            executed_at = datetime.now(timezone.utc)
+            
+            if not sync and webshell_audit_writer.enabled:
+                # 异步批量写入：租户和IP已在调用方上下文中解析
+                webshell_audit_writer.add({
+                    'tenant_id': tenant_id,
+                    'user_id': user_id,
+                    'host_id': host_id,
+                    'session_id': session_id,
+                    'command': command,
+                    'status': status,
+                    'output_summary': output_summary,
+                    'error_message': error,
+                    'block_reason': block_reason,
+                    'ip_address': ip_address,
+                    'execution_time': execution_time,
+                    'executed_at': executed_at
+                })
+                logger.debug(f"Audit log queued: user={user_id}, host={host_id}, status={status}, command={command[:50]}...")
+                return None
             
             # 创建审计日志
             audit_log = WebShellAuditLog(
@@ -112,7 +138,7 @@ class WebShellAuditService:
                 block_reason=block_reason,
                 ip_address=ip_address,
                 execution_time=execution_time,
-                executed_at=datetime.now(timezone.utc)
+                executed_at=executed_at
             )
             
             db.session.add(audit_log)
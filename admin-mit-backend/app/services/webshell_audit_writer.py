@@ -0,0 +1,508 @@
+"""
+WebShell 审计日志异步批量写入服务
+终端输入路径只把审计记录追加到内存中的待暂存队列，不访问 Redis 和数据库；
+后台线程将待暂存记录追加到 Redis 中该进程的暂存列表，达到行数阈值或时间阈值后
+用一条多行 INSERT 写入 webshell_audit_logs，终端延迟不受 Redis 和数据库延迟影响。
+
+写库成功后才从暂存列表中移除：进程正常退出时会先写完缓冲；
+进程异常退出时，其暂存列表由恢复任务补写入库。
+内存缓冲达到上限（数据库写入落后）后，新暂存的记录只保留在暂存列表中，
+由后台线程写库后再从列表读回。Redis 不可用时由后台线程直接写库；
+只有待暂存队列也达到上限（后台线程长时间无法暂存和写库）时，终端线程才同步写库。
+"""
+import atexit
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from app.extensions import db
+from app.models.webshell_audit import WebShellAuditLog
+from app.core.config_manager import config_manager
+
+logger = logging.getLogger(__name__)
+
+
+class WebShellAuditWriter:
+    """WebShell 审计日志批量写入器"""
+
+    SPOOL_PREFIX = 'webshell:audit:spool'
+    RECOVERING_MARKER = ':recovering:'
+    HEARTBEAT_PREFIX = 'webshell:audit:heartbeat'
+
+    # 写入的列（created_at/updated_at 由写入器填充）
+    COLUMNS = (
+        'tenant_id', 'user_id', 'host_id', 'session_id', 'command', 'status',
+        'output_summary', 'error_message', 'block_reason', 'ip_address',
+        'execution_time', 'executed_at', 'created_at', 'updated_at'
+    )
+    DATETIME_COLUMNS = ('executed_at', 'created_at', 'updated_at')
+
+    def __init__(self, redis_client=None):
+        self._redis = redis_client
+        self._app = None
+
+        writer_config = config_manager.get_app_config().get('ssh', {}).get('audit_writer', {})
+        self.enabled = writer_config.get('enabled', True)  # 关闭时审计日志同步写入
+        self.flush_rows = writer_config.get('flush_rows', 200)  # 缓冲达到该行数立即唤醒后台写入
+        self.flush_interval_ms = writer_config.get('flush_interval_ms', 500)  # 缓冲最长停留时间（毫秒）
+        self.max_buffer_rows = writer_config.get('max_buffer_rows', 10000)  # 内存缓冲上限，超出的记录只保留在暂存列表中
+        self.heartbeat_ttl = writer_config.get('heartbeat_ttl', 60)  # 进程心跳过期时间（秒）
+
+        self._pending: List[Dict[str, Any]] = []  # 尚未追加到暂存列表的记录
+        self._buffer: List[Dict[str, Any]] = []  # 已暂存、等待写库的记录（暂存列表的前缀）
+        self._buffer_since: Optional[float] = None
+        self._spilled = 0  # 只在暂存列表中、尚未读回内存缓冲的行数（位于缓冲之后）
+        self._spool_skip = 0  # 暂存列表头部已写库但未能移除的行数（非 0 时需改用新的暂存列表）
+        self._retry_at = 0.0  # 暂存或写库失败后下次重试的时间
+        self._heartbeat_at = 0.0  # 下次刷新心跳的时间
+        self._overflow_logged_at: Optional[float] = None  # 上次记录同步写库告警的时间
+        self._overflow_suppressed = 0  # 告警间隔内未记录的同步写库次数
+        # _lock 只保护内存状态，持有期间不访问 Redis 和数据库；
+        # 暂存列表的读写和写库由持有 _flush_lock 的后台线程（或进程退出时的 close）执行
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self._pid = None
+        self._worker_pid = None
+        self._worker_nonce = None
+        self._atexit_registered = False
+
+    @property
+    def redis(self):
+        """延迟获取 Redis 客户端"""
+        if self._redis is None:
+            from app.extensions import get_redis_client
+            self._redis = get_redis_client()
+        return self._redis
+
+    @property
+    def worker_id(self) -> str:
+        """当前进程标识（含随机后缀：容器重启后 PID 相同，不能沿用已退出进程的暂存列表）"""
+        if self._worker_pid != os.getpid():
+            self._worker_pid = os.getpid()
+            self._worker_nonce = uuid.uuid4().hex[:12]
+        return f"{socket.gethostname()}:{self._worker_pid}:{self._worker_nonce}"
+
+    def _get_spool_key(self, worker_id: Optional[str] = None) -> str:
+        """进程暂存列表键"""
+        return f"{self.SPOOL_PREFIX}:{worker_id or self.worker_id}"
+
+    def _get_heartbeat_key(self, worker_id: Optional[str] = None) -> str:
+        """进程心跳键"""
+        return f"{self.HEARTBEAT_PREFIX}:{worker_id or self.worker_id}"
+
+    # ==================== 写入 ====================
+
+    def start(self, app=None):
+        """启动后台刷新线程（每个进程一个，fork 后重新创建）"""
+        if app is not None:
+            self._app = app
+        if self._app is None:
+            try:
+                from flask import current_app
+                self._app = current_app._get_current_object()
+            except RuntimeError:
+                pass
+        if self._flusher is not None and self._flusher.is_alive() and self._pid == os.getpid():
+            return
+
+        self._pid = os.getpid()
+        self._stop_event = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name='webshell-audit-writer', daemon=True)
+        self._flusher.start()
+
+        # 进程正常退出时写完缓冲
+        if not self._atexit_registered:
+            atexit.register(self.close)
+            self._atexit_registered = True
+
+    @staticmethod
+    def _serialize(row: Dict[str, Any]) -> str:
+        return json.dumps({
+            key: value.isoformat() if isinstance(value, datetime) else value
+            for key, value in row.items()
+        }, ensure_ascii=False)
+
+    @classmethod
+    def _deserialize(cls, raw) -> Dict[str, Any]:
+        if isinstance(raw, bytes):
+            raw = raw.decode('utf-8')
+        row = json.loads(raw)
+        for key in cls.DATETIME_COLUMNS:
+            if row.get(key):
+                row[key] = datetime.fromisoformat(row[key])
+        return row
+
+    def add(self, row: Dict[str, Any]) -> int:
+        """
+        加入一条待写入的审计记录（只追加到内存队列，由后台线程暂存和写库）
+
+        Args:
+            row: 审计记录（键为 COLUMNS 中除 created_at/updated_at 外的列）
+
+        Returns:
+            int: 待写入的行数（含待暂存和只在暂存列表中的行）
+        """
+        self.start()
+        now = datetime.utcnow()
+        row = {column: row.get(column) for column in self.COLUMNS}
+        row['created_at'] = now
+        row['updated_at'] = now
+
+        with self._lock:
+            overflow = len(self._pending) >= self.max_buffer_rows
+            if not overflow:
+                self._pending.append(row)
+            pending = len(self._pending)
+            buffered = pending + len(self._buffer) + self._spilled
+
+        if overflow:
+            # 后台线程长时间无法暂存和写库：同步写库，不冒丢失审计记录的风险
+            self._log_overflow()
+            self._write_rows([row])
+        elif pending == 1 or buffered >= self.flush_rows:
+            # 队列由空变为非空时唤醒后台线程暂存；后台线程处理期间新增的记录在下次唤醒时一起暂存
+            self._wake_event.set()
+        return buffered
+
+    def _log_overflow(self):
+        """记录同步写库告警（每分钟最多一次）"""
+        now = time.monotonic()
+        with self._lock:
+            if self._overflow_logged_at is not None and now - self._overflow_logged_at < 60:
+                self._overflow_suppressed += 1
+                return
+            suppressed = self._overflow_suppressed
+            self._overflow_logged_at = now
+            self._overflow_suppressed = 0
+        logger.warning(
+            f"审计日志待暂存队列已满（{self.max_buffer_rows} 行），终端线程同步写库"
+            + (f"，上次告警后另有 {suppressed} 条" if suppressed else '')
+        )
+
+    def _flush_loop(self):
+        """后台刷新线程：暂存新记录，按行数/时间阈值写入并维持进程心跳"""
+        interval = self.flush_interval_ms / 1000.0
+        while not self._stop_event.is_set():
+            self._wake_event.wait(timeout=self._wait_timeout(interval))
+            self._wake_event.clear()
+            try:
+                self._spool_pending()
+                now = time.monotonic()
+                with self._lock:
+                    due = self._buffer_since is not None and now >= self._retry_at and (
+                        len(self._buffer) >= self.flush_rows
+                        or now - self._buffer_since >= interval
+                    )
+                if due:
+                    self.flush()
+                with self._flush_lock:
+                    if self._spool_skip:
+                        self._rotate_spool()
+                    # 暂存列表中有记录时才需要心跳，约每 1/3 过期时间刷新一次
+                    if (self._buffer or self._spilled or self._spool_skip) and time.monotonic() >= self._heartbeat_at:
+                        self.redis.set(self._get_heartbeat_key(), 1, ex=self.heartbeat_ttl)
+                        self._heartbeat_at = time.monotonic() + self.heartbeat_ttl / 3.0
+            except Exception as e:
+                logger.error(f"审计日志后台写入失败: {str(e)}")
+
+    def _wait_timeout(self, interval: float) -> Optional[float]:
+        """
+        计算后台线程下次等待的时长
+
+        Returns:
+            Optional[float]: 等待秒数；没有待处理的记录时返回 None（阻塞到有新记录）
+        """
+        with self._lock:
+            spooled = bool(self._buffer or self._spilled or self._spool_skip)
+            if not self._pending and not spooled:
+                return None
+            now = time.monotonic()
+            deadlines = []
+            if self._pending:
+                deadlines.append(self._retry_at)
+            if self._buffer_since is not None:
+                deadlines.append(max(self._buffer_since + interval, self._retry_at))
+            if self._spool_skip:
+                deadlines.append(now + interval)
+            if spooled:
+                deadlines.append(self._heartbeat_at)
+        return max(0.0, min(deadlines) - now) if deadlines else interval
+
+    def _spool_pending(self) -> int:
+        """
+        将待暂存的记录追加到暂存列表（后台线程调用）
+
+        暂存列表未对齐且切换失败、或 Redis 不可用时直接写库；写库也失败时放回队列等待重试
+
+        Returns:
+            int: 处理的行数
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending or time.monotonic() < self._retry_at:
+                    return 0
+                rows = self._pending
+                self._pending = []
+
+            # 暂存列表头部残留已写库的行时先改用新的暂存列表
+            if self._spool_skip and not self._rotate_spool():
+                spooled = False
+            else:
+                try:
+                    pipe = self.redis.pipeline()
+                    pipe.rpush(self._get_spool_key(), *[self._serialize(row) for row in rows])
+                    pipe.set(self._get_heartbeat_key(), 1, ex=self.heartbeat_ttl)
+                    pipe.execute()
+                    spooled = True
+                except Exception as e:
+                    logger.warning(f"审计日志暂存失败，直接写入数据库: {len(rows)} 行, 错误: {str(e)}")
+                    spooled = False
+
+            if spooled:
+                self._heartbeat_at = time.monotonic() + self.heartbeat_ttl / 3.0
+                with self._lock:
+                    for row in rows:
+                        if self._spilled or len(self._buffer) >= self.max_buffer_rows:
+                            # 缓冲已满：只保留在暂存列表中，保证内存缓冲始终是暂存列表的前缀
+                            self._spilled += 1
+                        else:
+                            self._buffer.append(row)
+                    if self._buffer and self._buffer_since is None:
+                        self._buffer_since = time.monotonic()
+                return len(rows)
+
+            try:
+                self._write_rows(rows)
+            except Exception as e:
+                logger.error(f"直接写入审计日志失败，保留记录等待重试: {len(rows)} 行, 错误: {str(e)}")
+                with self._lock:
+                    self._pending = rows + self._pending
+                    self._retry_at = time.monotonic() + self.flush_interval_ms / 1000.0
+                return 0
+            return len(rows)
+
+    def flush(self) -> int:
+        """
+        写入当前缓冲的全部记录
+
+        Returns:
+            int: 写入的行数
+        """
+        with self._flush_lock:
+            self._load_spilled()
+            with self._lock:
+                rows = self._buffer
+                self._buffer = []
+                self._buffer_since = None
+            if not rows:
+                return 0
+
+            try:
+                self._write_rows(rows)
+            except Exception as e:
+                logger.error(f"批量写入审计日志失败，保留缓冲等待重试: {len(rows)} 行, 错误: {str(e)}")
+                with self._lock:
+                    self._buffer = rows + self._buffer
+                    self._buffer_since = time.monotonic()
+                    self._retry_at = self._buffer_since + self.flush_interval_ms / 1000.0
+                return 0
+
+            # 写库成功后从暂存列表头部移除已写入的行；失败时记录残留行数，
+            # 之后的读回从残留行之后开始，并在暂存新记录前改用新的暂存列表
+            try:
+                self.redis.ltrim(self._get_spool_key(), self._spool_skip + len(rows), -1)
+                spool_skip = 0
+            except Exception as e:
+                logger.warning(f"清理审计日志暂存失败，改用新的暂存列表: {str(e)}")
+                spool_skip = self._spool_skip + len(rows)
+            with self._lock:
+                self._spool_skip = spool_skip
+
+            self._load_spilled()
+            logger.debug(f"批量写入审计日志: {len(rows)} 行")
+            return len(rows)
+
+    def _load_spilled(self):
+        """将只在暂存列表中的行读回内存缓冲（调用方持有 self._flush_lock）"""
+        if not self._spilled or len(self._buffer) >= self.max_buffer_rows:
+            return
+        count = min(self._spilled, self.max_buffer_rows - len(self._buffer))
+        start = self._spool_skip + len(self._buffer)
+        try:
+            raw_rows = self.redis.lrange(self._get_spool_key(), start, start + count - 1)
+        except Exception as e:
+            logger.warning(f"读取审计日志暂存失败: {str(e)}")
+            return
+        if not raw_rows:
+            return
+        rows = [self._deserialize(raw) for raw in raw_rows]
+        with self._lock:
+            self._buffer.extend(rows)
+            self._spilled -= len(rows)
+            if self._buffer_since is None:
+                self._buffer_since = time.monotonic()
+        self._wake_event.set()
+
+    def _rotate_spool(self) -> bool:
+        """
+        改用新的暂存列表（调用方持有 self._flush_lock）
+
+        旧列表中残留行之后的未写库记录在一个事务中复制到新列表并删除旧列表，
+        避免恢复任务把已写库的行重复补写
+
+        Returns:
+            bool: 是否已改用新的暂存列表
+        """
+        stale_worker_id = self.worker_id
+        nonce = uuid.uuid4().hex[:12]
+        worker_id = f"{socket.gethostname()}:{self._worker_pid}:{nonce}"
+        try:
+            raw_rows = self.redis.lrange(self._get_spool_key(stale_worker_id), self._spool_skip, -1)
+            pipe = self.redis.pipeline()
+            if raw_rows:
+                pipe.rpush(self._get_spool_key(worker_id), *raw_rows)
+            pipe.set(self._get_heartbeat_key(worker_id), 1, ex=self.heartbeat_ttl)
+            pipe.delete(self._get_spool_key(stale_worker_id), self._get_heartbeat_key(stale_worker_id))
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"切换审计日志暂存列表失败: {str(e)}")
+            return False
+
+        with self._lock:
+            self._worker_nonce = nonce
+            self._spool_skip = 0
+        self._heartbeat_at = time.monotonic() + self.heartbeat_ttl / 3.0
+        return True
+
+    def _write_rows(self, rows: List[Dict[str, Any]]):
+        """在一个事务中用多行 INSERT 写入"""
+        if self._app is not None:
+            with self._app.app_context():
+                return self._write_rows_in_context(rows)
+        return self._write_rows_in_context(rows)
+
+    def _write_rows_in_context(self, rows: List[Dict[str, Any]]):
+        """写入多行（需在应用上下文中调用）"""
+        try:
+            db.session.execute(WebShellAuditLog.__table__.insert(), rows)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def close(self):
+        """停止后台线程并写入剩余缓冲（进程退出时调用）"""
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._flusher is not None and self._flusher.is_alive() and self._flusher is not threading.current_thread():
+            self._flusher.join(timeout=5)
+        # 退出前不再等待重试间隔
+        self._retry_at = 0.0
+        self._spool_pending()
+        remaining = 0
+        while True:
+            written = self.flush()
+            if not written:
+                break
+            remaining += written
+        if remaining:
+            logger.info(f"进程退出前写入剩余审计日志: {remaining} 行")
+        if self._pending:
+            logger.error(f"进程退出前未能暂存或写入的审计日志: {len(self._pending)} 行")
+        with self._flush_lock:
+            # 头部残留已写库的行时先切换暂存列表，避免恢复任务重复补写
+            if self._spool_skip:
+                self._rotate_spool()
+            # 未写完时保留心跳到过期，剩余的暂存日志由恢复任务补写
+            if not self._buffer and not self._spilled:
+                try:
+                    self.redis.delete(self._get_heartbeat_key())
+                except Exception:
+                    pass
+
+    # ==================== 恢复 ====================
+
+    def recover_orphaned_spools(self, batch_size: int = 1000) -> int:
+        """
+        补写已退出进程遗留的暂存审计日志
+
+        暂存列表改名为 <暂存键>:recovering:<恢复进程> 后补写；补写失败时改回原名，
+        恢复进程中途退出（心跳过期）时其认领可被其他恢复任务重新认领
+
+        Returns:
+            int: 补写的行数
+        """
+        recovered = 0
+        # 恢复期间维持本进程心跳，其他恢复任务据此判断认领是否仍有效
+        self.redis.set(self._get_heartbeat_key(), 1, ex=self.heartbeat_ttl)
+        for key in self.redis.scan_iter(match=f"{self.SPOOL_PREFIX}:*", count=100):
+            if isinstance(key, bytes):
+                key = key.decode('utf-8')
+            spool_key, _, claimer = key.partition(self.RECOVERING_MARKER)
+            owner = claimer or spool_key[len(self.SPOOL_PREFIX) + 1:]
+            if owner == self.worker_id or self.redis.exists(self._get_heartbeat_key(owner)):
+                continue
+            worker_id = spool_key[len(self.SPOOL_PREFIX) + 1:]
+
+            # 先改名认领，避免多个恢复任务重复写入
+            claim_key = f"{spool_key}{self.RECOVERING_MARKER}{self.worker_id}"
+            try:
+                if not self.redis.renamenx(key, claim_key):
+                    continue
+            except Exception:
+                continue
+
+            try:
+                while True:
+                    raw_rows = self.redis.lrange(claim_key, 0, batch_size - 1)
+                    if not raw_rows:
+                        break
+                    rows = [self._deserialize(raw) for raw in raw_rows]
+                    self._write_rows(rows)
+                    self.redis.ltrim(claim_key, len(raw_rows), -1)
+                    recovered += len(rows)
+                    self.redis.set(self._get_heartbeat_key(), 1, ex=self.heartbeat_ttl)
+            except Exception as e:
+                logger.error(f"补写进程 {worker_id} 遗留的审计日志失败，下次恢复时重试: {str(e)}")
+                # 归还认领（已写入的行已从列表头部移除）
+                try:
+                    self.redis.renamenx(claim_key, spool_key)
+                except Exception:
+                    pass
+                continue
+
+            self.redis.delete(claim_key)
+            logger.info(f"已补写进程 {worker_id} 遗留的审计日志")
+
+        return recovered
+
+    def get_status(self) -> Dict[str, Any]:
+        """获取写入器状态"""
+        with self._lock:
+            pending = len(self._pending)
+            buffered = len(self._buffer)
+        return {
+            'worker_id': self.worker_id,
+            'enabled': self.enabled,
+            'pending': pending,
+            'buffered': buffered,
+            'spilled': self._spilled,
+            'spool_skip': self._spool_skip,
+            'flush_rows': self.flush_rows,
+            'flush_interval_ms': self.flush_interval_ms,
+            'max_buffer_rows': self.max_buffer_rows,
+            'flusher_alive': self._flusher is not None and self._flusher.is_alive()
+        }
+
+
+# 全局审计日志写入器实例
+webshell_audit_writer = WebShellAuditWriter()
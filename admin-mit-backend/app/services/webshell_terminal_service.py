@@ -3,11 +3,11 @@ WebShell 终端功能服务
 提供终端命令执行、输入输出处理、大小调整和历史记录功能
 集成命令过滤和审计日志功能
 """
+import codecs
 import threading
 import time
 import logging
 import json
-import queue
 from typing import Dict, Optional, Any, Tuple, List
 from datetime import datetime
 from dataclasses import dataclass, asdict
@@ -16,6 +16,7 @@ from app.services.webshell_service import webshell_service
 from app.services.websocket_service import websocket_service
 from app.services.command_filter_service import command_filter_service
 from app.services.webshell_audit_service import webshell_audit_service
+from app.services.terminal_multiplexer import terminal_multiplexer, SessionInputQueue
 from app.extensions import db, redis_client
 import paramiko
 
@@ -41,7 +42,11 @@ class TerminalCommand:
 
 
 class TerminalSession:
-    """终端会话类"""
+    """
+    终端会话类
+    
+    Shell 输出由终端多路复用器的事件循环读取，输入经会话输入队列在 I/O 线程池中写入
+    """
     
     def __init__(self, webshell_session_id: str, ssh_connection, user_id: int = None, 
                  host_id: int = None, tenant_id: int = None, ip_address: str = None):
@@ -63,14 +68,13 @@ class TerminalSession:
         # 命令缓冲区（用于检测完整命令）
         self._command_buffer = ""
         
-        # 输入输出队列
-        self.input_queue = queue.Queue()
-        self.output_queue = queue.Queue()
+        # 输入队列（启动 shell 时创建）
+        self.input_queue: Optional[SessionInputQueue] = None
         
-        # 线程控制
-        self.input_thread = None
-        self.output_thread = None
-        self.stop_threads = threading.Event()
+        # 输出解码与行缓冲（仅在事件循环线程中访问）
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+        self._line_buffer = ""
+        self._output_user_id = user_id
         
     def start_shell(self, cols: int = 80, rows: int = 24) -> Tuple[bool, str]:
         """启动 shell 会话"""
@@ -80,19 +84,24 @@ class TerminalSession:
                     return True, "Shell 已经启动"
                 
                 # 创建 shell 通道
-                self.shell_channel = self.ssh_connection.client.invoke_shell(
+                self.shell_channel = self.ssh_connection.invoke_shell(
                     term='xterm',
                     width=cols,
                     height=rows
                 )
                 
-                # 设置非阻塞模式
-                self.shell_channel.settimeout(0.1)
+                # 通道可读后 recv 立即返回，超时只作用于写入
+                self.shell_channel.settimeout(10)
                 
+                self.input_queue = SessionInputQueue(
+                    terminal_multiplexer,
+                    self._write_input,
+                    on_error=self._on_input_error
+                )
                 self.is_active = True
                 
-                # 启动输入输出处理线程
-                self._start_io_threads()
+                # 输出由事件循环在通道可读时回调处理
+                terminal_multiplexer.register(self.shell_channel, self._handle_output)
                 
                 logger.info(f"Shell 会话启动成功: {self.webshell_session_id}")
                 return True, "Shell 启动成功"
@@ -101,83 +110,82 @@ class TerminalSession:
             logger.error(f"启动 Shell 会话失败: {str(e)}")
             return False, f"启动 Shell 失败: {str(e)}"
     
-    def _start_io_threads(self):
-        """启动输入输出处理线程"""
-        self.stop_threads.clear()
+    def _handle_output(self, channel):
+        """处理 SSH 输出（事件循环线程，通道可读时回调）"""
+        if not self.is_active:
+            # 已停止但注销尚未执行，先注销避免通道持续可读时空转
+            terminal_multiplexer.unregister(channel)
+            return
+        
+        try:
+            raw = channel.recv(4096)
+        except Exception as e:
+            logger.error(f"处理输出时出错: {str(e)}")
+            self._close_from_loop(channel, f"读取终端输出失败: {str(e)}")
+            return
         
-        # 启动输出处理线程
-        self.output_thread = threading.Thread(
-            target=self._handle_output,
-            daemon=True
-        )
-        self.output_thread.start()
+        if not raw:
+            # 通道 EOF：远端 shell 退出或连接关闭
+            self._close_from_loop(channel, "SSH 连接已关闭")
+            return
         
-        # 启动输入处理线程
-        self.input_thread = threading.Thread(
-            target=self._handle_input,
-            daemon=True
-        )
-        self.input_thread.start()
+        data = self._decoder.decode(raw)
+        if not data:
+            return
+        
+        # 发送输出到 WebSocket 客户端
+        self._send_output_to_client(data)
+        
+        # 检查是否有完整的行（用于命令历史记录）
+        buffer = self._line_buffer + data
+        if '\n' in buffer or '\r' in buffer:
+            lines = buffer.split('\n')
+            buffer = lines[-1]  # 保留最后一行（可能不完整）
+            
+            for line in lines[:-1]:
+                line = line.strip('\r')
+                if line:
+                    self._process_output_line(line)
+        self._line_buffer = buffer
+    
+    def _close_from_loop(self, channel, reason: str):
+        """事件循环中检测到通道结束：注销通道后在线程池中终止会话并通知客户端"""
+        terminal_multiplexer.unregister(channel)
+        terminal_multiplexer.submit(self._terminate, reason)
+    
+    def _terminate(self, reason: str):
+        """终止会话（I/O 线程池中执行）"""
+        if not webshell_terminal_service.terminate_terminal_session(self.webshell_session_id):
+            # 已不在终端会话表中（如正被替换），仍需停止本会话
+            self.stop_shell()
+        # 结束 WebShell 会话并向客户端发送 webshell_session_terminated
+        webshell_service.terminate_session(self.webshell_session_id, reason)
     
-    def _handle_output(self):
-        """处理 SSH 输出"""
-        buffer = ""
+    def _write_input(self, input_data: str):
+        """写入输入数据（I/O 线程池中执行）"""
+        if not self.shell_channel or not input_data:
+            return
         
-        while not self.stop_threads.is_set() and self.is_active:
-            try:
-                if self.shell_channel and self.shell_channel.recv_ready():
-                    data = self.shell_channel.recv(4096).decode('utf-8', errors='ignore')
-                    if data:
-                        buffer += data
-                        
-                        # 发送输出到 WebSocket 客户端
-                        self._send_output_to_client(data)
-                        
-                        # 检查是否有完整的行（用于命令历史记录）
-                        if '\n' in buffer or '\r' in buffer:
-                            lines = buffer.split('\n')
-                            buffer = lines[-1]  # 保留最后一行（可能不完整）
-                            
-                            for line in lines[:-1]:
-                                line = line.strip('\r')
-                                if line:
-                                    self._process_output_line(line)
-                
-                time.sleep(0.01)  # 避免过度占用 CPU
-                
-            except Exception as e:
-                if self.is_active:
-                    logger.error(f"处理输出时出错: {str(e)}")
-                break
+        self.shell_channel.sendall(input_data)
+        
+        # 更新会话活动时间
+        webshell_service.update_session_activity(self.webshell_session_id)
     
-    def _handle_input(self):
-        """处理输入队列"""
-        while not self.stop_threads.is_set() and self.is_active:
-            try:
-                # 从队列获取输入数据
-                input_data = self.input_queue.get(timeout=0.1)
-                
-                if self.shell_channel and input_data:
-                    self.shell_channel.send(input_data)
-                    
-                    # 更新会话活动时间
-                    webshell_service.update_session_activity(self.webshell_session_id)
-                    
-            except queue.Empty:
-                continue
-            except Exception as e:
-                if self.is_active:
-                    logger.error(f"处理输入时出错: {str(e)}")
-                break
+    def _on_input_error(self, error: Exception):
+        if self.is_active:
+            logger.error(f"处理输入时出错: {str(error)}")
     
     def _send_output_to_client(self, data: str):
         """发送输出到 WebSocket 客户端"""
         try:
-            # 获取 WebShell 会话信息
-            session_info = webshell_service.get_session(self.webshell_session_id)
-            if session_info:
-                user_id = session_info['user_id']
-                
+            # 输出在事件循环中发送，会话所属用户只查询一次
+            if self._output_user_id is None:
+                session_info = webshell_service.get_session(self.webshell_session_id)
+                if session_info:
+                    self._output_user_id = session_info['user_id']
+            
+            user_id = self._output_user_id
+            if user_id is not None:
                 # 发送输出数据到客户端
                 websocket_service.send_to_user(
                     user_id,
@@ -248,7 +256,8 @@ class TerminalSession:
                     self._log_command_execution(command)
             
             # 发送输入到队列
-            self.input_queue.put(data)
+            if not self.input_queue or not self.input_queue.put(data):
+                return False, "输入队列已满"
             return True, ""
             
         except Exception as e:
@@ -541,24 +550,15 @@ class TerminalSession:
                 
                 self.is_active = False
                 
-                # 停止线程
-                self.stop_threads.set()
+                # 丢弃未写入的输入
+                if self.input_queue:
+                    self.input_queue.close()
                 
-                # 关闭 shell 通道
+                # 在事件循环中注销读取后，由线程池关闭 shell 通道
                 if self.shell_channel:
-                    try:
-                        self.shell_channel.close()
-                    except Exception as e:
-                        logger.warning(f"关闭 shell 通道时出错: {str(e)}")
-                    finally:
-                        self.shell_channel = None
-                
-                # 等待线程结束
-                if self.output_thread and self.output_thread.is_alive():
-                    self.output_thread.join(timeout=2)
-                
-                if self.input_thread and self.input_thread.is_alive():
-                    self.input_thread.join(timeout=2)
+                    channel = self.shell_channel
+                    self.shell_channel = None
+                    terminal_multiplexer.call_soon(self._teardown_channel, channel)
                 
                 logger.info(f"Shell 会话已停止: {self.webshell_session_id}")
                 
@@ -566,6 +566,20 @@ class TerminalSession:
             logger.error(f"停止 Shell 会话时出错: {str(e)}")
 
 
+    @staticmethod
+    def _teardown_channel(channel):
+        """注销并关闭 shell 通道（事件循环线程）"""
+        terminal_multiplexer.unregister(channel)
+        terminal_multiplexer.submit(TerminalSession._close_channel, channel)
+    
+    @staticmethod
+    def _close_channel(channel):
+        try:
+            channel.close()
+        except Exception as e:
+            logger.warning(f"关闭 shell 通道时出错: {str(e)}")
+
+
 class WebShellTerminalService:
     """WebShell 终端服务"""
     
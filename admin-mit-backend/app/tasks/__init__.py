@@ -7,6 +7,10 @@ Celery 任务模块
 # 任务模块列表（仅供参考，实际加载由 Celery 配置控制）
 # - network_probe_tasks: 网络探测任务
 # - host_probe_tasks: 主机探测任务
+# - host_metrics_tasks: 主机性能指标汇总与清理任务
+# - alert_tasks: 告警规则评估任务
+# - notification_tasks: 告警通知发送任务
 # - audit_cleanup_tasks: 审计清理任务
 # - backup_tasks: 备份任务
 # - ansible_tasks: Ansible 执行任务
+# - redis_tasks: Redis 键空间分析任务
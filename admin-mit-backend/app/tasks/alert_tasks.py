@@ -0,0 +1,96 @@
+"""
+告警监控 Celery 任务
+由 Celery beat 每个评估周期派发一次，每个租户一个评估任务；
+同一租户同一时刻只有持有租约的 Worker 执行评估
+"""
+import logging
+import os
+import socket
+from typing import Dict, Any
+from app.celery_app import celery
+
+logger = logging.getLogger(__name__)
+
+# 全局 Flask 应用实例（懒加载）
+_flask_app = None
+
+
+def get_flask_app():
+    """获取 Celery 专用的轻量级 Flask 应用实例"""
+    global _flask_app
+    if _flask_app is None:
+        from app.celery_flask_app import create_celery_flask_app
+        _flask_app = create_celery_flask_app()
+    return _flask_app
+
+
+@celery.task(
+    name='app.tasks.alert_tasks.dispatch_alert_evaluations',
+    priority=3
+)
+def dispatch_alert_evaluations() -> Dict[str, Any]:
+    """
+    为每个存在启用告警规则的租户派发评估任务
+    
+    Returns:
+        派发结果字典
+    """
+    app = get_flask_app()
+    with app.app_context():
+        from app.services.alert_monitoring_service import alert_monitoring_engine
+        
+        try:
+            tenant_ids = alert_monitoring_engine.get_active_tenant_ids()
+            # 超过一个评估周期仍未执行的任务直接丢弃，避免积压后集中评估
+            expires = alert_monitoring_engine.evaluation_interval
+            
+            for tenant_id in tenant_ids:
+                evaluate_tenant_alerts.apply_async(args=[tenant_id], expires=expires)
+            
+            logger.debug(f"[告警评估] 已派发 {len(tenant_ids)} 个租户的评估任务")
+            return {
+                'success': True,
+                'dispatched': len(tenant_ids),
+                'tenant_ids': tenant_ids
+            }
+        except Exception as e:
+            logger.error(f"[告警评估] 派发失败: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+
+@celery.task(
+    bind=True,
+    name='app.tasks.alert_tasks.evaluate_tenant_alerts',
+    priority=3
+)
+def evaluate_tenant_alerts(self, tenant_id: int) -> Dict[str, Any]:
+    """
+    执行单个租户的一轮告警评估
+    
+    Args:
+        tenant_id: 租户ID
+        
+    Returns:
+        评估结果字典
+    """
+    app = get_flask_app()
+    with app.app_context():
+        from app.services.alert_monitoring_service import alert_monitoring_engine
+        
+        owner = f"{socket.gethostname()}:{os.getpid()}:{self.request.id}"
+        try:
+            result = alert_monitoring_engine.run_scheduled_cycle(tenant_id, owner)
+            return {
+                'success': 'error' not in result,
+                **result
+            }
+        except Exception as e:
+            logger.error(f"[告警评估] 租户 {tenant_id} 评估失败: {str(e)}")
+            return {
+                'success': False,
+                'tenant_id': tenant_id,
+                'error': str(e)
+            }
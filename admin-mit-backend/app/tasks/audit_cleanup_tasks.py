@@ -19,6 +19,18 @@ logger = logging.getLogger(__name__)
 # 默认审计日志保留天数
 DEFAULT_AUDIT_LOG_RETENTION_DAYS = 90
 
+# 全局 Flask 应用实例（懒加载）
+_flask_app = None
+
+
+def get_flask_app():
+    """获取 Celery 专用的轻量级 Flask 应用实例"""
+    global _flask_app
+    if _flask_app is None:
+        from app.celery_flask_app import create_celery_flask_app
+        _flask_app = create_celery_flask_app()
+    return _flask_app
+
 
 def get_audit_log_retention_days(tenant_id: int) -> int:
     """
@@ -238,3 +250,35 @@ def get_cleanup_stats(self, tenant_id: int = None):
                 'success': False,
                 'error': str(e)
             }
+
+
+@shared_task(bind=True, name='app.tasks.audit_cleanup_tasks.recover_audit_log_spools')
+def recover_audit_log_spools(self):
+    """
+    补写异常退出进程遗留在 Redis 暂存列表中的 WebShell 审计日志
+    
+    此任务由 Celery Beat 定时调度，每分钟执行一次。
+    
+    Returns:
+        补写结果字典
+    """
+    app = get_flask_app()
+    
+    with app.app_context():
+        from app.services.webshell_audit_writer import webshell_audit_writer
+        
+        try:
+            recovered = webshell_audit_writer.recover_orphaned_spools()
+            if recovered > 0:
+                logger.info(f"Recovered {recovered} orphaned audit logs")
+            return {
+                'success': True,
+                'recovered': recovered
+            }
+            
+        except Exception as e:
+            logger.error(f"Failed to recover orphaned audit logs: {e}")
+            return {
+                'success': False,
+                'error': str(e)
+            }
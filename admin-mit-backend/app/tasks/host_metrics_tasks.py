@@ -0,0 +1,84 @@
+"""
+主机性能指标 Celery 任务
+负责将原始指标降采样为 1 分钟 / 5 分钟 / 1 小时汇总，并按保留期清理过期数据
+"""
+import logging
+from typing import Dict, Any
+from app.celery_app import celery
+
+logger = logging.getLogger(__name__)
+
+# 全局 Flask 应用实例（懒加载）
+_flask_app = None
+
+
+def get_flask_app():
+    """获取 Celery 专用的轻量级 Flask 应用实例"""
+    global _flask_app
+    if _flask_app is None:
+        from app.celery_flask_app import create_celery_flask_app
+        _flask_app = create_celery_flask_app()
+    return _flask_app
+
+
+@celery.task(
+    name='app.tasks.host_metrics_tasks.rollup_host_metrics',
+    priority=2
+)
+def rollup_host_metrics(resolution: int = 60) -> Dict[str, Any]:
+    """
+    汇总主机性能指标
+    
+    Args:
+        resolution: 汇总粒度（秒），60 / 300 / 3600
+        
+    Returns:
+        汇总结果字典
+    """
+    app = get_flask_app()
+    with app.app_context():
+        from app.services.host_metrics_rollup_service import host_metrics_rollup_service
+        
+        try:
+            result = host_metrics_rollup_service.rollup(resolution)
+            return {
+                'success': True,
+                **result
+            }
+        except Exception as e:
+            logger.error(f"[指标汇总] 失败: resolution={resolution}, error={str(e)}")
+            return {
+                'success': False,
+                'resolution': resolution,
+                'error': str(e)
+            }
+
+
+@celery.task(
+    name='app.tasks.host_metrics_tasks.prune_host_metrics',
+    priority=1
+)
+def prune_host_metrics() -> Dict[str, Any]:
+    """
+    按保留期清理过期的原始指标和汇总数据
+    
+    Returns:
+        清理结果字典
+    """
+    app = get_flask_app()
+    with app.app_context():
+        from app.services.host_metrics_rollup_service import host_metrics_rollup_service
+        
+        try:
+            deleted = host_metrics_rollup_service.prune()
+            return {
+                'success': True,
+                'deleted': deleted,
+                'message': '清理完成'
+            }
+        except Exception as e:
+            logger.error(f"[指标清理] 失败: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e)
+            }
@@ -2,8 +2,10 @@
 网络探测 Celery 任务
 """
 import logging
+import time
 from typing import Dict, Any
 from celery import Task
+from celery.signals import worker_process_shutdown, worker_shutdown
 from app.celery_app import celery
 
 logger = logging.getLogger(__name__)
@@ -21,6 +23,84 @@ def get_flask_app():
     return _flask_app
 
 
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def _flush_result_writer(**kwargs):
+    """
+    Worker 进程退出前写入缓冲中的探测结果
+
+    worker_process_shutdown 仅由 prefork 子进程发送；solo/threads 池在主进程中执行任务，
+    由 worker_shutdown 触发写入
+    """
+    from app.services.network_result_writer import network_result_writer
+    
+    try:
+        network_result_writer.close()
+    except Exception as e:
+        logger.error(f"[网络探测] 退出前写入探测结果失败: {str(e)}")
+
+
+def _sync_results_to_cache(results: list) -> None:
+    """同步探测结果到缓存、统计聚合并发布 SSE 推送事件（静默处理错误，同步失败不影响主流程）"""
+    from app.services.network_cache_service import network_cache_service
+    from app.services.network_probe_stats_service import network_probe_stats_service
+    from app.services.network_sse_service import network_sse_service
+    
+    status_map = {'success': 'success', 'timeout': 'timeout'}
+    published = []
+    for result in results:
+        try:
+            result_data = {
+                'id': result.id,
+                'tenant_id': result.tenant_id,
+                'probe_id': result.probe_id,
+                'status': result.status,
+                'response_time': result.response_time,
+                'status_code': result.status_code,
+                'error_message': result.error_message,
+                'probed_at': result.probed_at.isoformat() if result.probed_at else None,
+                'probe_type': result.probe_type
+            }
+            network_cache_service.sync_probe_result_to_cache(result.probe_id, result_data)
+            network_cache_service.update_probe_status(
+                result.probe_id,
+                status_map.get(result.status, 'failed')
+            )
+            published.append(result_data)
+        except Exception:
+            pass
+    
+    network_probe_stats_service.record_results(published)
+    network_sse_service.publish_probe_results(published)
+
+
+def dispatch_probe_shards(probe_ids: list, probe_type: str = 'auto', tenant_id: int = None,
+                          priority: int = 5) -> list:
+    """
+    将探测任务按分片大小切分后派发到 network_probes 队列
+    
+    Returns:
+        派发的 Celery 任务ID列表
+    """
+    from app.core.config_manager import config_manager
+    
+    runner_config = config_manager.get_app_config().get('network_probe', {}).get('runner', {})
+    shard_size = max(1, runner_config.get('shard_size', 200))
+    
+    task_ids = []
+    for start in range(0, len(probe_ids), shard_size):
+        task = execute_probe_shard.apply_async(
+            kwargs={
+                'probe_ids': probe_ids[start:start + shard_size],
+                'probe_type': probe_type,
+                'tenant_id': tenant_id
+            },
+            priority=priority
+        )
+        task_ids.append(task.id)
+    return task_ids
+
+
 class NetworkProbeTask(Task):
     """网络探测任务基类"""
     
@@ -54,7 +134,6 @@ def execute_probe(self, probe_id: int, tenant_id: int, probe_type: str = 'auto')
         from app.extensions import db
         from app.models.network import NetworkProbe, NetworkProbeResult
         from app.services.network_probe_service import NetworkProbeService
-        from app.services.network_cache_service import network_cache_service
         
         try:
             probe = NetworkProbe.query.filter_by(
@@ -85,26 +164,8 @@ def execute_probe(self, probe_id: int, tenant_id: int, probe_type: str = 'auto')
             db.session.add(result)
             db.session.commit()
             
-            # 同步结果到缓存（静默处理错误）
-            try:
-                result_data = {
-                    'id': result.id,
-                    'probe_id': probe_id,
-                    'status': result.status,
-                    'response_time': result.response_time,
-                    'status_code': result.status_code,
-                    'error_message': result.error_message,
-                    'probed_at': result.probed_at.isoformat() if result.probed_at else None,
-                    'probe_type': probe_type
-                }
-                network_cache_service.sync_probe_result_to_cache(probe_id, result_data)
-                status_map = {'success': 'success', 'timeout': 'timeout'}
-                network_cache_service.update_probe_status(
-                    probe_id, 
-                    status_map.get(result.status, 'failed')
-                )
-            except Exception:
-                pass  # 缓存同步失败不影响主流程
+            # 同步结果到缓存
+            _sync_results_to_cache([result])
             
             # 输出简洁日志
             status_icon = '[OK]' if result.status == 'success' else '[FAIL]'
@@ -124,26 +185,86 @@ def execute_probe(self, probe_id: int, tenant_id: int, probe_type: str = 'auto')
             raise
 
 
+@celery.task(
+    name='app.tasks.network_probe_tasks.execute_probe_shard',
+    queue='network_probes',
+    priority=5
+)
+def execute_probe_shard(probe_ids: list, probe_type: str = 'auto', tenant_id: int = None) -> Dict[str, Any]:
+    """
+    在当前 Worker 进程内并发执行一个分片的探测任务，并批量写入结果
+    
+    Args:
+        probe_ids: 探测任务ID列表
+        probe_type: 探测类型 ('manual' 或 'auto')
+        tenant_id: 租户ID（可选，用于限定范围）
+    """
+    app = get_flask_app()
+    with app.app_context():
+        from app.extensions import db
+        from app.models.network import NetworkProbe
+        from app.services.network_probe_runner import network_probe_runner
+        from app.services.network_result_writer import network_result_writer
+        
+        try:
+            query = NetworkProbe.query.filter(
+                NetworkProbe.id.in_(probe_ids),
+                NetworkProbe.enabled == True
+            )
+            if tenant_id is not None:
+                query = query.filter(NetworkProbe.tenant_id == tenant_id)
+            probes = query.all()
+            
+            if not probes:
+                return {'success': True, 'total': 0, 'message': '没有可执行的探测任务'}
+            
+            start_time = time.time()
+            results = network_probe_runner.run_shard(probes, probe_type)
+            probe_time = time.time() - start_time
+            
+            # 结果进入进程内缓冲，由写入器按行数/时间阈值批量入库并同步缓存
+            network_result_writer.start(app)
+            buffered = network_result_writer.add(results)
+            
+            status_counts = {}
+            for result in results:
+                status_counts[result.status] = status_counts.get(result.status, 0) + 1
+            
+            logger.info(
+                f"[网络探测] 分片完成: {len(results)} 个探测, "
+                f"状态 {status_counts}, 探测耗时 {probe_time:.2f}s, "
+                f"总耗时 {time.time() - start_time:.2f}s"
+            )
+            
+            return {
+                'success': True,
+                'total': len(results),
+                'status_counts': status_counts,
+                'probe_time': round(probe_time, 3),
+                'buffered': buffered
+            }
+            
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"[网络探测] 分片执行失败: {len(probe_ids)} 个探测, error={str(e)}")
+            return {'success': False, 'error': str(e)}
+
+
 @celery.task(
     name='app.tasks.network_probe_tasks.execute_batch_probes',
     queue='network_probes',
     priority=3
 )
 def execute_batch_probes(probe_ids: list, tenant_id: int, probe_type: str = 'auto') -> Dict[str, Any]:
-    """批量执行网络探测任务"""
+    """批量执行网络探测任务（按分片派发）"""
     logger.info(f"[网络探测] 批量任务: {len(probe_ids)} 个探测")
     
-    results = []
-    for probe_id in probe_ids:
-        try:
-            task = execute_probe.apply_async(
-                kwargs={'probe_id': probe_id, 'tenant_id': tenant_id, 'probe_type': probe_type}
-            )
-            results.append({'probe_id': probe_id, 'task_id': task.id, 'status': 'queued'})
-        except Exception as e:
-            results.append({'probe_id': probe_id, 'status': 'failed', 'error': str(e)})
+    try:
+        task_ids = dispatch_probe_shards(probe_ids, probe_type, tenant_id=tenant_id)
+    except Exception as e:
+        return {'success': False, 'total': len(probe_ids), 'error': str(e)}
     
-    return {'success': True, 'total': len(probe_ids), 'results': results}
+    return {'success': True, 'total': len(probe_ids), 'shards': len(task_ids), 'task_ids': task_ids}
 
 
 @celery.task(
@@ -153,46 +274,37 @@ def execute_batch_probes(probe_ids: list, tenant_id: int, probe_type: str = 'aut
 )
 def schedule_auto_probes() -> Dict[str, Any]:
     """
-    调度所有启用自动探测的任务
+    自动探测调度 ticker
     
-    此任务每 60 秒由 Celery Beat 调用一次，
-    为每个启用自动探测的任务创建独立的定时调度。
+    由 Celery Beat 每隔几秒调用一次，从 Redis 调度有序集合中批量取出到期的探测，
+    按分片派发 execute_probe_shard；并定期与数据库对账。
     """
     app = get_flask_app()
     with app.app_context():
-        from app.models.network import NetworkProbe
+        from app.services.network_probe_scheduler import network_probe_scheduler
         
         try:
-            probes = NetworkProbe.query.filter_by(
-                enabled=True,
-                auto_probe_enabled=True
-            ).all()
+            sync_result = network_probe_scheduler.sync_schedule()
             
-            if not probes:
-                return {'success': True, 'total_probes': 0, 'scheduled_count': 0}
-            
-            scheduled_count = 0
-            for probe in probes:
-                try:
-                    # 为每个探测任务创建独立的定时调度
-                    schedule_single_probe.apply_async(
-                        kwargs={
-                            'probe_id': probe.id,
-                            'tenant_id': probe.tenant_id,
-                            'interval_seconds': probe.interval_seconds
-                        }
-                    )
-                    scheduled_count += 1
-                except Exception as e:
-                    logger.warning(f"[网络探测] 调度失败: probe_id={probe.id}, error={str(e)}")
+            due_count = 0
+            shard_count = 0
+            while True:
+                probe_ids = network_probe_scheduler.pop_due_probes()
+                if not probe_ids:
+                    break
+                due_count += len(probe_ids)
+                shard_count += len(dispatch_probe_shards(probe_ids, 'auto'))
+                if len(probe_ids) < network_probe_scheduler.batch_size:
+                    break
             
-            if scheduled_count > 0:
-                logger.info(f"[网络探测] 初始化调度: {scheduled_count} 个任务")
+            if due_count > 0:
+                logger.debug(f"[网络探测] 派发到期探测: {due_count} 个, 分片 {shard_count} 个")
             
             return {
                 'success': True,
-                'total_probes': len(probes),
-                'scheduled_count': scheduled_count
+                'due_count': due_count,
+                'shard_count': shard_count,
+                'sync': sync_result
             }
             
         except Exception as e:
@@ -207,120 +319,17 @@ def schedule_auto_probes() -> Dict[str, Any]:
 )
 def schedule_single_probe(probe_id: int, tenant_id: int, interval_seconds: int) -> Dict[str, Any]:
     """
-    为单个探测任务创建独立的定时调度
+    将单个探测加入调度（兼容旧版本已入队的调度消息）
     
-    使用 Redis 锁机制确保每个探测任务按照自己的间隔独立执行，
-    避免重复调度。
+    探测将在下一次 ticker 时执行，之后按间隔由 ticker 统一派发。
     """
-    import redis
-    from datetime import datetime
-    from app.core.config_manager import config_manager
-    
     app = get_flask_app()
     with app.app_context():
-        from app.models.network import NetworkProbe
+        from app.services.network_probe_scheduler import network_probe_scheduler
         
         try:
-            # 获取 Redis 连接
-            redis_config = config_manager.get_redis_config()
-            redis_password = redis_config.get('password', '')
-            redis_client = redis.Redis(
-                host=redis_config['host'],
-                port=redis_config['port'],
-                password=redis_password if redis_password else None,
-                db=3,  # 使用独立的 db
-                decode_responses=True
-            )
-            
-            # 检查探测任务是否仍然启用
-            probe = NetworkProbe.query.filter_by(
-                id=probe_id,
-                tenant_id=tenant_id,
-                enabled=True,
-                auto_probe_enabled=True
-            ).first()
-            
-            if not probe:
-                # 任务已禁用，清理调度锁
-                redis_client.delete(f"probe_schedule:{probe_id}")
-                return {'success': False, 'message': '探测任务已禁用或不存在'}
-            
-            # 使用 Redis 检查是否需要执行（基于间隔时间）
-            schedule_key = f"probe_schedule:{probe_id}"
-            last_run_key = f"probe_last_run:{probe_id}"
-            
-            # 尝试获取调度锁（防止并发调度）
-            lock_key = f"probe_lock:{probe_id}"
-            if not redis_client.set(lock_key, "1", nx=True, ex=interval_seconds):
-                # 已有调度在运行，跳过
-                return {'success': True, 'message': '调度已在运行中', 'skipped': True}
-            
-            try:
-                # 检查上次执行时间
-                last_run = redis_client.get(last_run_key)
-                now = datetime.utcnow().timestamp()
-                
-                should_execute = False
-                if last_run is None:
-                    should_execute = True
-                else:
-                    time_since_last = now - float(last_run)
-                    if time_since_last >= interval_seconds:
-                        should_execute = True
-                
-                if should_execute:
-                    # 更新上次执行时间
-                    redis_client.set(last_run_key, str(now), ex=interval_seconds * 2)
-                    
-                    # 执行探测
-                    execute_probe.apply_async(
-                        kwargs={
-                            'probe_id': probe_id,
-                            'tenant_id': tenant_id,
-                            'probe_type': 'auto'
-                        }
-                    )
-                    
-                    # 调度下一次执行
-                    schedule_single_probe.apply_async(
-                        kwargs={
-                            'probe_id': probe_id,
-                            'tenant_id': tenant_id,
-                            'interval_seconds': interval_seconds
-                        },
-                        countdown=interval_seconds  # 延迟 interval_seconds 秒后执行
-                    )
-                    
-                    return {
-                        'success': True,
-                        'probe_id': probe_id,
-                        'executed': True,
-                        'next_run_in': interval_seconds
-                    }
-                else:
-                    # 还没到执行时间，计算剩余时间后重新调度
-                    remaining = interval_seconds - (now - float(last_run))
-                    if remaining > 0:
-                        schedule_single_probe.apply_async(
-                            kwargs={
-                                'probe_id': probe_id,
-                                'tenant_id': tenant_id,
-                                'interval_seconds': interval_seconds
-                            },
-                            countdown=int(remaining)
-                        )
-                    
-                    return {
-                        'success': True,
-                        'probe_id': probe_id,
-                        'executed': False,
-                        'next_run_in': int(remaining) if remaining > 0 else interval_seconds
-                    }
-                    
-            finally:
-                # 释放锁
-                redis_client.delete(lock_key)
-                
+            network_probe_scheduler.schedule_probe(probe_id, interval_seconds, delay=0)
+            return {'success': True, 'probe_id': probe_id, 'scheduled': True}
         except Exception as e:
             logger.error(f"[网络探测] 单任务调度失败: probe_id={probe_id}, error={str(e)}")
             return {'success': False, 'error': str(e)}
@@ -356,3 +365,44 @@ def cleanup_old_results(days: int = 30) -> Dict[str, Any]:
             db.session.rollback()
             logger.error(f"[网络探测] 清理失败: {str(e)}")
             return {'success': False, 'error': str(e)}
+
+
+@celery.task(
+    name='app.tasks.network_probe_tasks.recover_probe_result_spools',
+    queue='network_probes',
+    priority=2
+)
+def recover_probe_result_spools() -> Dict[str, Any]:
+    """补写异常退出的 Worker 进程遗留在 Redis 暂存列表中的探测结果"""
+    app = get_flask_app()
+    with app.app_context():
+        from app.services.network_result_writer import network_result_writer
+        
+        try:
+            network_result_writer.start(app)
+            recovered = network_result_writer.recover_orphaned_spools()
+            if recovered > 0:
+                logger.info(f"[网络探测] 补写遗留探测结果: {recovered} 条")
+            return {'success': True, 'recovered': recovered}
+        except Exception as e:
+            logger.error(f"[网络探测] 补写遗留探测结果失败: {str(e)}")
+            return {'success': False, 'error': str(e)}
+
+
+@celery.task(
+    name='app.tasks.network_probe_tasks.backfill_probe_statistics',
+    queue='network_probes',
+    priority=1
+)
+def backfill_probe_statistics(hours: int = 24 * 7) -> Dict[str, Any]:
+    """从探测结果表回填统计聚合数据（聚合上线后手动执行一次）"""
+    app = get_flask_app()
+    with app.app_context():
+        from app.services.network_probe_stats_service import network_probe_stats_service
+        
+        try:
+            total = network_probe_stats_service.backfill(hours)
+            return {'success': True, 'backfilled': total}
+        except Exception as e:
+            logger.error(f"[网络探测] 回填统计聚合失败: {str(e)}")
+            return {'success': False, 'error': str(e)}
@@ -0,0 +1,92 @@
+"""
+告警通知发送 Celery 任务
+在独立的 notifications 队列中发送告警通知，慢速的 SMTP 服务器不会阻塞告警评估
+"""
+import logging
+from typing import Dict, Any
+from app.celery_app import celery
+from app.core.config_manager import config_manager
+
+logger = logging.getLogger(__name__)
+
+# 全局 Flask 应用实例（懒加载）
+_flask_app = None
+
+# 每个 Worker 进程的发送速率限制
+_notification_config = config_manager.get_app_config().get('alert_monitoring', {}).get('notification', {})
+NOTIFICATION_RATE_LIMIT = _notification_config.get('rate_limit', '30/m')
+
+
+def get_flask_app():
+    """获取 Celery 专用的轻量级 Flask 应用实例"""
+    global _flask_app
+    if _flask_app is None:
+        from app.celery_flask_app import create_celery_flask_app
+        _flask_app = create_celery_flask_app()
+    return _flask_app
+
+
+@celery.task(
+    name='app.tasks.notification_tasks.flush_channel_notifications',
+    rate_limit=NOTIFICATION_RATE_LIMIT,
+    priority=4
+)
+def flush_channel_notifications(channel_id: int) -> Dict[str, Any]:
+    """
+    发送指定渠道队列中的待发送告警通知
+    
+    Args:
+        channel_id: 告警渠道ID
+        
+    Returns:
+        发送结果字典
+    """
+    app = get_flask_app()
+    with app.app_context():
+        from app.services.alert_notification_dispatcher import alert_notification_dispatcher
+        from app.services.email_notification_service import email_notification_service
+        
+        try:
+            result = alert_notification_dispatcher.flush_channel(channel_id)
+            return {
+                'success': True,
+                **result
+            }
+        except Exception as e:
+            logger.error(f"[告警通知] 渠道 {channel_id} 发送失败: {str(e)}")
+            return {
+                'success': False,
+                'channel_id': channel_id,
+                'error': str(e)
+            }
+        finally:
+            email_notification_service.connection_cache.close_idle()
+
+
+@celery.task(
+    name='app.tasks.notification_tasks.sweep_pending_notifications',
+    priority=3
+)
+def sweep_pending_notifications() -> Dict[str, Any]:
+    """
+    重新调度滞留在队列中的告警通知（发送任务丢失或 Worker 异常退出时）
+    
+    Returns:
+        调度结果字典
+    """
+    app = get_flask_app()
+    with app.app_context():
+        from app.services.alert_notification_dispatcher import alert_notification_dispatcher
+        
+        try:
+            rescheduled = alert_notification_dispatcher.sweep()
+            return {
+                'success': True,
+                'rescheduled': rescheduled
+            }
+        except Exception as e:
+            logger.error(f"[告警通知] 补发检查失败: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e)
+            }
@@ -0,0 +1,68 @@
+"""
+Redis 管理 Celery 任务
+键空间分析按时间分片执行，每个分片结束后保存游标并调度下一个分片
+"""
+import logging
+from typing import Dict, Any
+from app.celery_app import celery
+
+logger = logging.getLogger(__name__)
+
+# 全局 Flask 应用实例（懒加载）
+_flask_app = None
+
+
+def get_flask_app():
+    """获取 Celery 专用的轻量级 Flask 应用实例"""
+    global _flask_app
+    if _flask_app is None:
+        from app.celery_flask_app import create_celery_flask_app
+        _flask_app = create_celery_flask_app()
+    return _flask_app
+
+
+@celery.task(
+    bind=True,
+    name='app.tasks.redis_tasks.analyze_redis_keyspace',
+    priority=2,
+    max_retries=None
+)
+def analyze_redis_keyspace(self, tenant_id: int, conn_id: int, run_id: str) -> Dict[str, Any]:
+    """
+    执行一个键空间分析分片，未完成时调度下一个分片
+    
+    Args:
+        tenant_id: 租户 ID
+        conn_id: 连接配置 ID
+        run_id: 分析任务 ID（重新开始分析后旧任务的分片自动退出）
+    """
+    app = get_flask_app()
+    with app.app_context():
+        from app.services.redis_keyspace_analyzer import (
+            redis_keyspace_analyzer, KeyspaceAnalysisError, KeyspaceSliceBusyError
+        )
+        
+        try:
+            state = redis_keyspace_analyzer.run_slice(tenant_id, conn_id, run_id)
+        except KeyspaceSliceBusyError:
+            # 上一个分片（可能属于已被重新开始的旧任务）仍持有锁，等其结束后重试；
+            # 重试时本运行已被取消或重新开始则由 run_slice 直接返回
+            raise self.retry(countdown=min(redis_keyspace_analyzer.slice_seconds, 10))
+        except KeyspaceAnalysisError as e:
+            logger.warning(f"[键空间分析] 连接 {conn_id} 分片执行失败: {str(e)}")
+            return {'success': False, 'error': str(e)}
+        
+        status = state.get('status')
+        if status == redis_keyspace_analyzer.STATUS_RUNNING and state.get('run_id') == run_id:
+            analyze_redis_keyspace.apply_async(args=[tenant_id, conn_id, run_id])
+        elif status == redis_keyspace_analyzer.STATUS_COMPLETED:
+            logger.info(
+                f"[键空间分析] 连接 {conn_id} 分析完成: "
+                f"{state['scanned_keys']} 个键, 抽样 {state['sampled_keys']} 个"
+            )
+        
+        return {
+            'success': True,
+            'status': status,
+            'scanned_keys': state.get('scanned_keys', 0)
+        }
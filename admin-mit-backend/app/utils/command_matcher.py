@@ -0,0 +1,182 @@
+"""
+命令过滤规则匹配工具
+将白名单/黑名单模式预编译为匹配器：不含通配符的模式放入字典精确查找，
+通配符模式合并为一个正则，单条命令只需一次字典查找和一次正则匹配，
+匹配结果与逐个模式执行 fnmatch（忽略大小写）一致
+"""
+import logging
+import re
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+# glob 通配符
+WILDCARD_CHARS = re.compile(r'[*?\[]')
+
+logger = logging.getLogger(__name__)
+
+
+def glob_to_regex(pattern: str) -> str:
+    """
+    将 glob 模式转换为正则表达式（不含捕获组，便于合并）
+
+    支持 *、?、[seq]、[!seq]，语义与 fnmatch.translate 相同
+    """
+    i, n = 0, len(pattern)
+    parts: List[str] = []
+    while i < n:
+        c = pattern[i]
+        i += 1
+        if c == '*':
+            # 连续的 * 合并为一个
+            if not parts or parts[-1] != '.*':
+                parts.append('.*')
+        elif c == '?':
+            parts.append('.')
+        elif c == '[':
+            j = i
+            if j < n and pattern[j] == '!':
+                j += 1
+            if j < n and pattern[j] == ']':
+                j += 1
+            while j < n and pattern[j] != ']':
+                j += 1
+            if j >= n:
+                # 未闭合的 [ 按字面量处理
+                parts.append('\\[')
+            else:
+                stuff = pattern[i:j]
+                if '-' not in stuff:
+                    stuff = stuff.replace('\\', r'\\')
+                else:
+                    # 按 '-' 切分区间，去掉起点大于终点的空区间（如 [c-^]），否则正则编译失败
+                    chunks = []
+                    k = i + 2 if pattern[i] == '!' else i + 1
+                    while True:
+                        k = pattern.find('-', k, j)
+                        if k < 0:
+                            break
+                        chunks.append(pattern[i:k])
+                        i = k + 1
+                        k = k + 3
+                    chunk = pattern[i:j]
+                    if chunk:
+                        chunks.append(chunk)
+                    else:
+                        chunks[-1] += '-'
+                    for k in range(len(chunks) - 1, 0, -1):
+                        if chunks[k - 1][-1] > chunks[k][0]:
+                            chunks[k - 1] = chunks[k - 1][:-1] + chunks[k][1:]
+                            del chunks[k]
+                    # 转义反斜杠和非区间的 '-'，避免被解释为集合差运算
+                    stuff = '-'.join(s.replace('\\', r'\\').replace('-', r'\-') for s in chunks)
+                # 转义集合运算符（&&、~~、||）
+                stuff = re.sub(r'([&~|])', r'\\\1', stuff)
+                i = j + 1
+                if not stuff:
+                    # 空集合：永不匹配
+                    parts.append('(?!)')
+                elif stuff == '!':
+                    # 取反的空集合：匹配任意字符
+                    parts.append('.')
+                else:
+                    if stuff[0] == '!':
+                        stuff = '^' + stuff[1:]
+                    elif stuff[0] in ('^', '['):
+                        stuff = '\\' + stuff
+                    parts.append(f'[{stuff}]')
+        else:
+            parts.append(re.escape(c))
+    return ''.join(parts)
+
+
+class CommandMatcher:
+    """编译后的模式列表
+
+    find 返回列表中最靠前的命中模式（与按顺序逐个 fnmatch 的结果一致）
+    """
+
+    __slots__ = ('patterns', '_literals', '_wildcard_regex', '_wildcard_index')
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns: List[str] = list(patterns or [])
+        self._literals = {}
+        wildcard_parts = []
+        self._wildcard_index: List[int] = []
+
+        for index, pattern in enumerate(self.patterns):
+            if not pattern:
+                continue
+            lowered = pattern.lower()
+            if WILDCARD_CHARS.search(lowered):
+                regex = glob_to_regex(lowered)
+                try:
+                    re.compile(regex)
+                except re.error as e:
+                    # 单条无效模式不影响其余规则
+                    logger.warning(f"忽略无效的命令过滤模式 '{pattern}': {e}")
+                    continue
+                wildcard_parts.append(f'({regex})')
+                self._wildcard_index.append(index)
+            else:
+                self._literals.setdefault(lowered, index)
+
+        # 每个通配符模式对应一个捕获组，lastindex 即命中的模式
+        self._wildcard_regex = re.compile('|'.join(wildcard_parts), re.DOTALL) if wildcard_parts else None
+
+    def __bool__(self) -> bool:
+        return bool(self.patterns)
+
+    def find(self, command: str) -> Optional[str]:
+        """查找命令命中的第一个模式，未命中返回 None"""
+        if not command:
+            return None
+
+        lowered = command.lower()
+        best = self._literals.get(lowered)
+        if self._wildcard_regex is not None:
+            match = self._wildcard_regex.fullmatch(lowered)
+            if match:
+                index = self._wildcard_index[match.lastindex - 1]
+                if best is None or index < best:
+                    best = index
+
+        return self.patterns[best] if best is not None else None
+
+    def matches(self, command: str) -> bool:
+        """命令是否命中任一模式"""
+        return self.find(command) is not None
+
+
+class CommandFilterPolicy:
+    """编译后的命令过滤策略（模式 + 白名单/黑名单匹配器）"""
+
+    __slots__ = ('mode', 'whitelist', 'blacklist')
+
+    def __init__(self, mode: str, whitelist: Optional[Sequence[str]], blacklist: Optional[Sequence[str]]):
+        self.mode = mode
+        self.whitelist = CommandMatcher(whitelist or [])
+        self.blacklist = CommandMatcher(blacklist or [])
+
+    def check(self, base_commands: Sequence[str]) -> Tuple[bool, str]:
+        """
+        检查解析后的基础命令
+
+        Returns:
+            (is_allowed, reason) 元组
+        """
+        if self.mode == 'whitelist' and self.whitelist:
+            # 白名单模式：只允许白名单中的命令
+            for base_cmd in base_commands:
+                if not self.whitelist.matches(base_cmd):
+                    return False, f"命令 '{base_cmd}' 不在白名单中"
+            return True, ""
+
+        if self.mode == 'blacklist' or (not self.whitelist and self.blacklist):
+            # 黑名单模式：阻止黑名单中的命令
+            for base_cmd in base_commands:
+                matched_pattern = self.blacklist.find(base_cmd)
+                if matched_pattern:
+                    return False, f"命令 '{base_cmd}' 匹配黑名单规则 '{matched_pattern}'"
+            return True, ""
+
+        # 没有配置有效规则，允许执行
+        return True, ""
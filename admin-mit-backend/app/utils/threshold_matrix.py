@@ -0,0 +1,138 @@
+"""
+告警阈值矩阵评估工具
+将一批阈值规则与一批主机的指标值按列进行比较，返回触发的 (规则, 主机) 组合；
+安装了 NumPy 时使用向量化比较，否则退化为纯 Python 实现
+"""
+import operator
+from typing import Dict, List, Optional, Sequence, Tuple, Any
+
+# 尝试导入numpy，如果不存在则使用备用方案
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    np = None
+    HAS_NUMPY = False
+
+
+OPERATORS = {
+    '>': operator.gt,
+    '<': operator.lt,
+    '>=': operator.ge,
+    '<=': operator.le,
+    '==': operator.eq,
+}
+
+
+class ThresholdRule:
+    """参与矩阵评估的规则描述"""
+    
+    __slots__ = ('key', 'metric', 'operator', 'threshold', 'host_ids')
+    
+    def __init__(self, key: Any, metric: str, operator: str, threshold: float,
+                 host_ids: Optional[Sequence[int]] = None):
+        self.key = key
+        self.metric = metric
+        self.operator = operator
+        self.threshold = float(threshold)
+        # None 或空列表表示适用于所有主机
+        self.host_ids = list(host_ids) if host_ids else None
+
+
+class ThresholdMatrix:
+    """阈值矩阵评估器
+    
+    以主机为列建立各指标的取值向量，再按 (指标, 操作符) 将规则分组，
+    每组一次性完成 规则数 x 主机数 的比较
+    """
+    
+    def __init__(self, host_ids: Sequence[int], metric_values: Dict[str, Sequence[Optional[float]]],
+                 use_numpy: Optional[bool] = None):
+        """
+        Args:
+            host_ids: 参与评估的主机ID（列顺序）
+            metric_values: 指标名 -> 与 host_ids 对齐的取值序列，缺失值为 None
+            use_numpy: 是否使用 NumPy，默认在可用时使用
+        """
+        self.host_ids = list(host_ids)
+        self.host_index = {host_id: idx for idx, host_id in enumerate(self.host_ids)}
+        self.use_numpy = HAS_NUMPY if use_numpy is None else (use_numpy and HAS_NUMPY)
+        
+        if self.use_numpy:
+            self.columns = {
+                metric: np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+                for metric, values in metric_values.items()
+            }
+        else:
+            self.columns = {
+                metric: [None if v is None else float(v) for v in values]
+                for metric, values in metric_values.items()
+            }
+    
+    def evaluate(self, rules: Sequence[ThresholdRule]) -> List[Tuple[int, int, float]]:
+        """评估全部规则
+        
+        Returns:
+            触发的组合列表 [(规则下标, 主机下标, 当前值)]
+        """
+        groups: Dict[Tuple[str, str], List[int]] = {}
+        for idx, rule in enumerate(rules):
+            if rule.operator not in OPERATORS:
+                continue
+            groups.setdefault((rule.metric, rule.operator), []).append(idx)
+        
+        triggered: List[Tuple[int, int, float]] = []
+        
+        for (metric, op), rule_indexes in groups.items():
+            column = self.columns.get(metric)
+            if column is None:
+                continue
+            group_rules = [rules[i] for i in rule_indexes]
+            if self.use_numpy:
+                triggered.extend(self._evaluate_numpy(column, op, group_rules, rule_indexes))
+            else:
+                triggered.extend(self._evaluate_python(column, op, group_rules, rule_indexes))
+        
+        return triggered
+    
+    def _target_mask(self, rules: Sequence[ThresholdRule]):
+        """构建 规则 x 主机 的适用范围掩码"""
+        mask = np.ones((len(rules), len(self.host_ids)), dtype=bool)
+        for row, rule in enumerate(rules):
+            if rule.host_ids is None:
+                continue
+            mask[row, :] = False
+            cols = [self.host_index[h] for h in rule.host_ids if h in self.host_index]
+            if cols:
+                mask[row, cols] = True
+        return mask
+    
+    def _evaluate_numpy(self, column, op: str, rules: Sequence[ThresholdRule],
+                        rule_indexes: Sequence[int]) -> List[Tuple[int, int, float]]:
+        """NumPy 向量化比较"""
+        thresholds = np.array([rule.threshold for rule in rules], dtype=np.float64)
+        # NaN 参与比较结果恒为 False
+        compared = OPERATORS[op](column[np.newaxis, :], thresholds[:, np.newaxis])
+        compared &= self._target_mask(rules)
+        
+        rows, cols = np.nonzero(compared)
+        rule_positions = np.asarray(rule_indexes)[rows]
+        return list(zip(rule_positions.tolist(), cols.tolist(), column[cols].tolist()))
+    
+    def _evaluate_python(self, column, op: str, rules: Sequence[ThresholdRule],
+                         rule_indexes: Sequence[int]) -> List[Tuple[int, int, float]]:
+        """纯 Python 比较"""
+        compare = OPERATORS[op]
+        all_cols = range(len(self.host_ids))
+        hits = []
+        for rule_index, rule in zip(rule_indexes, rules):
+            if rule.host_ids is None:
+                cols = all_cols
+            else:
+                cols = [self.host_index[h] for h in rule.host_ids if h in self.host_index]
+            threshold = rule.threshold
+            for col in cols:
+                value = column[col]
+                if value is not None and compare(value, threshold):
+                    hits.append((rule_index, col, value))
+        return hits
@@ -23,9 +23,13 @@ with flask_app.app_context():
     # 显式导入任务模块以确保任务被注册
     from app.tasks import network_probe_tasks
     from app.tasks import host_probe_tasks
+    from app.tasks import host_metrics_tasks
+    from app.tasks import alert_tasks
+    from app.tasks import notification_tasks
     from app.tasks import audit_cleanup_tasks
     from app.tasks import backup_tasks
     from app.tasks import ansible_tasks
+    from app.tasks import redis_tasks
     
     # 自动发现任务模块
     celery.autodiscover_tasks(['app.tasks'])
@@ -0,0 +1,61 @@
+"""添加主机性能指标降采样汇总表
+
+Revision ID: 011_host_metrics_rollups
+Revises: e513a83e6461
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '011_host_metrics_rollups'
+down_revision = 'e513a83e6461'
+branch_labels = None
+depends_on = None
+
+
+METRIC_PREFIXES = ('cpu', 'memory', 'disk', 'load')
+
+
+def upgrade():
+    """创建 host_metrics_rollups 表"""
+    metric_columns = []
+    for prefix in METRIC_PREFIXES:
+        for stat in ('min', 'max', 'avg', 'last'):
+            metric_columns.append(sa.Column(f'{prefix}_{stat}', sa.Numeric(5, 2), nullable=True))
+    
+    op.create_table(
+        'host_metrics_rollups',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('host_id', sa.Integer(), sa.ForeignKey('ssh_hosts.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('resolution', sa.Integer(), nullable=False, comment='汇总粒度（秒）: 60/300/3600'),
+        sa.Column('bucket_start', sa.DateTime(), nullable=False, comment='时间桶起始时间（UTC）'),
+        sa.Column('sample_count', sa.Integer(), nullable=False, server_default='0', comment='原始样本数'),
+        *metric_columns,
+        sa.Column('network_in_last', sa.BigInteger(), nullable=True, comment='网络入流量计数器'),
+        sa.Column('network_out_last', sa.BigInteger(), nullable=True, comment='网络出流量计数器'),
+    )
+    
+    # 唯一约束 (host_id, resolution, bucket_start)，同时作为按主机查询时间范围的索引
+    op.create_unique_constraint(
+        'uq_host_metrics_rollup_bucket', 'host_metrics_rollups',
+        ['host_id', 'resolution', 'bucket_start']
+    )
+    # 汇总与保留期清理按 (resolution, bucket_start) 范围扫描
+    op.create_index(
+        'ix_host_metrics_rollups_resolution_bucket', 'host_metrics_rollups',
+        ['resolution', 'bucket_start']
+    )
+    
+    # 原始指标按主机和时间范围查询/清理
+    op.create_index('ix_host_metrics_host_collected_at', 'host_metrics', ['host_id', 'collected_at'])
+    op.create_index('ix_host_metrics_collected_at', 'host_metrics', ['collected_at'])
+
+
+def downgrade():
+    """删除 host_metrics_rollups 表"""
+    op.drop_index('ix_host_metrics_collected_at', table_name='host_metrics')
+    op.drop_index('ix_host_metrics_host_collected_at', table_name='host_metrics')
+    op.drop_index('ix_host_metrics_rollups_resolution_bucket', table_name='host_metrics_rollups')
+    op.drop_constraint('uq_host_metrics_rollup_bucket', 'host_metrics_rollups', type_='unique')
+    op.drop_table('host_metrics_rollups')
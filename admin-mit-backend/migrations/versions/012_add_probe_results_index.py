@@ -0,0 +1,36 @@
+"""添加网络探测结果 (probe_id, probed_at DESC) 复合索引
+
+Revision ID: 012_probe_results_index
+Revises: 011_host_metrics_rollups
+Create Date: 2026-10-16
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '012_probe_results_index'
+down_revision = '011_host_metrics_rollups'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """创建 idx_probe_results_probe_probed_at 索引"""
+    # 按探测任务取最近N次结果（LATERAL + LIMIT）与按时间范围统计都走该索引；
+    # INCLUDE 状态/响应时间/状态码，统计类查询可仅索引扫描
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'idx_probe_results_probe_probed_at', 'network_probe_results',
+            ['probe_id', sa.text('probed_at DESC')],
+            postgresql_include=['status', 'response_time', 'status_code'],
+            postgresql_concurrently=True
+        )
+
+
+def downgrade():
+    """删除 idx_probe_results_probe_probed_at 索引"""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'idx_probe_results_probe_probed_at', table_name='network_probe_results',
+            postgresql_concurrently=True
+        )
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+告警规则评估基准测试
+对比逐规则逐主机的 Decimal 比较与阈值矩阵（NumPy / 纯 Python）评估的单周期耗时
+
+用法:
+    python scripts/benchmark_alert_evaluation.py --rules 1000 --hosts 5000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.threshold_matrix import ThresholdMatrix, ThresholdRule, OPERATORS, HAS_NUMPY
+
+
+METRIC_KEYS = ['cpu_usage', 'memory_usage', 'disk_usage', 'load_average']
+
+
+def generate_dataset(rule_count: int, host_count: int, targeted_ratio: float, seed: int):
+    """生成模拟的主机指标快照和告警规则"""
+    rng = random.Random(seed)
+    host_ids = list(range(1, host_count + 1))
+    host_metrics = {}
+    for host_id in host_ids:
+        host_metrics[host_id] = {
+            'cpu_usage': round(rng.uniform(0, 100), 2),
+            'memory_usage': round(rng.uniform(0, 100), 2),
+            'disk_usage': round(rng.uniform(0, 100), 2),
+            # 少量主机缺失负载数据
+            'load_average': None if rng.random() < 0.02 else round(rng.uniform(0, 16), 2),
+        }
+
+    rules = []
+    for rule_id in range(1, rule_count + 1):
+        metric = rng.choice(METRIC_KEYS)
+        upper = 16 if metric == 'load_average' else 100
+        targeted = rng.random() < targeted_ratio
+        # 模拟常见的高水位告警规则，少量低水位规则
+        if rng.random() < 0.9:
+            operator = rng.choice(['>', '>='])
+            threshold = rng.uniform(0.8, 0.99) * upper
+        else:
+            operator = rng.choice(['<', '<='])
+            threshold = rng.uniform(0.01, 0.1) * upper
+        rules.append(ThresholdRule(
+            key=rule_id,
+            metric=metric,
+            operator=operator,
+            threshold=Decimal(str(round(threshold, 2))),
+            host_ids=rng.sample(host_ids, min(50, host_count)) if targeted else None
+        ))
+    return host_ids, host_metrics, rules
+
+
+def evaluate_legacy(host_ids, host_metrics, rules):
+    """逐规则逐主机构造 Decimal 比较（原实现的评估方式）"""
+    triggered = 0
+    for rule in rules:
+        threshold = Decimal(str(rule.threshold))
+        compare = OPERATORS[rule.operator]
+        for host_id in (rule.host_ids or host_ids):
+            value = host_metrics[host_id].get(rule.metric)
+            if value is None:
+                continue
+            if compare(Decimal(str(value)), threshold):
+                triggered += 1
+    return triggered
+
+
+def evaluate_matrix(host_ids, host_metrics, rules, use_numpy):
+    """构建阈值矩阵并评估"""
+    matrix = ThresholdMatrix(host_ids, {
+        key: [host_metrics[host_id].get(key) for host_id in host_ids]
+        for key in METRIC_KEYS
+    }, use_numpy=use_numpy)
+    return len(matrix.evaluate(rules))
+
+
+def measure(func, repeat: int):
+    """多次运行取最优耗时"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='告警规则评估基准测试')
+    parser.add_argument('--rules', type=int, default=1000, help='规则数量')
+    parser.add_argument('--hosts', type=int, default=5000, help='主机数量')
+    parser.add_argument('--targeted-ratio', type=float, default=0.2, help='指定主机范围的规则比例')
+    parser.add_argument('--repeat', type=int, default=3, help='每种方式重复次数')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子')
+    parser.add_argument('--skip-legacy', action='store_true', help='跳过逐规则 Decimal 评估')
+    args = parser.parse_args()
+
+    host_ids, host_metrics, rules = generate_dataset(args.rules, args.hosts, args.targeted_ratio, args.seed)
+
+    print("=" * 60)
+    print(f"告警规则评估基准测试: {args.rules} 条规则 x {args.hosts} 台主机")
+    print("=" * 60)
+
+    results = []
+    if not args.skip_legacy:
+        results.append(('逐规则 Decimal 比较', measure(lambda: evaluate_legacy(host_ids, host_metrics, rules), args.repeat)))
+    results.append(('阈值矩阵（纯 Python）', measure(lambda: evaluate_matrix(host_ids, host_metrics, rules, False), args.repeat)))
+    if HAS_NUMPY:
+        results.append(('阈值矩阵（NumPy）', measure(lambda: evaluate_matrix(host_ids, host_metrics, rules, True), args.repeat)))
+    else:
+        print("未安装 numpy，跳过向量化评估")
+
+    baseline = results[0][1][0]
+    for name, (elapsed, triggered) in results:
+        print(f"{name:<24} 周期耗时 {elapsed * 1000:>10.1f} ms  触发 {triggered:>8}  加速比 {baseline / elapsed:>6.1f}x")
+
+
+if __name__ == '__main__':
+    main()
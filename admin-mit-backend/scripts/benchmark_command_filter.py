@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+命令过滤基准测试
+对比逐模式 fnmatch（每次比较都转换大小写）与预编译匹配器（字面量字典 + 合并通配符正则）
+的单条命令检查耗时
+
+用法:
+    python scripts/benchmark_command_filter.py --patterns 500 --commands 20000
+"""
+import argparse
+import fnmatch
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.command_matcher import CommandFilterPolicy
+
+
+COMMON_COMMANDS = ['ls', 'cd', 'cat', 'grep', 'tail', 'less', 'ps', 'top', 'df', 'du',
+                   'vim', 'systemctl', 'journalctl', 'docker', 'kubectl', 'git', 'curl', 'awk']
+
+
+def random_word(rng: random.Random, min_len: int = 3, max_len: int = 10) -> str:
+    return ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(min_len, max_len)))
+
+
+def generate_patterns(count: int, wildcard_ratio: float, rng: random.Random):
+    """生成模式列表：大部分为命令名字面量，部分带通配符"""
+    patterns = []
+    for _ in range(count):
+        word = random_word(rng)
+        if rng.random() < wildcard_ratio:
+            kind = rng.random()
+            if kind < 0.5:
+                word = word[:rng.randint(2, 4)] + '*'
+            elif kind < 0.8:
+                word = '*' + word[-rng.randint(2, 4):]
+            else:
+                pos = rng.randint(1, len(word) - 1)
+                word = word[:pos] + '?' + word[pos + 1:]
+        # 少量大写，验证忽略大小写
+        patterns.append(word.upper() if rng.random() < 0.05 else word)
+    return patterns
+
+
+def generate_commands(count: int, patterns, rng: random.Random):
+    """生成基础命令列表：常用命令、随机命令和命中黑名单的命令混合"""
+    literals = [p for p in patterns if not any(c in p for c in '*?[')]
+    commands = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.6:
+            commands.append(rng.choice(COMMON_COMMANDS))
+        elif roll < 0.9 or not literals:
+            commands.append(random_word(rng))
+        else:
+            commands.append(rng.choice(literals))
+    return commands
+
+
+def check_legacy(mode, whitelist, blacklist, base_commands):
+    """原实现：逐模式 fnmatch，每次比较都转换大小写"""
+    def match(command, pattern):
+        if not command or not pattern:
+            return False
+        return fnmatch.fnmatch(command.lower(), pattern.lower())
+
+    if mode == 'whitelist' and whitelist:
+        for base_cmd in base_commands:
+            if not any(match(base_cmd, p) for p in whitelist):
+                return False, f"命令 '{base_cmd}' 不在白名单中"
+        return True, ""
+    if mode == 'blacklist' or (not whitelist and blacklist):
+        for base_cmd in base_commands:
+            for p in blacklist:
+                if match(base_cmd, p):
+                    return False, f"命令 '{base_cmd}' 匹配黑名单规则 '{p}'"
+        return True, ""
+    return True, ""
+
+
+def run(label, fn, commands, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [fn([cmd]) for cmd in commands]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    per_command_us = best / len(commands) * 1e6
+    blocked = sum(1 for allowed, _ in results if not allowed)
+    print(f"{label:<28}{per_command_us:>12.2f} us/命令{blocked:>10} 条被阻止")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='命令过滤基准测试')
+    parser.add_argument('--patterns', type=int, default=500, help='黑名单/白名单模式数量')
+    parser.add_argument('--commands', type=int, default=20000, help='检查的命令数量')
+    parser.add_argument('--wildcard-ratio', type=float, default=0.2, help='带通配符模式的比例')
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数（取最快一次）')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    patterns = generate_patterns(args.patterns, args.wildcard_ratio, rng)
+    commands = generate_commands(args.commands, patterns, rng)
+
+    print(f"模式数: {args.patterns}（通配符比例 {args.wildcard_ratio:.0%}），命令数: {args.commands}")
+
+    start = time.perf_counter()
+    blacklist_policy = CommandFilterPolicy('blacklist', [], patterns)
+    whitelist_policy = CommandFilterPolicy('whitelist', patterns, [])
+    compile_ms = (time.perf_counter() - start) * 1000 / 2
+    print(f"编译策略耗时: {compile_ms:.2f} ms")
+
+    for mode, policy in (('blacklist', blacklist_policy), ('whitelist', whitelist_policy)):
+        whitelist = patterns if mode == 'whitelist' else []
+        blacklist = patterns if mode == 'blacklist' else []
+        legacy = run(f"{mode} / fnmatch 逐模式", lambda cmds: check_legacy(mode, whitelist, blacklist, cmds),
+                     commands, args.repeat)
+        compiled = run(f"{mode} / 预编译匹配器", policy.check, commands, args.repeat)
+        if legacy != compiled:
+            mismatches = sum(1 for a, b in zip(legacy, compiled) if a != b)
+            print(f"  警告: {mismatches} 条命令的检查结果不一致")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+终端会话负载基准测试
+对比每会话读写两个线程（原 SSHTerminalBridge 实现）与终端多路复用器（单事件循环 + 固定线程池）
+在 N 个并发 Shell 会话下的线程数、内存和 CPU 开销
+
+在子进程中启动本地 paramiko 测试服务器：每个 Shell 通道周期性输出一行并回显输入；
+每种模式在独立子进程中运行，结果按会话平均。
+
+用法:
+    python scripts/benchmark_terminal_multiplexer.py --sessions 300 --duration 30
+"""
+import argparse
+import multiprocessing
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+
+import paramiko
+import psutil
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+USERNAME = 'bench'
+PASSWORD = 'bench'
+
+
+# ==================== 本地测试服务器 ====================
+
+class _BenchServer(paramiko.ServerInterface):
+    """接受任意密码并允许 PTY/Shell 请求的测试服务器"""
+
+    def __init__(self, shells: 'queue.Queue'):
+        self.shells = shells
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_pty_request(self, channel, term, width, height, pixelwidth, pixelheight, modes):
+        return True
+
+    def check_channel_shell_request(self, channel):
+        self.shells.put(channel)
+        return True
+
+
+def run_server(port_queue, output_interval: float, line_bytes: int):
+    """测试服务器进程：每个 Shell 通道按间隔输出一行，并回显收到的输入"""
+    host_key = paramiko.RSAKey.generate(2048)
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(128)
+    port_queue.put(listener.getsockname()[1])
+
+    shells: 'queue.Queue' = queue.Queue()
+    channels = []
+    line = (b'x' * (line_bytes - 2)) + b'\r\n'
+
+    def accept_loop():
+        while True:
+            sock, _ = listener.accept()
+            transport = paramiko.Transport(sock)
+            transport.add_server_key(host_key)
+            transport.start_server(server=_BenchServer(shells))
+
+    threading.Thread(target=accept_loop, daemon=True).start()
+
+    next_output = time.monotonic()
+    while True:
+        while True:
+            try:
+                channels.append(shells.get_nowait())
+            except queue.Empty:
+                break
+
+        now = time.monotonic()
+        emit = now >= next_output
+        if emit:
+            next_output = now + output_interval
+
+        for channel in list(channels):
+            if channel.closed:
+                channels.remove(channel)
+                continue
+            try:
+                if channel.recv_ready():
+                    channel.sendall(channel.recv(4096))
+                if emit:
+                    channel.sendall(line)
+            except Exception:
+                channels.remove(channel)
+
+        time.sleep(0.005)
+
+
+# ==================== 客户端会话 ====================
+
+def open_channels(port: int, sessions: int, per_transport: int):
+    """建立 SSH Transport 并在其上打开 Shell 通道（与连接池单 Transport 多通道一致）"""
+    transports = []
+    channels = []
+    while len(channels) < sessions:
+        transport = paramiko.Transport(('127.0.0.1', port))
+        transport.connect(username=USERNAME, password=PASSWORD)
+        transports.append(transport)
+        for _ in range(min(per_transport, sessions - len(channels))):
+            channel = transport.open_session()
+            channel.get_pty(term='xterm-256color', width=80, height=24)
+            channel.invoke_shell()
+            channels.append(channel)
+    return transports, channels
+
+
+class ThreadedSession:
+    """原实现：读取线程轮询 recv_ready，写入线程阻塞在队列上"""
+
+    def __init__(self, channel, counter):
+        self.channel = channel
+        self.counter = counter
+        self.write_queue = queue.Queue(maxsize=1000)
+        self.stop_event = threading.Event()
+
+    def start(self):
+        self.channel.settimeout(0.01)
+        self.channel.setblocking(False)
+        threading.Thread(target=self._read_loop, daemon=True).start()
+        threading.Thread(target=self._write_loop, daemon=True).start()
+
+    def send_input(self, data: bytes):
+        self.write_queue.put(data, timeout=1)
+
+    def _read_loop(self):
+        while not self.stop_event.is_set():
+            try:
+                if self.channel.recv_ready():
+                    data = self.channel.recv(4096)
+                    if not data:
+                        break
+                    self.counter.add(len(data))
+                time.sleep(0.001)
+            except socket.timeout:
+                continue
+            except Exception:
+                break
+
+    def _write_loop(self):
+        while not self.stop_event.is_set():
+            try:
+                data = self.write_queue.get(timeout=0.1)
+                self.channel.send(data)
+            except queue.Empty:
+                continue
+            except Exception:
+                break
+
+    def stop(self):
+        self.stop_event.set()
+
+
+class MultiplexedSession:
+    """终端多路复用器：通道注册到事件循环，输入经会话输入队列写入"""
+
+    def __init__(self, channel, counter, multiplexer, input_queue_cls):
+        self.channel = channel
+        self.counter = counter
+        self.multiplexer = multiplexer
+        self.input_queue = input_queue_cls(multiplexer, channel.sendall)
+
+    def start(self):
+        self.channel.settimeout(10)
+        self.multiplexer.register(self.channel, self._on_readable)
+
+    def send_input(self, data: bytes):
+        self.input_queue.put(data)
+
+    def _on_readable(self, channel):
+        data = channel.recv(16384)
+        if not data:
+            self.multiplexer.unregister(channel)
+            return
+        self.counter.add(len(data))
+
+    def stop(self):
+        self.input_queue.close()
+        self.multiplexer.unregister(self.channel)
+
+
+class ByteCounter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def add(self, n: int):
+        with self._lock:
+            self.value += n
+
+
+def run_client(mode: str, port: int, args, result_queue):
+    """在独立进程中运行一种模式并上报资源占用"""
+    process = psutil.Process()
+
+    if mode == 'mux':
+        from app.services.terminal_multiplexer import TerminalMultiplexer, SessionInputQueue
+        multiplexer = TerminalMultiplexer(io_workers=args.io_workers)
+
+    transports, channels = open_channels(port, args.sessions, args.per_transport)
+    time.sleep(1)
+
+    base_rss = process.memory_info().rss
+    base_threads = process.num_threads()
+
+    counter = ByteCounter()
+    if mode == 'mux':
+        sessions = [MultiplexedSession(ch, counter, multiplexer, SessionInputQueue) for ch in channels]
+    else:
+        sessions = [ThreadedSession(ch, counter) for ch in channels]
+    for session in sessions:
+        session.start()
+
+    # 预热后开始计量
+    time.sleep(2)
+    start_cpu = sum(process.cpu_times()[:2])
+    start_bytes = counter.value
+    start = time.monotonic()
+
+    keystroke = b'l'
+    next_input = start
+    while time.monotonic() - start < args.duration:
+        if time.monotonic() >= next_input:
+            for session in sessions:
+                session.send_input(keystroke)
+            next_input += args.input_interval
+        time.sleep(0.01)
+
+    elapsed = time.monotonic() - start
+    cpu = sum(process.cpu_times()[:2]) - start_cpu
+    rss = process.memory_info().rss
+    threads = process.num_threads()
+    received = counter.value - start_bytes
+
+    for session in sessions:
+        session.stop()
+    for transport in transports:
+        transport.close()
+
+    result_queue.put({
+        'mode': mode,
+        'sessions': len(sessions),
+        'threads': threads,
+        'threads_added': threads - base_threads,
+        'rss_mb': rss / 1024 / 1024,
+        'rss_per_session_kb': (rss - base_rss) / 1024 / len(sessions),
+        'cpu_percent': cpu / elapsed * 100,
+        'cpu_ms_per_session_per_s': cpu / elapsed / len(sessions) * 1000,
+        'throughput_kb_s': received / elapsed / 1024,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description='终端会话负载基准测试')
+    parser.add_argument('--sessions', type=int, default=300, help='并发 Shell 会话数')
+    parser.add_argument('--per-transport', type=int, default=8, help='单个 Transport 上的通道数')
+    parser.add_argument('--duration', type=float, default=30, help='计量时长（秒）')
+    parser.add_argument('--output-interval', type=float, default=0.5, help='服务器每个通道输出间隔（秒）')
+    parser.add_argument('--line-bytes', type=int, default=120, help='服务器每次输出的字节数')
+    parser.add_argument('--input-interval', type=float, default=1.0, help='每个会话发送输入的间隔（秒）')
+    parser.add_argument('--io-workers', type=int, default=8, help='多路复用器 I/O 线程数')
+    parser.add_argument('--modes', default='threads,mux', help='测试模式，逗号分隔：threads / mux')
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context('spawn')
+    port_queue = ctx.Queue()
+    server = ctx.Process(
+        target=run_server,
+        args=(port_queue, args.output_interval, args.line_bytes),
+        daemon=True
+    )
+    server.start()
+    port = port_queue.get(timeout=60)
+
+    print(f"会话数: {args.sessions}, 每 Transport 通道数: {args.per_transport}, "
+          f"计量时长: {args.duration}s, 服务器端口: {port}")
+
+    results = []
+    for mode in [m.strip() for m in args.modes.split(',') if m.strip()]:
+        result_queue = ctx.Queue()
+        client = ctx.Process(target=run_client, args=(mode, port, args, result_queue))
+        client.start()
+        results.append(result_queue.get(timeout=args.duration + 300))
+        client.join()
+
+    server.terminate()
+
+    header = (f"{'模式':<8}{'线程数':>8}{'新增线程':>10}{'RSS(MB)':>10}{'KB/会话':>10}"
+              f"{'CPU%':>8}{'CPU ms/会话/s':>15}{'吞吐(KB/s)':>12}")
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        print(f"{r['mode']:<8}{r['threads']:>8}{r['threads_added']:>10}{r['rss_mb']:>10.1f}"
+              f"{r['rss_per_session_kb']:>10.1f}{r['cpu_percent']:>8.1f}"
+              f"{r['cpu_ms_per_session_per_s']:>15.3f}{r['throughput_kb_s']:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -9,7 +9,7 @@ import './Terminal.css';
 
 export interface TerminalRef {
   terminal: XTerm | null;
-  write: (data: string) => void;
+  write: (data: string | Uint8Array) => void;
   writeln: (data: string) => void;
   clear: () => void;
   focus: () => void;
@@ -207,7 +207,7 @@ const Terminal = forwardRef<TerminalRef, TerminalProps>(({
 
   useImperativeHandle(ref, () => ({
     terminal: xtermRef.current,
-    write: (data: string) => {
+    write: (data: string | Uint8Array) => {
       xtermRef.current?.write(data);
     },
     writeln: (data: string) => {
@@ -51,7 +51,7 @@ const WebShellTerminal = forwardRef<WebShellTerminalRef, WebShellTerminalProps>(
   terminalStateRef.current.isTerminalReady = isTerminalReady;
 
   // 处理 WebShell 数据 - 使用 ref 避免依赖变化
-  const handleWebShellData = useCallback((data: string) => {
+  const handleWebShellData = useCallback((data: string | Uint8Array) => {
     if (terminalRef.current && terminalStateRef.current.isTerminalReady) {
       terminalRef.current.write(data);
     }
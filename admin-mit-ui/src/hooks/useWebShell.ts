@@ -7,7 +7,7 @@ import { webshellService, WebShellSession, WebSocketState } from '../services/we
 export interface UseWebShellOptions {
   hostId: number
   autoConnect?: boolean
-  onTerminalData?: (data: string) => void
+  onTerminalData?: (data: string | Uint8Array) => void
   onConnectionStateChange?: (state: WebSocketState) => void
   onError?: (error: any) => void
 }
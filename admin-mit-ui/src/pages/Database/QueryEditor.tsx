@@ -276,7 +276,8 @@ export const QueryEditor: React.FC<QueryEditorProps> = ({
         sql: sql.trim(),
         page,
         per_page: result?.pagination?.per_page || 50,
-        max_rows: 1000
+        max_rows: 1000,
+        session_id: result?.session_id
       })
       setResult(queryResult)
     } catch (err: any) {
@@ -40,7 +40,7 @@ export const QueryResultTable: React.FC<QueryResultTableProps> = ({
   const [selectedRow, setSelectedRow] = useState<number | null>(null)
   const tableRef = useRef<HTMLDivElement>(null)
 
-  const { columns, rows, row_count, execution_time, affected_rows, pagination } = result
+  const { columns, rows, row_count, execution_time, affected_rows, pagination, total_count, total_estimated } = result
 
   // 复制单元格内容
   const handleCopyCell = useCallback((value: any, cellId: string) => {
@@ -72,20 +72,26 @@ export const QueryResultTable: React.FC<QueryResultTableProps> = ({
     return 'text-gray-700'
   }
 
-  // 分页处理
+  // 分页处理（总数未知时 pages 为已知页数下界，翻页以 has_prev/has_next 为准）
   const currentPage = pagination?.page || 1
   const totalPages = pagination?.pages || 1
   const perPage = pagination?.per_page || 50
-  const total = pagination?.total || row_count
+  const totalKnown = pagination?.total != null
+  const total = pagination?.total ?? row_count
+  const hasPrev = pagination?.has_prev ?? currentPage > 1
+  const hasNext = pagination?.has_next ?? currentPage < totalPages
+  const showPagination = !!pagination && (totalPages > 1 || hasPrev || hasNext)
 
   const handlePageChange = (page: number) => {
-    if (page < 1 || page > totalPages || loading) return
+    if (page < 1 || loading) return
+    if (page > currentPage && !hasNext) return
+    if (totalKnown && page > totalPages) return
     onPageChange?.(page)
   }
 
   // 渲染分页控件
   const renderPagination = () => {
-    if (!pagination || totalPages <= 1) return null
+    if (!showPagination) return null
 
     const pageNumbers: (number | string)[] = []
     const maxVisiblePages = 5
@@ -127,7 +133,7 @@ export const QueryResultTable: React.FC<QueryResultTableProps> = ({
         {/* 上一页 */}
         <button
           onClick={() => handlePageChange(currentPage - 1)}
-          disabled={currentPage === 1 || loading}
+          disabled={!hasPrev || loading}
           className="p-1.5 rounded hover:bg-gray-100 disabled:opacity-50 disabled:cursor-not-allowed transition-colors"
           title="上一页"
         >
@@ -159,7 +165,7 @@ export const QueryResultTable: React.FC<QueryResultTableProps> = ({
         {/* 下一页 */}
         <button
           onClick={() => handlePageChange(currentPage + 1)}
-          disabled={currentPage === totalPages || loading}
+          disabled={!hasNext || loading}
           className="p-1.5 rounded hover:bg-gray-100 disabled:opacity-50 disabled:cursor-not-allowed transition-colors"
           title="下一页"
         >
@@ -169,7 +175,7 @@ export const QueryResultTable: React.FC<QueryResultTableProps> = ({
         {/* 末页 */}
         <button
           onClick={() => handlePageChange(totalPages)}
-          disabled={currentPage === totalPages || loading}
+          disabled={!totalKnown || currentPage === totalPages || loading}
           className="p-1.5 rounded hover:bg-gray-100 disabled:opacity-50 disabled:cursor-not-allowed transition-colors"
           title="末页"
         >
@@ -228,10 +234,19 @@ export const QueryResultTable: React.FC<QueryResultTableProps> = ({
             <Rows className="w-4 h-4 text-gray-400" />
             <span>
               {pagination ? (
-                <>
-                  第 {(currentPage - 1) * perPage + 1}-{Math.min(currentPage * perPage, total)} 条，
-                  共 {total.toLocaleString()} 条
-                </>
+                totalKnown ? (
+                  <>
+                    第 {(currentPage - 1) * perPage + 1}-{Math.min(currentPage * perPage, total)} 条，
+                    共 {total.toLocaleString()} 条
+                  </>
+                ) : (
+                  <>
+                    第 {(currentPage - 1) * perPage + 1}-{(currentPage - 1) * perPage + row_count} 条
+                    {total_count != null && (
+                      <>，{total_estimated ? '约' : '共'} {total_count.toLocaleString()} 条</>
+                    )}
+                  </>
+                )
               ) : (
                 <>{row_count.toLocaleString()} 条记录</>
               )}
@@ -341,7 +356,7 @@ export const QueryResultTable: React.FC<QueryResultTableProps> = ({
       </div>
 
       {/* 底部分页（移动端） */}
-      {pagination && totalPages > 1 && (
+      {showPagination && (
         <div className="bg-white border-t px-4 py-2 flex items-center justify-center sm:hidden">
           {renderPagination()}
         </div>
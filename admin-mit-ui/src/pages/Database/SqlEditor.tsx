@@ -52,7 +52,7 @@ export const SqlEditor: React.FC<SqlEditorProps> = ({
   const textareaRef = useRef<HTMLTextAreaElement>(null)
 
   // 执行 SQL
-  const executeQuery = async (page: number = 1) => {
+  const executeQuery = async (page: number = 1, sessionId?: string) => {
     if (!sql.trim()) {
       databaseToast.warning('请输入 SQL', '请输入要执行的 SQL 语句')
       return
@@ -66,7 +66,8 @@ export const SqlEditor: React.FC<SqlEditorProps> = ({
         sql: sql.trim(),
         page,
         per_page: perPage,
-        max_rows: 10000
+        max_rows: 10000,
+        session_id: sessionId
       })
       
       setResult(queryResult)
@@ -139,7 +140,11 @@ export const SqlEditor: React.FC<SqlEditorProps> = ({
     return () => window.removeEventListener('keydown', handleKeyDown)
   }, [sql, isFullscreen])
 
-  const totalPages = result?.pagination?.pages || 1
+  // 总数未知时 pages 为已知页数下界，翻页以 has_prev/has_next 为准
+  const pagination = result?.pagination
+  const totalPages = pagination?.pages || 1
+  const hasPrev = pagination?.has_prev ?? currentPage > 1
+  const hasNext = pagination?.has_next ?? currentPage < totalPages
 
   return (
     <div className={`flex flex-col h-full ${isFullscreen ? 'fixed inset-0 z-50 bg-white' : ''}`}>
@@ -309,22 +314,31 @@ export const SqlEditor: React.FC<SqlEditorProps> = ({
             </div>
 
             {/* 分页 */}
-            {totalPages > 1 && (
+            {(totalPages > 1 || hasPrev || hasNext) && (
               <div className="flex items-center justify-between px-4 py-3 bg-gray-50 border-t">
                 <div className="text-sm text-gray-500">
-                  第 {currentPage} / {totalPages} 页，共 {result.row_count} 条
+                  {pagination?.total != null ? (
+                    <>第 {currentPage} / {totalPages} 页，共 {pagination.total} 条</>
+                  ) : (
+                    <>
+                      第 {currentPage} 页
+                      {result.total_count != null && (
+                        <>，{result.total_estimated ? '约' : '共'} {result.total_count} 条</>
+                      )}
+                    </>
+                  )}
                 </div>
                 <div className="flex items-center gap-2">
                   <button
-                    onClick={() => executeQuery(currentPage - 1)}
-                    disabled={currentPage <= 1 || executing}
+                    onClick={() => executeQuery(currentPage - 1, result?.session_id)}
+                    disabled={!hasPrev || executing}
                     className="px-3 py-1.5 text-sm border rounded-lg hover:bg-gray-100 disabled:opacity-50 disabled:cursor-not-allowed"
                   >
                     <ChevronLeft className="w-4 h-4" />
                   </button>
                   <button
-                    onClick={() => executeQuery(currentPage + 1)}
-                    disabled={currentPage >= totalPages || executing}
+                    onClick={() => executeQuery(currentPage + 1, result?.session_id)}
+                    disabled={!hasNext || executing}
                     className="px-3 py-1.5 text-sm border rounded-lg hover:bg-gray-100 disabled:opacity-50 disabled:cursor-not-allowed"
                   >
                     <ChevronRight className="w-4 h-4" />
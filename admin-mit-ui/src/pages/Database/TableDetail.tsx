@@ -124,7 +124,7 @@ export const TableDetail: React.FC<TableDetailProps> = ({
   }, [connection.id, table.name, schema])
 
   // 加载数据预览
-  const loadData = useCallback(async (page: number = 1) => {
+  const loadData = useCallback(async (page: number = 1, sessionId?: string) => {
     try {
       setLoadingData(true)
       // 构建查询 SQL
@@ -135,7 +135,8 @@ export const TableDetail: React.FC<TableDetailProps> = ({
         sql,
         page,
         per_page: dataPerPage,
-        max_rows: 1000
+        max_rows: 1000,
+        session_id: sessionId
       })
       setDataResult(result)
       setDataPage(page)
@@ -402,8 +403,11 @@ export const TableDetail: React.FC<TableDetailProps> = ({
       )
     }
 
-    const { columns: cols, rows, row_count, execution_time, pagination } = dataResult
+    const { columns: cols, rows, row_count, execution_time, pagination, total_count, total_estimated } = dataResult
+    // 总数未知时 pages 为已知页数下界，翻页以 has_prev/has_next 为准
     const totalPages = pagination?.pages || 1
+    const hasPrev = pagination?.has_prev ?? dataPage > 1
+    const hasNext = pagination?.has_next ?? dataPage < totalPages
 
     return (
       <div className="flex flex-col h-full">
@@ -459,22 +463,29 @@ export const TableDetail: React.FC<TableDetailProps> = ({
         </div>
 
         {/* 分页 */}
-        {totalPages > 1 && (
+        {(totalPages > 1 || hasPrev || hasNext) && (
           <div className="flex items-center justify-between px-4 py-3 bg-gray-50 border-t">
             <div className="text-sm text-gray-500">
-              第 {dataPage} / {totalPages} 页
+              {pagination?.total != null ? (
+                <>第 {dataPage} / {totalPages} 页，共 {pagination.total} 条</>
+              ) : (
+                <>
+                  第 {dataPage} 页
+                  {total_count != null && <>，{total_estimated ? '约' : '共'} {total_count} 条</>}
+                </>
+              )}
             </div>
             <div className="flex items-center gap-2">
               <button
-                onClick={() => loadData(dataPage - 1)}
-                disabled={dataPage <= 1 || loadingData}
+                onClick={() => loadData(dataPage - 1, dataResult?.session_id)}
+                disabled={!hasPrev || loadingData}
                 className="px-3 py-1.5 text-sm border rounded-lg hover:bg-gray-100 disabled:opacity-50 disabled:cursor-not-allowed"
               >
                 <ChevronLeft className="w-4 h-4" />
               </button>
               <button
-                onClick={() => loadData(dataPage + 1)}
-                disabled={dataPage >= totalPages || loadingData}
+                onClick={() => loadData(dataPage + 1, dataResult?.session_id)}
+                disabled={!hasNext || loadingData}
                 className="px-3 py-1.5 text-sm border rounded-lg hover:bg-gray-100 disabled:opacity-50 disabled:cursor-not-allowed"
               >
                 <ChevronRight className="w-4 h-4" />
@@ -143,9 +143,9 @@ export const KeyDetail: React.FC<KeyDetailProps> = ({
     loadKeyDetail()
   }, [loadKeyDetail])
 
-  // 保存键值
+  // 保存键值（集合只加载了部分元素时不能整体替换）
   const handleSave = async () => {
-    if (!state.keyDetail) return
+    if (!state.keyDetail || state.keyDetail.truncated) return
 
     try {
       setState(prev => ({ ...prev, saving: true }))
@@ -164,6 +164,7 @@ export const KeyDetail: React.FC<KeyDetailProps> = ({
 
       await redisService.updateKey(connection.id, keyInfo.key, {
         value: valueToSave,
+        type: state.keyDetail.type,
         ttl: state.editedTTL && state.editedTTL > 0 ? state.editedTTL : undefined
       })
 
@@ -427,6 +428,17 @@ export const KeyDetail: React.FC<KeyDetailProps> = ({
           </div>
         </div>
 
+        {/* 集合过大时只显示第一页，只读 */}
+        {state.keyDetail.truncated && (
+          <div className="flex items-start space-x-2 p-3 text-sm text-yellow-800 bg-yellow-50 border border-yellow-200 rounded-lg">
+            <AlertTriangle className="w-4 h-4 mt-0.5 flex-shrink-0" />
+            <span>
+              仅显示前 {Array.isArray(state.keyDetail.value) ? state.keyDetail.value.length : Object.keys(state.keyDetail.value || {}).length} 个元素
+              （共 {state.keyDetail.total} 个），集合过大不能整体编辑，请使用字段/成员级操作修改
+            </span>
+          </div>
+        )}
+
         {/* 根据类型显示不同的编辑器 */}
         {state.keyDetail.type === 'string' ? (
           <textarea
@@ -441,7 +453,7 @@ export const KeyDetail: React.FC<KeyDetailProps> = ({
             <textarea
               value={state.editedValue}
               onChange={(e) => setState(prev => ({ ...prev, editedValue: e.target.value }))}
-              readOnly={!hasPermission('redis:update')}
+              readOnly={!hasPermission('redis:update') || !!state.keyDetail.truncated}
               className="w-full h-64 px-3 py-2 font-mono text-sm border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-red-500 resize-y"
               placeholder="JSON 格式的值"
             />
@@ -469,7 +481,7 @@ export const KeyDetail: React.FC<KeyDetailProps> = ({
         >
           关闭
         </button>
-        {hasPermission('redis:update') && (
+        {hasPermission('redis:update') && !state.keyDetail.truncated && (
           <button
             onClick={handleSave}
             disabled={state.saving}
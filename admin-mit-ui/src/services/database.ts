@@ -200,10 +200,13 @@ export interface QueryResult {
   row_count: number
   execution_time: number  // 毫秒
   affected_rows?: number
+  total_count?: number | null  // 未知时为 null
+  total_estimated?: boolean  // total_count 是否为执行计划估算值
+  session_id?: string  // 查询会话 ID（SELECT 查询），翻页时传回
   pagination?: {
     page: number
     per_page: number
-    total: number
+    total: number | null  // 总数未知时为 null
     pages: number
     has_prev: boolean
     has_next: boolean
@@ -230,6 +233,7 @@ export interface ExecuteQueryRequest {
   page?: number
   per_page?: number
   max_rows?: number
+  session_id?: string  // 翻页时传回上次返回的 session_id；不传则重新执行查询
 }
 
 /**
@@ -84,7 +84,48 @@ export interface KeyInfo {
 
 // 键详情（包含值）
 export interface KeyDetail extends KeyInfo {
-  value: any
+  value: any  // 集合类型只包含第一页
+  total?: number | null  // 集合元素总数
+  truncated?: boolean  // 集合是否只返回了部分元素（此时不能整体替换）
+  next_cursor?: number | null  // 下一页游标（Hash/Set）或起始索引（List/ZSet）
+}
+
+// Hash 分页响应
+export interface HashPage {
+  key: string
+  type: 'hash'
+  fields: Record<string, string>
+  field_count: number
+  total: number
+  cursor: number  // 0 表示读取完成
+}
+
+// Set 分页响应
+export interface SetPage {
+  key: string
+  type: 'set'
+  members: string[]
+  member_count: number
+  total: number
+  cursor: number  // 0 表示读取完成
+}
+
+// List 分页响应
+export interface ListPage {
+  key: string
+  type: 'list'
+  elements: string[]
+  element_count: number
+  next_start: number | null  // null 表示读取完成
+}
+
+// ZSet 分页响应
+export interface ZSetPage {
+  key: string
+  type: 'zset'
+  members: Array<{ member: string; score: number }>
+  member_count: number
+  next_start: number | null  // null 表示读取完成
 }
 
 // 扫描键响应
@@ -268,10 +309,12 @@ class RedisService {
   // ==================== Hash 操作 ====================
 
   /**
-   * 获取 Hash 所有字段
+   * 分页获取 Hash 字段（HSCAN，cursor 为 0 表示读取完成）
    */
-  async hgetAll(connId: number, key: string): Promise<Record<string, string>> {
-    const response = await api.get(`${this.baseUrl}/${connId}/hash/${encodeURIComponent(key)}`)
+  async hgetAll(connId: number, key: string, cursor: number = 0, count?: number): Promise<HashPage> {
+    const response = await api.get(`${this.baseUrl}/${connId}/hash/${encodeURIComponent(key)}`, {
+      params: { cursor, count }
+    })
     return response.data
   }
 
@@ -296,7 +339,7 @@ class RedisService {
   /**
    * 获取 List 元素
    */
-  async lrange(connId: number, key: string, start: number = 0, stop: number = -1): Promise<string[]> {
+  async lrange(connId: number, key: string, start: number = 0, stop: number = -1): Promise<ListPage> {
     const response = await api.get(`${this.baseUrl}/${connId}/list/${encodeURIComponent(key)}`, {
       params: { start, stop }
     })
@@ -325,10 +368,12 @@ class RedisService {
   // ==================== Set 操作 ====================
 
   /**
-   * 获取 Set 成员
+   * 分页获取 Set 成员（SSCAN，cursor 为 0 表示读取完成）
    */
-  async smembers(connId: number, key: string): Promise<string[]> {
-    const response = await api.get(`${this.baseUrl}/${connId}/set/${encodeURIComponent(key)}`)
+  async smembers(connId: number, key: string, cursor: number = 0, count?: number): Promise<SetPage> {
+    const response = await api.get(`${this.baseUrl}/${connId}/set/${encodeURIComponent(key)}`, {
+      params: { cursor, count }
+    })
     return response.data
   }
 
@@ -353,7 +398,7 @@ class RedisService {
   /**
    * 获取 ZSet 成员
    */
-  async zrange(connId: number, key: string, start: number = 0, stop: number = -1, withscores: boolean = true): Promise<Array<{ member: string; score: number }>> {
+  async zrange(connId: number, key: string, start: number = 0, stop: number = -1, withscores: boolean = true): Promise<ZSetPage> {
     const response = await api.get(`${this.baseUrl}/${connId}/zset/${encodeURIComponent(key)}`, {
       params: { start, stop, withscores }
     })
@@ -28,7 +28,7 @@ export interface TerminalCommandRecord {
 export interface SSHTerminalConfig {
   cols?: number
   rows?: number
-  onData?: (data: string) => void
+  onData?: (data: string | Uint8Array) => void
   onResize?: (cols: number, rows: number) => void
   onConnected?: () => void
   onDisconnected?: (reason?: string) => void
@@ -151,10 +151,13 @@ export class SSHTerminalService {
     this.cleanupFunctions.push(this.socketManager.on('webshell_terminal_created', onTerminalCreated))
 
     // 终端输出
-    const onOutput = (data: any) => {
+    // 二进制帧为原始字节（xterm 自行处理 UTF-8 解码），处理后回执 ack 以便服务端流控
+    const onOutput = (data: any, ack?: () => void) => {
       if (data.session_id === this.session?.sessionId) {
-        this.config.onData?.(data.data)
+        const payload = data.data instanceof ArrayBuffer ? new Uint8Array(data.data) : data.data
+        this.config.onData?.(payload)
       }
+      ack?.()
     }
     this.cleanupFunctions.push(this.socketManager.on('webshell_output', onOutput))
 
@@ -224,7 +227,8 @@ export class SSHTerminalService {
     this.socketManager.send('webshell_create_terminal', {
       session_id: this.session.sessionId,
       cols: this.session.terminalSize.cols,
-      rows: this.session.terminalSize.rows
+      rows: this.session.terminalSize.rows,
+      binary: true
     })
   }
 
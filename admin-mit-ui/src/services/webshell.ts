@@ -184,11 +184,13 @@ export class WebShellService {
     })
 
     // 终端输出
-    this.socket.on('webshell_output', (data: any) => {
-      console.log('Received webshell_output:', data.session_id, 'expected:', sessionId, 'data length:', data.data?.length)
+    // 二进制帧为原始字节（xterm 自行处理 UTF-8 解码），处理后回执 ack 以便服务端流控
+    this.socket.on('webshell_output', (data: any, ack?: () => void) => {
       if (data.session_id === sessionId) {
-        this.emit('terminalData', data.data)
+        const payload = data.data instanceof ArrayBuffer ? new Uint8Array(data.data) : data.data
+        this.emit('terminalData', payload)
       }
+      ack?.()
     })
 
     // 终端大小调整确认
@@ -238,7 +240,8 @@ export class WebShellService {
       session_id: sessionId,
       cols,
       rows,
-      use_bridge: true  // 使用优化的桥接模式
+      use_bridge: true,  // 使用优化的桥接模式
+      binary: true  // 接收二进制输出帧
     })
   }
 
@@ -321,7 +324,7 @@ export class WebShellService {
   /**
    * 监听终端数据
    */
-  onTerminalData(callback: (data: string) => void): () => void {
+  onTerminalData(callback: (data: string | Uint8Array) => void): () => void {
     return this.on('terminalData', callback)
   }
 